@@ -3,14 +3,33 @@ Route Aide à la Décision / Decision Support route.
 Simulation pure — aucun impact sur les données.
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import require_permission
+from app.api.deps import (
+    authenticate_websocket,
+    get_user_tenant_id,
+    require_permission,
+    user_has_permission,
+)
 from app.database import get_db
 from app.models.user import User
-from app.schemas.aide_decision import AideDecisionRequest, AideDecisionResponse
+from app.schemas.aide_decision import (
+    AideDecisionBatchRequest,
+    AideDecisionBatchResponse,
+    AideDecisionRequest,
+    AideDecisionResponse,
+)
 from app.services.aide_decision import AideDecisionService
+from app.services.aide_decision_batch import AideDecisionBatchService
+from app.services.aide_decision_jobs import (
+    TooManyJobsError,
+    cancel_job,
+    get_job,
+    submit_job,
+    subscribe,
+    unsubscribe,
+)
 
 router = APIRouter()
 
@@ -26,3 +45,100 @@ async def generate_aide_decision(
     """
     service = AideDecisionService(db)
     return await service.generate(request)
+
+
+@router.post("/batch", response_model=AideDecisionBatchResponse)
+async def generate_aide_decision_batch(
+    request: AideDecisionBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(require_permission("aide-decision", "read")),
+) -> AideDecisionBatchResponse:
+    """Simulation consolidée de plusieurs (base, température) pour une date /
+    Consolidated simulation of several (base, temperature) scopes for one date.
+    Contrats répartis entre périmètres, calculs en parallèle. Aucune donnée modifiée.
+    """
+    service = AideDecisionBatchService(db)
+    return await service.generate(request)
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_aide_decision_job(
+    request: AideDecisionRequest,
+    user: User = Depends(require_permission("aide-decision", "read")),
+) -> dict:
+    """Lancer une simulation en arrière-plan / Start a background simulation.
+
+    Retourne l'identifiant du job ; suivre la progression sur
+    `/aide-decision/jobs/{job_id}/ws`, lire le résultat via GET.
+    """
+    try:
+        job = await submit_job(request, user.id, get_user_tenant_id(user))
+    except TooManyJobsError as exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(exc))
+    return job.as_dict()
+
+
+@router.get("/jobs/{job_id}")
+async def get_aide_decision_job(
+    job_id: str,
+    user: User = Depends(require_permission("aide-decision", "read")),
+) -> dict:
+    """État du job, avec le résultat une fois terminé / Job state, with the result once done."""
+    job = await get_job(job_id, user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return job.as_dict(with_result=True)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_aide_decision_job(
+    job_id: str,
+    user: User = Depends(require_permission("aide-decision", "read")),
+) -> dict:
+    """Annuler un job en cours (le solveur est arrêté) / Cancel a running job (stops the solver)."""
+    job = await get_job(job_id, user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    if not await cancel_job(job):
+        raise HTTPException(status_code=409, detail=f"Job déjà terminé ({job.status})")
+    return job.as_dict()
+
+
+@router.websocket("/jobs/{job_id}/ws")
+async def websocket_aide_decision_job(
+    websocket: WebSocket,
+    job_id: str,
+    token: str = Query(default=""),
+):
+    """Flux de progression d'un job / Job progress stream.
+
+    Messages : `job_status` (état complet, dont le premier envoyé à la
+    connexion) et `job_progress` (meilleure solution courante du solveur).
+    La connexion est fermée par le serveur quand le job se termine.
+    """
+    user = await authenticate_websocket(websocket, token)
+    if user is None:
+        return
+    if not user_has_permission(user, "aide-decision", "read"):
+        await websocket.close(code=4003, reason="Permission required: aide-decision:read")
+        return
+    # Job d'un autre utilisateur = introuvable / another user's job: not found
+    job = await get_job(job_id, user.id)
+    if job is None:
+        await websocket.close(code=4004, reason="Job not found")
+        return
+
+    await websocket.accept()
+    queue = subscribe(job)
+    try:
+        await websocket.send_json({"type": "job_status", "job": job.as_dict()})
+        finished = job.finished
+        while not finished:
+            message = await queue.get()
+            await websocket.send_json(message)
+            finished = message["type"] == "job_status" and message["job"]["status"] != "running"
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        unsubscribe(job, queue)
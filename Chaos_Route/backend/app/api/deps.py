@@ -5,16 +5,19 @@ Injectées dans les routes via Depends().
 
 from datetime import datetime, timezone
 
-from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi import Depends, Header, HTTPException, Request, WebSocket, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.database import get_db, set_session_tenant
+from app.database import async_session, get_db, set_session_tenant
 from app.models.device_assignment import DeviceAssignment
 from app.models.mobile_device import MobileDevice
 from app.models.tenant import DEFAULT_TENANT_ID
 from app.models.user import User
+from app.services.device_cache import last_seen_buffer, load_device
+from app.services.principal_cache import Principal, bind_principal, principal_cache, principal_of
 from app.utils.auth import decode_token
 
 # Permission spéciale levant le cloisonnement tenant (lecture multi-société) /
@@ -58,12 +61,13 @@ async def get_current_user(
     if await is_revoked(db, payload.get("jti")):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
 
-    user_id = int(payload["sub"])
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-
-    if user is None or not user.is_active:
+    principal = await get_principal(int(payload["sub"]))
+    if principal is None or not principal.user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
+    # Copie attachée à la session de la requête, sans requête SQL : l'endpoint
+    # peut la modifier et valider / Session-bound copy, no SQL: endpoints may
+    # modify and commit it.
+    user = bind_principal(await db.merge(principal.user, load=False), principal)
 
     # Compte avec rotation de mot de passe imposée (ex. superadmin seedé) :
     # bloquer tout sauf la consultation du profil et le changement de mot de passe /
@@ -77,26 +81,48 @@ async def get_current_user(
     # Positionner le tenant courant sur la session : toutes les requêtes suivantes
     # de cette requête HTTP seront filtrées automatiquement (None = pas de filtre,
     # pour superadmin / rôle consolidation) / Set current tenant on the session.
-    set_session_tenant(db, get_user_tenant_id(user))
+    set_session_tenant(db, principal.tenant_id)
     # Acteur pour l'audit ORM généralisé (STIME A5) / Actor for the generic audit trail
     db.info["actor"] = user.username
 
     return user
 
 
+async def get_principal(user_id: int) -> Principal | None:
+    """Utilisateur authentifié précalculé, depuis le cache ou la base /
+    Precomputed authenticated user, from the cache or the database.
+
+    Sur défaut de cache, l'utilisateur (rôles, permissions, régions) est lu
+    dans une session dédiée puis détaché : l'instantané n'appartient à aucune
+    requête. None si l'utilisateur n'existe pas.
+    """
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    generation = principal_cache.generation()
+    async with async_session() as session:
+        user = (await session.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+        if user is None:
+            return None
+        principal = Principal(
+            user=user,
+            tenant_id=get_user_tenant_id(user),
+            permissions=frozenset((p.resource, p.action) for role in user.roles for p in role.permissions),
+            region_ids=tuple(r.id for r in user.regions),
+        )
+        session.expunge_all()
+    bind_principal(user, principal)
+    principal_cache.put(user_id, principal, generation)
+    return principal
+
+
 def user_can_consolidate(user: User) -> bool:
     """L'utilisateur a-t-il le droit de consolidation multi-société ? /
     May the user read across tenants?
 
     Superadmin ou rôle portant la permission `consolidation:read`.
     """
-    if user.is_superadmin:
-        return True
-    for role in user.roles:
-        for perm in role.permissions:
-            if perm.resource == CONSOLIDATION_RESOURCE and perm.action == CONSOLIDATION_ACTION:
-                return True
-    return False
+    return user_has_permission(user, CONSOLIDATION_RESOURCE, CONSOLIDATION_ACTION)
 
 
 def get_user_tenant_id(user: User) -> int | None:
@@ -125,6 +151,46 @@ async def require_superadmin(user: User = Depends(get_current_user)) -> User:
     return user
 
 
+def user_has_permission(user: User, resource: str, action: str) -> bool:
+    """L'utilisateur porte-t-il la permission ? (superadmin : toujours) /
+    Does the user hold the permission? (superadmin: always)"""
+    if user.is_superadmin:
+        return True
+    principal = principal_of(user)
+    if principal is not None:
+        return (resource, action) in principal.permissions
+    for role in user.roles:
+        for perm in role.permissions:
+            if perm.resource == resource and perm.action == action:
+                return True
+    return False
+
+
+async def authenticate_websocket(websocket: WebSocket, token: str = "") -> User | None:
+    """Authentifier une connexion WebSocket (JWT) / Authenticate a WebSocket connection.
+
+    Jeton en query param (legacy) ou cookie HttpOnly `access_token` (web, STIME A4).
+    En cas d'échec la connexion est fermée (4001) et None est retourné.
+    """
+    raw_token = token or websocket.cookies.get("access_token", "")
+    payload = decode_token(raw_token) if raw_token else None
+    if payload is None or payload.get("type") != "access":
+        await websocket.close(code=4001, reason="Invalid token")
+        return None
+    try:
+        user_id = int(payload["sub"])
+    except (KeyError, ValueError, TypeError):
+        await websocket.close(code=4001, reason="Invalid token")
+        return None
+
+    principal = await get_principal(user_id)
+    if principal is None or not principal.user.is_active:
+        await websocket.close(code=4001, reason="User not found or inactive")
+        return None
+    # Instantané détaché partagé : lecture seule / shared detached snapshot: read-only
+    return principal.user
+
+
 def require_permission(resource: str, action: str):
     """Factory de dépendance qui vérifie une permission / Dependency factory that checks a permission.
 
@@ -132,14 +198,9 @@ def require_permission(resource: str, action: str):
     """
 
     async def _check(user: User = Depends(get_current_user)) -> User:
-        if user.is_superadmin:
+        if user_has_permission(user, resource, action):
             return user
 
-        for role in user.roles:
-            for perm in role.permissions:
-                if perm.resource == resource and perm.action == action:
-                    return user
-
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Permission required: {resource}:{action}",
@@ -157,19 +218,18 @@ async def get_authenticated_device(
     """Authentifier un appareil mobile via son UUID / Authenticate a mobile device via its UUID.
 
     Le telephone envoie son device_identifier dans le header X-Device-ID.
-    Met a jour automatiquement app_version, os_version, last_seen_at.
+    Met a jour automatiquement app_version, os_version (si modifiées) et
+    last_seen_at (regroupé, cf. services/device_cache).
     """
     if not x_device_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing X-Device-ID header")
 
-    result = await db.execute(
-        select(MobileDevice).where(MobileDevice.device_identifier == x_device_id)
-    )
-    device = result.scalar_one_or_none()
+    # Instantané en cache (sans requête SQL) / Cached snapshot (no SQL)
+    snapshot = await load_device(x_device_id)
 
-    if device is None:
+    if snapshot is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown device")
-    if not device.is_active:
+    if not snapshot.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Device deactivated")
 
     # Positionner le tenant de l'appareil sur la session : sans ça, les opérations
@@ -178,16 +238,24 @@ async def get_authenticated_device(
     # backfill de démarrage, et lues sans cloisonnement. Une tablette appartient à
     # une société : tout son trafic est scopé à ce tenant. /
     # Set the device's tenant on the session (mobile ops were running tenant-less).
-    set_session_tenant(db, device.tenant_id)
+    set_session_tenant(db, snapshot.tenant_id)
     # Acteur pour l'audit ORM généralisé (STIME A5) / Actor for the generic audit trail
-    db.info["actor"] = f"device:{device.id}"
+    db.info["actor"] = f"device:{snapshot.id}"
 
-    # Auto-update tracabilite / Auto-update traceability fields
+    # Copie attachée à la session de la requête / Copy bound to the request session
+    device = await db.merge(snapshot, load=False)
+
+    # last_seen_at : battement regroupé, écrit en lot hors audit ; la copie le
+    # reflète sans être modifiée / coalesced heartbeat, batch-written outside
+    # the audit trail; the copy reflects it without being dirtied
     now = datetime.now(timezone.utc).isoformat(timespec="seconds")
-    device.last_seen_at = now
-    if x_app_version:
+    last_seen_buffer.touch(device.id, now)
+    set_committed_value(device, "last_seen_at", now)
+    # Versions : écrites seulement si elles changent (mise à jour de l'app) /
+    # versions: written only when they change (app update)
+    if x_app_version and device.app_version != x_app_version:
         device.app_version = x_app_version
-    if x_os_version:
+    if x_os_version and device.os_version != x_os_version:
         device.os_version = x_os_version
 
     return device
@@ -233,9 +301,9 @@ def get_user_region_ids(user: User) -> list[int] | None:
     """
     if user.is_superadmin:
         return None
-    if not user.regions:
-        return None
-    return [r.id for r in user.regions]
+    principal = principal_of(user)
+    region_ids = list(principal.region_ids) if principal is not None else [r.id for r in user.regions]
+    return region_ids or None
 
 
 def get_user_pdv_id(user: User) -> int | None:
@@ -25,6 +25,7 @@ from app.models.user import User
 from app.models.vehicle_inspection import VehicleInspection
 from app.schemas.mobile import MobileDeviceCreate, MobileDeviceRead, MobileDeviceUpdate, DeviceRegistration
 from app.api.deps import require_permission, get_authenticated_device
+from app.services.device_cache import overlay_last_seen
 
 router = APIRouter()
 
@@ -66,7 +67,9 @@ async def list_devices(
     if base_id is not None:
         query = query.where(MobileDevice.base_id == base_id)
     result = await db.execute(query)
-    return result.scalars().all()
+    devices = result.scalars().all()
+    overlay_last_seen(devices)
+    return devices
 
 
 @router.get("/{device_id}", response_model=MobileDeviceRead)
@@ -78,6 +81,7 @@ async def get_device(
     device = await db.get(MobileDevice, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
+    overlay_last_seen([device])
     return device
 
 
@@ -21,7 +21,6 @@ from app.database import get_db
 from app.models.audit import AuditLog
 from app.models.delivery_alert import AlertSeverity, AlertType, DeliveryAlert
 from app.models.device_assignment import DeviceAssignment
-from app.models.gps_position import GPSPosition
 from app.models.mobile_device import MobileDevice
 from app.models.pdv import PDV
 from app.models.stop_event import StopEvent, StopEventType
@@ -61,6 +60,7 @@ from app.schemas.combi_scan import (
 from app.schemas.inventory import InventorySubmit
 from app.api.deps import get_authenticated_device, require_device_tour_access
 from app.api.ws_tracking import manager
+from app.services.gps_ingest import gps_write_buffer, insert_positions, load_gps_context
 
 router = APIRouter()
 
@@ -556,62 +556,54 @@ async def submit_gps_batch(
     db: AsyncSession = Depends(get_db),
     device: MobileDevice = Depends(get_authenticated_device),
 ):
-    """Batch GPS positions / Batch insert GPS positions."""
+    """Batch GPS positions / Batch insert GPS positions.
+
+    Pipeline d'ingestion (services/gps_ingest) : contexte affectation /
+    consentement / tour en cache, insertion Core (ou COPY), tampon
+    d'écriture différée optionnel.
+    """
     # Verifier que l'appareil est assigne a ce tour / Verify device is assigned to this tour
-    assignment_result = await db.execute(
-        select(DeviceAssignment).where(
-            DeviceAssignment.tour_id == data.tour_id,
-            DeviceAssignment.device_id == device.id,
-        ).limit(1)
-    )
-    if not assignment_result.scalar_one_or_none():
+    context = await load_gps_context(db, device.id, data.tour_id)
+    if not context.assigned:
         raise HTTPException(status_code=403, detail="Device not assigned to this tour")
 
     # Opt-out geolocalisation (RGPD, STIME A7) : si le chauffeur a refuse le
     # suivi, les positions sont ignorees cote serveur (defense en profondeur,
     # meme si l'app cesse d'emettre) / GPS opt-out: drop positions server-side.
-    from app.services.consent import GPS_TRACKING, get_latest_consent
-    consent = await get_latest_consent(db, GPS_TRACKING, device_id=device.id)
-    if consent is not None and not consent.granted:
+    if context.opted_out:
         return {"inserted": 0, "detail": "Suivi GPS refuse par le chauffeur (opt-out)"}
 
-    positions = []
-    for pos in data.positions:
-        gps = GPSPosition(
-            device_id=device.id,
-            tour_id=data.tour_id,
-            latitude=pos.latitude,
-            longitude=pos.longitude,
-            accuracy=pos.accuracy,
-            speed=pos.speed,
-            timestamp=pos.timestamp,
-        )
-        db.add(gps)
-        positions.append({
+    rows = [
+        {
+            "device_id": device.id,
+            "tour_id": data.tour_id,
             "latitude": pos.latitude,
             "longitude": pos.longitude,
-            "speed": pos.speed,
             "accuracy": pos.accuracy,
+            "speed": pos.speed,
             "timestamp": pos.timestamp,
-        })
-    await db.flush()
+            "tenant_id": device.tenant_id,
+        }
+        for pos in data.positions
+    ]
+    if not (gps_write_buffer.enabled and gps_write_buffer.add(rows)):
+        await insert_positions(db, rows)
 
     # Broadcast WebSocket
-    tour = await db.get(Tour, data.tour_id)
-    if positions:
-        last = positions[-1]
-        await manager.broadcast(tenant_id=device.tenant_id, message={
+    if rows:
+        last = rows[-1]
+        await manager.broadcast(tenant_id=device.tenant_id, base_id=context.base_id, message={
             "type": "gps_update",
             "tour_id": data.tour_id,
-            "tour_code": tour.code if tour else "",
-            "driver_name": tour.driver_name if tour else "",
+            "tour_code": context.tour_code,
+            "driver_name": context.driver_name,
             "latitude": last["latitude"],
             "longitude": last["longitude"],
             "speed": last["speed"],
             "timestamp": last["timestamp"],
         })
 
-    return {"inserted": len(data.positions)}
+    return {"inserted": len(rows)}
 
 
 @router.post("/tour/{tour_id}/stops/{stop_id}/scan-pdv")
@@ -681,7 +673,7 @@ async def scan_pdv(
 
     await db.flush()
 
-    await manager.broadcast(tenant_id=device.tenant_id, message={
+    await manager.broadcast(tenant_id=device.tenant_id, base_id=tour.base_id if tour else None, message={
         "type": "stop_event",
         "event": "ARRIVAL",
         "tour_id": tour_id,
@@ -869,7 +861,7 @@ async def reopen_stop(
 
     await db.flush()
 
-    await manager.broadcast(tenant_id=device.tenant_id, message={
+    await manager.broadcast(tenant_id=device.tenant_id, base_id=tour.base_id if tour else None, message={
         "type": "stop_event",
         "event": "REOPEN",
         "tour_id": tour_id,
@@ -905,7 +897,7 @@ async def return_to_base(
 
     await db.flush()
 
-    await manager.broadcast(tenant_id=device.tenant_id, message={
+    await manager.broadcast(tenant_id=device.tenant_id, base_id=tour.base_id, message={
         "type": "tour_status",
         "tour_id": tour_id,
         "tour_code": tour.code,
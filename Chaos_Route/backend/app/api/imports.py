@@ -1,9 +1,13 @@
 """Routes Import CSV/Excel / Import API routes."""
 
-from datetime import time as dt_time
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, time as dt_time
 
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
-from sqlalchemy import select, inspect, func, delete as sa_delete, update as sa_update
+from sqlalchemy import select, inspect, func, delete as sa_delete, insert as sa_insert, update as sa_update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
@@ -19,10 +23,16 @@ from app.models.km_tax import KmTax
 from app.models.cnuf_temperature import CnufTemperature
 from app.models.tour import Tour
 from app.models.tour_manifest_line import TourManifestLine
+from app.models.audit import AuditLog
 from app.models.user import User
+from app.services.distance_matrix_store import mark_dirty
+from app.services.import_progress import get_progress, start_progress, update_progress
 from app.services.import_service import ImportService
+from app.services.timeline_versions import record_timeline_changes
 from app.api.deps import require_permission
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Mapping entité -> modèle SQLAlchemy / Entity to model mapping
@@ -260,9 +270,43 @@ def _refuse_tenantless_import(user) -> None:
         )
 
 
+# Taille des lots d'écriture du distancier / Distance matrix write batch size
+TIME_MATRIX_BATCH_SIZE = 5000
+
+
+def _read_time_matrix(content: bytes) -> tuple[list[str | None], list[tuple]] | None:
+    """Lire la matrice en streaming (openpyxl read_only) / Stream-read the matrix sheet.
+
+    Retourne (codes header normalisés à partir de la colonne D, [(n° ligne,
+    code brut colonne A, valeurs D+)]) ou None si aucune feuille active.
+    Exécutée dans un thread : le parsing ne bloque pas la boucle asyncio.
+    """
+    import openpyxl
+    from io import BytesIO
+
+    wb = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        if ws is None:
+            return None
+        rows_iter = ws.iter_rows(values_only=True)
+        header = next(rows_iter, None) or ()
+        header_codes = [_normalize_code(raw) for raw in header[3:]]  # D = col 4
+        next(rows_iter, None)  # Ligne 2 : labels / Row 2: labels
+        rows = [
+            (row_idx, values[0], values[3:])
+            for row_idx, values in enumerate(rows_iter, start=3)
+            if values
+        ]
+        return header_codes, rows
+    finally:
+        wb.close()
+
+
 @router.post("/time-matrix")
 async def import_time_matrix(
     file: UploadFile = File(...),
+    progress_id: str | None = Query(None, max_length=64),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_permission("imports-exports", "create")),
 ):
@@ -274,6 +318,11 @@ async def import_time_matrix(
     - Ligne 1 (header) : colonnes D+ = codes numériques des points
     - Ligne 2 : labels (ignorée)
     - Lignes 3+ : colonne A = code, colonnes D+ = temps (datetime.time)
+
+    Pipeline en lots : lecture streaming, codes résolus une fois, paires
+    existantes préchargées en UNE requête, écritures INSERT/UPDATE groupées
+    (executemany). `progress_id` (optionnel) permet de suivre l'avancement via
+    `GET /imports/progress/{progress_id}`.
     """
     if not file.filename or not file.filename.lower().endswith((".xlsx", ".xls")):
         raise HTTPException(status_code=400, detail="Only .xlsx files are supported")
@@ -282,26 +331,22 @@ async def import_time_matrix(
     _refuse_tenantless_import(user)
 
     content = await file.read()
-
-    import openpyxl
-    from io import BytesIO
+    progress = start_progress(progress_id, user.id)
+    started = time.perf_counter()
 
     try:
-        wb = openpyxl.load_workbook(BytesIO(content), data_only=True)
+        parsed = await asyncio.to_thread(_read_time_matrix, content)
     except Exception as e:
+        update_progress(progress, phase="error", message=str(e))
         raise HTTPException(status_code=400, detail=f"Error reading Excel file: {e}")
-
-    ws = wb.active
-    if ws is None:
+    if parsed is None:
+        update_progress(progress, phase="error", message="No active worksheet found")
         raise HTTPException(status_code=400, detail="No active worksheet found")
+    header_codes, rows = parsed
+    read_ms = (time.perf_counter() - started) * 1000
+    update_progress(progress, phase="resolving")
 
-    # 1. Lire les codes en header (ligne 1, colonnes D+) / Read header codes (row 1, cols D+)
-    header_codes: list[str | None] = []
-    for col_idx in range(4, ws.max_column + 1):  # D = col 4
-        raw = ws.cell(row=1, column=col_idx).value
-        header_codes.append(_normalize_code(raw))
-
-    # 2. Construire le lookup code -> (type, db_id) / Build code lookup
+    # 1. Construire le lookup code -> (type, db_id) / Build code lookup
     code_lookup = await _build_code_lookup(db)
 
     # Ajouter des variantes sans/avec zéros / Add variants without/with leading zeros
@@ -330,14 +375,37 @@ async def import_time_matrix(
                 return found
         return None
 
-    # 3. Parser les données (lignes 3+) / Parse data rows (row 3+)
+    # 2. Colonnes résolues une seule fois / Header columns resolved once
+    columns: list[tuple[int, str, int]] = []
+    for col_offset, col_code in enumerate(header_codes):
+        col_resolved = resolve_code(col_code)
+        if col_resolved is not None:
+            columns.append((col_offset, *col_resolved))
+
+    # 3. Paires existantes en UNE requête / Existing pairs in ONE query
+    result = await db.execute(select(
+        DistanceMatrix.id,
+        DistanceMatrix.origin_type,
+        DistanceMatrix.origin_id,
+        DistanceMatrix.destination_type,
+        DistanceMatrix.destination_id,
+        DistanceMatrix.duration_minutes,
+    ))
+    existing: dict[tuple[str, int, str, int], dict] = {}
+    for dm_id, o_type, o_id, d_type, d_id, minutes in result.all():
+        existing.setdefault((o_type, o_id, d_type, d_id), {"id": dm_id, "duration_minutes": minutes})
+
+    # 4. Classer chaque cellule : création, mise à jour ou inchangée /
+    #    Classify each cell: insert, update or unchanged
+    tenant_id = db.info.get("tenant_id")
+    inserts: list[dict] = []
+    updates: dict[int, dict] = {}
     created = 0
     updated = 0
     skipped = 0
     errors: list[str] = []
 
-    for row_idx in range(3, ws.max_row + 1):
-        row_code_raw = ws.cell(row=row_idx, column=1).value
+    for row_idx, row_code_raw, values in rows:
         row_code = _normalize_code(row_code_raw)
         if row_code is None:
             continue
@@ -350,71 +418,100 @@ async def import_time_matrix(
 
         row_type, row_id = row_resolved
 
-        for col_offset, col_code in enumerate(header_codes):
-            if col_code is None:
-                continue
-
-            col_resolved = resolve_code(col_code)
-            if col_resolved is None:
-                continue
-
-            col_type, col_id = col_resolved
-
+        for col_offset, col_type, col_id in columns:
             # Ignorer la diagonale / Skip diagonal
             if row_type == col_type and row_id == col_id:
                 continue
+            if col_offset >= len(values):
+                continue
 
-            cell_val = ws.cell(row=row_idx, column=4 + col_offset).value
-            minutes = _time_to_minutes(cell_val)
+            minutes = _time_to_minutes(values[col_offset])
             if minutes is None:
                 continue
 
-            # Chercher l'entrée existante (bidirectionnelle) / Find existing entry (bidirectional)
-            result = await db.execute(
-                select(DistanceMatrix).where(
-                    DistanceMatrix.origin_type == row_type,
-                    DistanceMatrix.origin_id == row_id,
-                    DistanceMatrix.destination_type == col_type,
-                    DistanceMatrix.destination_id == col_id,
-                )
-            )
-            existing = result.scalar_one_or_none()
-
-            if not existing:
-                result = await db.execute(
-                    select(DistanceMatrix).where(
-                        DistanceMatrix.origin_type == col_type,
-                        DistanceMatrix.origin_id == col_id,
-                        DistanceMatrix.destination_type == row_type,
-                        DistanceMatrix.destination_id == row_id,
-                    )
-                )
-                existing = result.scalar_one_or_none()
-
-            if existing:
-                if existing.duration_minutes != minutes:
-                    existing.duration_minutes = minutes
+            # Entrée existante (bidirectionnelle), y compris celles créées plus
+            # haut dans ce fichier / Existing entry (bidirectional), including
+            # rows created earlier in this file
+            pair = (row_type, row_id, col_type, col_id)
+            entry = existing.get(pair) or existing.get((col_type, col_id, row_type, row_id))
+
+            if entry is not None:
+                if entry["duration_minutes"] != minutes:
+                    entry["duration_minutes"] = minutes
+                    if "id" in entry:
+                        updates[entry["id"]] = entry
                     updated += 1
                 else:
                     skipped += 1
             else:
-                db.add(DistanceMatrix(
-                    origin_type=row_type,
-                    origin_id=row_id,
-                    destination_type=col_type,
-                    destination_id=col_id,
-                    distance_km=0,
-                    duration_minutes=minutes,
-                ))
+                entry = {
+                    "origin_type": row_type,
+                    "origin_id": row_id,
+                    "destination_type": col_type,
+                    "destination_id": col_id,
+                    "distance_km": 0,
+                    "duration_minutes": minutes,
+                    "tenant_id": tenant_id,
+                }
+                inserts.append(entry)
+                existing[pair] = entry
                 created += 1
 
-    if created > 0 or updated > 0:
+    # 5. Écritures groupées / Batched writes
+    update_params = [{"id": dm_id, "duration_minutes": e["duration_minutes"]} for dm_id, e in updates.items()]
+    update_progress(progress, phase="writing", total=len(inserts) + len(update_params), done=0)
+    write_started = time.perf_counter()
+
+    if inserts or update_params:
         try:
+            done = 0
+            for start in range(0, len(inserts), TIME_MATRIX_BATCH_SIZE):
+                batch = inserts[start:start + TIME_MATRIX_BATCH_SIZE]
+                await db.execute(sa_insert(DistanceMatrix), batch)
+                done += len(batch)
+                update_progress(progress, done=done)
+            for start in range(0, len(update_params), TIME_MATRIX_BATCH_SIZE):
+                batch = update_params[start:start + TIME_MATRIX_BATCH_SIZE]
+                # UPDATE par clé primaire ; ids issus de la lecture déjà filtrée
+                # par tenant / Update by primary key; ids come from the
+                # tenant-filtered read above
+                await db.execute(
+                    sa_update(DistanceMatrix).execution_options(skip_tenant_filter=True),
+                    batch,
+                )
+                done += len(batch)
+                update_progress(progress, done=done)
+
+            # Écritures hors flush ORM : invalidation du distancier et trace
+            # d'audit résumée / Non-ORM writes: distance store invalidation
+            # and one summary audit entry
+            mark_dirty(db)
+            db.add(AuditLog(
+                entity_type="distance_matrix",
+                entity_id=0,
+                action="IMPORT",
+                changes=json.dumps(
+                    {"source": file.filename, "created": created, "updated": updated},
+                    ensure_ascii=False,
+                ),
+                user=user.username,
+                timestamp=datetime.utcnow().isoformat(),
+            ))
             await db.flush()
         except Exception as e:
             await db.rollback()
+            update_progress(progress, phase="error", message=str(e))
             raise HTTPException(status_code=400, detail=f"Database error: {e}")
 
+    logger.info(
+        "Time matrix import: %d rows x %d columns, %d created, %d updated, "
+        "read %.0f ms, write %.0f ms, total %.0f ms",
+        len(rows), len(columns), created, updated, read_ms,
+        (time.perf_counter() - write_started) * 1000,
+        (time.perf_counter() - started) * 1000,
+    )
+    update_progress(progress, phase="done")
+
     return {
         "status": "success",
         "created": created,
@@ -425,6 +522,18 @@ async def import_time_matrix(
     }
 
 
+@router.get("/progress/{progress_id}")
+async def get_import_progress(
+    progress_id: str,
+    user: User = Depends(require_permission("imports-exports", "create")),
+):
+    """Avancement d'un import long / Progress of a long-running import."""
+    progress = get_progress(progress_id, user.id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import progress not found")
+    return progress.as_dict()
+
+
 @router.post("/manifest/{tour_id}")
 async def import_manifest(
     tour_id: int,
@@ -590,6 +699,8 @@ async def import_manifest(
                         TourStop.pdv_id.in_(pdv_ids),
                     ).values(eqp_count=round(float(eqc_total), 2))
                 )
+        # UPDATE hors flush : signaler le tour à la timeline / Bulk UPDATE: report the tour to the timeline
+        await record_timeline_changes(db, [tour])
 
         await db.flush()
 
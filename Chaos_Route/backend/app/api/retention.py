@@ -17,7 +17,7 @@ from app.database import get_db
 from app.models.audit import AuditLog
 from app.models.retention_policy import RetentionPolicy
 from app.models.user import User
-from app.services.retention import MIN_AUDIT_RETENTION_DAYS, run_retention_purge
+from app.services.retention import MIN_AUDIT_RETENTION_DAYS, retention_metrics, run_retention_purge
 
 router = APIRouter()
 
@@ -48,6 +48,13 @@ async def list_policies(
     return result.scalars().all()
 
 
+@router.get("/metrics")
+async def purge_metrics(user: User = Depends(require_superadmin)):
+    """Mesures de la dernière purge par catégorie (lignes, lots, débit, retard) /
+    Last purge metrics per category (rows, batches, throughput, lag)."""
+    return {category: stats.as_dict() for category, stats in sorted(retention_metrics.items())}
+
+
 @router.put("/{category}", response_model=RetentionPolicyRead)
 async def update_policy(
     category: str,
@@ -2,23 +2,24 @@
 
 import json
 import logging
+import os
+import tempfile
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 
 logger = logging.getLogger(__name__)
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
 from app.models.audit import AuditLog
 from app.models.contract import Contract
-from app.models.distance_matrix import DistanceMatrix
 from app.models.km_tax import KmTax
-from app.models.parameter import Parameter
 from app.models.pdv import PDV
 from app.models.tour import Tour, TourStatus, TourType, PICKUP_TYPES
 from app.models.tour_stop import TourStop
@@ -32,7 +33,35 @@ from app.models.tour_manifest_line import TourManifestLine
 from app.schemas.tour import ManifestLineRead, ReorderStopsRequest, TourCreate, TourGateUpdate, TourOperationsUpdate, TourRead, TourSchedule, TourStopInsert, TourUpdate
 from app.api.deps import require_permission, get_user_region_ids
 from app.utils.fuel_pricing import load_fuel_unit_prices, price_for_contract, contract_fuel_type
-from app.services.cmro_extraction import CMRO_COLUMNS, CMRO_FIELDS, build_row as _build_cmro_row
+from app.services.cmro_extraction import CMRO_EXPORT, iter_cmro_rows, stream_cmro_csv, write_cmro_xlsx
+from app.services.distance_matrix_store import DistanceEntry, get_distance_snapshot
+from app.services.compatibility_index import (
+    CAP_NOT_FOLDABLE,
+    CAP_TAILGATE,
+    TYPE_BITS,
+    capabilities,
+    load_compatibility_index,
+    violations as violations_of,
+)
+from app.services.timeline_versions import (
+    changed_tour_ids,
+    horizon as timeline_horizon,
+    timeline_etag,
+    timeline_version,
+)
+from app.services.tour_cost_facts import check_cost_facts, load_cost_facts
+from app.services.tour_costing import (
+    build_segments as _build_segments,
+    compute_tour_cost,
+    load_km_taxes,
+    recalculate_costs,
+)
+from app.services.tour_timing import (
+    TimingContext,
+    compute_tour_times,
+    load_timing_context,
+    load_timing_params,
+)
 
 router = APIRouter()
 
@@ -44,10 +73,6 @@ PICKUP_FLAG_TO_TYPE: dict[str, PickupType] = {
     "pickup_consignment": PickupType.CONSIGNMENT,
 }
 
-# -- Constantes par défaut / Default constants --
-DEFAULT_DOCK_TIME_MINUTES = 15
-DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES = 2  # minutes par EQC / minutes per EQC (nom hérité)
-
 # Facteur de conversion : 1 EQP = 1.64 EQC / Conversion factor: 1 EQP = 1.64 EQC
 EQC_PER_EQP = 1.64
 
@@ -68,39 +93,16 @@ def _add_minutes(time_str: str, minutes: int) -> str:
     return _format_time(dt)
 
 
-async def _get_param(db: AsyncSession, key: str, default: str) -> str:
-    """Lire un paramètre système / Read a system parameter."""
-    result = await db.execute(select(Parameter).where(Parameter.key == key))
-    param = result.scalar_one_or_none()
-    return param.value if param else default
-
-
 async def _get_distance(
     db: AsyncSession,
     origin_type: str, origin_id: int,
     dest_type: str, dest_id: int,
-) -> DistanceMatrix | None:
-    """Chercher distance dans le distancier (bidirectionnel) / Lookup distance (bidirectional)."""
-    result = await db.execute(
-        select(DistanceMatrix).where(
-            DistanceMatrix.origin_type == origin_type,
-            DistanceMatrix.origin_id == origin_id,
-            DistanceMatrix.destination_type == dest_type,
-            DistanceMatrix.destination_id == dest_id,
-        )
-    )
-    entry = result.scalar_one_or_none()
-    if entry:
-        return entry
-    result = await db.execute(
-        select(DistanceMatrix).where(
-            DistanceMatrix.origin_type == dest_type,
-            DistanceMatrix.origin_id == dest_id,
-            DistanceMatrix.destination_type == origin_type,
-            DistanceMatrix.destination_id == origin_id,
-        )
-    )
-    return result.scalar_one_or_none()
+) -> DistanceEntry | None:
+    """Chercher distance dans le distancier (bidirectionnel) / Lookup distance (bidirectional).
+    Lecture en mémoire via le store process (aucune requête par segment).
+    """
+    snapshot = await get_distance_snapshot(db)
+    return snapshot.lookup(origin_type, origin_id, dest_type, dest_id)
 
 
 def _day_to_minutes(day_str: str | None) -> int:
@@ -143,92 +145,18 @@ async def calculate_tour_times(
     stops_data: list[dict],
     base_id: int,
     db: AsyncSession,
+    ctx: TimingContext | None = None,
 ) -> tuple[list[dict], str, int]:
     """
     Calculer les temps à chaque arrêt / Calculate times at each stop.
+    Nombre constant de requêtes (paramètres + PDV en lot, distancier en mémoire) ;
+    `ctx` permet de réutiliser un contexte déjà chargé (aucune requête).
 
     Returns: (enriched_stops, return_time, total_duration_minutes)
     """
-    default_dock = int(await _get_param(db, "default_dock_time_minutes", str(DEFAULT_DOCK_TIME_MINUTES)))
-    default_unload = int(await _get_param(db, "default_unload_time_per_eqp_minutes", str(DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES)))
-
-    current_time = _parse_time(departure_time)
-    prev_type = "BASE"
-    prev_id = base_id
-    enriched = []
-
-    for stop in stops_data:
-        pdv_id = stop["pdv_id"]
-        # Forcer float : eqp_count peut etre Decimal (colonne numeric en DB)
-        # et timedelta n'accepte pas Decimal /
-        # Force float: eqp_count may be Decimal (numeric column) and timedelta
-        # doesn't accept Decimal
-        eqp_count = float(stop["eqp_count"])
-
-        dist_entry = await _get_distance(db, prev_type, prev_id, "PDV", pdv_id)
-        travel_minutes = dist_entry.duration_minutes if dist_entry else 0
-        distance_km = float(dist_entry.distance_km) if dist_entry else 0.0
-
-        arrival = current_time + timedelta(minutes=travel_minutes)
-
-        pdv_result = await db.execute(select(PDV).where(PDV.id == pdv_id))
-        pdv = pdv_result.scalar_one_or_none()
-        dock_time = pdv.dock_time_minutes if (pdv and pdv.dock_time_minutes) else default_dock
-        unload_per_eqp = pdv.unload_time_per_eqp_minutes if (pdv and pdv.unload_time_per_eqp_minutes) else default_unload
-        unload_duration = dock_time + (eqp_count * unload_per_eqp)
-
-        departure = arrival + timedelta(minutes=unload_duration)
-
-        enriched.append({
-            "pdv_id": pdv_id,
-            "sequence_order": stop["sequence_order"],
-            "eqp_count": eqp_count,
-            "arrival_time": _format_time(arrival),
-            "departure_time": _format_time(departure),
-            "distance_from_previous_km": round(distance_km, 2),
-            "duration_from_previous_minutes": travel_minutes,
-        })
-
-        current_time = departure
-        prev_type = "PDV"
-        prev_id = pdv_id
-
-    if enriched:
-        last_pdv_id = enriched[-1]["pdv_id"]
-        return_dist = await _get_distance(db, "PDV", last_pdv_id, "BASE", base_id)
-        return_minutes = return_dist.duration_minutes if return_dist else 0
-        return_dt = current_time + timedelta(minutes=return_minutes)
-        return_time = _format_time(return_dt)
-    else:
-        return_time = departure_time
-
-    start_dt = _parse_time(departure_time)
-    end_dt = _parse_time(return_time)
-    total_minutes = int((end_dt - start_dt).total_seconds() / 60)
-    if total_minutes < 0:
-        total_minutes += 24 * 60
-
-    return enriched, return_time, total_minutes
-
-
-def _build_segments(
-    base_id: int, stops: list[dict],
-) -> list[tuple[str, int, str, int]]:
-    """Construire la liste des segments du tour / Build list of tour segments.
-    Returns: [(origin_type, origin_id, dest_type, dest_id), ...]
-    """
-    segments: list[tuple[str, int, str, int]] = []
-    sorted_stops = sorted(stops, key=lambda s: s.get("sequence_order", 0))
-    prev_type = "BASE"
-    prev_id = base_id
-    for stop in sorted_stops:
-        pdv_id = stop["pdv_id"]
-        segments.append((prev_type, prev_id, "PDV", pdv_id))
-        prev_type = "PDV"
-        prev_id = pdv_id
-    if sorted_stops:
-        segments.append(("PDV", sorted_stops[-1]["pdv_id"], "BASE", base_id))
-    return segments
+    if ctx is None:
+        ctx = await load_timing_context(db, [s["pdv_id"] for s in stops_data])
+    return compute_tour_times(departure_time, stops_data, base_id, ctx)
 
 
 async def _calculate_cost(
@@ -243,47 +171,21 @@ async def _calculate_cost(
     Formule : (fixed_daily_cost / nb_tours_jour) + (vacation / nb_tours_jour) + (km * fuel_price * consumption_coeff) + sum(km_tax par segment)
     Retourne (cost, warnings) / Returns (cost, warnings)
     """
-    cost = 0.0
-    warnings: list[str] = []
-
-    # 1. Terme fixe + vacation / nombre de tours du contrat ce jour
-    # Arrondir chaque composant à 2 décimales (cohérent avec cost-breakdown)
-    # Round each component to 2 decimals (consistent with cost-breakdown)
     nb_tours = await db.scalar(
         select(func.count(Tour.id)).where(
             Tour.contract_id == contract.id,
             Tour.date == tour_date,
         )
-    ) or 1
-    cost += round(float(contract.fixed_daily_cost or 0) / nb_tours, 2)
-    cost += round(float(contract.vacation or 0) / nb_tours, 2)
-
-    # 2. km * prix carburant (selon type du contrat) * coefficient consommation
+    )
     fuel_prices = await load_fuel_unit_prices(db, tour_date)
-    fuel_price = price_for_contract(fuel_prices, contract)
-    if not fuel_price:
-        ft = contract_fuel_type(contract).lower()
-        warnings.append(f"Aucun prix {ft} trouvé pour la date {tour_date}")
-        logger.warning("No %s fuel price found for date %s", ft, tour_date)
-    consumption = float(contract.consumption_coefficient or 0)
-    cost += round(total_km * fuel_price * consumption, 2)
-
-    # 3. Taxe km (montant forfaitaire par segment, pas un taux/km)
-    # Km tax (flat amount per segment, not a rate per km)
-    km_tax_total = 0.0
     segments = _build_segments(tour_base_id, stops)
-    for seg in segments:
-        tax_entry = await db.scalar(
-            select(KmTax.tax_per_km).where(
-                KmTax.origin_type == seg[0], KmTax.origin_id == seg[1],
-                KmTax.destination_type == seg[2], KmTax.destination_id == seg[3],
-            )
-        )
-        if tax_entry:
-            km_tax_total += round(float(tax_entry), 2)
-    cost += round(km_tax_total, 2)
-
-    return round(cost, 2), warnings
+    taxes = await load_km_taxes(db, segments)
+    cost, warnings = compute_tour_cost(
+        total_km, contract, nb_tours, fuel_prices, [taxes.get(seg) for seg in segments], tour_date,
+    )
+    if warnings:
+        logger.warning("No %s fuel price found for date %s", contract_fuel_type(contract).lower(), tour_date)
+    return cost, warnings
 
 
 async def _recalculate_sibling_tours(
@@ -352,20 +254,14 @@ async def _check_vehicle_type_compatibility(
     pdv_ids = [s["pdv_id"] for s in stops_data]
     if not pdv_ids:
         return []
-    result = await db.execute(select(PDV).where(PDV.id.in_(pdv_ids)))
-    pdvs = {p.id: p for p in result.scalars().all()}
-
-    vt = contract.vehicle_type
-    vt_value = vt.value if (vt and hasattr(vt, 'value')) else vt
+    index = await load_compatibility_index(db, pdv_ids)
+    caps = capabilities(contract)
 
     violations: list[str] = []
-    for stop in stops_data:
-        pdv = pdvs.get(stop["pdv_id"])
-        if not pdv or not pdv.allowed_vehicle_types:
-            continue
-        allowed = pdv.allowed_vehicle_types.split("|")
-        if vt_value and vt_value not in allowed:
-            violations.append(f"TYPE_NOT_ALLOWED:{pdv.code} {pdv.name} (requiert {', '.join(allowed)})")
+    for pdv_id in pdv_ids:
+        pdv = index.pdvs.get(pdv_id)
+        if pdv and violations_of(pdv.required, caps) & TYPE_BITS:
+            violations.append(f"TYPE_NOT_ALLOWED:{pdv.code} {pdv.name} (requiert {', '.join(pdv.allowed)})")
 
     return violations
 
@@ -380,30 +276,22 @@ async def _check_dock_tailgate_compatibility(
     pdv_ids = [s["pdv_id"] for s in stops_data]
     if not pdv_ids:
         return []
-    result = await db.execute(select(PDV).where(PDV.id.in_(pdv_ids)))
-    pdvs = {p.id: p for p in result.scalars().all()}
-
-    has_tailgate = contract.has_tailgate
-    tailgate_type = contract.tailgate_type
-    # Normaliser la valeur du type de hayon / Normalize tailgate type value
-    tg_value = tailgate_type.value if (tailgate_type and hasattr(tailgate_type, 'value')) else tailgate_type
+    index = await load_compatibility_index(db, pdv_ids)
+    caps = capabilities(contract)
 
     violations: list[str] = []
-    for stop in stops_data:
-        pdv = pdvs.get(stop["pdv_id"])
+    for pdv_id in pdv_ids:
+        pdv = index.pdvs.get(pdv_id)
         if not pdv:
             continue
-
-        if not pdv.has_dock:
+        missing = violations_of(pdv.required, caps)
+        if missing & CAP_TAILGATE:
             # PDV sans quai → hayon obligatoire / No dock → tailgate required
-            if not has_tailgate:
-                violations.append(f"DOCK_NO_TAILGATE:{pdv.code} {pdv.name}")
-        else:
-            # PDV avec quai / PDV with dock
-            if not pdv.dock_has_niche and has_tailgate and tg_value == "RABATTABLE":
-                # Quai sans niche : seul le hayon rétractable est utilisable (rabattable interdit) /
-                # Dock without niche: only retractable tailgate usable (foldable forbidden)
-                violations.append(f"DOCK_NO_NICHE_FOLDABLE:{pdv.code} {pdv.name}")
+            violations.append(f"DOCK_NO_TAILGATE:{pdv.code} {pdv.name}")
+        elif missing & CAP_NOT_FOLDABLE:
+            # Quai sans niche : seul le hayon rétractable est utilisable (rabattable interdit) /
+            # Dock without niche: only retractable tailgate usable (foldable forbidden)
+            violations.append(f"DOCK_NO_NICHE_FOLDABLE:{pdv.code} {pdv.name}")
 
     return violations
 
@@ -517,24 +405,21 @@ async def available_contracts_for_tours(
             or (c.temperature_type.value if hasattr(c.temperature_type, 'value') else c.temperature_type) in compatible
         ]
 
-    # Filtrer les contrats incompatibles quai/hayon / Filter dock/tailgate incompatible contracts
+    # Filtrer les contrats incompatibles quai/hayon/type (index de compatibilité) /
+    # Filter dock/tailgate/vehicle-type incompatible contracts (compatibility index)
     if tour_id is not None:
-        tour_result = await db.execute(
-            select(Tour).where(Tour.id == tour_id).options(selectinload(Tour.stops))
-        )
-        tour = tour_result.scalar_one_or_none()
-        if tour and tour.stops:
-            stops_data = [
-                {"pdv_id": s.pdv_id, "sequence_order": s.sequence_order, "eqp_count": s.eqp_count}
-                for s in tour.stops
+        pdv_ids = (await db.execute(select(TourStop.pdv_id).where(TourStop.tour_id == tour_id))).scalars().all()
+        if pdv_ids:
+            index = await load_compatibility_index(db, pdv_ids)
+            required = index.required_for(pdv_ids)
+            eligible = index.eligible_contracts(required)
+            # Contrat créé depuis le chargement de l'index : capacité calculée ici /
+            # Contract created since the index was loaded: capability computed here
+            indexed = set(index.contract_ids)
+            available = [
+                c for c in available
+                if (c.id in eligible if c.id in indexed else not violations_of(required, capabilities(c)))
             ]
-            compatible = []
-            for c in available:
-                dock_violations = await _check_dock_tailgate_compatibility(db, stops_data, c)
-                vt_violations = await _check_vehicle_type_compatibility(db, stops_data, c)
-                if not dock_violations and not vt_violations:
-                    compatible.append(c)
-            available = compatible
 
     return [
         {
@@ -638,85 +523,6 @@ async def contract_blockers(
     return reasons
 
 
-async def _build_cmro_rows(db, date_from, date_to, base_id, transporter_name, user,
-                           billing_company=None) -> list[dict]:
-    """Construit les lignes d'extraction CMRO (1/tour) sur la période."""
-    query = (
-        select(Tour).where(
-            Tour.date >= date_from, Tour.date <= date_to,
-            Tour.contract_id.isnot(None), Tour.departure_time.isnot(None),
-        ).options(selectinload(Tour.stops))
-    )
-    if base_id:
-        query = query.where(Tour.base_id == base_id)
-    if billing_company:
-        bc_ids = (await db.execute(
-            select(BaseLogistics.id).where(BaseLogistics.billing_company == billing_company))).scalars().all()
-        query = query.where(Tour.base_id.in_(bc_ids if bc_ids else [-1]))
-    user_region_ids = get_user_region_ids(user)
-    if user_region_ids is not None:
-        query = query.join(BaseLogistics, Tour.base_id == BaseLogistics.id).where(
-            BaseLogistics.region_id.in_(user_region_ids)
-        )
-    tours = (await db.execute(query)).scalars().all()
-    if not tours:
-        return []
-
-    contract_ids = list({t.contract_id for t in tours if t.contract_id})
-    contracts_map = {c.id: c for c in (await db.execute(
-        select(Contract).where(Contract.id.in_(contract_ids)))).scalars().all()}
-    base_ids = list({t.base_id for t in tours})
-    bases_map = {b.id: b for b in (await db.execute(
-        select(BaseLogistics).where(BaseLogistics.id.in_(base_ids)))).scalars().all()}
-    pdv_ids = list({s.pdv_id for t in tours for s in t.stops})
-    pdvs_map = {p.id: p for p in (await db.execute(
-        select(PDV).where(PDV.id.in_(pdv_ids)))).scalars().all()} if pdv_ids else {}
-
-    if transporter_name:
-        nl = transporter_name.lower()
-        tours = [t for t in tours
-                 if (contracts_map.get(t.contract_id)
-                     and nl in (contracts_map[t.contract_id].transporter_name or "").lower())]
-
-    nb_map: dict[tuple, int] = {}
-    for cid, d in {(t.contract_id, t.date) for t in tours}:
-        nb_map[(cid, d)] = (await db.scalar(
-            select(func.count(Tour.id)).where(Tour.contract_id == cid, Tour.date == d))) or 1
-    fuel_map: dict[str, dict] = {}
-    for d in {t.date for t in tours}:
-        fuel_map[d] = await load_fuel_unit_prices(db, d)
-
-    rows: list[dict] = []
-    for t in sorted(tours, key=lambda x: (x.date, x.departure_time or "",
-                                          x.priority if x.priority is not None else 999)):
-        c = contracts_map.get(t.contract_id)
-        if not c:
-            continue
-        stops_data = [
-            {"pdv_id": s.pdv_id, "sequence_order": s.sequence_order, "eqp_count": s.eqp_count}
-            for s in sorted(t.stops, key=lambda s: s.sequence_order)
-        ]
-        km_tax_total = 0.0
-        for seg in _build_segments(t.base_id, stops_data):
-            tax = await db.scalar(select(KmTax.tax_per_km).where(
-                KmTax.origin_type == seg[0], KmTax.origin_id == seg[1],
-                KmTax.destination_type == seg[2], KmTax.destination_id == seg[3],
-            ))
-            if tax:
-                km_tax_total += float(tax)
-        eqc_liv, colis_liv = (await db.execute(
-            select(func.sum(TourManifestLine.eqc), func.sum(TourManifestLine.nb_colis))
-            .where(TourManifestLine.tour_id == t.id, TourManifestLine.scanned == True)  # noqa: E712
-        )).one()
-        fuel_price = price_for_contract(fuel_map.get(t.date, {}), c)
-        base = bases_map.get(t.base_id)
-        rows.append(_build_cmro_row(
-            t, c, base.name if base else "", nb_map.get((t.contract_id, t.date), 1),
-            fuel_price, km_tax_total, eqc_liv, colis_liv, pdvs_map,
-        ))
-    return rows
-
-
 @router.get("/cmro-extraction")
 async def cmro_extraction(
     date_from: str = Query(...),
@@ -728,13 +534,13 @@ async def cmro_extraction(
     user: User = Depends(require_permission("tour-history", "read")),
 ):
     """Extraction pré-facturation au format CMRO (1 ligne/tour, colonnes Tour_ERT)."""
-    rows = await _build_cmro_rows(db, date_from, date_to, base_id, transporter_name, user, billing_company)
-    keep = [(f, col) for f, col in zip(CMRO_FIELDS, CMRO_COLUMNS) if col]
+    batches = iter_cmro_rows(db, date_from, date_to, base_id, transporter_name, billing_company,
+                             get_user_region_ids(user))
     return {
         "period": {"date_from": date_from, "date_to": date_to},
-        "columns": [col for _, col in keep],
-        "fields": [f for f, _ in keep],
-        "rows": rows,
+        "columns": [col for _, col in CMRO_EXPORT],
+        "fields": [f for f, _ in CMRO_EXPORT],
+        "rows": [row async for rows in batches for row in rows],
     }
 
 
@@ -745,30 +551,39 @@ async def cmro_extraction_export(
     base_id: int | None = Query(default=None),
     transporter_name: str | None = Query(default=None),
     billing_company: str | None = Query(default=None),
+    format: str = Query("xlsx", pattern="^(csv|xlsx)$"),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_permission("tour-history", "read")),
 ):
-    """Export Excel de l'extraction CMRO (en-têtes/ordre du modèle Tour_ERT)."""
-    import io
-    import openpyxl
-
-    rows = await _build_cmro_rows(db, date_from, date_to, base_id, transporter_name, user, billing_company)
-    keep = [(f, col) for f, col in zip(CMRO_FIELDS, CMRO_COLUMNS) if col]
+    """Export de l'extraction CMRO (en-têtes/ordre du modèle Tour_ERT), lot par lot /
+    CMRO extraction export, batch by batch.
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Tour_ERT"
-    ws.append([col for _, col in keep])
-    for r in rows:
-        ws.append([r.get(f, "") for f, _ in keep])
-    bio = io.BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    filename = f"extraction_CMRO_{date_from}_{date_to}.xlsx"
-    return StreamingResponse(
-        bio,
+    xlsx : classeur en écriture seule dans un fichier temporaire, envoyé par
+    morceaux puis supprimé. csv : lignes envoyées au fil des lots, lues dans
+    une session dédiée (une erreur en cours de route tronque le fichier au
+    lieu d'un 500).
+    """
+    filters = (date_from, date_to, base_id, transporter_name, billing_company, get_user_region_ids(user))
+    filename = f"extraction_CMRO_{date_from}_{date_to}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "csv":
+        # Envoyé après le retour de l'endpoint : session dédiée / sent after return: dedicated session
+        return StreamingResponse(stream_cmro_csv(db, *filters), media_type="text/csv; charset=utf-8",
+                                 headers=headers)
+
+    batches = iter_cmro_rows(db, *filters)
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await write_cmro_xlsx(batches, path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return FileResponse(
+        path,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        headers=headers,
+        background=BackgroundTask(os.unlink, path),
     )
 
 
@@ -887,31 +702,24 @@ async def available_vehicles_for_tours(
     ]
 
 
-@router.get("/timeline")
-async def tour_timeline(
-    date: str = Query(...),
-    base_id: int | None = Query(default=None),
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(require_permission("tour-planning", "read")),
-):
-    """Timeline 3 jours (J, J+1, J+2) / 3-day timeline with stops."""
-    from datetime import datetime as _dt, timedelta as _td
-    _base = _dt.strptime(date, "%Y-%m-%d")
-    _dates = [(_base + _td(days=i)).strftime("%Y-%m-%d") for i in range(3)]
-
+async def _timeline_tours(db: AsyncSession, dates: list[str], base_id: int | None,
+                          region_ids: list[int] | None, tour_ids: set[int] | None = None) -> list[dict]:
+    """Tours de la fenêtre (ou seulement `tour_ids`) sérialisés pour la timeline /
+    Window tours (or only `tour_ids`) serialised for the timeline."""
     query = (
         select(Tour)
-        .where(Tour.date.in_(_dates))
+        .where(Tour.date.in_(dates))
         .options(selectinload(Tour.stops))
         .order_by(Tour.departure_time)
     )
+    if tour_ids is not None:
+        query = query.where(Tour.id.in_(tour_ids))
     if base_id is not None:
         query = query.where(Tour.base_id == base_id)
     # Scope région / Region scope
-    user_region_ids = get_user_region_ids(user)
-    if user_region_ids is not None:
+    if region_ids is not None:
         query = query.join(BaseLogistics, Tour.base_id == BaseLogistics.id).where(
-            BaseLogistics.region_id.in_(user_region_ids)
+            BaseLogistics.region_id.in_(region_ids)
         )
     result = await db.execute(query)
     tours = result.scalars().all()
@@ -961,10 +769,58 @@ async def tour_timeline(
                 for s in tour.stops
             ],
         })
-
     return timeline
 
 
+@router.get("/timeline")
+async def tour_timeline(
+    request: Request,
+    response: Response,
+    date: str = Query(...),
+    base_id: int | None = Query(default=None),
+    since: int | None = Query(default=None, ge=0),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(require_permission("tour-planning", "read")),
+):
+    """Timeline 3 jours (J, J+1, J+2) / 3-day timeline with stops.
+
+    Versionnée (`services/timeline_versions.py`) : en-têtes ETag et
+    X-Timeline-Version ; If-None-Match identique → 304. Avec `since=N` :
+    {"version", "full", "tours", "removed"}, seulement les tours modifiés
+    après la version N (`removed` : supprimés ou sortis de la fenêtre).
+    Fenêtre plus ancienne que le journal : toujours servie en entier.
+    """
+    from datetime import datetime as _dt, timedelta as _td
+    _base = _dt.strptime(date, "%Y-%m-%d")
+    _dates = [(_base + _td(days=i)).strftime("%Y-%m-%d") for i in range(3)]
+    user_region_ids = get_user_region_ids(user)
+
+    # Version lue AVANT les tours : un changement concurrent sera vu au prochain appel /
+    # Version read BEFORE the tours: a concurrent change shows up on the next call
+    version = None
+    if _dates[0] >= timeline_horizon():
+        version = await timeline_version(db, _dates, base_id, user_region_ids)
+        etag = timeline_etag(version)
+        headers = {"ETag": etag, "X-Timeline-Version": str(version), "Cache-Control": "no-cache"}
+        if etag in {t.strip() for t in request.headers.get("if-none-match", "").split(",")}:
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    if since is None:
+        return await _timeline_tours(db, _dates, base_id, user_region_ids)
+    if version is None:
+        tours = await _timeline_tours(db, _dates, base_id, user_region_ids)
+        return {"version": None, "full": True, "tours": tours, "removed": []}
+    changed = await changed_tour_ids(db, since, _dates, base_id, user_region_ids)
+    tours = await _timeline_tours(db, _dates, base_id, user_region_ids, changed) if changed else []
+    return {
+        "version": version,
+        "full": False,
+        "tours": tours,
+        "removed": sorted(changed - {t["tour_id"] for t in tours}),
+    }
+
+
 @router.get("/transporter-summary")
 async def transporter_summary(
     date_from: str = Query(...),
@@ -1013,11 +869,9 @@ async def transporter_summary(
     if tour_ids:
         s_result = await db.execute(
             select(TourSurcharge).where(TourSurcharge.tour_id.in_(tour_ids))
+            .options(selectinload(TourSurcharge.surcharge_type))
         )
         all_surcharges = s_result.scalars().all()
-        # Eager-load surcharge_type for label / Charger le type de surcharge
-        for s in all_surcharges:
-            await db.refresh(s, ["surcharge_type"])
         for s in all_surcharges:
             if s.status == SurchargeStatus.VALIDATED:
                 surcharges_map[s.tour_id].append({
@@ -1072,65 +926,30 @@ async def transporter_summary(
             return name_lower in (contract.transporter_name or "").lower()
         tours = [t for t in tours if t.contract_id and _matches_transporter(t)]
 
-    # 3. Calculer le cost breakdown par tour / Calculate cost breakdown per tour
-    # Pré-charger nb_tours par (contract_id, date) / Pre-load nb_tours per (contract_id, date)
-    contract_date_pairs = list({(t.contract_id, t.date) for t in tours if t.contract_id})
-    nb_tours_map: dict[tuple[int, str], int] = {}
-    for cid, d in contract_date_pairs:
-        count = await db.scalar(
-            select(func.count(Tour.id)).where(Tour.contract_id == cid, Tour.date == d)
-        )
-        nb_tours_map[(cid, d)] = count or 1
-
-    # Pré-charger prix carburant par date unique (par type) / Pre-load fuel prices per date (by type)
-    unique_dates = list({t.date for t in tours})
-    fuel_map: dict[str, dict[str, float]] = {}
-    missing_fuel_dates: list[str] = []
-    for d in unique_dates:
-        fuel_map[d] = await load_fuel_unit_prices(db, d)
-        if not fuel_map[d]:
-            missing_fuel_dates.append(d)
-            logger.warning("No fuel price found for date %s in transporter summary", d)
+    # 3. Décomposition du coût par tour : faits persistés, calculés pour les
+    # seuls tours qui n'en ont pas / Per-tour cost breakdown: persisted facts,
+    # computed only for tours without one
+    facts = await load_cost_facts(db, [t.id for t in tours])
+    missing_fuel_dates = sorted({f["date"] for f in facts.values() if f["fuel_price_missing"]})
+    for d in missing_fuel_dates:
+        logger.warning("No fuel price found for date %s in transporter summary", d)
 
     # 4. Construire les données par tour / Build per-tour data
-    default_dock = int(await _get_param(db, "default_dock_time_minutes", str(DEFAULT_DOCK_TIME_MINUTES)))
-    default_unload = int(await _get_param(db, "default_unload_time_per_eqp_minutes", str(DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES)))
+    default_dock, default_unload = await load_timing_params(db)
 
     tour_rows: list[dict] = []
     for tour in tours:
         contract = contracts_map.get(tour.contract_id)
         if not contract:
             continue
+        fact = facts.get(tour.id)
+        if not fact:
+            continue
         base = bases_map.get(tour.base_id)
         total_km = float(tour.total_km or 0)
-        nb_tours = nb_tours_map.get((contract.id, tour.date), 1)
-        fixed_share = round(float(contract.fixed_daily_cost or 0) / nb_tours, 2)
-        vacation_share = round(float(contract.vacation or 0) / nb_tours, 2)
-
-        fuel_price = price_for_contract(fuel_map.get(tour.date, {}), contract)
-        consumption = float(contract.consumption_coefficient or 0)
-        fuel_cost = round(total_km * fuel_price * consumption, 2)
-
-        # Taxe km / Km tax
-        stops_data = [
-            {"pdv_id": s.pdv_id, "sequence_order": s.sequence_order, "eqp_count": s.eqp_count}
-            for s in sorted(tour.stops, key=lambda s: s.sequence_order)
-        ]
-        segments = _build_segments(tour.base_id, stops_data)
-        km_tax_total = 0.0
-        for seg in segments:
-            tax_entry = await db.scalar(
-                select(KmTax.tax_per_km).where(
-                    KmTax.origin_type == seg[0], KmTax.origin_id == seg[1],
-                    KmTax.destination_type == seg[2], KmTax.destination_id == seg[3],
-                )
-            )
-            if tax_entry:
-                km_tax_total += round(float(tax_entry), 2)
-        km_tax_total = round(km_tax_total, 2)
         surcharges_for_tour = surcharges_map.get(tour.id, [])
-        surcharges_total = sum(s["amount"] for s in surcharges_for_tour)
-        total_calculated = round(fixed_share + vacation_share + fuel_cost + km_tax_total + surcharges_total, 2)
+        surcharges_total = fact["surcharges_total"]
+        total_calculated = fact["total_calculated"]
 
         sorted_stops = sorted(tour.stops, key=lambda s: s.sequence_order)
 
@@ -1171,10 +990,10 @@ async def transporter_summary(
             "surcharges_total": round(surcharges_total, 2),
             "pending_surcharges_count": pending_surcharges_count.get(tour.id, 0),
             "cost_breakdown": {
-                "fixed_share": fixed_share,
-                "vacation_share": vacation_share,
-                "fuel_cost": fuel_cost,
-                "km_tax_total": km_tax_total,
+                "fixed_share": fact["fixed_share"],
+                "vacation_share": fact["vacation_share"],
+                "fuel_cost": fact["fuel_cost"],
+                "km_tax_total": fact["km_tax_total"],
                 "surcharges_total": round(surcharges_total, 2),
                 "total_calculated": total_calculated,
             },
@@ -1313,7 +1132,7 @@ async def transporter_summary(
             },
         })
 
-    warnings = [f"Aucun prix carburant trouvé pour la date {d}" for d in sorted(missing_fuel_dates)]
+    warnings = [f"Aucun prix carburant trouvé pour la date {d}" for d in missing_fuel_dates]
     return {
         "period": {"date_from": date_from, "date_to": date_to},
         "transporters": transporters_result,
@@ -1351,8 +1170,7 @@ async def get_tour_time_breakdown(
     if not tour:
         raise HTTPException(status_code=404, detail="Tour not found")
 
-    default_dock = int(await _get_param(db, "default_dock_time_minutes", str(DEFAULT_DOCK_TIME_MINUTES)))
-    default_unload = int(await _get_param(db, "default_unload_time_per_eqp_minutes", str(DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES)))
+    default_dock, default_unload = await load_timing_params(db)
 
     sorted_stops = sorted(tour.stops, key=lambda s: s.sequence_order)
 
@@ -2461,7 +2279,7 @@ async def update_tour_gate(
     if "barrier_entry_time" in changes and changes["barrier_entry_time"] and tour.status == TourStatus.RETURNING:
         tour.status = TourStatus.COMPLETED
         from app.api.ws_tracking import manager
-        await manager.broadcast(tenant_id=tour.tenant_id, message={
+        await manager.broadcast(tenant_id=tour.tenant_id, base_id=tour.base_id, message={
             "type": "tour_status",
             "tour_id": tour_id,
             "tour_code": tour.code,
@@ -2807,51 +2625,21 @@ async def recalculate_tour_costs(
     """Recalculer en masse les coûts des tours / Bulk recalculate tour costs.
     Filtres optionnels : date, base_id, contract_id. Sans filtre = tous les tours planifiés.
     """
-    query = (
-        select(Tour)
-        .where(Tour.departure_time.isnot(None), Tour.contract_id.isnot(None))
-        .options(selectinload(Tour.stops))
-    )
-    if date:
-        query = query.where(Tour.date == date)
-    if base_id:
-        query = query.where(Tour.base_id == base_id)
-    if contract_id:
-        query = query.where(Tour.contract_id == contract_id)
-
-    result = await db.execute(query)
-    tours = result.scalars().all()
-
-    # Charger les contrats en une seule requête / Load contracts in a single query
-    contract_ids = list({t.contract_id for t in tours if t.contract_id})
-    contracts_map: dict[int, Contract] = {}
-    if contract_ids:
-        c_result = await db.execute(select(Contract).where(Contract.id.in_(contract_ids)))
-        for c in c_result.scalars().all():
-            contracts_map[c.id] = c
+    return await recalculate_costs(db, user.username, date=date, base_id=base_id, contract_id=contract_id)
 
-    updated = 0
-    for tour in tours:
-        contract = contracts_map.get(tour.contract_id)
-        if not contract:
-            continue
-        stops_data = [
-            {"pdv_id": s.pdv_id, "sequence_order": s.sequence_order, "eqp_count": s.eqp_count}
-            for s in sorted(tour.stops, key=lambda s: s.sequence_order)
-        ]
-        old_cost = float(tour.total_cost) if tour.total_cost else 0
-        new_cost, _ = await _calculate_cost(
-            db, float(tour.total_km or 0), contract, tour.date, tour.base_id, stops_data,
-        )
-        if old_cost != new_cost:
-            tour.total_cost = new_cost
-            await _log_audit(db, "tour", tour.id, "RECALCULATE", user, {
-                "old_cost": old_cost, "new_cost": new_cost,
-            })
-            updated += 1
 
-    await db.flush()
-    return {"total": len(tours), "updated": updated}
+@router.post("/cost-facts/rebuild")
+async def rebuild_cost_facts(
+    date_from: str = Query(...),
+    date_to: str = Query(...),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(require_permission("tour-planning", "update")),
+):
+    """Contrôler et reconstruire les faits de coût d'une période /
+    Check and rebuild the cost facts of a period.
+    Retourne le nombre de faits manquants, divergents et orphelins réécrits.
+    """
+    return await check_cost_facts(db, date_from, date_to)
 
 
 @router.delete("/{tour_id}", status_code=204)
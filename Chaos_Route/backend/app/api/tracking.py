@@ -2,14 +2,13 @@
 
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
 from app.models.delivery_alert import DeliveryAlert
-from app.models.gps_position import GPSPosition
 from app.models.pdv import PDV
 from app.models.stop_event import StopEvent
 from app.models.tour import Tour, TourStatus
@@ -18,6 +17,8 @@ from app.models.base_logistics import BaseLogistics
 from app.models.user import User
 from app.schemas.mobile import DeliveryAlertRead, DriverPositionRead, GPSPositionRead, TrackingDashboard
 from app.api.deps import require_permission, get_user_region_ids
+from app.services.gps_trails import load_trail
+from app.services.live_state import load_live_states
 
 router = APIRouter()
 
@@ -29,11 +30,15 @@ async def get_latest_positions(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_permission("tracking", "read")),
 ):
-    """Derniere position GPS par tour actif / Latest GPS position per active tour."""
+    """Derniere position GPS par tour actif / Latest GPS position per active tour.
+
+    Positions et compteurs d'arrets lus dans l'etat temps reel des tours
+    (`services/live_state.py`) / Positions and stop counters read from the tour live state.
+    """
     target_date = date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
     # Trouver les tours actifs / Find active tours
-    query = select(Tour).where(
+    query = select(Tour.id, Tour.code, Tour.driver_name).where(
         Tour.delivery_date == target_date,
         Tour.status.in_([TourStatus.IN_PROGRESS, TourStatus.VALIDATED, TourStatus.RETURNING]),
     )
@@ -47,65 +52,29 @@ async def get_latest_positions(
             BaseLogistics.region_id.in_(region_ids)
         )
 
-    result = await db.execute(query)
-    tours = result.scalars().all()
-
-    tour_ids = [t.id for t in tours]
-
-    if not tour_ids:
+    tours = (await db.execute(query)).all()
+    if not tours:
         return []
 
-    # Batch: derniere position GPS par tour / Latest GPS position per tour
-    latest_ts = (
-        select(GPSPosition.tour_id, func.max(GPSPosition.timestamp).label("max_ts"))
-        .where(GPSPosition.tour_id.in_(tour_ids))
-        .group_by(GPSPosition.tour_id)
-        .subquery()
-    )
-    gps_result = await db.execute(
-        select(GPSPosition).join(
-            latest_ts,
-            (GPSPosition.tour_id == latest_ts.c.tour_id) & (GPSPosition.timestamp == latest_ts.c.max_ts)
-        )
-    )
-    gps_by_tour = {g.tour_id: g for g in gps_result.scalars().all()}
-
-    # Batch: nombre total de stops par tour / Total stop counts per tour
-    stops_total_result = await db.execute(
-        select(TourStop.tour_id, func.count(TourStop.id))
-        .where(TourStop.tour_id.in_(tour_ids))
-        .group_by(TourStop.tour_id)
-    )
-    stops_total_map = dict(stops_total_result.all())
-
-    # Batch: stops livres par tour / Delivered stop counts per tour
-    stops_delivered_result = await db.execute(
-        select(TourStop.tour_id, func.count(TourStop.id))
-        .where(TourStop.tour_id.in_(tour_ids), TourStop.delivery_status == "DELIVERED")
-        .group_by(TourStop.tour_id)
-    )
-    stops_delivered_map = dict(stops_delivered_result.all())
+    states = await load_live_states(db, [t.id for t in tours])
 
     positions = []
     for tour in tours:
-        gps = gps_by_tour.get(tour.id)
-        if not gps:
+        state = states.get(tour.id)
+        if state is None or state.timestamp is None:
             continue
 
-        total = stops_total_map.get(tour.id, 0)
-        delivered = stops_delivered_map.get(tour.id, 0)
-
         positions.append(DriverPositionRead(
             tour_id=tour.id,
             tour_code=tour.code,
             driver_name=tour.driver_name,
-            latitude=gps.latitude,
-            longitude=gps.longitude,
-            speed=gps.speed,
-            accuracy=gps.accuracy,
-            timestamp=gps.timestamp,
-            stops_total=total,
-            stops_delivered=delivered,
+            latitude=state.latitude,
+            longitude=state.longitude,
+            speed=state.speed,
+            accuracy=state.accuracy,
+            timestamp=state.timestamp,
+            stops_total=state.stops_total,
+            stops_delivered=state.stops_delivered,
         ))
 
     return positions
@@ -114,16 +83,16 @@ async def get_latest_positions(
 @router.get("/tour/{tour_id}/trail", response_model=list[GPSPositionRead])
 async def get_tour_trail(
     tour_id: int,
+    detail: str = Query("standard", pattern="^(overview|standard|fine|raw)$"),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_permission("tracking", "read")),
 ):
-    """Trace GPS complete d'un tour / Full GPS trail for a tour."""
-    result = await db.execute(
-        select(GPSPosition)
-        .where(GPSPosition.tour_id == tour_id)
-        .order_by(GPSPosition.timestamp)
-    )
-    return result.scalars().all()
+    """Trace GPS d'un tour, simplifiee selon `detail` (`raw` = tous les points) /
+    GPS trail for a tour, simplified per `detail` (`raw` = every point).
+
+    Voir `services/gps_trails.py` / see services/gps_trails.py.
+    """
+    return await load_trail(db, tour_id, detail)
 
 
 @router.get("/tour/{tour_id}/events")
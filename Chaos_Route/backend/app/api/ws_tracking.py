@@ -5,66 +5,240 @@ l'utilisateur authentifie. `broadcast()` exige le tenant de la donnee emise et n
 diffuse qu'aux connexions du MEME tenant (les clients consolidation/superadmin,
 tenant=None, recoivent tout). Oublier le tenant a l'emission est une ERREUR de
 signature, pas une fuite silencieuse. / Tenant-partitioned real-time tracking.
+
+DIFFUSION : les connexions sont indexees par tenant ; un message est serialise
+une seule fois puis depose dans la file bornee de chaque destinataire, videe
+par une tache d'envoi propre a la connexion. Un navigateur lent ne bloque donc
+plus l'emetteur (lot GPS, scan...) : ses `gps_update` en attente sont
+fusionnes par tour (seule la derniere position compte), et une file pleine
+sans position a ecarter ferme la connexion (le client se reconnecte et
+recharge par l'API REST). / Indexed fan-out with bounded per-connection
+queues; stale gps_update messages are coalesced per tour.
+
+PLUSIEURS WORKERS : `broadcast()` publie via le backend configure
+(`services/tracking_bus.py` : memoire ou LISTEN/NOTIFY PostgreSQL) ; chaque
+worker livre ensuite a ses propres connexions via `deliver()`, avec le meme
+cloisonnement. / broadcast() publishes through the configured backend; each
+worker delivers to its own connections.
+
+ABONNEMENTS : un client peut restreindre ce qu'il recoit en envoyant
+`{"type": "subscribe", "bases": [..], "tours": [..]}` (sans listes = tout).
+Un abonnement ne fait que restreindre, il ne leve jamais le cloisonnement.
 """
 
+import asyncio
+import itertools
 import json
+import logging
+from collections import OrderedDict
 
 from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
 
-from app.api.deps import get_user_tenant_id
-from app.database import async_session
-from app.models.user import User
-from app.utils.auth import decode_token
+from app.api.deps import authenticate_websocket, get_user_tenant_id
+from app.services.tracking_bus import InProcessBackend
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Messages en attente max par connexion / Max pending messages per connection
+WS_QUEUE_MAX_MESSAGES = 256
+# Delai max d'un envoi avant abandon de la connexion (s) / Max send time before dropping (s)
+WS_SEND_TIMEOUT_SECONDS = 10
+# Correspondances tour -> base retenues (abonnements par base) / Remembered tour -> base links
+WS_TOUR_BASE_MAX_ENTRIES = 50_000
+
+# Types fusionnes par tour (seul le dernier compte) / Types coalesced per tour (latest wins)
+_COALESCED_TYPES = frozenset({"gps_update"})
+
+
+class _Connection:
+    """Connexion et sa file d'envoi / Connection and its send queue."""
+
+    def __init__(self, websocket: WebSocket, tenant_id: int | None):
+        self.websocket = websocket
+        self.tenant_id = tenant_id
+        # None = pas de filtre / no filter
+        self.bases: frozenset[int] | None = None
+        self.tours: frozenset[int] | None = None
+        self.pending: OrderedDict[object, str] = OrderedDict()
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.coalesced = 0
+
+    def wants(self, tour_id: int | None, base_id: int | None) -> bool:
+        """Le message correspond-il a l'abonnement ? / Does the message match the subscription?"""
+        if self.bases is None and self.tours is None:
+            return True
+        if tour_id is not None and self.tours and tour_id in self.tours:
+            return True
+        if base_id is None:
+            # Base inconnue : envoye aux abonnes par base / unknown base: sent to base subscribers
+            return tour_id is None or bool(self.bases)
+        return bool(self.bases) and base_id in self.bases
+
+    def enqueue(self, key: object, data: str) -> bool:
+        """Deposer un message ; False si la file est pleine / Queue a message; False when full."""
+        if key in self.pending:
+            self.pending[key] = data
+            self.coalesced += 1
+            return True
+        if len(self.pending) >= WS_QUEUE_MAX_MESSAGES:
+            stale = next((k for k in self.pending if isinstance(k, tuple)), None)
+            if stale is None:
+                return False
+            del self.pending[stale]
+            self.coalesced += 1
+        self.pending[key] = data
+        self.wakeup.set()
+        return True
+
 
 class TrackingConnectionManager:
     """Gestionnaire de connexions WebSocket cloisonne par tenant / Tenant-scoped manager."""
 
     def __init__(self):
-        # (websocket, tenant_id) ; tenant_id=None => consolidation/superadmin (recoit tout)
-        self.active_connections: list[tuple[WebSocket, int | None]] = []
+        # tenant_id -> {websocket: connexion} ; None => consolidation/superadmin (recoit tout)
+        self._by_tenant: dict[int | None, dict[WebSocket, _Connection]] = {}
+        self._connections: dict[WebSocket, _Connection] = {}
+        self._tour_bases: OrderedDict[int, int] = OrderedDict()
+        self._sequence = itertools.count()
+        self.backend = InProcessBackend(self.deliver)
+
+    @property
+    def active_connections(self) -> list[tuple[WebSocket, int | None]]:
+        return [(ws, conn.tenant_id) for ws, conn in self._connections.items()]
 
     async def connect(self, websocket: WebSocket, tenant_id: int | None):
         await websocket.accept()
-        self.active_connections.append((websocket, tenant_id))
+        conn = _Connection(websocket, tenant_id)
+        self._connections[websocket] = conn
+        self._by_tenant.setdefault(tenant_id, {})[websocket] = conn
+        conn.task = asyncio.create_task(self._sender(conn))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections = [
-            (ws, t) for (ws, t) in self.active_connections if ws is not websocket
-        ]
+        conn = self._connections.pop(websocket, None)
+        if conn is None:
+            return
+        shard = self._by_tenant.get(conn.tenant_id)
+        if shard is not None:
+            shard.pop(websocket, None)
+            if not shard:
+                del self._by_tenant[conn.tenant_id]
+        if conn.task is not None and conn.task is not asyncio.current_task():
+            conn.task.cancel()
+
+    def subscribe(self, websocket: WebSocket, bases=None, tours=None):
+        """Restreindre les messages recus (None partout = tout) / Restrict received messages."""
+        conn = self._connections.get(websocket)
+        if conn is None:
+            return
+        conn.bases = frozenset(int(b) for b in bases) if bases is not None else None
+        conn.tours = frozenset(int(t) for t in tours) if tours is not None else None
+        if conn.bases is not None and conn.tours is None:
+            conn.tours = frozenset()
+        elif conn.tours is not None and conn.bases is None:
+            conn.bases = frozenset()
+
+    async def set_backend(self, backend):
+        """Changer de backend de diffusion (demarrage) / Swap the broadcast backend (startup)."""
+        await self.backend.stop()
+        self.backend = backend
+        await backend.start()
 
-    async def broadcast(self, message: dict, tenant_id: int | None):
-        """Diffuser aux clients du tenant `tenant_id` (celui de la donnee emise).
+    async def broadcast(self, message: dict, tenant_id: int | None, base_id: int | None = None):
+        """Diffuser aux clients du tenant `tenant_id` (celui de la donnee emise),
+        sur tous les workers / Broadcast to `tenant_id` clients on every worker.
+
+        Voir `deliver()` pour les regles de cloisonnement / see deliver() for scoping rules.
+        """
+        await self.backend.publish(message, tenant_id, base_id)
+
+    async def deliver(self, message: dict, tenant_id: int | None, base_id: int | None = None):
+        """Livrer aux clients de CE process du tenant `tenant_id` (celui de la donnee emise).
 
         - Un client consolidation (tenant None) recoit TOUT.
         - Un client scope a un tenant ne recoit QUE les donnees de son tenant.
         - Une donnee au tenant inconnu (None) ne part qu'aux clients consolidation.
         `tenant_id` est OBLIGATOIRE : il n'y a pas de diffusion "a tout le monde".
+        `base_id` (optionnel) sert aux abonnements par base ; il est retenu par
+        tour pour les messages suivants qui ne le portent pas.
         """
+        tour_id = message.get("tour_id")
+        if tour_id is not None:
+            if base_id is not None:
+                self._tour_bases[tour_id] = base_id
+                self._tour_bases.move_to_end(tour_id)
+                while len(self._tour_bases) > WS_TOUR_BASE_MAX_ENTRIES:
+                    self._tour_bases.popitem(last=False)
+            else:
+                base_id = self._tour_bases.get(tour_id)
+
+        targets = list(self._by_tenant.get(None, {}).values())
+        if tenant_id is not None:
+            targets += self._by_tenant.get(tenant_id, {}).values()
+        if not targets:
+            return
+
         data = json.dumps(message, ensure_ascii=False)
-        disconnected: list[WebSocket] = []
-        for connection, conn_tenant in self.active_connections:
-            # Cloisonnement : un client scope ne voit que son tenant.
-            if conn_tenant is not None and conn_tenant != tenant_id:
+        if message.get("type") in _COALESCED_TYPES and tour_id is not None:
+            key: object = (message["type"], tour_id)
+        else:
+            key = next(self._sequence)
+        for conn in targets:
+            if not conn.wants(tour_id, base_id):
                 continue
-            try:
-                await connection.send_text(data)
-            except Exception:
-                disconnected.append(connection)
-        for conn in disconnected:
-            self.disconnect(conn)
+            if not conn.enqueue(key, data):
+                logger.warning("WebSocket saturee (%d messages en attente) : connexion fermee",
+                               len(conn.pending))
+                self._drop(conn)
+        # Laisser partir les envois immediats / let immediate sends go out
+        await asyncio.sleep(0)
 
     async def send_personal(self, websocket: WebSocket, message: dict):
         await websocket.send_text(json.dumps(message, ensure_ascii=False))
 
+    async def _sender(self, conn: _Connection):
+        """Vider la file d'une connexion (tache de fond) / Drain one connection's queue."""
+        try:
+            while True:
+                await conn.wakeup.wait()
+                conn.wakeup.clear()
+                while conn.pending:
+                    _, data = conn.pending.popitem(last=False)
+                    async with asyncio.timeout(WS_SEND_TIMEOUT_SECONDS):
+                        await conn.websocket.send_text(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._drop(conn)
+
+    def _drop(self, conn: _Connection):
+        """Retirer et fermer une connexion defaillante / Remove and close a failing connection."""
+        self.disconnect(conn.websocket)
+        close = getattr(conn.websocket, "close", None)
+        if close is not None:
+            task = asyncio.create_task(close(code=1013))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
 
 # Singleton global / Global singleton
 manager = TrackingConnectionManager()
 
 
+def _handle_client_message(websocket: WebSocket, text: str):
+    """Messages client : pings ignores, abonnements appliques / Client messages."""
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return
+    if isinstance(payload, dict) and payload.get("type") == "subscribe":
+        try:
+            manager.subscribe(websocket, bases=payload.get("bases"), tours=payload.get("tours"))
+        except (TypeError, ValueError):
+            pass
+
+
 @router.websocket("/ws/tracking")
 async def websocket_tracking(
     websocket: WebSocket,
@@ -78,31 +252,21 @@ async def websocket_tracking(
     """
     # Authentification JWT : query param (legacy) ou cookie HttpOnly (web, STIME A4)
     # JWT auth: query param (legacy) or HttpOnly cookie (web)
-    raw_token = token or websocket.cookies.get("access_token", "")
-    payload = decode_token(raw_token) if raw_token else None
-    if payload is None or payload.get("type") != "access":
-        await websocket.close(code=4001, reason="Invalid token")
+    user = await authenticate_websocket(websocket, token)
+    if user is None:
         return
 
     # Resoudre le tenant du client (None = consolidation/superadmin -> voit tout) /
     # Resolve the client's tenant (None = consolidation/superadmin -> sees all).
-    try:
-        user_id = int(payload["sub"])
-    except (KeyError, ValueError, TypeError):
-        await websocket.close(code=4001, reason="Invalid token")
-        return
-
-    async with async_session() as db:
-        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
-        if user is None or not user.is_active:
-            await websocket.close(code=4001, reason="User not found or inactive")
-            return
-        tenant_id = get_user_tenant_id(user)
+    tenant_id = get_user_tenant_id(user)
 
     await manager.connect(websocket, tenant_id)
     try:
         while True:
-            # Garder la connexion ouverte, recevoir pings / Keep connection alive
-            await websocket.receive_text()
+            # Garder la connexion ouverte, recevoir pings et abonnements /
+            # Keep connection alive, receive pings and subscriptions
+            _handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
@@ -60,6 +60,47 @@ class Settings(BaseSettings):
     DEFAULT_MAX_DAILY_HOURS: float = 10.0
     DEFAULT_BREAK_DURATION_MINUTES: int = 45
 
+    # Aide à la décision Niveau 2 : process solveur OR-Tools en parallèle
+    # (le mode portefeuille occupe un process par stratégie) /
+    # Decision support level 2: concurrent OR-Tools solver processes
+    # (portfolio mode takes one process per strategy)
+    SOLVER_POOL_WORKERS: int = 4
+
+    # Ingestion GPS : période du tampon d'écriture différée en ms (0 = insertion
+    # dans la requête) et taille max du tampon / GPS ingestion: write-behind
+    # period in ms (0 = insert within the request) and max buffered rows
+    GPS_WRITE_BEHIND_MS: int = 0
+    GPS_WRITE_BEHIND_MAX_ROWS: int = 50_000
+
+    # Diffusion du suivi temps réel entre workers : "memory" (un seul worker) ou
+    # "postgres" (LISTEN/NOTIFY, plusieurs workers uvicorn) / Real-time tracking
+    # broadcast across workers: "memory" (single worker) or "postgres"
+    TRACKING_BROADCAST_BACKEND: str = "memory"
+
+    # Purge de rétention : lignes par lot (une transaction chacun), pause entre
+    # lots (ms) et budget de temps par catégorie (s) / Retention purge: rows per
+    # batch (one transaction each), pause between batches, time budget per category
+    RETENTION_BATCH_ROWS: int = 5000
+    RETENTION_BATCH_PAUSE_MS: int = 100
+    RETENTION_MAX_SECONDS_PER_CATEGORY: int = 1800
+
+    # Audit ORM : "batched" (un executemany par transaction, au COMMIT) ou
+    # "outbox" (une ligne par transaction, versée dans audit_logs en tâche de
+    # fond toutes les N ms) / ORM audit: "batched" (one executemany per
+    # transaction) or "outbox" (one row per transaction, moved in the background)
+    AUDIT_WRITE_MODE: str = "batched"
+    AUDIT_OUTBOX_FLUSH_MS: int = 500
+
+    # Démarrage : forcer la migration complète même si l'empreinte du schéma
+    # est à jour / Startup: force the full migration even if the schema
+    # fingerprint is current
+    SCHEMA_FORCE_MIGRATE: bool = False
+
+    # Timeline de planning : jours de planning passés dont le journal des
+    # changements (ETag / `since`) est conservé / Planning timeline: past
+    # planning days whose change log (ETag / `since`) is kept
+    TIMELINE_CHANGES_KEEP_DAYS: int = 14
+
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
 
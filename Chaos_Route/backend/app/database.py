@@ -3,7 +3,10 @@ Connexion a la base de donnees / Database connection.
 Supporte SQLite (dev) et PostgreSQL (prod) via SQLAlchemy 2.0 async.
 """
 
-from sqlalchemy import Enum as SAEnum, event, text
+import hashlib
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Enum as SAEnum, Integer, MetaData, String, Table, delete, event, insert, select, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, ORMExecuteState, Session, with_loader_criteria
 
@@ -130,9 +133,23 @@ async def get_db() -> AsyncSession:
 
 
 async def init_db():
-    """Creer les tables au demarrage / Create tables on startup."""
+    """Creer / migrer le schema au demarrage / Create or migrate the schema on startup.
+
+    Si l'empreinte du schema (`schema_fingerprint`) est celle enregistree au
+    dernier demarrage, toute l'introspection est sautee : seules les migrations
+    ponctuelles en attente (une requete) et l'entretien des partitions GPS
+    tournent. / When the schema fingerprint matches the recorded one, every
+    introspecting step is skipped.
+    """
+    fingerprint = schema_fingerprint()
+    if not settings.SCHEMA_FORCE_MIGRATE and await _recorded_fingerprint() == fingerprint:
+        await _run_one_off_migrations()
+        await _maintain_gps_partitions()
+        return
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_schema_meta.create_all)
     # Ajouter les colonnes manquantes sur tables existantes /
     # Add missing columns on existing tables
     await _migrate_enum_values()
@@ -152,17 +169,103 @@ async def init_db():
     # Ajouter les contraintes FK manquantes (PG uniquement) /
     # Add missing FK constraints (PG only)
     await _migrate_missing_foreign_keys()
-    # Retro-remplir le type de carburant (DIESEL/gasoil par defaut) / Backfill fuel_type
-    await _backfill_fuel_type()
-    # Retro-remplir la nature des tours (LIVRAISON par defaut) / Backfill tour_type
-    await _backfill_tour_type()
-    # Generer les QR/badge codes manquants / Backfill missing QR/badge codes
-    await _backfill_qr_codes()
-    # Marquer le support combi (code CO) si pas encore fait /
-    # Mark combi support type (code CO) if not yet flagged
-    await _backfill_combi_support_type()
-    # Purger les positions GPS > 30 jours / Purge GPS positions older than 30 days
-    await _cleanup_old_gps()
+    # Retro-remplissages et conversions, une seule fois chacun /
+    # Backfills and conversions, once each
+    await _run_one_off_migrations()
+    await _maintain_gps_partitions()
+    await _record_fingerprint(fingerprint)
+
+
+# ---------------------------------------------------------------------------
+# Version du schema : empreinte des modeles et migrations ponctuelles suivies.
+#
+# `schema_version` (une ligne) garde l'empreinte des modeles au dernier
+# demarrage complet ; `schema_migrations` la liste des migrations ponctuelles
+# (`ONE_OFF_MIGRATIONS`) deja appliquees. Tables hors `Base.metadata` (pas de
+# modele ORM, jamais auditees). Incrementer `SCHEMA_REVISION` quand une etape
+# d'init_db change sans changement de modele (ex. liste `_migrate_column_types`).
+# ---------------------------------------------------------------------------
+SCHEMA_REVISION = 1
+
+_schema_meta = MetaData()
+_schema_version = Table(
+    "schema_version", _schema_meta,
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("updated_at", String(32), nullable=False),
+)
+_schema_migrations = Table(
+    "schema_migrations", _schema_meta,
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", String(32), nullable=False),
+)
+
+
+def schema_fingerprint(metadata: MetaData | None = None) -> str:
+    """Empreinte SHA-256 des tables, colonnes, index et contraintes des modeles /
+    SHA-256 fingerprint of the models' tables, columns, indexes and constraints."""
+    metadata = metadata if metadata is not None else Base.metadata
+    parts = [f"revision={SCHEMA_REVISION}"]
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"T {table.name}")
+        for col in table.columns:
+            col_type = col.type
+            enums = ",".join(col_type.enums) if isinstance(col_type, SAEnum) else ""
+            fks = ",".join(sorted(f"{fk.target_fullname}:{fk.ondelete}" for fk in col.foreign_keys))
+            parts.append(f"C {col.name} {col_type!r} {enums} null={col.nullable} "
+                         f"pk={col.primary_key} fk={fks}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            parts.append(f"I {index.name} {index.unique} {','.join(c.name for c in index.columns)}")
+        parts.extend(sorted(
+            f"K {type(c).__name__} {c.name} {','.join(sorted(col.name for col in getattr(c, 'columns', ())))}"
+            for c in table.constraints
+        ))
+    parts.append("M " + ",".join(name for name, _ in ONE_OFF_MIGRATIONS))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+async def _recorded_fingerprint() -> str | None:
+    """Empreinte enregistree (None si jamais enregistree) / Recorded fingerprint."""
+    try:
+        async with engine.connect() as conn:
+            return (await conn.execute(
+                select(_schema_version.c.fingerprint).where(_schema_version.c.id == 1)
+            )).scalar_one_or_none()
+    except Exception:
+        # Table absente (premier demarrage) / missing table (first start)
+        return None
+
+
+async def _record_fingerprint(fingerprint: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(delete(_schema_version))
+        await conn.execute(insert(_schema_version).values(
+            id=1, fingerprint=fingerprint, updated_at=_now_iso(),
+        ))
+    print(f"[migrate] schema_version: {fingerprint[:12]}")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+async def _run_one_off_migrations():
+    """Appliquer les migrations ponctuelles pas encore enregistrees ; une
+    migration qui echoue est retentee au demarrage suivant / Apply one-off
+    migrations not yet recorded; a failing one is retried on the next start."""
+    async with engine.connect() as conn:
+        applied = set((await conn.execute(select(_schema_migrations.c.name))).scalars())
+    for name, migration in ONE_OFF_MIGRATIONS:
+        if name in applied:
+            continue
+        try:
+            await migration()
+        except Exception as e:
+            print(f"[migrate] WARN {name}: {e}")
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(insert(_schema_migrations).values(name=name, applied_at=_now_iso()))
+        print(f"[migrate] {name}: applied")
 
 
 async def _backfill_tour_type():
@@ -170,23 +273,21 @@ async def _backfill_tour_type():
     Backfill tour_type=LIVRAISON on existing tours.
 
     Aligne aussi la nature sur l'ancien drapeau is_pickup_tour : les tours
-    de reprise existants deviennent ENLEVEMENT.
+    de reprise existants deviennent ENLEVEMENT. Une erreur remonte au runner
+    (migration retentee au demarrage suivant) / Errors propagate to the runner.
     """
     async with engine.begin() as conn:
-        try:
-            r1 = await conn.execute(text(
-                "UPDATE tours SET tour_type = 'ENLEVEMENT' "
-                "WHERE tour_type IS NULL AND is_pickup_tour = "
-                + ("TRUE" if not _is_sqlite else "1")
-            ))
-            r2 = await conn.execute(text(
-                "UPDATE tours SET tour_type = 'LIVRAISON' WHERE tour_type IS NULL"
-            ))
-            n = (r1.rowcount or 0) + (r2.rowcount or 0)
-            if n:
-                print(f"[backfill] tours: {n} lignes -> tour_type (LIVRAISON/ENLEVEMENT)")
-        except Exception as e:
-            print(f"[backfill] WARN tour_type: {e}")
+        r1 = await conn.execute(text(
+            "UPDATE tours SET tour_type = 'ENLEVEMENT' "
+            "WHERE tour_type IS NULL AND is_pickup_tour = "
+            + ("TRUE" if not _is_sqlite else "1")
+        ))
+        r2 = await conn.execute(text(
+            "UPDATE tours SET tour_type = 'LIVRAISON' WHERE tour_type IS NULL"
+        ))
+        n = (r1.rowcount or 0) + (r2.rowcount or 0)
+        if n:
+            print(f"[backfill] tours: {n} lignes -> tour_type (LIVRAISON/ENLEVEMENT)")
 
 
 async def _backfill_qr_codes():
@@ -246,17 +347,99 @@ async def _backfill_combi_support_type():
             print(f"[backfill] Flagged support_type id={row[0]} (code=CO) as is_combi")
 
 
-async def _cleanup_old_gps(days: int = 30):
-    """Purger les positions GPS des tours > 30 jours / Purge GPS positions for tours older than 30 days."""
-    from datetime import datetime, timedelta
-    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+async def _backfill_tour_live_states():
+    """Creer l'etat temps reel des tours qui n'en ont pas / Backfill tour_live_states.
+
+    Idempotent : seuls les tours avec arrets mais sans ligne sont inseres, puis
+    la derniere position GPS est reportee sur les lignes qui n'en ont pas.
+    Ensuite, la table est tenue a jour par services/live_state.py. Une erreur
+    remonte au runner / Errors propagate to the runner.
+    """
+    async with engine.begin() as conn:
+        r1 = await conn.execute(text(
+            "INSERT INTO tour_live_states (tour_id, tenant_id, stops_total, stops_delivered) "
+            "SELECT t.id, t.tenant_id, COUNT(s.id), "
+            "SUM(CASE WHEN s.delivery_status = 'DELIVERED' THEN 1 ELSE 0 END) "
+            "FROM tours t JOIN tour_stops s ON s.tour_id = t.id "
+            "WHERE NOT EXISTS (SELECT 1 FROM tour_live_states l WHERE l.tour_id = t.id) "
+            "GROUP BY t.id, t.tenant_id"
+        ))
+        latest = (
+            "(SELECT g.{col} FROM gps_positions g WHERE g.tour_id = tour_live_states.tour_id "
+            "ORDER BY g.timestamp DESC LIMIT 1)"
+        )
+        r2 = await conn.execute(text(
+            "UPDATE tour_live_states SET "
+            + ", ".join(f"{c} = {latest.format(col=c)}"
+                        for c in ("latitude", "longitude", "accuracy", "speed", "timestamp"))
+            + " WHERE timestamp IS NULL AND EXISTS "
+            "(SELECT 1 FROM gps_positions g WHERE g.tour_id = tour_live_states.tour_id)"
+        ))
+        if r1.rowcount or r2.rowcount:
+            print(f"[backfill] tour_live_states: {r1.rowcount or 0} tours, "
+                  f"{r2.rowcount or 0} dernieres positions")
+
+
+async def _backfill_timeline_versions():
+    """Versionner le journal de timeline ecrit avant l'horloge (version = id)
+    et amorcer `timeline_clock` / Version pre-clock timeline rows and seed the clock.
+
+    Les curseurs `since` deja distribues (ids) restent valides : l'horloge
+    repart du plus grand id.
+    """
+    async with engine.begin() as conn:
+        r = await conn.execute(text("UPDATE timeline_changes SET version = id WHERE version IS NULL"))
+        await conn.execute(text(
+            "INSERT INTO timeline_clock (id, version) "
+            "SELECT 1, COALESCE(MAX(version), 0) FROM timeline_changes "
+            "WHERE NOT EXISTS (SELECT 1 FROM timeline_clock WHERE id = 1)"
+        ))
+        if r.rowcount:
+            print(f"[backfill] timeline_changes: {r.rowcount} lignes -> version")
+
+
+async def _seed_tour_cost_fact_clock():
+    """Amorcer `tour_cost_fact_clock` / Seed the cost-input clock row.
+
+    Sans ligne, la relecture `FOR SHARE` d'un calcul ne verrouille rien.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO tour_cost_fact_clock (id, version) SELECT 1, 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM tour_cost_fact_clock WHERE id = 1)"
+        ))
+
+
+async def _migrate_gps_partitions():
+    """Convertir gps_positions en table partitionnée par jour (une fois) /
+    Convert gps_positions to daily partitions (once). PostgreSQL uniquement.
+    """
+    if _is_sqlite:
+        return
+    from app.services import gps_partitions
+
     async with engine.begin() as conn:
-        result = await conn.execute(text(
-            "DELETE FROM gps_positions WHERE tour_id IN "
-            "(SELECT id FROM tours WHERE date < :cutoff)"
-        ), {"cutoff": cutoff})
-        if result.rowcount:
-            print(f"[cleanup] {result.rowcount} GPS positions removed (tours before {cutoff})")
+        if not await gps_partitions.is_partitioned(conn):
+            moved = await gps_partitions.convert_to_partitioned(conn)
+            print(f"[migrate] gps_positions partitionnée par jour ({moved} positions migrées)")
+
+
+async def _maintain_gps_partitions():
+    """Créer les partitions GPS à venir (à chaque démarrage) /
+    Create upcoming GPS partitions (every start). PostgreSQL uniquement."""
+    if _is_sqlite:
+        return
+    from app.services import gps_partitions
+
+    try:
+        async with engine.begin() as conn:
+            if not await gps_partitions.is_partitioned(conn):
+                return
+            created = await gps_partitions.maintain_partitions(conn)
+            if created:
+                print(f"[migrate] gps_positions: {created} partitions journalières créées")
+    except Exception as e:
+        print(f"[migrate] WARN gps_positions partitions: {e}")
 
 
 async def _seed_default_tenant_and_backfill():
@@ -360,17 +543,17 @@ async def _migrate_create_enum_types():
 async def _backfill_fuel_type():
     """Retro-remplir fuel_type=DIESEL (gasoil) sur les lignes existantes (NULL) /
     Backfill fuel_type=DIESEL on existing rows (legacy contracts/fuel prices).
+
+    Une seule transaction ; une erreur remonte au runner (migration retentee
+    au demarrage suivant) / One transaction; errors propagate to the runner.
     """
     async with engine.begin() as conn:
         for table in ("contracts", "fuel_prices"):
-            try:
-                result = await conn.execute(text(
-                    f"UPDATE {table} SET fuel_type = 'DIESEL' WHERE fuel_type IS NULL"
-                ))
-                if result.rowcount:
-                    print(f"[backfill] {table}: {result.rowcount} lignes -> fuel_type=DIESEL")
-            except Exception as e:
-                print(f"[backfill] WARN fuel_type {table}: {e}")
+            result = await conn.execute(text(
+                f"UPDATE {table} SET fuel_type = 'DIESEL' WHERE fuel_type IS NULL"
+            ))
+            if result.rowcount:
+                print(f"[backfill] {table}: {result.rowcount} lignes -> fuel_type=DIESEL")
 
 
 async def _migrate_missing_columns():
@@ -491,10 +674,13 @@ async def _migrate_missing_indexes():
                 if index.name and index.name not in existing_indexes:
                     cols = ", ".join(f'"{c.name}"' for c in index.columns)
                     unique = "UNIQUE " if index.unique else ""
+                    # Index partiel (`postgresql_where` / `sqlite_where`) / Partial index
+                    where = index.dialect_options["sqlite" if _is_sqlite else "postgresql"].get("where")
+                    where = f" WHERE {where}" if where is not None else ""
                     try:
                         await conn.execute(text(
                             f'CREATE {unique}INDEX IF NOT EXISTS "{index.name}" '
-                            f'ON "{table.name}" ({cols})'
+                            f'ON "{table.name}" ({cols}){where}'
                         ))
                         print(f"[migrate] Added index {index.name} on {table.name}({cols})")
                     except Exception as e:
@@ -562,3 +748,18 @@ async def _migrate_missing_foreign_keys():
             # Donnée orpheline ou contrainte déjà présente sous un autre nom /
             # Orphan data or constraint already present under another name
             print(f"[migrate] WARN: failed to add FK on {tname}.{cname}: {e}")
+
+
+# Migrations ponctuelles, dans l'ordre ; le nom est la cle enregistree dans
+# `schema_migrations` (ne jamais renommer) / One-off migrations, in order; the
+# name is the key recorded in schema_migrations (never rename).
+ONE_OFF_MIGRATIONS = [
+    ("backfill_fuel_type", _backfill_fuel_type),
+    ("backfill_tour_type", _backfill_tour_type),
+    ("backfill_qr_codes", _backfill_qr_codes),
+    ("backfill_combi_support_type", _backfill_combi_support_type),
+    ("backfill_tour_live_states", _backfill_tour_live_states),
+    ("gps_positions_partitioned", _migrate_gps_partitions),
+    ("backfill_timeline_versions", _backfill_timeline_versions),
+    ("seed_tour_cost_fact_clock", _seed_tour_cost_fact_clock),
+]
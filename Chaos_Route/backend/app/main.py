@@ -24,6 +24,12 @@ from app.config import settings
 from app.database import async_session, init_db
 from app.rate_limit import limiter
 from app.services import audit_trail  # noqa: F401 — enregistre l'audit ORM global (STIME A5)
+from app.services import distance_matrix_store  # noqa: F401 — invalidation du distancier en mémoire au commit
+from app.services import simulation_cache  # noqa: F401 — invalidation du cache aide à la décision au commit
+from app.services import device_cache  # noqa: F401 — invalidation du cache des appareils au commit
+from app.services import gps_ingest  # noqa: F401 — invalidation des contextes d'ingestion GPS au commit
+from app.services import live_state  # noqa: F401 — miroir de l'état temps réel des tours au flush / commit
+from app.services import principal_cache  # noqa: F401 — invalidation du cache des utilisateurs authentifiés au commit
 from app.utils.seed import seed_superadmin
 
 logger = logging.getLogger("chaos_route")
@@ -55,8 +61,38 @@ async def lifespan(app: FastAPI):
     async with async_session() as session:
         await ensure_default_policies(session)
     retention_task = asyncio.create_task(retention_scheduler())
+    # last_seen_at des appareils : écriture regroupée / Coalesced device last_seen_at writes
+    from app.services.device_cache import flush_last_seen, last_seen_scheduler
+    last_seen_task = asyncio.create_task(last_seen_scheduler())
+    # Tampon d'écriture différée GPS (si activé) / GPS write-behind buffer (if enabled)
+    from app.services.gps_ingest import gps_write_behind_scheduler, gps_write_buffer
+    gps_task = asyncio.create_task(gps_write_behind_scheduler()) if gps_write_buffer.enabled else None
+    # Audit : boîte d'envoi versée en tâche de fond (reliquat versé au démarrage) /
+    # Audit: outbox drained in the background (leftovers drained at startup)
+    from app.services.audit_trail import audit_outbox_scheduler, drain_audit_outbox
+    await drain_audit_outbox()
+    audit_task = asyncio.create_task(audit_outbox_scheduler()) if settings.AUDIT_WRITE_MODE == "outbox" else None
+    # Diffusion du suivi entre workers / Cross-worker tracking broadcast
+    from app.api.ws_tracking import manager as tracking_manager
+    from app.services.tracking_bus import make_backend
+    await tracking_manager.set_backend(make_backend(tracking_manager.deliver))
     yield
+    await tracking_manager.backend.stop()
     retention_task.cancel()
+    last_seen_task.cancel()
+    if gps_task is not None:
+        gps_task.cancel()
+    if audit_task is not None:
+        audit_task.cancel()
+    try:
+        await flush_last_seen()
+        await gps_write_buffer.flush()
+        await drain_audit_outbox()
+    except Exception:
+        logger.exception("Échec d'écriture des tampons à l'arrêt")
+    # Pool de process du solveur Niveau 2 / Level 2 solver process pool
+    from app.services.solver_pool import shutdown_solver_pool
+    shutdown_solver_pool()
 
 
 # 3C. Desactiver Swagger en production / Disable Swagger in production
@@ -80,7 +116,9 @@ app.add_middleware(
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type", "X-Device-ID", "X-Requested-With"],
+    allow_headers=["Authorization", "Content-Type", "X-Device-ID", "X-Requested-With", "If-None-Match"],
+    # Timeline versionnée / Versioned timeline
+    expose_headers=["ETag", "X-Timeline-Version"],
 )
 
 
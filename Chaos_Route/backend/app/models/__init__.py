@@ -20,12 +20,14 @@ from app.models.distance_matrix import DistanceMatrix
 from app.models.fuel_price import FuelPrice
 from app.models.km_tax import KmTax
 from app.models.parameter import Parameter
-from app.models.audit import AuditLog
+from app.models.audit import AuditLog, AuditOutbox
 from app.models.loader import Loader
 from app.models.user import User, Role, Permission, user_roles, user_regions
 from app.models.mobile_device import MobileDevice
 from app.models.device_assignment import DeviceAssignment
 from app.models.gps_position import GPSPosition
+from app.models.tour_live_state import TourLiveState
+from app.models.gps_trail import GPSTrail
 from app.models.stop_event import StopEvent, StopEventType
 from app.models.support_scan import SupportScan
 from app.models.delivery_alert import DeliveryAlert, AlertType, AlertSeverity
@@ -34,6 +36,9 @@ from app.models.pickup_request import PickupRequest, PickupLabel, PickupMovement
 from app.models.tour_manifest_line import TourManifestLine
 from app.models.surcharge_type import SurchargeType
 from app.models.tour_surcharge import TourSurcharge, SurchargeStatus
+from app.models.tour_cost_fact import TourCostFact, TourCostFactClock
+from app.models.timeline_change import TimelineChange, TimelineClock
+from app.models.aide_decision_job import AideDecisionJobState
 from app.models.driver_declaration import DriverDeclaration, DeclarationPhoto, DeclarationType
 from app.models.vehicle import Vehicle, FleetVehicleType, VehicleStatus, FuelType, OwnershipType
 from app.models.inspection_template import InspectionTemplate, InspectionCategory
@@ -88,6 +93,7 @@ __all__ = [
     "KmTax",
     "Parameter",
     "AuditLog",
+    "AuditOutbox",
     "User",
     "Role",
     "Permission",
@@ -97,6 +103,8 @@ __all__ = [
     "MobileDevice",
     "DeviceAssignment",
     "GPSPosition",
+    "TourLiveState",
+    "GPSTrail",
     "StopEvent",
     "StopEventType",
     "SupportScan",
@@ -115,6 +123,11 @@ __all__ = [
     "SurchargeType",
     "TourSurcharge",
     "SurchargeStatus",
+    "TourCostFact",
+    "TourCostFactClock",
+    "TimelineChange",
+    "TimelineClock",
+    "AideDecisionJobState",
     "DriverDeclaration",
     "DeclarationPhoto",
     "DeclarationType",
@@ -0,0 +1,35 @@
+"""Modele Etat d'un job d'aide a la decision / Decision support job state model."""
+
+from sqlalchemy import Boolean, Float, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class AideDecisionJobState(Base):
+    """Etat partage d'un job d'aide a la decision / Shared state of a decision support job.
+
+    Ecrit en Core par `services/aide_decision_jobs.py` : le worker qui execute
+    le job y reporte statut, progression (au plus une fois par
+    `JOB_POLL_SECONDS`, avec un battement de coeur) et resultat ; les autres
+    workers le lisent (GET, WebSocket) et y deposent une demande
+    d'annulation. `tenant_id` sans FK ni TenantMixin : NULL = job d'un
+    utilisateur consolidation, le filtrage est fait par le service.
+    """
+    __tablename__ = "aide_decision_jobs"
+    __table_args__ = (
+        Index("ix_aide_decision_jobs_user_status", "user_id", "status"),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    tenant_id: Mapped[int | None] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String(12), nullable=False)  # queued, running, succeeded, failed, cancelled
+    request: Mapped[str] = mapped_column(Text, nullable=False)  # JSON AideDecisionRequest
+    progress: Mapped[str | None] = mapped_column(Text)  # JSON : derniere amelioration du solveur
+    result: Mapped[str | None] = mapped_column(Text)  # JSON AideDecisionResponse
+    error: Mapped[str | None] = mapped_column(Text)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)  # epoch (s)
+    finished_at: Mapped[float | None] = mapped_column(Float)
+    heartbeat_at: Mapped[float] = mapped_column(Float, nullable=False)
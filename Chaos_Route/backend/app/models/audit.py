@@ -24,3 +24,16 @@ class AuditLog(Base, TenantMixin):
 
     def __repr__(self) -> str:
         return f"<AuditLog {self.action} {self.entity_type}:{self.entity_id}>"
+
+
+class AuditOutbox(Base):
+    """Boîte d'envoi de l'audit (mode `AUDIT_WRITE_MODE=outbox`) : une ligne par
+    transaction auditée, écrite dans cette transaction, puis versée dans
+    `audit_logs` par une tâche de fond (`services/audit_trail.py`). Les entrées
+    du `payload` portent chacune leur tenant. / Audit outbox: one row per
+    audited transaction, moved into audit_logs by a background task."""
+    __tablename__ = "audit_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON : liste d'entrées audit_logs
+    created_at: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO 8601
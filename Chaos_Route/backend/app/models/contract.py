@@ -72,7 +72,8 @@ class Contract(Base, TenantMixin):
     prime_saturday: Mapped[float | None] = mapped_column(Numeric(10, 2))      # Prime samedi
     prime_sunday_holiday: Mapped[float | None] = mapped_column(Numeric(10, 2))  # Prime dimanche/férié
     # Type de carburant (obligatoire à la saisie ; nullable en base pour migration
-    # sûre, rétro-rempli GASOIL au démarrage). Détermine quel prix carburant utiliser.
+    # sûre, rétro-rempli GASOIL par la migration ponctuelle `backfill_fuel_type`,
+    # une seule fois). Détermine quel prix carburant utiliser.
     # Pour le gaz, consumption_coefficient s'exprime en kg/km (sinon L/km).
     fuel_type: Mapped[FuelType | None] = mapped_column(
         Enum(FuelType), nullable=True, default=FuelType.DIESEL
@@ -27,7 +27,8 @@ class FuelPrice(Base, TenantMixin):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     # Type de carburant. Nullable en base (migration sûre), rétro-rempli DIESEL
-    # au démarrage. Requis côté API (création).
+    # par la migration ponctuelle `backfill_fuel_type` (une seule fois). Requis
+    # côté API (création).
     fuel_type: Mapped[FuelType | None] = mapped_column(
         Enum(FuelType), nullable=True, default=FuelType.DIESEL
     )
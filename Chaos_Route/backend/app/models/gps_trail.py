@@ -0,0 +1,25 @@
+"""Modele Trace GPS simplifiee d'un tour / Simplified tour GPS trail model."""
+
+from sqlalchemy import ForeignKey, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.models.mixins import TenantMixin
+
+
+class GPSTrail(Base, TenantMixin):
+    """Trace precalculee d'un tour a un niveau de detail (Douglas-Peucker) /
+    Precomputed tour trail at one level of detail (Douglas-Peucker).
+
+    Calculee par `services/gps_trails.py` a la premiere lecture et prolongee
+    des que la derniere position du tour (`source_last_timestamp`) change.
+    `points` : JSON de tableaux compacts [id, device_id, lat, lon, accuracy, speed, timestamp].
+    """
+    __tablename__ = "gps_trails"
+
+    tour_id: Mapped[int] = mapped_column(ForeignKey("tours.id", ondelete="CASCADE"), primary_key=True)
+    level: Mapped[str] = mapped_column(String(10), primary_key=True)  # overview / standard / fine
+    points: Mapped[str] = mapped_column(Text, nullable=False)
+    point_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    source_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    source_last_timestamp: Mapped[str | None] = mapped_column(String(32))  # ISO 8601
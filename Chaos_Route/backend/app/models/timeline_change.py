@@ -0,0 +1,48 @@
+"""Modele Changement de timeline / Timeline change model."""
+
+from sqlalchemy import BigInteger, Index, Integer, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.models.mixins import TenantMixin
+
+
+class TimelineChange(Base, TenantMixin):
+    """Un tour modifie sur un couple (base, jour) du planning / A tour changed on a (base, day) of the planning.
+
+    Ecrite par `services/timeline_versions.py` dans la transaction qui modifie
+    le tour ou ses arrets. `version` est attribuee au COMMIT par l'horloge
+    `timeline_clock` (pas l'id, attribue a l'INSERT) : l'ordre des versions
+    est celui des commits. La version d'un couple (societe, base, jour) est la
+    plus grande de ses lignes. NULL = transaction pas encore validee.
+    Pas de FK vers `tours` : un tour supprime doit rester signale.
+    """
+    __tablename__ = "timeline_changes"
+    __table_args__ = (
+        Index("ix_timeline_changes_date_base_version", "date", "base_id", "version"),
+        # Lignes pas encore versionnees (transactions en cours) / Rows not yet versioned
+        Index("ix_timeline_changes_unversioned", "id",
+              postgresql_where=text("version IS NULL"), sqlite_where=text("version IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    base_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    date: Mapped[str] = mapped_column(String(10), nullable=False)  # YYYY-MM-DD
+    tour_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    changed_at: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO 8601
+    version: Mapped[int | None] = mapped_column(BigInteger)
+
+
+class TimelineClock(Base):
+    """Horloge des versions de timeline (une ligne, id=1) / Timeline version clock (single row).
+
+    Incrementee par `UPDATE ... RETURNING` juste avant le COMMIT d'une
+    transaction qui journalise des changements : le verrou de ligne est garde
+    jusqu'au COMMIT, donc une version plus grande est toujours validee apres
+    les plus petites. Commune a toutes les societes (les versions ne servent
+    qu'a comparer).
+    """
+    __tablename__ = "timeline_clock"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,51 @@
+"""Modele Fait de cout par tour / Per-tour cost fact model."""
+
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Index, Integer, Numeric, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.models.mixins import TenantMixin
+
+
+class TourCostFact(Base, TenantMixin):
+    """Decomposition du cout d'un tour planifie / Cost breakdown of a planned tour.
+
+    Ecrite par `services/tour_cost_facts.py` (synthese transporteur, recalcul
+    en masse) et supprimee dans la transaction qui modifie une de ses entrees
+    (tour, arrets, surcharges, contrat, prix carburant, taxe km) ; une ligne
+    absente est recalculee a la lecture. Un calcul n'est enregistre que si
+    `TourCostFactClock` n'a pas bouge depuis la lecture de ses entrees : une
+    ecriture concurrente ne laisse pas de ligne perimee. Les ecritures hors
+    ORM (non vues par le hook) se reparent par `POST /tours/cost-facts/rebuild`.
+    """
+    __tablename__ = "tour_cost_facts"
+    __table_args__ = (
+        Index("ix_tour_cost_facts_date_contract", "date", "contract_id"),
+    )
+
+    tour_id: Mapped[int] = mapped_column(ForeignKey("tours.id", ondelete="CASCADE"), primary_key=True)
+    contract_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    date: Mapped[str] = mapped_column(String(10), nullable=False)  # YYYY-MM-DD
+    fixed_share: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    vacation_share: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    fuel_cost: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    km_tax_total: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    surcharges_total: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    total_calculated: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    # Aucun prix carburant a la date du tour / No fuel price at all on the tour's date
+    fuel_price_missing: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    computed_at: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO 8601
+
+
+class TourCostFactClock(Base):
+    """Horloge des entrees de cout (une ligne, id=1) / Cost-input clock (single row).
+
+    Incrementee juste avant le COMMIT d'une transaction qui invalide des faits
+    (verrou de ligne garde jusqu'au COMMIT) ; un calcul la relit `FOR SHARE`
+    avant d'enregistrer ses faits et renonce si elle a bouge depuis la lecture
+    de ses entrees. Commune a toutes les societes.
+    """
+    __tablename__ = "tour_cost_fact_clock"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,26 @@
+"""Modele Etat temps reel d'un tour / Tour live-state model."""
+
+from sqlalchemy import Float, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+from app.models.mixins import TenantMixin
+
+
+class TourLiveState(Base, TenantMixin):
+    """Derniere position GPS et compteurs d'arrets d'un tour (une ligne par tour) /
+    Latest GPS position and stop counters of a tour (one row per tour).
+
+    Miroir du magasin en memoire `services/live_state.py`, tenu a jour par
+    UPSERT Core : insertion GPS et ecritures ORM sur les arrets.
+    """
+    __tablename__ = "tour_live_states"
+
+    tour_id: Mapped[int] = mapped_column(ForeignKey("tours.id", ondelete="CASCADE"), primary_key=True)
+    latitude: Mapped[float | None] = mapped_column(Float)
+    longitude: Mapped[float | None] = mapped_column(Float)
+    accuracy: Mapped[float | None] = mapped_column(Float)
+    speed: Mapped[float | None] = mapped_column(Float)
+    timestamp: Mapped[str | None] = mapped_column(String(32))  # ISO 8601, None = pas encore de GPS
+    stops_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    stops_delivered: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
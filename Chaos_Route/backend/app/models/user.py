@@ -3,6 +3,7 @@ Modèles Authentification et Autorisation / Authentication and Authorization mod
 User, Role, Permission + tables de jonction / junction tables.
 """
 
+import uuid
 from datetime import datetime
 
 from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Table, func
@@ -52,7 +53,8 @@ class User(Base):
     # du tenant). / Owning tenant; NOT auto-filtered (login precedes tenant resolution).
     tenant_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
     pdv_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("pdvs.id"), nullable=True)  # Lien optionnel vers un PDV / Optional link to a PDV
-    badge_code: Mapped[str | None] = mapped_column(String(8), unique=True)
+    # Genere a l'insertion (plus de retro-remplissage au demarrage) / Generated on insert
+    badge_code: Mapped[str | None] = mapped_column(String(8), unique=True, default=lambda: uuid.uuid4().hex[:8].upper())
     default_route: Mapped[str | None] = mapped_column(String(100))
     supplier_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("suppliers.id"), nullable=True)  # Lien optionnel vers un fournisseur / Optional link to a supplier
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -6,6 +6,7 @@ Physical fleet entity, separated from Contract which handles transporter costs.
 """
 
 import enum
+import uuid
 
 from sqlalchemy import Boolean, Enum, ForeignKey, Integer, Numeric, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -57,7 +58,8 @@ class Vehicle(Base, TenantMixin):
     vin: Mapped[str | None] = mapped_column(String(30))
     brand: Mapped[str | None] = mapped_column(String(50))
     model: Mapped[str | None] = mapped_column(String(50))
-    qr_code: Mapped[str | None] = mapped_column(String(8), unique=True)
+    # Genere a l'insertion (plus de retro-remplissage au demarrage) / Generated on insert
+    qr_code: Mapped[str | None] = mapped_column(String(8), unique=True, default=lambda: uuid.uuid4().hex[:8].upper())
 
     # --- Classification ---
     fleet_vehicle_type: Mapped[FleetVehicleType] = mapped_column(
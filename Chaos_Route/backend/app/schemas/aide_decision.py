@@ -3,7 +3,7 @@ Schémas Aide à la Décision / Decision Support schemas.
 Simulation pure — aucun impact sur les données.
 """
 
-from pydantic import BaseModel, field_validator, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 _VALID_PRIORITIES = {"cost", "punctuality", "fill_rate", "num_tours"}
 _DEFAULT_PRIORITIES = ["cost", "punctuality", "fill_rate", "num_tours"]
@@ -29,7 +29,10 @@ class AideDecisionRequest(BaseModel):
     temperature_class: str      # SEC | FRAIS | GEL
     level: int = 1              # 1 = heuristique, 2 = OR-Tools
     time_limit_seconds: int = 30  # limite de recherche OR-Tools (level 2)
+    local_search_ms: int = Field(0, ge=0, le=10_000)  # budget 2-opt/Or-opt level 1 (0 = désactivé)
     optimization_priorities: list[str] = _DEFAULT_PRIORITIES.copy()
+    use_cache: bool = True      # réutiliser données / résultats / tours d'un run identique
+    portfolio: bool = False     # level 2 : plusieurs stratégies OR-Tools en parallèle, la meilleure gagne
 
     @model_validator(mode="after")
     def _validate_priorities(self):
@@ -124,3 +127,43 @@ class AideDecisionResponse(BaseModel):
     unassigned_pdvs: list[UnassignedPDV] = []
     summary: AideDecisionSummary
     warnings: list[str] = []
+    solver_strategy: str | None = None  # level 2 : stratégie OR-Tools retenue / winning OR-Tools strategy
+
+
+class AideDecisionScope(BaseModel):
+    """Périmètre d'un lot : une base × une température / Batch scope: one base × one temperature."""
+    base_origin_id: int
+    temperature_class: str      # SEC | FRAIS | GEL
+
+
+class AideDecisionBatchRequest(BaseModel):
+    """Simulation de plusieurs périmètres pour une date / Multi-scope simulation for one date.
+
+    Mêmes paramètres de run que `AideDecisionRequest`, appliqués à chaque périmètre.
+    """
+    dispatch_date: str          # YYYY-MM-DD
+    scopes: list[AideDecisionScope] = Field(..., min_length=1, max_length=100)
+    level: int = 1
+    time_limit_seconds: int = 30
+    local_search_ms: int = Field(0, ge=0, le=10_000)
+    optimization_priorities: list[str] = _DEFAULT_PRIORITIES.copy()
+    use_cache: bool = True
+    portfolio: bool = False
+
+
+class AideDecisionScopeResult(BaseModel):
+    """Résultat d'un périmètre / Per-scope result."""
+    base_origin_id: int
+    temperature_class: str
+    contract_ids: list[int] = []        # contrats attribués au périmètre / contracts allocated to the scope
+    result: AideDecisionResponse | None = None  # None : périmètre en échec / failed scope
+    error: str | None = None
+
+
+class AideDecisionBatchResponse(BaseModel):
+    """Simulation consolidée / Consolidated simulation."""
+    dispatch_date: str
+    scopes: list[AideDecisionScopeResult] = []
+    summary: AideDecisionSummary
+    contested_contracts: int = 0        # contrats éligibles à plusieurs périmètres / contracts eligible to several scopes
+    warnings: list[str] = []
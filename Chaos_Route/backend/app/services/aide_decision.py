@@ -6,16 +6,17 @@ Simulation pure : aucun tour créé, aucun volume modifié.
 """
 
 import logging
-import math
+import time
 from collections import defaultdict
+from collections.abc import Callable, Mapping
 
+import numpy as np
 from sqlalchemy import select, func, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.base_logistics import BaseLogistics
 from app.models.contract import Contract, TemperatureType, TailgateType
 from app.models.contract_schedule import ContractSchedule
-from app.models.distance_matrix import DistanceMatrix
 from app.models.km_tax import KmTax
 from app.models.pdv import PDV
 from app.models.tour import Tour
@@ -29,7 +30,21 @@ from app.schemas.aide_decision import (
     SuggestedTour,
     UnassignedPDV,
 )
+from app.services.compatibility_index import capabilities, requirements, violations
+from app.services.distance_matrix_store import MISSING_DURATION, get_distance_snapshot
+from app.services.level1_engine import Level1Engine
+from app.services.simulation_cache import (
+    PDV_SNAPSHOT_COLUMNS,
+    PDVSnapshot,
+    SimulationEntry,
+    SimulationInputs,
+    result_key,
+    simulation_cache,
+    simulation_fingerprint,
+)
+from app.services.solver_pool import run_portfolio, run_solver, strategy_label
 from app.utils.fuel_pricing import load_fuel_unit_prices, price_for_contract
+from app.utils.geo import ROAD_FACTOR, coord_array, haversine_matrix
 
 log = logging.getLogger(__name__)
 
@@ -41,6 +56,7 @@ DEFAULT_CAPACITY_EQP = 54       # capacité par défaut si aucun contrat
 SAS_DEADLINE = "06:00"
 NON_SAS_DEADLINE = "09:00"
 AVERAGE_SPEED_KMH = 60          # pour estimation durée si manquante
+WARM_START_STAGNATION_SECONDS = 3  # départ à chaud : arrêt après 3 s sans amélioration
 
 # Multiplicateurs par position dans la liste de priorités / Priority position multipliers
 # Ecarts elargis pour que le changement d'ordre ait un effet visible /
@@ -78,24 +94,106 @@ def _minutes_to_time(m: int) -> str:
     return f"{h:02d}:{mn:02d}"
 
 
-def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Distance haversine en km × 1.3 (correction route) / Haversine distance in km × 1.3 (road correction)."""
-    R = 6371.0
-    rlat1, rlon1, rlat2, rlon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = rlat2 - rlat1
-    dlon = rlon2 - rlon1
-    a = math.sin(dlat / 2) ** 2 + math.cos(rlat1) * math.cos(rlat2) * math.sin(dlon / 2) ** 2
-    return R * 2 * math.asin(math.sqrt(a)) * 1.3
+def is_contract_available(
+    contract: Contract, dispatch_date: str, temperature_class: str, unavailable_ids: set[int],
+) -> bool:
+    """Contrat utilisable ce jour pour cette température ? / Contract usable that day for that temperature?
+
+    Indisponibilité planifiée, période de validité, compatibilité température.
+    """
+    if contract.id in unavailable_ids:
+        return False
+    if contract.start_date and contract.start_date > dispatch_date:
+        return False
+    if contract.end_date and contract.end_date < dispatch_date:
+        return False
+    if contract.temperature_type:
+        temp_val = contract.temperature_type.value if hasattr(contract.temperature_type, "value") else contract.temperature_type
+        if temp_val not in TEMP_COMPAT.get(temperature_class, {temperature_class}):
+            return False
+    return True
+
+
+def summarize_tours(tours: list[SuggestedTour]) -> AideDecisionSummary:
+    """Résumé d'une liste de tours / Summary of a list of tours."""
+    fill_rates = [t.contract.fill_rate_pct for t in tours if t.contract and t.contract.capacity_eqp > 0]
+    return AideDecisionSummary(
+        total_tours=len(tours),
+        total_eqp=sum(t.total_eqp for t in tours),
+        total_weight_kg=round(sum(t.total_weight_kg for t in tours), 2),
+        total_km=round(sum(t.total_km for t in tours), 1),
+        total_cost=round(sum(t.total_cost for t in tours), 2),
+        avg_fill_rate_pct=round(sum(fill_rates) / len(fill_rates), 1) if fill_rates else 0.0,
+    )
+
+
+class _PairMatrix(Mapping):
+    """Vue dict `(o_type, o_id, d_type, d_id) → valeur` sur une matrice dense /
+    Dict-like `(o_type, o_id, d_type, d_id) → value` view over a dense matrix.
+
+    Seules les paires connues hors diagonale existent (mêmes clés que les
+    anciens dicts de cache), sans matérialiser N² entrées Python.
+    """
+
+    __slots__ = ("points", "matrix", "known", "_index")
+
+    def __init__(self, points: list[tuple[str, int]], matrix: np.ndarray, known: np.ndarray):
+        self.points = points
+        self.matrix = matrix
+        self.known = known
+        self._index = {p: k for k, p in enumerate(points)}
+
+    def _locate(self, key) -> tuple[int, int] | None:
+        i = self._index.get(key[:2])
+        j = self._index.get(key[2:])
+        if i is None or j is None or not self.known[i, j]:
+            return None
+        return i, j
+
+    def __getitem__(self, key):
+        loc = self._locate(key)
+        if loc is None:
+            raise KeyError(key)
+        return self.matrix.item(loc)
+
+    def get(self, key, default=None):
+        loc = self._locate(key)
+        return default if loc is None else self.matrix.item(loc)
+
+    def __contains__(self, key) -> bool:
+        return self._locate(key) is not None
+
+    def __iter__(self):
+        for i, j in zip(*np.nonzero(self.known)):
+            yield (*self.points[i], *self.points[j])
+
+    def __len__(self) -> int:
+        return int(self.known.sum())
 
 
 class AideDecisionService:
     """Service de simulation aide à la décision / Decision support simulation service."""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, on_solver_progress: Callable[[dict], None] | None = None):
         self.db = db
+        # Progression du solveur Niveau 2 (jobs en arrière-plan) / Level 2 solver progress
+        self.on_solver_progress = on_solver_progress
+        # Entrée du cache de simulation du run courant / Current run's simulation cache entry
+        self._cache_entry: SimulationEntry | None = None
+        # Stratégie OR-Tools retenue au Niveau 2 / Level 2 winning OR-Tools strategy
+        self._solver_strategy: str | None = None
+
+    async def generate(
+        self,
+        request: AideDecisionRequest,
+        contracts: list[Contract] | None = None,
+        fuel_prices: dict[str, float] | None = None,
+    ) -> AideDecisionResponse:
+        """Générer la simulation / Generate simulation.
 
-    async def generate(self, request: AideDecisionRequest) -> AideDecisionResponse:
-        """Générer la simulation / Generate simulation."""
+        `contracts` / `fuel_prices` : données déjà chargées par l'appelant (lot
+        multi-périmètres), sinon lues ici / preloaded by the caller (batch).
+        """
         warnings: list[str] = []
 
         # --- 0. Charger la base d'origine / Load origin base ---
@@ -109,32 +207,45 @@ class AideDecisionService:
             return self._empty_response(
                 request, base.name, "Aucun volume non affecté pour ces critères"
             )
-
-        # --- 2. Charger les PDV / Load PDVs ---
         pdv_ids = list(pdv_agg.keys())
-        pdvs = await self._load_pdvs(pdv_ids)
 
-        # --- 3. Précharger la matrice de distances / Preload distance matrix ---
-        dist_cache, dur_cache = await self._load_distance_cache(
-            base.id, pdv_ids, base, pdvs
-        )
-
-        # --- 4. Charger les contrats disponibles / Load available contracts ---
-        contracts = await self._load_contracts(request, base)
+        # --- 2. Charger les contrats disponibles / Load available contracts ---
+        if contracts is None:
+            contracts = await self._load_contracts(request, base)
         if not contracts:
             warnings.append("Aucun contrat disponible — capacité par défaut (54 EQP)")
 
-        # --- 4b. Charger prix gasoil + cache taxe km / Load fuel price + km tax cache ---
-        fuel_prices = await self._load_fuel_prices(request.dispatch_date)
+        # --- 3. Cache de simulation : volumes + contrats font l'empreinte /
+        #        Simulation cache: volumes + contracts make the fingerprint ---
+        fingerprint = None
+        if request.use_cache:
+            fingerprint = simulation_fingerprint(self.db, request, pdv_agg, contracts)
+            self._cache_entry = simulation_cache.get(fingerprint)
+            cached = self._cache_entry.results.get(result_key(request)) if self._cache_entry else None
+            if cached is not None:
+                log.info("Aide-decision: identical simulation served from cache (%s)", fingerprint[:12])
+                return cached.model_copy(deep=True)
+
+        # --- 4. PDV, distancier, prix gasoil, taxe km (réutilisés si en cache) /
+        #        PDVs, distance matrix, fuel price, km tax (reused when cached) ---
+        if self._cache_entry is not None:
+            inputs = self._cache_entry.inputs
+        else:
+            generation = simulation_cache.generation()
+            inputs = await self._load_inputs(request, base, pdv_ids, fuel_prices)
+            if fingerprint is not None:
+                self._cache_entry = simulation_cache.put(fingerprint, inputs, generation)
+        pdvs = inputs.pdvs
+        dist_cache, dur_cache = inputs.dist_cache, inputs.dur_cache
+        fuel_prices, km_tax_cache = inputs.fuel_prices, inputs.km_tax_cache
         if not fuel_prices:
             warnings.append(
                 f"Aucun prix carburant pour le {request.dispatch_date} — coût carburant à 0"
             )
-        km_tax_cache = await self._load_km_tax_cache(base.id, pdv_ids)
 
         # --- 5. Branchement Niveau 1 / Niveau 2 ---
         if request.level == 2:
-            tours, unassigned, level_warnings = self._build_tours_level2(
+            tours, unassigned, level_warnings = await self._build_tours_level2(
                 request, base, pdv_agg, pdv_ids, pdvs, dist_cache, dur_cache,
                 contracts, fuel_prices, km_tax_cache,
             )
@@ -147,28 +258,9 @@ class AideDecisionService:
             warnings.extend(level_warnings)
 
         # --- 6. Résumé / Summary ---
-        total_tours = len(tours)
-        sum_eqp = sum(t.total_eqp for t in tours)
-        sum_weight = sum(t.total_weight_kg for t in tours)
-        sum_km = sum(t.total_km for t in tours)
-        sum_cost = sum(t.total_cost for t in tours)
-
-        fill_rates = []
-        for t in tours:
-            if t.contract and t.contract.capacity_eqp > 0:
-                fill_rates.append(t.contract.fill_rate_pct)
-        avg_fill = round(sum(fill_rates) / len(fill_rates), 1) if fill_rates else 0.0
-
-        summary = AideDecisionSummary(
-            total_tours=total_tours,
-            total_eqp=sum_eqp,
-            total_weight_kg=round(sum_weight, 2),
-            total_km=round(sum_km, 1),
-            total_cost=round(sum_cost, 2),
-            avg_fill_rate_pct=avg_fill,
-        )
+        summary = summarize_tours(tours)
 
-        return AideDecisionResponse(
+        response = AideDecisionResponse(
             dispatch_date=request.dispatch_date,
             base_origin_id=request.base_origin_id,
             base_name=base.name,
@@ -177,6 +269,30 @@ class AideDecisionService:
             unassigned_pdvs=unassigned,
             summary=summary,
             warnings=warnings,
+            solver_strategy=self._solver_strategy,
+        )
+        if self._cache_entry is not None:
+            self._cache_entry.results[result_key(request)] = response.model_copy(deep=True)
+        return response
+
+    async def _load_inputs(
+        self,
+        request: AideDecisionRequest,
+        base: BaseLogistics,
+        pdv_ids: list[int],
+        fuel_prices: dict[str, float] | None = None,
+    ) -> SimulationInputs:
+        """Charger PDV, distancier, prix carburant et taxe km / Load PDVs, distances, fuel, km tax."""
+        pdvs = await self._load_pdvs(pdv_ids)
+        dist_cache, dur_cache = await self._load_distance_cache(base.id, pdv_ids, base, pdvs)
+        if fuel_prices is None:
+            fuel_prices = await self._load_fuel_prices(request.dispatch_date)
+        return SimulationInputs(
+            pdvs=pdvs,
+            dist_cache=dist_cache,
+            dur_cache=dur_cache,
+            fuel_prices=fuel_prices,
+            km_tax_cache=await self._load_km_tax_cache(base.id, pdv_ids),
         )
 
     # ══════════════════════════════════════════════════════════════
@@ -190,21 +306,20 @@ class AideDecisionService:
         pdv_agg: dict,
         pdv_ids: list[int],
         pdvs: dict[int, PDV],
-        dist_cache: dict,
-        dur_cache: dict,
+        dist_cache: Mapping,
+        dur_cache: Mapping,
         contracts: list[Contract],
         fuel_prices: dict[str, float],
         km_tax_cache: dict[tuple, float],
     ) -> tuple[list[SuggestedTour], list[UnassignedPDV], list[str]]:
-        """Construire les tours par nearest-neighbor / Build tours by nearest-neighbor."""
-        warnings: list[str] = []
+        """Construire les tours par nearest-neighbor / Build tours by nearest-neighbor.
 
-        # Trier PDV par distance depuis la base (décroissant)
-        pdv_distances = {}
-        for pid in pdv_ids:
-            key = ("BASE", base.id, "PDV", pid)
-            pdv_distances[pid] = dist_cache.get(key, 9999)
-        sorted_pdv_ids = sorted(pdv_ids, key=lambda p: pdv_distances.get(p, 0), reverse=True)
+        Moteur incrémental (`Level1Engine`) : graine = PDV le plus loin de la
+        base, puis plus proche voisin tant que capacité et 10h (-30 min) tiennent.
+        `request.local_search_ms` > 0 active le 2-opt / Or-opt après le
+        séquencement SAS d'abord, dans ce budget de temps global.
+        """
+        warnings: list[str] = []
 
         # Capacité max disponible
         max_capacity = DEFAULT_CAPACITY_EQP
@@ -213,62 +328,36 @@ class AideDecisionService:
             if max_cap_contract > 0:
                 max_capacity = max_cap_contract
 
-        remaining = set(sorted_pdv_ids)
+        engine = self._level1_engine(base, pdv_agg, pdv_ids, pdvs, dist_cache, dur_cache)
+        routes = engine.build_routes(max_capacity, MAX_DAILY_MINUTES - 30)
+
+        deadline = None
+        if request.local_search_ms > 0:
+            deadline = time.monotonic() + request.local_search_ms / 1000
+        node_of = {pid: k for k, pid in enumerate(pdv_ids, start=1)}
+
         unassigned: list[UnassignedPDV] = []
         tours: list[SuggestedTour] = []
-        tour_number = 0
         contract_tour_count: dict[int, int] = defaultdict(int)
         contract_duration: dict[int, int] = defaultdict(int)
 
-        while remaining:
-            tour_number += 1
-
-            # a) Graine = PDV le plus loin
-            seed_id = None
-            for pid in sorted_pdv_ids:
-                if pid in remaining:
-                    seed_id = pid
-                    break
-            if seed_id is None:
-                break
-
-            tour_pdvs = [seed_id]
-            remaining.discard(seed_id)
-            tour_eqp = pdv_agg[seed_id]["eqp_count"]
-
-            # b) Remplir par nearest-neighbor
-            while remaining:
-                last_id = tour_pdvs[-1]
-                best_id = None
-                best_dist = float("inf")
-                for candidate in remaining:
-                    key = ("PDV", last_id, "PDV", candidate)
-                    d = dist_cache.get(key, 9999)
-                    if d < best_dist:
-                        best_dist = d
-                        best_id = candidate
-                if best_id is None:
-                    break
-                cand_eqp = pdv_agg[best_id]["eqp_count"]
-                if tour_eqp + cand_eqp > max_capacity:
-                    if cand_eqp > max_capacity:
-                        break
-                    break
-                est_time = self._estimate_tour_time(
-                    tour_pdvs + [best_id], base, pdvs, pdv_agg,
-                    dist_cache, dur_cache
-                )
-                if est_time > MAX_DAILY_MINUTES - 30:
-                    break
-                tour_pdvs.append(best_id)
-                remaining.discard(best_id)
-                tour_eqp += cand_eqp
+        for tour_number, route in enumerate(routes, start=1):
+            tour_pdvs = [pdv_ids[k - 1] for k in route]
 
             # c) Séquencer : SAS d'abord, puis non-SAS
             sequenced = self._sequence_sas_first(
                 tour_pdvs, base, pdvs, dist_cache, request.temperature_class
             )
 
+            # c') Post-optimisation 2-opt / Or-opt, bloc SAS conservé en tête
+            if deadline is not None and time.monotonic() < deadline:
+                n_sas = sum(
+                    1 for pid in sequenced
+                    if pdvs.get(pid) and self._has_sas(pdvs[pid], request.temperature_class)
+                )
+                nodes = engine.improve([node_of[pid] for pid in sequenced], n_sas, deadline)
+                sequenced = [pdv_ids[k - 1] for k in nodes]
+
             # d-g) Construire le tour complet
             tour = self._build_single_tour(
                 tour_number, sequenced, base, pdvs, pdv_agg,
@@ -280,31 +369,74 @@ class AideDecisionService:
 
         return tours, unassigned, warnings
 
+    def _level1_engine(
+        self,
+        base: BaseLogistics,
+        pdv_agg: dict,
+        pdv_ids: list[int],
+        pdvs: dict[int, PDV],
+        dist_cache: Mapping,
+        dur_cache: Mapping,
+    ) -> Level1Engine:
+        """Matrices du moteur Niveau 1 (nœud 0 = base) / Level 1 engine matrices (node 0 = base).
+
+        Trajet = durée connue sinon 0, service = quai + EQP × déchargement
+        (défauts si non renseignés).
+        """
+        points = [("BASE", base.id)] + [("PDV", pid) for pid in pdv_ids]
+        if (isinstance(dist_cache, _PairMatrix) and isinstance(dur_cache, _PairMatrix)
+                and dist_cache.points == points and dur_cache.points == points):
+            dist_mat = np.where(dist_cache.known, dist_cache.matrix, np.nan)
+            dur_mat = np.where(dur_cache.known, dur_cache.matrix, MISSING_DURATION)
+        else:
+            # Caches dict quelconques : matrices reconstruites / plain dict caches: rebuild
+            dist_mat = np.array(
+                [[dist_cache.get((*a, *b), np.nan) for b in points] for a in points], dtype=np.float64
+            )
+            dur_mat = np.array(
+                [[dur_cache.get((*a, *b), MISSING_DURATION) for b in points] for a in points], dtype=np.int64
+            )
+
+        service = np.zeros(len(pdv_ids) + 1, dtype=np.float64)
+        demand = np.zeros(len(pdv_ids) + 1, dtype=np.float64)
+        for k, pid in enumerate(pdv_ids, start=1):
+            pdv = pdvs.get(pid)
+            eqp = pdv_agg[pid]["eqp_count"]
+            dock = (pdv.dock_time_minutes if pdv and pdv.dock_time_minutes else DEFAULT_DOCK_TIME)
+            unload = (pdv.unload_time_per_eqp_minutes if pdv and pdv.unload_time_per_eqp_minutes else DEFAULT_UNLOAD_PER_EQP)
+            service[k] = dock + (eqp * unload)
+            demand[k] = eqp
+
+        travel = np.where(dur_mat == MISSING_DURATION, 0, dur_mat)
+        return Level1Engine(dist_mat, travel, service, demand)
+
     # ══════════════════════════════════════════════════════════════
     # Niveau 2 — OR-Tools CVRPTW
     # ══════════════════════════════════════════════════════════════
 
-    def _build_tours_level2(
+    async def _build_tours_level2(
         self,
         request: AideDecisionRequest,
         base: BaseLogistics,
         pdv_agg: dict,
         pdv_ids: list[int],
         pdvs: dict[int, PDV],
-        dist_cache: dict,
-        dur_cache: dict,
+        dist_cache: Mapping,
+        dur_cache: Mapping,
         contracts: list[Contract],
         fuel_prices: dict[str, float],
         km_tax_cache: dict[tuple, float],
     ) -> tuple[list[SuggestedTour], list[UnassignedPDV], list[str]]:
-        """Construire les tours par OR-Tools CVRPTW / Build tours with OR-Tools CVRPTW."""
+        """Construire les tours par OR-Tools CVRPTW / Build tours with OR-Tools CVRPTW.
+
+        Le solveur tourne dans le pool de process (`solver_pool`) : la boucle
+        d'événements reste libre pendant la recherche.
+        """
         warnings: list[str] = []
 
         # Import conditionnel / Conditional import
         try:
-            from app.services.optimizer_ortools import (
-                ORToolsInput, VehicleSlot, solve_cvrptw,
-            )
+            from app.services.optimizer_ortools import ORToolsInput, VehicleSlot
         except ImportError:
             warnings.append(
                 "OR-Tools non installé — fallback Niveau 1. "
@@ -409,7 +541,7 @@ class AideDecisionService:
         if not contract_list:
             # Fallback : véhicules virtuels (capacité 54 EQP)
             total_eqp_demand = sum(pdv_agg[pid]["eqp_count"] for pid in pdv_ids)
-            num_virtual = max(4, ((total_eqp_demand // DEFAULT_CAPACITY_EQP) + 2) * 2)
+            num_virtual = max(4, int((total_eqp_demand // DEFAULT_CAPACITY_EQP) + 2) * 2)
             for i in range(num_virtual):
                 vehicles.append(VehicleSlot(
                     contract_idx=0,
@@ -419,6 +551,14 @@ class AideDecisionService:
                     compatible_nodes=set(range(1, num_nodes)),
                 ))
         else:
+            # Nœuds regroupés par exigence (index de compatibilité) : un ET par
+            # groupe et par contrat / Nodes grouped by requirement mask: one AND
+            # per group and contract
+            nodes_by_required: dict[int, set[int]] = defaultdict(set)
+            for node in range(1, num_nodes):
+                pdv = pdvs.get(node_to_pdv[node])
+                nodes_by_required[requirements(pdv) if pdv else 0].add(node)
+
             for c_idx, c in enumerate(contract_list):
                 cap = c.capacity_eqp or DEFAULT_CAPACITY_EQP
                 # Coût fixe = fixed_daily_cost + vacation (partagé par nb_tours, géré par OR-Tools)
@@ -434,14 +574,11 @@ class AideDecisionService:
                     km_cents = int(float(c.cost_per_km or 0) * 100)
 
                 # Compatible nodes (dock/hayon + type véhicule)
+                caps = capabilities(c)
                 compatible = set()
-                for node in range(1, num_nodes):
-                    pid = node_to_pdv[node]
-                    pdv = pdvs.get(pid)
-                    if pdv and self._check_dock_tailgate(pdv, c) and self._check_vehicle_type(pdv, c):
-                        compatible.add(node)
-                    elif not pdv:
-                        compatible.add(node)
+                for required, nodes in nodes_by_required.items():
+                    if not violations(required, caps):
+                        compatible |= nodes
 
                 # Slot A — coût complet (premier trip)
                 vehicles.append(VehicleSlot(
@@ -491,13 +628,39 @@ class AideDecisionService:
             cost_multiplier=1.0,  # neutre : multiplier uniforme = no-op
         )
 
+        # Départ à chaud : meilleurs tours du run précédent sur les mêmes entrées /
+        # Warm start: best routes of the previous run on the same inputs
+        entry = self._cache_entry
+        if entry is not None and entry.best_routes and len(entry.best_routes) == len(vehicles):
+            try:
+                ortools_input.initial_routes = [
+                    [pdv_to_node[pid] for pid in route] for route in entry.best_routes
+                ]
+                ortools_input.stagnation_seconds = WARM_START_STAGNATION_SECONDS
+            except KeyError:
+                ortools_input.initial_routes = None
+
         # ── Résoudre / Solve ──
         log.info(
-            "OR-Tools L2: %d PDVs, %d vehicle slots, time_limit=%ds",
-            num_pdvs, len(vehicles), request.time_limit_seconds,
+            "OR-Tools L2: %d PDVs, %d vehicle slots, time_limit=%ds, portfolio=%s",
+            num_pdvs, len(vehicles), request.time_limit_seconds, request.portfolio,
         )
         try:
-            raw_tours, dropped_indices = solve_cvrptw(ortools_input)
+            if request.portfolio:
+                outcome = await run_portfolio(ortools_input, self.on_solver_progress)
+                raw_tours, dropped_indices = outcome.tours, outcome.dropped
+                self._solver_strategy = outcome.strategy
+                # Trace d'ajustement des défauts par taille de base /
+                # trace for tuning defaults per base size
+                log.info(
+                    "OR-Tools L2 portfolio: base=%s pdvs=%d slots=%d winner=%s objectives=%s",
+                    base.id, num_pdvs, len(vehicles), outcome.strategy, outcome.objectives,
+                )
+            else:
+                raw_tours, dropped_indices = await run_solver(ortools_input, self.on_solver_progress)
+                self._solver_strategy = strategy_label((
+                    ortools_input.first_solution_strategy, ortools_input.local_search_metaheuristic,
+                ))
         except Exception:
             log.exception("OR-Tools L2: solver crashed — fallback Niveau 1")
             warnings.append(
@@ -511,9 +674,15 @@ class AideDecisionService:
             "OR-Tools L2: %d tours trouvés, %d PDVs droppés",
             len(raw_tours), len(dropped_indices),
         )
+        if entry is not None and raw_tours:
+            best_routes: list[list[int]] = [[] for _ in vehicles]
+            for rt in raw_tours:
+                best_routes[rt.vehicle_slot] = [node_to_pdv[n] for n in rt.node_sequence]
+            entry.best_routes = best_routes
 
         if not raw_tours and dropped_indices:
             # Aucune solution → fallback Niveau 1
+            self._solver_strategy = None
             warnings.append(
                 "OR-Tools n'a trouvé aucune solution — fallback Niveau 1"
             )
@@ -783,7 +952,7 @@ class AideDecisionService:
 
     def _sequence_sas_first(
         self, tour_pdvs: list[int], base: BaseLogistics,
-        pdvs: dict[int, PDV], dist_cache: dict, temperature_class: str
+        pdvs: dict[int, PDV], dist_cache: Mapping, temperature_class: str
     ) -> list[int]:
         """Séquencer SAS d'abord, puis non-SAS par nearest-neighbor / Sequence SAS first then non-SAS."""
         sas_pdvs = []
@@ -841,8 +1010,8 @@ class AideDecisionService:
         base: BaseLogistics,
         pdvs: dict[int, PDV],
         pdv_agg: dict,
-        dist_cache: dict,
-        dur_cache: dict,
+        dist_cache: Mapping,
+        dur_cache: Mapping,
         contracts: list[Contract],
         request: AideDecisionRequest,
         contract_tour_count: dict[int, int],
@@ -1021,99 +1190,54 @@ class AideDecisionService:
             }
         return agg
 
-    async def _load_pdvs(self, pdv_ids: list[int]) -> dict[int, PDV]:
+    async def _load_pdvs(self, pdv_ids: list[int]) -> dict[int, PDVSnapshot]:
+        """Instantanés des PDV (colonnes seules, mis en cache) / PDV snapshots
+        (columns only, cached across sessions)."""
         if not pdv_ids:
             return {}
-        result = await self.db.execute(select(PDV).where(PDV.id.in_(pdv_ids)))
-        return {p.id: p for p in result.scalars().all()}
+        result = await self.db.execute(select(*PDV_SNAPSHOT_COLUMNS).where(PDV.id.in_(pdv_ids)))
+        return {row.id: PDVSnapshot(*row) for row in result.all()}
 
     async def _load_distance_cache(
         self, base_id: int, pdv_ids: list[int],
-        base: BaseLogistics, pdvs: dict[int, PDV]
-    ) -> tuple[dict, dict]:
+        base: BaseLogistics, pdvs: dict[int, PDVSnapshot]
+    ) -> tuple[Mapping, Mapping]:
         """Charger toutes les distances en batch / Load all distances in batch.
-        Returns (dist_cache, dur_cache) with bidirectional keys.
+        Returns (dist_cache, dur_cache) with bidirectional keys : vues dict sur
+        les matrices denses [base] + pdv_ids (pas de dict de N² entrées).
         """
-        dist_cache: dict[tuple, float] = {}
-        dur_cache: dict[tuple, int] = {}
-
         if not pdv_ids:
-            return dist_cache, dur_cache
-
-        # All pairs involving BASE or PDV↔PDV
-        all_ids = pdv_ids + [base_id]
-        stmt = select(DistanceMatrix).where(
-            or_(
-                and_(
-                    DistanceMatrix.origin_type == "BASE",
-                    DistanceMatrix.origin_id == base_id,
-                    DistanceMatrix.destination_type == "PDV",
-                    DistanceMatrix.destination_id.in_(pdv_ids),
-                ),
-                and_(
-                    DistanceMatrix.origin_type == "PDV",
-                    DistanceMatrix.origin_id.in_(pdv_ids),
-                    DistanceMatrix.destination_type == "BASE",
-                    DistanceMatrix.destination_id == base_id,
-                ),
-                and_(
-                    DistanceMatrix.origin_type == "PDV",
-                    DistanceMatrix.origin_id.in_(pdv_ids),
-                    DistanceMatrix.destination_type == "PDV",
-                    DistanceMatrix.destination_id.in_(pdv_ids),
-                ),
-            )
-        )
-        result = await self.db.execute(stmt)
-        for row in result.scalars().all():
-            fwd = (row.origin_type, row.origin_id, row.destination_type, row.destination_id)
-            rev = (row.destination_type, row.destination_id, row.origin_type, row.origin_id)
-            d = float(row.distance_km)
-            dur = int(row.duration_minutes)
-            dist_cache[fwd] = d
-            dist_cache[rev] = d
-            dur_cache[fwd] = dur
-            dur_cache[rev] = dur
-
-        # Fallback haversine for missing pairs
-        base_lat, base_lon = base.latitude, base.longitude
-        for pid in pdv_ids:
-            key_fwd = ("BASE", base_id, "PDV", pid)
-            if key_fwd not in dist_cache:
-                pdv = pdvs.get(pid)
-                if pdv and pdv.latitude and pdv.longitude and base_lat and base_lon:
-                    d = _haversine_km(base_lat, base_lon, pdv.latitude, pdv.longitude)
-                    dur = int(d / AVERAGE_SPEED_KMH * 60)
-                    key_rev = ("PDV", pid, "BASE", base_id)
-                    dist_cache[key_fwd] = d
-                    dist_cache[key_rev] = d
-                    dur_cache[key_fwd] = dur
-                    dur_cache[key_rev] = dur
-
-            for pid2 in pdv_ids:
-                if pid == pid2:
-                    continue
-                key = ("PDV", pid, "PDV", pid2)
-                if key not in dist_cache:
-                    p1, p2 = pdvs.get(pid), pdvs.get(pid2)
-                    if (p1 and p2 and p1.latitude and p1.longitude
-                            and p2.latitude and p2.longitude):
-                        d = _haversine_km(p1.latitude, p1.longitude, p2.latitude, p2.longitude)
-                        dur = int(d / AVERAGE_SPEED_KMH * 60)
-                        key_rev = ("PDV", pid2, "PDV", pid)
-                        dist_cache[key] = d
-                        dist_cache[key_rev] = d
-                        dur_cache[key] = dur
-                        dur_cache[key_rev] = dur
-
-        return dist_cache, dur_cache
+            return {}, {}
+
+        # Sous-matrice BASE + PDV depuis le distancier en mémoire (aucune requête
+        # si l'instantané du tenant est chaud) / BASE + PDV sub-matrix from the
+        # in-memory distance matrix (no query when the tenant snapshot is warm)
+        points = [("BASE", base_id)] + [("PDV", pid) for pid in pdv_ids]
+        snapshot = await get_distance_snapshot(self.db)
+        dist_mat, dur_mat = snapshot.submatrix(points)
+
+        # Fallback haversine vectorisé pour les paires manquantes (points
+        # géocodés des deux côtés) / Vectorized haversine fallback for missing
+        # pairs (both endpoints geocoded)
+        located = [base] + [pdvs.get(pid) for pid in pdv_ids]
+        lats = coord_array(p.latitude if p else None for p in located)
+        lons = coord_array(p.longitude if p else None for p in located)
+        has_coords = ~(np.isnan(lats) | np.isnan(lons))
+        missing = (dur_mat == MISSING_DURATION) & has_coords[:, None] & has_coords[None, :]
+        np.fill_diagonal(missing, False)
+        if missing.any():
+            est_km = haversine_matrix(lats, lons)[missing] * ROAD_FACTOR
+            dist_mat[missing] = est_km
+            dur_mat[missing] = (est_km / AVERAGE_SPEED_KMH * 60).astype(np.int64)
+
+        known = dur_mat != MISSING_DURATION
+        np.fill_diagonal(known, False)
+        return _PairMatrix(points, dist_mat, known), _PairMatrix(points, dur_mat, known)
 
     async def _load_contracts(
         self, request: AideDecisionRequest, base: BaseLogistics
     ) -> list[Contract]:
         """Charger les contrats disponibles / Load available contracts."""
-        compatible_temps = TEMP_COMPAT.get(request.temperature_class, {request.temperature_class})
-
         # IDs des contrats indisponibles ce jour / Unavailable contract IDs for this date
         unavail_stmt = (
             select(ContractSchedule.contract_id)
@@ -1131,23 +1255,10 @@ class AideDecisionService:
         result = await self.db.execute(stmt)
         all_contracts = result.scalars().all()
 
-        valid = []
-        for c in all_contracts:
-            if c.id in unavail_ids:
-                continue
-            # Check date validity
-            if c.start_date and c.start_date > request.dispatch_date:
-                continue
-            if c.end_date and c.end_date < request.dispatch_date:
-                continue
-            # Check temperature compatibility
-            if c.temperature_type:
-                temp_val = c.temperature_type.value if hasattr(c.temperature_type, "value") else c.temperature_type
-                if temp_val not in compatible_temps:
-                    continue
-            valid.append(c)
-
-        return valid
+        return [
+            c for c in all_contracts
+            if is_contract_available(c, request.dispatch_date, request.temperature_class, unavail_ids)
+        ]
 
     async def _load_fuel_prices(self, dispatch_date: str) -> dict[str, float]:
         """Charger les prix carburant (par type) pour la date /
@@ -1236,7 +1347,7 @@ class AideDecisionService:
     def _compute_stops_info(
         self, sequenced: list[int], base: BaseLogistics,
         pdvs: dict[int, PDV], pdv_agg: dict,
-        dist_cache: dict, dur_cache: dict, temperature_class: str
+        dist_cache: Mapping, dur_cache: Mapping, temperature_class: str
     ) -> list[dict]:
         """Compute distance/duration/unload info for each stop in sequence."""
         stops_info = []
@@ -1261,61 +1372,8 @@ class AideDecisionService:
             prev_type, prev_id = "PDV", pid
         return stops_info
 
-    def _estimate_tour_time(
-        self, pdv_ids: list[int], base: BaseLogistics,
-        pdvs: dict[int, PDV], pdv_agg: dict,
-        dist_cache: dict, dur_cache: dict
-    ) -> int:
-        """Estimer la durée totale d'un tour (conduite + déchargement + retour) / Estimate total tour duration."""
-        total = 0
-        prev_type, prev_id = "BASE", base.id
-        for pid in pdv_ids:
-            key = (prev_type, prev_id, "PDV", pid)
-            d_km = dist_cache.get(key, 0)
-            total += dur_cache.get(key, int(d_km / AVERAGE_SPEED_KMH * 60) if d_km else 0)
-            pdv = pdvs.get(pid)
-            eqp = pdv_agg[pid]["eqp_count"]
-            dock = (pdv.dock_time_minutes if pdv and pdv.dock_time_minutes else DEFAULT_DOCK_TIME)
-            unload = (pdv.unload_time_per_eqp_minutes if pdv and pdv.unload_time_per_eqp_minutes else DEFAULT_UNLOAD_PER_EQP)
-            total += dock + (eqp * unload)
-            prev_type, prev_id = "PDV", pid
-        if pdv_ids:
-            key = ("PDV", pdv_ids[-1], "BASE", base.id)
-            d_km = dist_cache.get(key, 0)
-            total += dur_cache.get(key, int(d_km / AVERAGE_SPEED_KMH * 60) if d_km else 0)
-        return total
-
     # ── Contract helpers ─────────────────────────────────────────
 
-    def _check_vehicle_type(self, pdv: PDV, contract: Contract) -> bool:
-        """Vérifie compatibilité type véhicule / Check vehicle type compatibility.
-        NULL allowed_vehicle_types = tous acceptés / all accepted.
-        Returns True if compatible, False if violation.
-        """
-        if not pdv.allowed_vehicle_types:
-            return True
-        allowed = pdv.allowed_vehicle_types.split("|")
-        vt = contract.vehicle_type
-        vt_value = vt.value if (vt and hasattr(vt, "value")) else vt
-        return vt_value in allowed if vt_value else True
-
-    def _check_dock_tailgate(self, pdv: PDV, contract: Contract) -> bool:
-        """Vérifie compatibilité dock/hayon / Check dock/tailgate compatibility.
-        Returns True if compatible, False if violation.
-        """
-        has_tailgate = contract.has_tailgate
-        tg_type = contract.tailgate_type
-        tg_value = tg_type.value if (tg_type and hasattr(tg_type, "value")) else tg_type
-
-        if not pdv.has_dock:
-            if not has_tailgate:
-                return False
-        else:
-            # Quai sans niche : seul le hayon rétractable est utilisable (rabattable interdit)
-            if not pdv.dock_has_niche and has_tailgate and tg_value == "RABATTABLE":
-                return False
-        return True
-
     def _select_contract(
         self, contracts: list[Contract], pdv_ids: list[int],
         pdvs: dict[int, PDV], total_eqp: int, total_duration: int,
@@ -1324,6 +1382,11 @@ class AideDecisionService:
     ) -> dict | None:
         """Sélectionner le meilleur contrat / Select best contract."""
         candidates = []
+        required = 0
+        for pid in pdv_ids:
+            pdv = pdvs.get(pid)
+            if pdv:
+                required |= requirements(pdv)
         for c in contracts:
             cap = c.capacity_eqp or DEFAULT_CAPACITY_EQP
             if cap < total_eqp:
@@ -1333,13 +1396,7 @@ class AideDecisionService:
             if used + total_duration > MAX_DAILY_MINUTES:
                 continue
 
-            compatible = True
-            for pid in pdv_ids:
-                pdv = pdvs.get(pid)
-                if pdv and (not self._check_dock_tailgate(pdv, c) or not self._check_vehicle_type(pdv, c)):
-                    compatible = False
-                    break
-            if not compatible:
+            if violations(required, capabilities(c)):
                 continue
 
             fill_rate = total_eqp / cap if cap > 0 else 0
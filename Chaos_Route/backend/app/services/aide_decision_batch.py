@@ -0,0 +1,213 @@
+"""Aide à la décision en lot multi-périmètres / Multi-scope batch decision support.
+
+La planification de nuit enchaînait un appel par (base, température) : chaque
+appel relisait contrats et prix carburant, et tous se disputaient les mêmes
+contrats. Le lot :
+1. charge UNE fois les données partagées (bases, demande par périmètre,
+   indisponibilités, contrats des régions concernées, prix carburant) ;
+2. répartit les contrats entre périmètres AVANT le calcul (un contrat = un
+   véhicule, utilisable par un seul périmètre dans la journée) ;
+3. résout les périmètres en parallèle, chacun dans sa session (même tenant) :
+   le Niveau 2 occupe les process du pool solveur ;
+4. consolide les résultats (résumé global + résumé par périmètre).
+
+Un périmètre en échec n'interrompt pas les autres, tous attendus jusqu'au
+bout : son résultat est vide, l'erreur est rapportée dans le périmètre et
+dans les avertissements du lot.
+
+Répartition : un contrat éligible à un seul périmètre lui revient ; un contrat
+disputé va au périmètre dont le besoin non couvert (EQP demandés − capacité
+déjà attribuée) est le plus grand, les contrats les moins disputés et les plus
+gros étant placés d'abord.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import TENANT_BYPASS, async_session, set_session_tenant
+from app.models.base_logistics import BaseLogistics
+from app.models.contract import Contract
+from app.models.contract_schedule import ContractSchedule
+from app.models.volume import Volume
+from app.schemas.aide_decision import (
+    AideDecisionBatchRequest,
+    AideDecisionBatchResponse,
+    AideDecisionRequest,
+    AideDecisionScopeResult,
+)
+from app.services.aide_decision import (
+    DEFAULT_CAPACITY_EQP,
+    AideDecisionService,
+    is_contract_available,
+    summarize_tours,
+)
+from app.utils.fuel_pricing import load_fuel_unit_prices
+
+log = logging.getLogger(__name__)
+
+Scope = tuple[int, str]  # (base_origin_id, temperature_class)
+
+
+def allocate_contracts(
+    scopes: list[Scope],
+    demand: dict[Scope, float],
+    eligible: dict[int, list[Scope]],
+    capacity: dict[int, float],
+) -> dict[Scope, list[int]]:
+    """Répartir les contrats entre périmètres / Split contracts between scopes.
+
+    Args:
+        eligible: contract_id → périmètres où le contrat est utilisable.
+        capacity: contract_id → capacité EQP.
+    Returns: périmètre → contract_ids attribués (ordre croissant).
+    """
+    allocation: dict[Scope, list[int]] = {scope: [] for scope in scopes}
+    covered: dict[Scope, float] = defaultdict(float)
+    rank = {scope: k for k, scope in enumerate(scopes)}
+    order = sorted(eligible, key=lambda cid: (len(eligible[cid]), -capacity[cid], cid))
+    for cid in order:
+        candidates = eligible[cid]
+        if not candidates:
+            continue
+        winner = max(candidates, key=lambda sc: (demand.get(sc, 0.0) - covered[sc], -rank[sc]))
+        allocation[winner].append(cid)
+        covered[winner] += capacity[cid]
+    for ids in allocation.values():
+        ids.sort()
+    return allocation
+
+
+class AideDecisionBatchService:
+    """Simulation consolidée de plusieurs périmètres / Consolidated multi-scope simulation."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def generate(self, batch: AideDecisionBatchRequest) -> AideDecisionBatchResponse:
+        """Générer la simulation consolidée / Generate the consolidated simulation."""
+        date = batch.dispatch_date
+        scopes: list[Scope] = list(dict.fromkeys(
+            (s.base_origin_id, s.temperature_class) for s in batch.scopes
+        ))
+        warnings: list[str] = []
+        if len(scopes) < len(batch.scopes):
+            warnings.append("Périmètres en double ignorés")
+
+        # --- 1. Données partagées, une requête chacune / Shared data, one query each ---
+        base_ids = sorted({base_id for base_id, _ in scopes})
+        bases = {
+            b.id: b for b in (await self.db.execute(
+                select(BaseLogistics).where(BaseLogistics.id.in_(base_ids))
+            )).scalars().all()
+        }
+        demand_rows = await self.db.execute(
+            select(Volume.base_origin_id, Volume.temperature_class, func.sum(Volume.eqp_count))
+            .where(
+                Volume.dispatch_date == date,
+                Volume.base_origin_id.in_(base_ids),
+                Volume.tour_id.is_(None),
+            )
+            .group_by(Volume.base_origin_id, Volume.temperature_class)
+        )
+        demand: dict[Scope, float] = {}
+        for base_id, temp, eqp in demand_rows.all():
+            temp_val = temp.value if hasattr(temp, "value") else temp
+            demand[(base_id, temp_val)] = float(eqp or 0)
+        unavailable = {
+            row[0] for row in (await self.db.execute(
+                select(ContractSchedule.contract_id).where(
+                    ContractSchedule.date == date,
+                    ContractSchedule.is_available == False,  # noqa: E712
+                )
+            )).all()
+        }
+        region_ids = {b.region_id for b in bases.values()}
+        contracts = (await self.db.execute(
+            select(Contract).where(Contract.region_id.in_(region_ids))
+        )).scalars().all() if region_ids else []
+        fuel_prices = await load_fuel_unit_prices(self.db, date)
+
+        # --- 2. Répartition des contrats / Contract allocation ---
+        eligible: dict[int, list[Scope]] = {}
+        for c in contracts:
+            eligible[c.id] = [
+                (base_id, temp) for base_id, temp in scopes
+                if base_id in bases and bases[base_id].region_id == c.region_id
+                and is_contract_available(c, date, temp, unavailable)
+            ]
+        contested = sum(1 for sc in eligible.values() if len(sc) > 1)
+        allocation = allocate_contracts(
+            scopes, demand, eligible,
+            {c.id: float(c.capacity_eqp or DEFAULT_CAPACITY_EQP) for c in contracts},
+        )
+        by_id = {c.id: c for c in contracts}
+
+        # --- 3. Périmètres en parallèle / Scopes in parallel ---
+        # Le pool solveur borne le parallélisme CPU ; le double garde le pool
+        # alimenté pendant les chargements / the solver pool bounds CPU
+        # parallelism, twice that keeps it fed while scopes load.
+        limit = asyncio.Semaphore(max(1, settings.SOLVER_POOL_WORKERS) * 2)
+
+        async def solve(scope: Scope):
+            base_id, temp = scope
+            request = AideDecisionRequest(
+                dispatch_date=date,
+                base_origin_id=base_id,
+                temperature_class=temp,
+                level=batch.level,
+                time_limit_seconds=batch.time_limit_seconds,
+                local_search_ms=batch.local_search_ms,
+                optimization_priorities=batch.optimization_priorities,
+                use_cache=batch.use_cache,
+                portfolio=batch.portfolio,
+            )
+            async with limit, async_session() as db:
+                self._share_tenant(db)
+                return await AideDecisionService(db).generate(
+                    request,
+                    contracts=[by_id[cid] for cid in allocation[scope]],
+                    fuel_prices=fuel_prices,
+                )
+
+        # Chaque périmètre va au bout : un échec est rapporté, pas propagé /
+        # every scope runs to completion, a failure is reported, not raised
+        results = await asyncio.gather(*(solve(scope) for scope in scopes), return_exceptions=True)
+
+        # --- 4. Consolidation ---
+        scope_results = []
+        for (base_id, temp), result in zip(scopes, results):
+            scope_result = AideDecisionScopeResult(
+                base_origin_id=base_id,
+                temperature_class=temp,
+                contract_ids=allocation[(base_id, temp)],
+            )
+            if isinstance(result, BaseException):
+                log.error("Aide-decision batch %s: scope %s/%s failed", date, base_id, temp, exc_info=result)
+                scope_result.error = str(result) or result.__class__.__name__
+                warnings.append(f"Périmètre base {base_id} {temp} en échec : {scope_result.error}")
+            else:
+                scope_result.result = result
+            scope_results.append(scope_result)
+        log.info(
+            "Aide-decision batch %s: %d scopes, %d contracts (%d contested)",
+            date, len(scopes), len(contracts), contested,
+        )
+        return AideDecisionBatchResponse(
+            dispatch_date=date,
+            scopes=scope_results,
+            summary=summarize_tours([t for s in scope_results if s.result for t in s.result.tours]),
+            contested_contracts=contested,
+            warnings=warnings,
+        )
+
+    def _share_tenant(self, db: AsyncSession) -> None:
+        """Même tenant et même acteur que la session appelante / Same tenant and actor as the caller."""
+        info = self.db.info
+        set_session_tenant(db, None if info.get(TENANT_BYPASS) else info.get("tenant_id"))
+        if "actor" in info:
+            db.info["actor"] = info["actor"]
@@ -0,0 +1,351 @@
+"""Jobs d'aide à la décision en arrière-plan / Background decision support jobs.
+
+Un run Niveau 2 dure 15-30 s : plutôt que de tenir la requête HTTP ouverte, le
+client soumet un job, reçoit son identifiant, suit la progression (meilleure
+solution courante) sur le WebSocket du job et peut l'annuler. Le solveur tourne
+dans le pool de process (`solver_pool`), le chargement des données dans une
+session dédiée au tenant du demandeur.
+
+PLUSIEURS WORKERS : l'état du job est partagé dans `aide_decision_jobs`. Le
+worker qui l'exécute garde la tâche et ses abonnés locaux (progression
+immédiate) et reporte en base statut, résultat et, toutes les
+`JOB_POLL_SECONDS`, progression et battement de cœur ; il y relève aussi les
+demandes d'annulation déposées par un autre worker. Un autre worker lit la
+ligne (GET), la sonde pour ses abonnés WebSocket et y dépose les annulations.
+Un job sans battement de cœur depuis `JOB_STALE_SECONDS` (worker arrêté) est
+vu en échec.
+
+PROPRIÉTAIRE : un job n'est visible (lecture, flux, annulation) que de
+l'utilisateur qui l'a soumis ; pour les autres il est introuvable. Le quota
+de jobs actifs est vérifié sous verrou de la ligne `users` du demandeur : deux
+soumissions simultanées (même sur deux workers) ne peuvent pas le dépasser.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.database import async_session, engine, set_session_tenant
+from app.models.aide_decision_job import AideDecisionJobState
+from app.models.user import User
+from app.schemas.aide_decision import AideDecisionRequest, AideDecisionResponse
+from app.services.aide_decision import AideDecisionService
+
+log = logging.getLogger(__name__)
+
+# Durée de conservation d'un job terminé / Finished job lifetime (seconds)
+JOB_TTL_SECONDS = 3600
+# Jobs non terminés par utilisateur / Unfinished jobs per user
+MAX_ACTIVE_JOBS_PER_USER = 3
+# File d'événements par abonné WebSocket / Per-subscriber event queue size
+SUBSCRIBER_QUEUE_SIZE = 100
+# Période de report en base et de sondage (s) / Shared-state write and poll period (s)
+JOB_POLL_SECONDS = 1.0
+# Job sans battement de cœur depuis (s) : worker arrêté / No heartbeat since (s): worker gone
+JOB_STALE_SECONDS = 30
+
+# Statuts : queued, running, succeeded, failed, cancelled
+FINISHED_STATUSES = frozenset({"succeeded", "failed", "cancelled"})
+
+_jobs_table = AideDecisionJobState.__table__
+
+
+class TooManyJobsError(Exception):
+    """Quota de jobs actifs atteint / Active job quota reached."""
+
+
+@dataclass
+class AideDecisionJob:
+    """État d'un job / Job state."""
+    id: str
+    user_id: int
+    tenant_id: int | None
+    request: AideDecisionRequest
+    status: str = "queued"
+    progress: dict | None = None           # dernière amélioration du solveur / latest solver improvement
+    result: AideDecisionResponse | None = None
+    error: str | None = None
+    cancel_requested: bool = False
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    # Tâche et abonnés : seulement sur le worker qui exécute / only on the running worker
+    task: asyncio.Task | None = field(default=None, repr=False)
+    subscribers: set[asyncio.Queue] = field(default_factory=set, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def as_dict(self, with_result: bool = False) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "level": self.request.level,
+            "dispatch_date": self.request.dispatch_date,
+            "base_origin_id": self.request.base_origin_id,
+            "temperature_class": self.request.temperature_class,
+            "progress": self.progress,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if with_result:
+            data["result"] = self.result.model_dump() if self.result else None
+        return data
+
+
+# Jobs exécutés par ce worker / Jobs run by this worker
+_jobs: dict[str, AideDecisionJob] = {}
+# Arrêt des sondes de la ligne partagée, par abonné (jobs d'un autre worker) /
+# Stop events of the shared-row pollers, per subscriber (another worker's jobs)
+_pollers: dict[asyncio.Queue, asyncio.Event] = {}
+
+
+def _visible(job: AideDecisionJob, user_id: int) -> bool:
+    # Seul le demandeur, même en consolidation / Owner only, even when consolidating
+    return job.user_id == user_id
+
+
+def _purge_local() -> None:
+    now = time.time()
+    for job_id in [
+        k for k, j in _jobs.items()
+        if j.finished and j.finished_at and now - j.finished_at > JOB_TTL_SECONDS
+    ]:
+        _jobs.pop(job_id, None)
+
+
+# ── État partagé / Shared state ───────────────────────────────────
+
+
+async def _save(job_id: str, **values) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(update(_jobs_table).where(_jobs_table.c.id == job_id).values(**values))
+
+
+def _from_row(row) -> AideDecisionJob:
+    job = AideDecisionJob(
+        id=row.id, user_id=row.user_id, tenant_id=row.tenant_id,
+        request=AideDecisionRequest.model_validate_json(row.request),
+        status=row.status,
+        progress=json.loads(row.progress) if row.progress else None,
+        result=AideDecisionResponse.model_validate_json(row.result) if row.result else None,
+        error=row.error, cancel_requested=row.cancel_requested,
+        created_at=row.created_at, finished_at=row.finished_at,
+    )
+    if not job.finished and time.time() - row.heartbeat_at > JOB_STALE_SECONDS:
+        # Worker arrêté en cours de job / worker stopped mid-job
+        job.status, job.error, job.finished_at = "failed", "Worker arrêté en cours de job", row.heartbeat_at
+    return job
+
+
+async def _load(job_id: str) -> AideDecisionJob | None:
+    async with engine.connect() as conn:
+        row = (await conn.execute(select(_jobs_table).where(_jobs_table.c.id == job_id))).first()
+    return _from_row(row) if row is not None else None
+
+
+# ── Exécution (worker propriétaire) / Execution (owning worker) ───
+
+
+def _offer(q: asyncio.Queue, message: dict) -> None:
+    """Déposer un événement ; une file saturée perd le plus ancien /
+    Enqueue an event; a full queue drops its oldest one."""
+    if q.full():
+        q.get_nowait()
+    q.put_nowait(message)
+
+
+def _publish(job: AideDecisionJob, message: dict) -> None:
+    """Diffuser aux abonnés locaux du job / Fan out to the job's local subscribers."""
+    for q in job.subscribers:
+        _offer(q, message)
+
+
+async def _set_status(job: AideDecisionJob, status: str) -> None:
+    job.status = status
+    if job.finished:
+        job.finished_at = time.time()
+    _publish(job, {"type": "job_status", "job": job.as_dict()})
+    try:
+        await _save(
+            job.id, status=job.status, finished_at=job.finished_at, error=job.error,
+            progress=json.dumps(job.progress) if job.progress else None,
+            result=job.result.model_dump_json() if job.result else None, heartbeat_at=time.time(),
+        )
+    except Exception:
+        log.exception("Aide-decision job %s: shared state not saved", job.id)
+
+
+def _on_progress(job: AideDecisionJob, event: dict) -> None:
+    job.progress = event
+    _publish(job, {"type": "job_progress", "job_id": job.id, **event})
+
+
+async def _tick(stop: asyncio.Event) -> bool:
+    """Attendre une période ; False si arrêt demandé. Les tâches de sondage
+    s'arrêtent ainsi entre deux requêtes, jamais annulées en cours de requête /
+    Wait one period; False once stopped, so pollers never die mid-query."""
+    try:
+        await asyncio.wait_for(stop.wait(), JOB_POLL_SECONDS)
+    except TimeoutError:
+        return True
+    return False
+
+
+async def _heartbeat(job: AideDecisionJob, stop: asyncio.Event) -> None:
+    """Reporter progression et battement de cœur, relever les annulations
+    demandées par un autre worker / Report progress and heartbeat, pick up
+    cancellations requested by another worker."""
+    saved = None
+    while await _tick(stop):
+        values = {"heartbeat_at": time.time()}
+        if job.progress is not saved:
+            values["progress"] = json.dumps(job.progress) if job.progress else None
+            saved = job.progress
+        try:
+            async with engine.begin() as conn:
+                cancel = (await conn.execute(
+                    update(_jobs_table).where(_jobs_table.c.id == job.id).values(**values)
+                    .returning(_jobs_table.c.cancel_requested)
+                )).scalar()
+        except Exception:
+            log.warning("Aide-decision job %s: heartbeat failed", job.id, exc_info=True)
+            continue
+        if cancel and job.task is not None:
+            job.cancel_requested = True
+            job.task.cancel()
+            return
+
+
+async def _run(job: AideDecisionJob) -> None:
+    """Exécuter le job dans une session au tenant du demandeur / Run in a tenant-scoped session."""
+    await _set_status(job, "running")
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(job, stop))
+    try:
+        async with async_session() as db:
+            set_session_tenant(db, job.tenant_id)
+            service = AideDecisionService(db, on_solver_progress=lambda e: _on_progress(job, e))
+            job.result = await service.generate(job.request)
+            # Simulation pure : rien à valider / pure simulation, nothing to commit
+            await db.rollback()
+        status = "succeeded"
+    except asyncio.CancelledError:
+        status = "cancelled"
+    except Exception as exc:
+        log.exception("Aide-decision job %s failed", job.id)
+        job.error = str(exc) or exc.__class__.__name__
+        status = "failed"
+    # Battement de cœur arrêté avant l'écriture finale / heartbeat stopped before the final write
+    stop.set()
+    await heartbeat
+    await _set_status(job, status)
+
+
+async def submit_job(request: AideDecisionRequest, user_id: int, tenant_id: int | None) -> AideDecisionJob:
+    """Créer et démarrer un job / Create and start a job.
+
+    Raises: TooManyJobsError si l'utilisateur a déjà trop de jobs en cours
+    (tous workers confondus).
+    """
+    _purge_local()
+    now = time.time()
+    async with engine.begin() as conn:
+        # Soumissions d'un même utilisateur sérialisées jusqu'au COMMIT : le
+        # comptage et l'insertion forment un tout / Same-user submissions are
+        # serialized until COMMIT, so count and insert are atomic
+        await conn.execute(select(User.id).where(User.id == user_id).with_for_update())
+        await conn.execute(delete(_jobs_table).where(
+            func.coalesce(_jobs_table.c.finished_at, _jobs_table.c.heartbeat_at) < now - JOB_TTL_SECONDS))
+        active = (await conn.execute(select(func.count()).select_from(_jobs_table).where(
+            _jobs_table.c.user_id == user_id,
+            _jobs_table.c.status.not_in(FINISHED_STATUSES),
+            _jobs_table.c.heartbeat_at >= now - JOB_STALE_SECONDS,
+        ))).scalar()
+        if active >= MAX_ACTIVE_JOBS_PER_USER:
+            raise TooManyJobsError(f"{active} jobs déjà en cours (max {MAX_ACTIVE_JOBS_PER_USER})")
+        job = AideDecisionJob(id=uuid.uuid4().hex, user_id=user_id, tenant_id=tenant_id, request=request)
+        await conn.execute(insert(_jobs_table).values(
+            id=job.id, user_id=user_id, tenant_id=tenant_id, status=job.status,
+            request=request.model_dump_json(), cancel_requested=False,
+            created_at=job.created_at, heartbeat_at=now,
+        ))
+    _jobs[job.id] = job
+    job.task = asyncio.create_task(_run(job))
+    return job
+
+
+async def get_job(job_id: str, user_id: int) -> AideDecisionJob | None:
+    """Lire un job de cet utilisateur, local ou d'un autre worker /
+    Read a job of this user, local or from another worker."""
+    job = _jobs.get(job_id) or await _load(job_id)
+    if job is None or not _visible(job, user_id):
+        return None
+    return job
+
+
+async def cancel_job(job: AideDecisionJob) -> bool:
+    """Annuler un job non terminé (arrête aussi le solveur) / Cancel an unfinished job.
+
+    Job d'un autre worker : demande déposée dans la ligne partagée, relevée
+    par ce worker sous `JOB_POLL_SECONDS`.
+    Returns: False si le job était déjà terminé.
+    """
+    if job.finished:
+        return False
+    if job.task is None:
+        async with engine.begin() as conn:
+            result = await conn.execute(update(_jobs_table).where(
+                _jobs_table.c.id == job.id, _jobs_table.c.status.not_in(FINISHED_STATUSES),
+            ).values(cancel_requested=True))
+        job.cancel_requested = bool(result.rowcount)
+        return job.cancel_requested
+    if not job.cancel_requested:
+        # Une seule annulation : _run écrit ensuite l'état final / cancel once, _run then writes the final state
+        job.cancel_requested = True
+        job.task.cancel()
+    if job.status == "queued":
+        # Tâche jamais démarrée : _run ne verra pas l'annulation / never started
+        await _set_status(job, "cancelled")
+    return True
+
+
+async def _poll(job: AideDecisionJob, q: asyncio.Queue, stop: asyncio.Event) -> None:
+    """Relayer à un abonné les changements d'un job d'un autre worker /
+    Relay another worker's job changes to a subscriber."""
+    status, progress = job.status, job.progress
+    while status not in FINISHED_STATUSES and await _tick(stop):
+        current = await _load(job.id)
+        if current is None:
+            return
+        if current.progress != progress:
+            progress = current.progress
+            _offer(q, {"type": "job_progress", "job_id": job.id, **(progress or {})})
+        if current.status != status:
+            status = current.status
+            _offer(q, {"type": "job_status", "job": current.as_dict()})
+
+
+def subscribe(job: AideDecisionJob) -> asyncio.Queue:
+    """S'abonner aux événements du job / Subscribe to job events."""
+    q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    if job.task is not None:
+        job.subscribers.add(q)
+    else:
+        _pollers[q] = stop = asyncio.Event()
+        asyncio.create_task(_poll(job, q, stop))
+    return q
+
+
+def unsubscribe(job: AideDecisionJob, q: asyncio.Queue) -> None:
+    job.subscribers.discard(q)
+    stop = _pollers.pop(q, None)
+    if stop is not None:
+        stop.set()
@@ -17,20 +17,34 @@ Limites connues : les UPDATE/DELETE en masse (`session.execute(update(...))`)
 ne passent pas par le flush ORM — les imports en mode « replace » journalisent
 déjà leur propre trace (import_manifest). La rétention des entrées est gérée
 par la purge A6 (12 mois, plancher 6 mois).
+
+Écriture (`AUDIT_WRITE_MODE`) : la capture est inchangée, mais les entrées
+sont accumulées sur la transaction et écrites en un seul executemany au COMMIT
+(et non plus un INSERT par flush) ; dans un SAVEPOINT elles sont écrites tout
+de suite, pour être annulées avec lui. Mode `outbox` : une seule ligne JSON
+par transaction dans `audit_outbox` (même transaction, donc aussi durable),
+versée dans `audit_logs` par `audit_outbox_scheduler` — les entrées
+apparaissent avec un léger décalage (`AUDIT_OUTBOX_FLUSH_MS`).
 """
 
+import asyncio
 import json
+import logging
 from datetime import datetime, timezone
 
-from sqlalchemy import event, inspect
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.orm import Mapper, Session
+
+from app.config import settings
+from app.models.audit import AuditLog, AuditOutbox
 
-from app.models.audit import AuditLog
+logger = logging.getLogger(__name__)
 
 # Tables jamais auditées : le journal lui-même (récursion), les flux à très
 # haut volume qui sont leur propre trace, et les contenus SMS (données perso).
 EXCLUDED_TABLES = {
     "audit_logs",
+    "audit_outbox",
     "gps_positions",
     "sms_queue",
 }
@@ -40,9 +54,18 @@ SENSITIVE_FIELDS = {"hashed_password", "password", "secret", "totp_secret", "tok
 
 MAX_VALUE_LEN = 200
 
+# Lignes de boîte d'envoi versées par transaction / Outbox rows moved per transaction
+AUDIT_OUTBOX_BATCH_ROWS = 500
+
 _PENDING_KEY = "_pending_audit_rows"
+_BUFFER_KEY = "_buffered_audit_rows"
+_COMMITTING_KEY = "_audit_committing"
 _DISABLE_KEY = "audit_trail_disabled"
 
+# Colonnes auditées par mapper : (diff UPDATE, valeurs CREATE) /
+# Audited columns per mapper: (UPDATE diff, CREATE values)
+_mapper_columns: dict[Mapper, tuple[tuple[str, ...], tuple[str, ...]]] = {}
+
 
 def _truncate(value) -> str | None:
     if value is None:
@@ -56,72 +79,160 @@ def _is_auditable(obj) -> bool:
     return table is not None and table not in EXCLUDED_TABLES and not isinstance(obj, AuditLog)
 
 
+def _columns(mapper: Mapper) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Colonnes auditées du mapper, calculées une fois / Mapper's audited columns, computed once."""
+    columns = _mapper_columns.get(mapper)
+    if columns is None:
+        keys = tuple(attr.key for attr in mapper.column_attrs if attr.key not in SENSITIVE_FIELDS)
+        columns = _mapper_columns[mapper] = (keys, tuple(k for k in keys if k != "id"))
+    return columns
+
+
 def _now() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
-def _base_row(session: Session, obj, action: str, changes: dict | None) -> dict:
+def _base_row(session: Session, obj, action: str, changes: dict | None, now: str) -> dict:
     return {
         "entity_type": obj.__tablename__,
         "entity_id": getattr(obj, "id", None) or 0,
         "action": action,
         "changes": json.dumps(changes, ensure_ascii=False) if changes else None,
         "user": session.info.get("actor", "system"),
-        "timestamp": _now(),
+        "timestamp": now,
         "tenant_id": getattr(obj, "tenant_id", None) or session.info.get("tenant_id"),
     }
 
 
+def _write(session: Session, rows: list[dict]) -> None:
+    """Écrire des entrées via la connexion de la transaction (executemany, ou une
+    ligne de boîte d'envoi) / Write entries through the transaction's connection."""
+    if settings.AUDIT_WRITE_MODE == "outbox":
+        session.connection().execute(AuditOutbox.__table__.insert(), {
+            "payload": json.dumps(rows, ensure_ascii=False, separators=(",", ":")),
+            "created_at": _now(),
+        })
+    else:
+        session.connection().execute(AuditLog.__table__.insert(), rows)
+
+
 @event.listens_for(Session, "before_flush")
 def _capture_updates_and_deletes(session: Session, flush_context, instances) -> None:
     """Capturer les diffs UPDATE et les DELETE avant que le flush n'efface l'historique."""
     if session.info.get(_DISABLE_KEY):
         return
     pending = session.info.setdefault(_PENDING_KEY, [])
+    now = _now()
 
     for obj in session.dirty:
         if not _is_auditable(obj) or not session.is_modified(obj, include_collections=False):
             continue
         changes: dict = {}
         state = inspect(obj)
-        for attr in state.mapper.column_attrs:
-            if attr.key in SENSITIVE_FIELDS:
-                continue
-            history = state.attrs[attr.key].history
+        attrs = state.attrs
+        for key in _columns(state.mapper)[0]:
+            history = attrs[key].history
             if history.has_changes():
                 old = history.deleted[0] if history.deleted else None
                 new = history.added[0] if history.added else None
-                changes[attr.key] = [_truncate(old), _truncate(new)]
+                changes[key] = [_truncate(old), _truncate(new)]
         if changes:
-            pending.append(_base_row(session, obj, "UPDATE", changes))
+            pending.append(_base_row(session, obj, "UPDATE", changes, now))
 
     for obj in session.deleted:
         if _is_auditable(obj):
-            pending.append(_base_row(session, obj, "DELETE", None))
+            pending.append(_base_row(session, obj, "DELETE", None, now))
 
 
 @event.listens_for(Session, "after_flush")
 def _capture_creates_and_write(session: Session, flush_context) -> None:
-    """Capturer les CREATE (id désormais assigné) et écrire toutes les entrées."""
+    """Capturer les CREATE (id désormais assigné) ; écrire tout de suite en
+    SAVEPOINT ou pendant le COMMIT, sinon accumuler jusqu'au COMMIT."""
     if session.info.get(_DISABLE_KEY):
         return
     pending = session.info.pop(_PENDING_KEY, [])
+    now = _now()
 
     for obj in session.new:
         if not _is_auditable(obj):
             continue
         state = inspect(obj)
         values = {}
-        for attr in state.mapper.column_attrs:
-            if attr.key in SENSITIVE_FIELDS or attr.key == "id":
-                continue
-            value = getattr(obj, attr.key, None)
+        for key in _columns(state.mapper)[1]:
+            value = getattr(obj, key, None)
             if value is not None:
-                values[attr.key] = _truncate(value)
-        pending.append(_base_row(session, obj, "CREATE", values))
+                values[key] = _truncate(value)
+        pending.append(_base_row(session, obj, "CREATE", values, now))
 
-    if pending:
+    if not pending:
+        return
+    if session.in_nested_transaction() or session.info.get(_COMMITTING_KEY):
         # En after_flush, on écrit via la connexion du flush (même transaction) ;
         # session.execute est proscrit pendant le flush. / Write through the
         # flush connection (same transaction); session.execute is off-limits here.
-        session.connection().execute(AuditLog.__table__.insert(), pending)
+        _write(session, pending)
+    else:
+        session.info.setdefault(_BUFFER_KEY, []).extend(pending)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_on_commit(session: Session) -> None:
+    """Écrire les entrées accumulées de la transaction, en un seul lot ; les
+    flushs restants du COMMIT écrivent directement / Write the transaction's
+    buffered entries in one batch; the commit's own flushes write directly."""
+    session.info[_COMMITTING_KEY] = True
+    buffered = session.info.pop(_BUFFER_KEY, None)
+    if buffered:
+        _write(session, buffered)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset_on_transaction_end(session: Session, transaction) -> None:
+    # Fin de la transaction racine (COMMIT ou ROLLBACK) ; un SAVEPOINT annulé a
+    # déjà annulé ses propres entrées / Root transaction end; a rolled-back
+    # savepoint already undid its own entries
+    if transaction.parent is None:
+        for key in (_BUFFER_KEY, _PENDING_KEY, _COMMITTING_KEY):
+            session.info.pop(key, None)
+
+
+# ── Boîte d'envoi / Outbox ─────────────────────────────────────────
+
+
+async def drain_audit_outbox(batch_rows: int = AUDIT_OUTBOX_BATCH_ROWS) -> int:
+    """Verser la boîte d'envoi dans `audit_logs` (lots transactionnels, lignes
+    verrouillées SKIP LOCKED sur PostgreSQL : plusieurs workers possibles) ;
+    retourne le nombre d'entrées versées / Move the outbox into audit_logs."""
+    from app.database import async_session
+
+    outbox = AuditOutbox.__table__
+    moved = 0
+    while True:
+        async with async_session() as session:
+            conn = await session.connection()
+            rows = (await conn.execute(
+                select(outbox.c.id, outbox.c.payload).order_by(outbox.c.id)
+                .limit(batch_rows).with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                return moved
+            entries = [entry for row in rows for entry in json.loads(row.payload)]
+            if entries:
+                await conn.execute(AuditLog.__table__.insert(), entries)
+            await conn.execute(delete(outbox).where(outbox.c.id.in_([row.id for row in rows])))
+            await session.commit()
+        moved += len(entries)
+        if len(rows) < batch_rows:
+            return moved
+
+
+async def audit_outbox_scheduler() -> None:
+    """Boucle de versement de la boîte d'envoi (tâche de fond) / Outbox drain loop."""
+    while True:
+        await asyncio.sleep(settings.AUDIT_OUTBOX_FLUSH_MS / 1000)
+        try:
+            await drain_audit_outbox()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec du versement de l'audit (nouvelle tentative au prochain cycle)")
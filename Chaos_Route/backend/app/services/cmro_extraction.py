@@ -7,12 +7,36 @@ de correspondance. Les colonnes que CHAOS ne sait pas remplir restent vides.
 
 Le coût/tournée réplique le barème CMRO :
   Coût = T_fixe + T_km + Gasoil + T_horaire + HA + T_rem + Prime + Total_Taxe
+
+Les lignes sont produites par lots de tours (`iter_cmro_rows`) : seuls les ids
+triés de la période sont gardés en mémoire, chaque lot charge ses tours,
+arrêts, PDV, nb de tours, taxes km et volumes livrés en un nombre constant de
+requêtes. L'export (`write_cmro_xlsx`, `cmro_csv_chunks`) écrit lot par lot :
+la mémoire reste stable quelle que soit la longueur de la période. Le CSV en
+flux (`stream_cmro_csv`) lit dans sa propre session : il est envoyé après le
+retour de l'endpoint, quand la session de la requête est fermée.
 """
 
+import asyncio
+import csv
+import io
 import json
+from collections.abc import AsyncIterator, Iterable
 from datetime import date, datetime
 from pathlib import Path
 
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.database import TENANT_BYPASS, async_session, set_session_tenant
+from app.models.base_logistics import BaseLogistics
+from app.models.contract import Contract
+from app.models.pdv import PDV
+from app.models.tour import Tour
+from app.models.tour_manifest_line import TourManifestLine
+from app.services.tour_costing import build_segments, load_km_taxes
+from app.utils.fuel_pricing import load_fuel_unit_prices_by_date, price_for_contract
 from app.utils.holidays_be import is_belgian_holiday
 
 # En-têtes exacts du modèle (Tour_ERT) / Exact model headers
@@ -42,6 +66,12 @@ assert len(CMRO_FIELDS) == len(CMRO_COLUMNS), (
     f"CMRO mapping désaligné: {len(CMRO_FIELDS)} clés vs {len(CMRO_COLUMNS)} colonnes"
 )
 
+# Colonnes exportées (en-tête non vide) / Exported columns (non-empty header)
+CMRO_EXPORT: list[tuple[str, str]] = [(f, col) for f, col in zip(CMRO_FIELDS, CMRO_COLUMNS) if col]
+
+# Tours par lot d'extraction / Tours per extraction batch
+CMRO_BATCH_TOURS = 500
+
 _STATUS_FR = {
     "DRAFT": "Brouillon", "VALIDATED": "Validée", "IN_PROGRESS": "En cours",
     "RETURNING": "Retour", "COMPLETED": "Livrée",
@@ -221,3 +251,164 @@ def build_row(tour, contract, base_name: str, nb_tours: int, fuel_price: float,
     if contract:
         row.update(compute_cost(tour, contract, nb_tours, fuel_price, km_tax_total))
     return row
+
+
+# ── Extraction par lots / Batched extraction ─────────────────────
+
+
+async def iter_cmro_rows(
+    db: AsyncSession,
+    date_from: str,
+    date_to: str,
+    base_id: int | None = None,
+    transporter_name: str | None = None,
+    billing_company: str | None = None,
+    region_ids: list[int] | None = None,
+    batch_size: int | None = None,
+) -> AsyncIterator[list[dict]]:
+    """Lignes CMRO de la période (1/tour planifié), par lots de `batch_size`
+    tours, triées par date, heure de départ, priorité /
+    CMRO rows of the period, in batches of tours, sorted by date, departure, priority."""
+    batch_size = batch_size or CMRO_BATCH_TOURS
+    criteria = [
+        Tour.date >= date_from, Tour.date <= date_to,
+        Tour.contract_id.isnot(None), Tour.departure_time.isnot(None),
+    ]
+    if base_id:
+        criteria.append(Tour.base_id == base_id)
+    if billing_company:
+        criteria.append(Tour.base_id.in_(
+            select(BaseLogistics.id).where(BaseLogistics.billing_company == billing_company)))
+    if region_ids is not None:
+        criteria.append(Tour.base_id.in_(select(BaseLogistics.id).where(BaseLogistics.region_id.in_(region_ids))))
+
+    # Contrats et bases de la période : peu nombreux, gardés pour tous les lots /
+    # Contracts and bases of the period: few, kept for every batch
+    contracts = {c.id: c for c in (await db.execute(
+        select(Contract).where(Contract.id.in_(select(Tour.contract_id).where(*criteria)))
+    )).scalars()}
+    if transporter_name:
+        nl = transporter_name.lower()
+        matching = [cid for cid, c in contracts.items() if nl in (c.transporter_name or "").lower()]
+        criteria.append(Tour.contract_id.in_(matching or [-1]))
+    base_names = dict((await db.execute(
+        select(BaseLogistics.id, BaseLogistics.name).where(BaseLogistics.id.in_(select(Tour.base_id).where(*criteria)))
+    )).all())
+
+    tour_ids = (await db.execute(
+        select(Tour.id).where(*criteria)
+        .order_by(Tour.date, Tour.departure_time, func.coalesce(Tour.priority, 999), Tour.id)
+    )).scalars().all()
+    fuel_by_date: dict[str, dict[str, float]] = {}
+    for start in range(0, len(tour_ids), batch_size):
+        batch = tour_ids[start:start + batch_size]
+        rows = await _cmro_batch(db, batch, contracts, base_names, fuel_by_date)
+        if rows:
+            yield rows
+
+
+async def _cmro_batch(db: AsyncSession, tour_ids: list[int], contracts: dict[int, Contract],
+                      base_names: dict[int, str], fuel_by_date: dict[str, dict[str, float]]) -> list[dict]:
+    """Lignes d'un lot de tours, dans l'ordre de `tour_ids` / Rows of one batch, in `tour_ids` order."""
+    loaded = {t.id: t for t in (await db.execute(
+        select(Tour).where(Tour.id.in_(tour_ids)).options(selectinload(Tour.stops))
+    )).scalars()}
+    tours = [loaded[tid] for tid in tour_ids if tid in loaded and loaded[tid].contract_id in contracts]
+    if not tours:
+        return []
+
+    pdv_ids = {s.pdv_id for t in tours for s in t.stops}
+    pdv_map = {row.id: row for row in (await db.execute(
+        select(PDV.id, PDV.code, PDV.name).where(PDV.id.in_(pdv_ids))
+    )).all()} if pdv_ids else {}
+
+    # Nb de tours par (contrat, jour), tous statuts / Tours per (contract, day), all statuses
+    dates = {t.date for t in tours}
+    nb_tours = {(cid, day): count for cid, day, count in await db.execute(
+        select(Tour.contract_id, Tour.date, func.count(Tour.id))
+        .where(Tour.contract_id.in_({t.contract_id for t in tours}), Tour.date.in_(dates))
+        .group_by(Tour.contract_id, Tour.date)
+    )}
+    new_dates = dates - fuel_by_date.keys()
+    if new_dates:
+        fuel_by_date.update(await load_fuel_unit_prices_by_date(db, new_dates))
+
+    segments = {
+        t.id: build_segments(t.base_id, [{"pdv_id": s.pdv_id, "sequence_order": s.sequence_order} for s in t.stops])
+        for t in tours
+    }
+    taxes = await load_km_taxes(db, (seg for segs in segments.values() for seg in segs))
+    delivered = {tour_id: (eqc, colis) for tour_id, eqc, colis in await db.execute(
+        select(TourManifestLine.tour_id, func.sum(TourManifestLine.eqc), func.sum(TourManifestLine.nb_colis))
+        .where(TourManifestLine.tour_id.in_([t.id for t in tours]), TourManifestLine.scanned == True)  # noqa: E712
+        .group_by(TourManifestLine.tour_id)
+    )}
+
+    rows = []
+    for t in tours:
+        contract = contracts[t.contract_id]
+        km_tax_total = 0.0
+        for seg in segments[t.id]:
+            if taxes.get(seg):
+                km_tax_total += taxes[seg]
+        eqc_liv, colis_liv = delivered.get(t.id, (None, None))
+        rows.append(build_row(
+            t, contract, base_names.get(t.base_id, ""), nb_tours.get((t.contract_id, t.date), 1),
+            price_for_contract(fuel_by_date.get(t.date, {}), contract), km_tax_total,
+            eqc_liv, colis_liv, pdv_map,
+        ))
+    return rows
+
+
+def _export_values(row: dict) -> list:
+    return [row.get(f, "") for f, _ in CMRO_EXPORT]
+
+
+async def write_cmro_xlsx(batches: AsyncIterator[list[dict]], path: str) -> None:
+    """Écrire le classeur Tour_ERT lot par lot (openpyxl en écriture seule,
+    hors boucle d'événements) / Write the Tour_ERT workbook batch by batch
+    (write-only openpyxl, off the event loop)."""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Tour_ERT")
+    ws.append([col for _, col in CMRO_EXPORT])
+
+    def append(rows: Iterable[dict]) -> None:
+        for row in rows:
+            ws.append(_export_values(row))
+
+    async for rows in batches:
+        await asyncio.to_thread(append, rows)
+    await asyncio.to_thread(wb.save, path)
+
+
+async def cmro_csv_chunks(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    """CSV UTF-8 BOM séparateur ';' (comme les exports génériques), un morceau
+    par lot / ';'-separated UTF-8 BOM CSV, one chunk per batch."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=";")
+    output.write("\ufeff")
+    writer.writerow([col for _, col in CMRO_EXPORT])
+    yield output.getvalue().encode("utf-8")
+    async for rows in batches:
+        output.seek(0)
+        output.truncate()
+        writer.writerows(_export_values(row) for row in rows)
+        yield output.getvalue().encode("utf-8")
+
+
+def stream_cmro_csv(db: AsyncSession, *args, **kwargs) -> AsyncIterator[bytes]:
+    """CSV de `iter_cmro_rows(db, *args, **kwargs)` pour une StreamingResponse :
+    lu dans une session dédiée, au tenant de `db` (relevé maintenant) /
+    CSV for a StreamingResponse, read in a dedicated session with `db`'s tenant."""
+    info = db.info
+    tenant_id = None if info.get(TENANT_BYPASS) else info.get("tenant_id")
+
+    async def chunks() -> AsyncIterator[bytes]:
+        async with async_session() as session:
+            set_session_tenant(session, tenant_id)
+            async for chunk in cmro_csv_chunks(iter_cmro_rows(session, *args, **kwargs)):
+                yield chunk
+
+    return chunks()
@@ -0,0 +1,152 @@
+"""Caches process invalidés au COMMIT / Process caches invalidated on COMMIT.
+
+Plusieurs services gardent en mémoire des données de référence relues à
+chaque requête (utilisateurs authentifiés, appareils, distancier, données de
+simulation, contextes GPS, index de compatibilité). Ils partagent le même
+mécanisme, réuni ici :
+- LRU borné (`max_entries`) et TTL par entrée (filet de sécurité pour les
+  écritures Core ou hors process) ;
+- compteur de génération : `put` reçoit la génération lue AVANT le
+  chargement, une invalidation concurrente rend l'entrée obsolète ;
+- invalidation au COMMIT : toute écriture ORM sur un des `models` est notée
+  au flush dans `session.info` (les écritures Core appellent `mark_dirty`),
+  le cache est vidé après le COMMIT, jamais avant (pas de rechargement avec
+  des données non validées) ; un ROLLBACK oublie la marque ;
+- dépendances : un cache construit à partir d'un autre (`invalidated_by`) est
+  vidé avec lui ;
+- plusieurs workers : chaque invalidation est relayée aux autres workers par
+  un signal du bus de suivi (`services/tracking_bus.py`, backend `postgres`),
+  qui vident la même entrée ; le TTL ne couvre plus que les écritures Core
+  sans `mark_dirty` et les signaux perdus (reconnexion de l'écoute).
+
+Trois hooks de session seulement, quel que soit le nombre de caches.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.tracking_bus import on_signal, send_signal
+
+_SIGNAL = "cache_invalidate"
+
+# Caches enregistrés (ordre de création) / Registered caches (creation order)
+_caches: list["CommitInvalidatedCache"] = []
+
+
+class CommitInvalidatedCache:
+    """Cache LRU + TTL vidé au COMMIT d'une écriture sur `models` /
+    LRU + TTL cache dropped when a write to `models` commits."""
+
+    def __init__(
+        self,
+        name: str,
+        models: Iterable[type] = (),
+        ttl_seconds: float = 300,
+        max_entries: int | None = None,
+        invalidated_by: Iterable["CommitInvalidatedCache"] = (),
+    ):
+        self.name = name
+        self.models = tuple(models)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._dirty_key = f"_{name}_dirty"
+        self._entries: OrderedDict[Hashable, tuple[object, float]] = OrderedDict()
+        self._generation = 0
+        self._dependents: list[CommitInvalidatedCache] = []
+        for parent in invalidated_by:
+            parent._dependents.append(self)
+        _caches.append(self)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value, generation: int) -> None:
+        """Enregistrer ; `generation` est celle lue AVANT le chargement (une
+        invalidation concurrente rend l'entrée obsolète) /
+        Store; `generation` is read BEFORE loading."""
+        if generation != self._generation:
+            return
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        if self.max_entries is not None:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Oublier une entrée, ou toutes (et les caches dépendants), ici et
+        dans les autres workers / Drop one entry, or all of them (and dependent
+        caches), here and in the other workers."""
+        self._drop(key)
+        send_signal(_SIGNAL, {"cache": self.name, "key": key})
+
+    def _drop(self, key: Hashable | None) -> None:
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        for dependent in self._dependents:
+            dependent._drop(None)
+
+    def mark_dirty(self, session) -> None:
+        """Signaler une écriture hors ORM (invalidation au COMMIT) /
+        Flag a non-ORM write (invalidated on COMMIT)."""
+        session.info[self._dirty_key] = True
+
+    def is_dirty(self, session) -> bool:
+        """Écritures non validées dans cette session / Uncommitted writes in this session."""
+        return bool(session.info.get(self._dirty_key))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _apply_remote(payload: dict) -> None:
+    """Invalidation relayée par un autre worker / Invalidation relayed by another worker."""
+    for cache in _caches:
+        if cache.name == payload["cache"]:
+            cache._drop(payload["key"])
+
+
+on_signal(_SIGNAL, _apply_remote)
+
+
+# ── Invalidation automatique / Automatic invalidation ──────────────
+
+
+@event.listens_for(Session, "before_flush")
+def _flag_writes(session: Session, flush_context, instances) -> None:
+    written = {type(obj) for obj in (*session.new, *session.dirty, *session.deleted)}
+    if not written:
+        return
+    for cache in _caches:
+        if cache.models and any(issubclass(cls, cache.models) for cls in written):
+            session.info[cache._dirty_key] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    for cache in _caches:
+        if session.info.pop(cache._dirty_key, False):
+            cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_flags_on_rollback(session: Session) -> None:
+    for cache in _caches:
+        session.info.pop(cache._dirty_key, None)
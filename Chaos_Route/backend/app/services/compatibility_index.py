@@ -0,0 +1,180 @@
+"""Index de compatibilité PDV / véhicule / PDV–vehicle compatibility index.
+
+Les règles (type de véhicule autorisé, quai / niche / hayon) étaient réévaluées
+pour chaque couple PDV × contrat, en relisant les PDV et en redécoupant
+`allowed_vehicle_types` à chaque contrat candidat. Elles deviennent deux
+masques de bits :
+- une CAPACITÉ par contrat (ou véhicule propre) : un bit `_NOT_TYPE[t]` pour
+  chaque type de véhicule t qu'il n'est PAS (contrat sans type : tous),
+  `CAP_TAILGATE` s'il a un hayon, `CAP_NOT_FOLDABLE` sauf hayon rabattable ;
+- une EXIGENCE par PDV : les bits `_NOT_TYPE` des types non autorisés,
+  `CAP_TAILGATE` sans quai, `CAP_NOT_FOLDABLE` pour un quai sans niche.
+Compatible ⇔ `exigence & ~capacité == 0` ; les bits restants disent quelle
+règle est violée. L'exigence d'un tour est le OU de celles de ses arrêts.
+
+L'index d'une société (exigences de tous ses PDV, capacités de tous ses
+contrats rangées en ensembles de bits par capacité) est chargé en deux
+requêtes puis gardé en mémoire : `eligible_contracts` fait un ET sur tous les
+contrats à la fois. Invalidation au COMMIT d'une écriture ORM sur PDV ou
+Contract (`CommitInvalidatedCache`) et par TTL (écritures Core ou hors
+process). Une session qui a elle-même modifié un PDV ou un contrat non encore
+validé lit la base sans passer par le cache.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import TENANT_BYPASS
+from app.models.contract import Contract, VehicleType
+from app.models.pdv import PDV
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+
+# Durée de vie max d'un index / Max index lifetime (seconds)
+COMPATIBILITY_INDEX_TTL_SECONDS = 300
+
+# Capacité « n'est pas de ce type » par type de véhicule / "is not this type" capability per vehicle type
+_NOT_TYPE = {vt.value: 1 << bit for bit, vt in enumerate(VehicleType)}
+TYPE_BITS = sum(_NOT_TYPE.values())
+CAP_TAILGATE = 1 << len(_NOT_TYPE)
+CAP_NOT_FOLDABLE = CAP_TAILGATE << 1
+DOCK_BITS = CAP_TAILGATE | CAP_NOT_FOLDABLE
+_ALL_BITS = TYPE_BITS | DOCK_BITS
+
+# Modèles dont l'écriture invalide les index / Models invalidating the indexes
+_INDEXED_MODELS = (PDV, Contract)
+
+
+def _value(enum_or_str) -> str | None:
+    return enum_or_str.value if (enum_or_str and hasattr(enum_or_str, "value")) else enum_or_str
+
+
+def capabilities(vehicle) -> int:
+    """Capacité d'un contrat ou d'un objet équivalent (vehicle_type, has_tailgate,
+    tailgate_type) / Capability mask of a contract or duck-typed vehicle."""
+    caps = TYPE_BITS & ~_NOT_TYPE.get(_value(vehicle.vehicle_type), 0)
+    if vehicle.has_tailgate:
+        caps |= CAP_TAILGATE
+        if _value(vehicle.tailgate_type) != "RABATTABLE":
+            caps |= CAP_NOT_FOLDABLE
+    else:
+        caps |= CAP_NOT_FOLDABLE
+    return caps
+
+
+def requirements(pdv) -> int:
+    """Exigence d'un PDV (has_dock, dock_has_niche, allowed_vehicle_types) /
+    Requirement mask of a PDV. NULL allowed_vehicle_types = tous acceptés."""
+    req = 0
+    if pdv.allowed_vehicle_types:
+        allowed = set(pdv.allowed_vehicle_types.split("|"))
+        req |= sum(bit for vt, bit in _NOT_TYPE.items() if vt not in allowed)
+    if not pdv.has_dock:
+        # PDV sans quai → hayon obligatoire / No dock → tailgate required
+        req |= CAP_TAILGATE
+    elif not pdv.dock_has_niche:
+        # Quai sans niche : hayon rabattable interdit / Dock without niche: foldable tailgate forbidden
+        req |= CAP_NOT_FOLDABLE
+    return req
+
+
+def violations(required: int, caps: int) -> int:
+    """Bits d'exigence non couverts (0 = compatible) / Uncovered requirement bits (0 = compatible)."""
+    return required & ~caps
+
+
+@dataclass(frozen=True)
+class PDVCompat:
+    """Exigence d'un PDV et libellés des messages / PDV requirement and message labels."""
+    code: str
+    name: str
+    allowed: tuple[str, ...]
+    required: int
+
+
+def _pdv_entry(row) -> PDVCompat:
+    allowed = tuple(row.allowed_vehicle_types.split("|")) if row.allowed_vehicle_types else ()
+    return PDVCompat(code=row.code, name=row.name, allowed=allowed, required=requirements(row))
+
+
+_PDV_COLUMNS = (PDV.id, PDV.code, PDV.name, PDV.has_dock, PDV.dock_has_niche, PDV.allowed_vehicle_types)
+
+
+@dataclass
+class CompatibilityIndex:
+    """Exigences PDV et capacités contrats d'une société / A tenant's PDV requirements and contract capabilities."""
+    pdvs: dict[int, PDVCompat]
+    contract_ids: list[int]
+    # Par bit de capacité, ensemble (bits de position dans contract_ids) des contrats qui l'ont /
+    # Per capability bit, set (position bits in contract_ids) of contracts having it
+    holders: dict[int, int]
+
+    @classmethod
+    def build(cls, pdv_rows, contract_rows) -> "CompatibilityIndex":
+        contract_ids: list[int] = []
+        holders = {1 << bit: 0 for bit in range(_ALL_BITS.bit_length())}
+        for position, contract in enumerate(contract_rows):
+            contract_ids.append(contract.id)
+            caps = capabilities(contract)
+            for bit in holders:
+                if caps & bit:
+                    holders[bit] |= 1 << position
+        return cls(
+            pdvs={row.id: _pdv_entry(row) for row in pdv_rows},
+            contract_ids=contract_ids, holders=holders,
+        )
+
+    def required_for(self, pdv_ids) -> int:
+        """Exigence cumulée d'un ensemble de PDV (PDV inconnu : aucune) /
+        Combined requirement of PDVs (unknown PDV: none)."""
+        required = 0
+        for pdv_id in pdv_ids:
+            entry = self.pdvs.get(pdv_id)
+            if entry is not None:
+                required |= entry.required
+        return required
+
+    def eligible_contracts(self, required: int) -> set[int]:
+        """Contrats dont la capacité couvre `required`, tous d'un coup /
+        Contracts whose capability covers `required`, all at once."""
+        members = (1 << len(self.contract_ids)) - 1
+        bit = 1
+        while required and members:
+            if required & bit:
+                members &= self.holders[bit]
+                required &= ~bit
+            bit <<= 1
+        return {cid for position, cid in enumerate(self.contract_ids) if members >> position & 1}
+
+
+compatibility_cache = CommitInvalidatedCache(
+    "compatibility", _INDEXED_MODELS, COMPATIBILITY_INDEX_TTL_SECONDS,
+)
+
+
+async def load_compatibility_index(db: AsyncSession, pdv_ids=()) -> CompatibilityIndex:
+    """Index de la société de la session ; les `pdv_ids` absents (créés hors ORM
+    depuis le chargement) y sont ajoutés / Index of the session's tenant;
+    missing `pdv_ids` are added to it."""
+    tenant = None if db.info.get(TENANT_BYPASS) else db.info.get("tenant_id")
+    uncommitted = compatibility_cache.is_dirty(db) or any(
+        isinstance(obj, _INDEXED_MODELS) for obj in (*db.new, *db.dirty, *db.deleted)
+    )
+    index = None if uncommitted else compatibility_cache.get(tenant)
+    if index is None:
+        generation = compatibility_cache.generation()
+        pdv_rows = (await db.execute(select(*_PDV_COLUMNS))).all()
+        contract_rows = (await db.execute(
+            select(Contract.id, Contract.vehicle_type, Contract.has_tailgate, Contract.tailgate_type)
+            .order_by(Contract.id)
+        )).all()
+        index = CompatibilityIndex.build(pdv_rows, contract_rows)
+        if not uncommitted:
+            compatibility_cache.put(tenant, index, generation)
+
+    missing = {pid for pid in pdv_ids if pid not in index.pdvs}
+    if missing:
+        for row in (await db.execute(select(*_PDV_COLUMNS).where(PDV.id.in_(missing)))).all():
+            index.pdvs[row.id] = _pdv_entry(row)
+    return index
@@ -0,0 +1,129 @@
+"""Cache des appareils mobiles et regroupement de last_seen_at /
+Mobile device cache and last_seen_at write coalescing.
+
+Chaque requête mobile (lot GPS, scan, déclaration) relisait `MobileDevice` par
+`device_identifier` puis réécrivait `last_seen_at` : une ligne modifiée, donc
+un UPDATE + une entrée d'audit par requête et par téléphone.
+
+- Cache : instantané DÉTACHÉ de l'appareil (tenant, actif, profil…) indexé par
+  `device_identifier`, jamais modifié ; chaque requête en reçoit une copie
+  attachée à sa session (`merge(load=False)`, sans requête SQL). Invalidé au
+  COMMIT d'une écriture ORM sur `MobileDevice` (administration, enregistrement,
+  version d'application) et par TTL.
+- last_seen_at : noté en mémoire (`last_seen_buffer`) et écrit en lot, au plus
+  une fois par appareil et par `DEVICE_LAST_SEEN_FLUSH_SECONDS`, par un UPDATE
+  Core (hors audit ORM — c'est un battement de cœur, pas une modification
+  métier). Les lectures admin superposent les valeurs en attente.
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database import async_session
+from app.models.mobile_device import MobileDevice
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie max d'une entrée / Max entry lifetime (seconds)
+DEVICE_CACHE_TTL_SECONDS = 300
+# Nombre max d'entrées (LRU) / Max entries (LRU)
+DEVICE_CACHE_MAX_ENTRIES = 5000
+# Période d'écriture des last_seen_at en attente (s) / Pending last_seen_at write period (s)
+DEVICE_LAST_SEEN_FLUSH_SECONDS = 60
+
+
+device_cache = CommitInvalidatedCache(
+    "devices", (MobileDevice,), DEVICE_CACHE_TTL_SECONDS, DEVICE_CACHE_MAX_ENTRIES,
+)
+
+
+async def load_device(identifier: str) -> MobileDevice | None:
+    """Instantané détaché de l'appareil, depuis le cache ou la base (session
+    dédiée, sans filtre tenant) / Detached device snapshot, from cache or DB."""
+    device = device_cache.get(identifier)
+    if device is not None:
+        return device
+    generation = device_cache.generation()
+    async with async_session() as session:
+        device = (await session.execute(
+            select(MobileDevice).where(MobileDevice.device_identifier == identifier)
+        )).scalar_one_or_none()
+        if device is None:
+            return None
+        session.expunge(device)
+    device_cache.put(identifier, device, generation)
+    return device
+
+
+class LastSeenBuffer:
+    """last_seen_at en attente d'écriture / Pending last_seen_at writes."""
+
+    def __init__(self):
+        self._pending: dict[int, str] = {}
+
+    def touch(self, device_id: int, seen_at: str) -> None:
+        self._pending[device_id] = seen_at
+
+    def pending(self, device_id: int) -> str | None:
+        return self._pending.get(device_id)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Écrire les valeurs en attente en un seul UPDATE multi-lignes /
+        Write pending values in one executemany UPDATE."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        table = MobileDevice.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(last_seen_at=bindparam("b_seen"))
+        )
+        try:
+            await session.execute(stmt, [{"b_id": k, "b_seen": v} for k, v in batch.items()])
+            await session.commit()
+        except Exception:
+            # Remettre en attente sans écraser un battement plus récent /
+            # requeue without overwriting a newer heartbeat
+            for device_id, seen_at in batch.items():
+                self._pending.setdefault(device_id, seen_at)
+            raise
+        return len(batch)
+
+
+last_seen_buffer = LastSeenBuffer()
+
+
+def overlay_last_seen(devices) -> None:
+    """Superposer les last_seen_at en attente (sans rendre l'objet modifié) /
+    Overlay pending last_seen_at (without dirtying the object)."""
+    for device in devices:
+        seen_at = last_seen_buffer.pending(device.id)
+        if seen_at is not None:
+            set_committed_value(device, "last_seen_at", seen_at)
+
+
+async def flush_last_seen() -> int:
+    """Écrire maintenant les last_seen_at en attente / Write pending last_seen_at now."""
+    async with async_session() as session:
+        return await last_seen_buffer.flush(session)
+
+
+async def last_seen_scheduler(interval_seconds: int = DEVICE_LAST_SEEN_FLUSH_SECONDS) -> None:
+    """Boucle d'écriture des last_seen_at (tâche de fond) / last_seen_at write loop."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await flush_last_seen()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec d'écriture des last_seen_at (nouvelle tentative au prochain cycle)")
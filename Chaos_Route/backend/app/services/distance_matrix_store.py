@@ -0,0 +1,221 @@
+"""Distancier en mémoire, indexé et partagé par process / Process-wide in-memory distance matrix.
+
+Le distancier d'un tenant est chargé UNE fois (une seule requête) dans une
+structure compacte NumPy :
+- une table d'index dense par type de point (`BASE`, `PDV`, `SUPPLIER`...) :
+  tableau id → indice de ligne (-1 si absent) ;
+- une matrice `float32` des distances (NaN = paire inconnue) et une matrice
+  `int16` des durées en minutes (-1 = paire inconnue).
+
+Les lookups sont symétriques et en O(1) : l'entrée origine→destination est
+prioritaire, à défaut l'entrée inverse est utilisée (même sémantique que
+l'ancien `_get_distance` bidirectionnel).
+
+Invalidation (`CommitInvalidatedCache`) : toute écriture ORM sur
+`distance_matrix` est détectée au flush et le cache est vidé au COMMIT, donc
+jamais rechargé avec des données non validées. Les écritures Core (bulk
+insert/update) doivent appeler `mark_dirty(session)`. Un TTL borne la durée de
+vie d'un instantané (filet de sécurité pour les écritures hors process).
+"""
+
+import logging
+import time
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import TENANT_BYPASS
+from app.models.distance_matrix import DistanceMatrix
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+
+log = logging.getLogger(__name__)
+
+# Durée de vie max d'un instantané / Max snapshot lifetime (seconds)
+STORE_TTL_SECONDS = 300
+
+# Marqueurs « paire inconnue » / "unknown pair" markers
+MISSING_DURATION = -1
+_INT16_MAX = np.iinfo(np.int16).max
+
+
+class DistanceEntry(NamedTuple):
+    """Distance/durée d'un segment / Segment distance and duration."""
+    distance_km: float
+    duration_minutes: int
+
+
+class DistanceMatrixSnapshot:
+    """Instantané immuable du distancier d'un tenant / Immutable tenant distance matrix snapshot."""
+
+    __slots__ = ("index", "dist_km", "dur_min")
+
+    def __init__(
+        self,
+        index: dict[str, np.ndarray],
+        dist_km: np.ndarray,
+        dur_min: np.ndarray,
+    ):
+        self.index = index          # type de point → tableau dense id → indice
+        self.dist_km = dist_km      # float32 [n, n], NaN si inconnu
+        self.dur_min = dur_min      # int16 [n, n], -1 si inconnu
+
+    @classmethod
+    def from_rows(cls, rows) -> "DistanceMatrixSnapshot":
+        """Construire depuis des tuples (o_type, o_id, d_type, d_id, km, minutes) /
+        Build from (o_type, o_id, d_type, d_id, km, minutes) tuples."""
+        rows = list(rows)
+        ids_by_type: dict[str, set[int]] = {}
+        for o_type, o_id, d_type, d_id, _km, _min in rows:
+            ids_by_type.setdefault(o_type, set()).add(o_id)
+            ids_by_type.setdefault(d_type, set()).add(d_id)
+
+        index: dict[str, np.ndarray] = {}
+        offset = 0
+        for p_type in sorted(ids_by_type):
+            ids = np.fromiter(sorted(ids_by_type[p_type]), dtype=np.int64)
+            dense = np.full(int(ids.max()) + 1, -1, dtype=np.int32)
+            dense[ids] = np.arange(offset, offset + len(ids), dtype=np.int32)
+            index[p_type] = dense
+            offset += len(ids)
+
+        n = offset
+        dist_km = np.full((n, n), np.nan, dtype=np.float32)
+        dur_min = np.full((n, n), MISSING_DURATION, dtype=np.int16)
+        if rows:
+            src = np.fromiter((index[r[0]][r[1]] for r in rows), dtype=np.int64, count=len(rows))
+            dst = np.fromiter((index[r[2]][r[3]] for r in rows), dtype=np.int64, count=len(rows))
+            km = np.fromiter((float(r[4]) for r in rows), dtype=np.float32, count=len(rows))
+            minutes = np.fromiter((int(r[5] or 0) for r in rows), dtype=np.int64, count=len(rows))
+            minutes = np.clip(minutes, 0, _INT16_MAX).astype(np.int16)
+
+            # 1) sens saisi / as-entered direction
+            dist_km[src, dst] = km
+            dur_min[src, dst] = minutes
+            # 2) sens inverse seulement là où aucune entrée directe n'existe /
+            #    reverse direction only where no direct entry exists
+            rev = np.isnan(dist_km[dst, src])
+            dist_km[dst[rev], src[rev]] = km[rev]
+            dur_min[dst[rev], src[rev]] = minutes[rev]
+
+        return cls(index, dist_km, dur_min)
+
+    def __len__(self) -> int:
+        return self.dist_km.shape[0]
+
+    def node_index(self, p_type: str, p_id: int) -> int:
+        """Indice d'un point (-1 si absent) / Point index (-1 if unknown)."""
+        dense = self.index.get(p_type)
+        if dense is None or p_id is None or p_id < 0 or p_id >= len(dense):
+            return -1
+        return int(dense[p_id])
+
+    def lookup(
+        self, origin_type: str, origin_id: int, dest_type: str, dest_id: int,
+    ) -> DistanceEntry | None:
+        """Distance/durée symétrique en O(1) / O(1) symmetric lookup."""
+        i = self.node_index(origin_type, origin_id)
+        j = self.node_index(dest_type, dest_id)
+        if i < 0 or j < 0:
+            return None
+        dur = int(self.dur_min[i, j])
+        if dur == MISSING_DURATION:
+            return None
+        return DistanceEntry(float(self.dist_km[i, j]), dur)
+
+    def indices(self, points: list[tuple[str, int]]) -> np.ndarray:
+        """Indices d'une liste de points (-1 si absent) / Indices for a list of points."""
+        return np.fromiter(
+            (self.node_index(p_type, p_id) for p_type, p_id in points),
+            dtype=np.int64, count=len(points),
+        )
+
+    def submatrix(self, points: list[tuple[str, int]]) -> tuple[np.ndarray, np.ndarray]:
+        """Sous-matrices (km, minutes) pour une liste ordonnée de points /
+        (km, minutes) sub-matrices for an ordered list of points.
+
+        Les paires inconnues valent NaN (km) et -1 (minutes).
+        """
+        idx = self.indices(points)
+        n = len(points)
+        if len(self.dist_km) == 0:
+            # Distancier vide (ex. tenant sans distances) / empty distance matrix
+            return np.full((n, n), np.nan), np.full((n, n), MISSING_DURATION, dtype=np.int64)
+        known = idx >= 0
+        safe = np.where(known, idx, 0)
+        dist = self.dist_km[np.ix_(safe, safe)].astype(np.float64)
+        dur = self.dur_min[np.ix_(safe, safe)].astype(np.int64)
+        unknown = ~(known[:, None] & known[None, :])
+        dist[unknown] = np.nan
+        dur[unknown] = MISSING_DURATION
+        return dist, dur
+
+
+class DistanceMatrixStore:
+    """Cache process des instantanés par tenant / Process cache of per-tenant snapshots."""
+
+    def __init__(self, ttl_seconds: float = STORE_TTL_SECONDS):
+        self.snapshots = CommitInvalidatedCache("distance_matrix", (DistanceMatrix,), ttl_seconds)
+
+    @property
+    def generation(self) -> int:
+        """Compteur d'invalidations / Invalidation counter."""
+        return self.snapshots.generation()
+
+    @staticmethod
+    def _tenant_key(db: AsyncSession) -> int | None:
+        info = db.info
+        if info.get(TENANT_BYPASS):
+            return None
+        return info.get("tenant_id")
+
+    async def get(self, db: AsyncSession) -> DistanceMatrixSnapshot:
+        """Instantané du tenant de la session (chargé au besoin) /
+        Snapshot for the session's tenant (loaded on demand)."""
+        key = self._tenant_key(db)
+        snap = self.snapshots.get(key)
+        if snap is not None:
+            return snap
+        # Pas de verrou : deux chargements concurrents sont sans danger (le
+        # dernier gagne) / No lock: two concurrent loads are harmless.
+        generation = self.snapshots.generation()
+        started = time.perf_counter()
+        result = await db.execute(select(
+            DistanceMatrix.origin_type,
+            DistanceMatrix.origin_id,
+            DistanceMatrix.destination_type,
+            DistanceMatrix.destination_id,
+            DistanceMatrix.distance_km,
+            DistanceMatrix.duration_minutes,
+        ))
+        snap = DistanceMatrixSnapshot.from_rows(result.all())
+        # Une invalidation pendant le chargement, ou des écritures non validées
+        # dans cette session, rendent l'instantané douteux : on le sert à cet
+        # appelant sans le garder / A concurrent invalidation or uncommitted
+        # writes in this session make the snapshot suspect: serve once, don't keep.
+        if not self.snapshots.is_dirty(db):
+            self.snapshots.put(key, snap, generation)
+        log.info(
+            "Distance matrix loaded: tenant=%s, %d points, %.0f ms",
+            key, len(snap), (time.perf_counter() - started) * 1000,
+        )
+        return snap
+
+    def invalidate(self) -> None:
+        """Vider tous les instantanés / Drop every snapshot."""
+        self.snapshots.invalidate()
+
+
+distance_store = DistanceMatrixStore()
+
+
+async def get_distance_snapshot(db: AsyncSession) -> DistanceMatrixSnapshot:
+    """Raccourci vers le store process / Shortcut to the process store."""
+    return await distance_store.get(db)
+
+
+def mark_dirty(session) -> None:
+    """Signaler une écriture hors ORM sur le distancier (invalidation au commit) /
+    Flag a non-ORM write to the distance matrix (invalidated on commit)."""
+    distance_store.snapshots.mark_dirty(session)
@@ -3,7 +3,7 @@ Service de calcul des distances / Distance calculation service.
 Utilise le distancier ou les coordonnées lat/lon.
 """
 
-import math
+from app.utils.geo import ROAD_FACTOR, haversine
 
 
 class DistanceService:
@@ -15,18 +15,10 @@ class DistanceService:
         Calcul de distance à vol d'oiseau (Haversine) / Haversine distance calculation.
         Retourne la distance en km.
         """
-        R = 6371.0  # rayon de la Terre en km / Earth radius in km
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        a = (
-            math.sin(dlat / 2) ** 2
-            + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
-        )
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return round(R * c, 2)
+        return round(haversine(lat1, lon1, lat2, lon2), 2)
 
     @staticmethod
-    def estimate_road_distance(haversine_km: float, factor: float = 1.3) -> float:
+    def estimate_road_distance(haversine_km: float, factor: float = ROAD_FACTOR) -> float:
         """
         Estimation de la distance routière / Estimate road distance.
         Facteur multiplicateur par défaut: 1.3 (routes sinueuses).
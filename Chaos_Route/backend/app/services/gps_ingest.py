@@ -0,0 +1,179 @@
+"""Ingestion GPS à haut débit / High-throughput GPS ingestion.
+
+Chaque lot GPS (toutes les 2 s par téléphone) relisait l'affectation
+appareil/tour, le dernier consentement et le tour, puis créait un objet ORM
+par point. Le pipeline :
+- contexte (affecté ?, opt-out ?, code tour, chauffeur, base) mis en cache par
+  (appareil, tour) ; invalidé au COMMIT d'une écriture ORM sur
+  `DeviceAssignment`, `ConsentRecord` ou `Tour` (un opt-out reste immédiat),
+  et par TTL ;
+- insertion Core : INSERT multi-lignes par paquets, ou `COPY` asyncpg
+  (`copy_records_to_table`) au-delà de `GPS_COPY_MIN_ROWS` lignes sur
+  PostgreSQL. Hors ORM : le tenant est posé explicitement (celui de
+  l'appareil) ; `gps_positions` est de toute façon exclue de l'audit. La
+  dernière position de chaque tour est reportée dans `tour_live_states`
+  (`services/live_state.py`) dans la même transaction, et les traces
+  simplifiées dépassées par un lot en retard sont supprimées
+  (`services/gps_trails.py`) ;
+- tampon d'écriture différée optionnel (`GPS_WRITE_BEHIND_MS` > 0) : les lots
+  de tous les appareils sont regroupés en une insertion toutes les N ms. Un
+  tampon plein (`GPS_WRITE_BEHIND_MAX_ROWS`) repasse en insertion directe.
+  Contrepartie : les positions en attente sont perdues si le process tombe.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models.consent_record import ConsentRecord
+from app.models.device_assignment import DeviceAssignment
+from app.models.gps_position import GPSPosition
+from app.models.tour import Tour
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+from app.services.consent import GPS_TRACKING, get_latest_consent
+from app.services.gps_trails import invalidate_trails
+from app.services.live_state import record_positions
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie max d'un contexte (s) / Max context lifetime (s)
+GPS_CONTEXT_TTL_SECONDS = 60
+# Nombre max de contextes (LRU) / Max contexts (LRU)
+GPS_CONTEXT_MAX_ENTRIES = 20_000
+# Lignes par INSERT multi-lignes (limite de paramètres SQLite/PG) /
+# Rows per multi-row INSERT (SQLite/PG bind parameter limit)
+GPS_INSERT_CHUNK_ROWS = 1000
+# Seuil de passage au COPY asyncpg / asyncpg COPY threshold
+GPS_COPY_MIN_ROWS = 200
+
+GPS_COLUMNS = ("device_id", "tour_id", "latitude", "longitude", "accuracy", "speed", "timestamp", "tenant_id")
+
+# Modèles dont l'écriture invalide les contextes / Models invalidating contexts
+_CONTEXT_MODELS = (DeviceAssignment, ConsentRecord, Tour)
+
+
+@dataclass(frozen=True)
+class GpsContext:
+    """Contexte d'ingestion d'un (appareil, tour) / Ingestion context of a (device, tour)."""
+    assigned: bool
+    opted_out: bool
+    tour_code: str
+    driver_name: str
+    base_id: int | None = None
+
+
+gps_context_cache = CommitInvalidatedCache(
+    "gps_context", _CONTEXT_MODELS, GPS_CONTEXT_TTL_SECONDS, GPS_CONTEXT_MAX_ENTRIES,
+)
+
+
+async def load_gps_context(db: AsyncSession, device_id: int, tour_id: int) -> GpsContext:
+    """Contexte depuis le cache ou la base (session de la requête, donc
+    cloisonnée au tenant de l'appareil) / Context from cache or database."""
+    key = (device_id, tour_id)
+    context = gps_context_cache.get(key)
+    if context is not None:
+        return context
+    generation = gps_context_cache.generation()
+    assigned = (await db.execute(
+        select(DeviceAssignment.id).where(
+            DeviceAssignment.tour_id == tour_id,
+            DeviceAssignment.device_id == device_id,
+        ).limit(1)
+    )).first() is not None
+    consent = await get_latest_consent(db, GPS_TRACKING, device_id=device_id)
+    tour = (await db.execute(select(Tour.code, Tour.driver_name, Tour.base_id).where(Tour.id == tour_id))).first()
+    context = GpsContext(
+        assigned=assigned,
+        opted_out=consent is not None and not consent.granted,
+        tour_code=tour.code if tour else "",
+        driver_name=(tour.driver_name or "") if tour else "",
+        base_id=tour.base_id if tour else None,
+    )
+    gps_context_cache.put(key, context, generation)
+    return context
+
+
+async def insert_positions(session: AsyncSession, rows: list[dict]) -> int:
+    """Insérer des positions (dicts aux clés `GPS_COLUMNS`) hors ORM /
+    Insert positions (dicts keyed by `GPS_COLUMNS`) outside the ORM."""
+    if not rows:
+        return 0
+    conn = await session.connection()
+    if conn.dialect.driver == "asyncpg" and len(rows) >= GPS_COPY_MIN_ROWS:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            GPSPosition.__tablename__,
+            records=[tuple(row[c] for c in GPS_COLUMNS) for row in rows],
+            columns=list(GPS_COLUMNS),
+        )
+    else:
+        table = GPSPosition.__table__
+        for start in range(0, len(rows), GPS_INSERT_CHUNK_ROWS):
+            await session.execute(insert(table).values(rows[start:start + GPS_INSERT_CHUNK_ROWS]))
+    await record_positions(session, rows)
+    await invalidate_trails(session, rows)
+    return len(rows)
+
+
+class GpsWriteBuffer:
+    """Positions en attente d'insertion groupée / Positions pending a grouped insert."""
+
+    def __init__(self):
+        self._rows: list[dict] = []
+
+    @property
+    def enabled(self) -> bool:
+        return settings.GPS_WRITE_BEHIND_MS > 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, rows: list[dict]) -> bool:
+        """Mettre en attente ; False si le tampon est plein (insérer directement) /
+        Queue rows; False when the buffer is full (insert directly)."""
+        if len(self._rows) + len(rows) > settings.GPS_WRITE_BEHIND_MAX_ROWS:
+            return False
+        self._rows.extend(rows)
+        return True
+
+    async def flush(self) -> int:
+        """Insérer toutes les positions en attente en une transaction /
+        Insert every pending position in one transaction."""
+        if not self._rows:
+            return 0
+        batch, self._rows = self._rows, []
+        try:
+            async with async_session() as session:
+                await insert_positions(session, batch)
+                await session.commit()
+        except Exception:
+            # Remettre en tête, dans la limite du tampon / requeue, within the buffer limit
+            requeued = batch + self._rows
+            overflow = len(requeued) - settings.GPS_WRITE_BEHIND_MAX_ROWS
+            if overflow > 0:
+                logger.error("Tampon GPS plein : %d positions abandonnées", overflow)
+                requeued = requeued[overflow:]
+            self._rows = requeued
+            raise
+        return len(batch)
+
+
+gps_write_buffer = GpsWriteBuffer()
+
+
+async def gps_write_behind_scheduler() -> None:
+    """Boucle d'insertion groupée (tâche de fond) / Grouped insert loop (background task)."""
+    while True:
+        await asyncio.sleep(settings.GPS_WRITE_BEHIND_MS / 1000)
+        try:
+            await gps_write_buffer.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec d'insertion du tampon GPS (nouvelle tentative au prochain cycle)")
@@ -0,0 +1,161 @@
+"""Partitionnement journalier de gps_positions / Daily partitioning of gps_positions.
+
+PostgreSQL : `gps_positions` devient une table partitionnée par plage sur
+`timestamp` (ISO 8601, collation "C" : l'ordre lexicographique est l'ordre
+chronologique), une partition par jour `gps_positions_pAAAAMMJJ` plus une
+partition DEFAULT pour les horodatages hors plage. La rétention supprime des
+partitions entières (DETACH CONCURRENTLY puis DROP TABLE, une transaction par
+partition, sans balayage ni VACUUM) au lieu d'un DELETE par plage ; seul le
+jour à cheval sur la date limite est purgé ligne à ligne.
+
+La conversion d'une table existante (non partitionnée) est faite une fois au
+démarrage (`init_db`), dans une transaction : renommage, création de la table
+partitionnée (même séquence d'ids), partitions couvrant les données, copie.
+
+SQLite (tests, dev) : table simple, la rétention garde le DELETE par plage.
+"""
+
+import logging
+from datetime import date, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+TABLE = "gps_positions"
+# Partitions créées d'avance (jours) / Partitions created ahead (days)
+GPS_PARTITION_DAYS_AHEAD = 7
+# Partitions créées en arrière (lots différés des téléphones) / Created behind (late phone batches)
+GPS_PARTITION_DAYS_BEHIND = 2
+
+_PARTITION_PREFIX = f"{TABLE}_p"
+
+
+def partition_name(day: date) -> str:
+    return f"{_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    """gps_positions est-elle partitionnée ? (toujours False hors PostgreSQL) /
+    Is gps_positions partitioned? (always False outside PostgreSQL)"""
+    if conn.dialect.name != "postgresql":
+        return False
+    kind = (await conn.execute(text(
+        "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:t)"
+    ), {"t": TABLE})).scalar_one_or_none()
+    return kind == "p"
+
+
+async def ensure_partitions(conn: AsyncConnection, first: date, last: date) -> int:
+    """Créer les partitions journalières manquantes de `first` à `last` inclus.
+    Une partition dont la plage a déjà des lignes dans DEFAULT est ignorée
+    (journalisée) / Create missing daily partitions from first to last."""
+    existing = await _partition_days(conn)
+    created = 0
+    day = first
+    while day <= last:
+        if day not in existing:
+            try:
+                async with conn.begin_nested():
+                    await conn.execute(text(
+                        f'CREATE TABLE IF NOT EXISTS "{partition_name(day)}" PARTITION OF {TABLE} '
+                        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                    ))
+                created += 1
+            except Exception as e:
+                logger.warning("Partition GPS %s non créée : %s", partition_name(day), e)
+        day += timedelta(days=1)
+    return created
+
+
+async def drop_partitions_before(engine: AsyncEngine, cutoff: date) -> int:
+    """Supprimer les partitions entièrement antérieures à `cutoff`, une à une
+    (connexion dédiée en autocommit) : `DETACH PARTITION CONCURRENTLY` ne
+    bloque pas les insertions GPS, puis `DROP TABLE` de la table détachée.
+    Retourne le nombre ESTIMÉ de lignes supprimées (`pg_class.reltuples`, sans
+    balayage) / Drop partitions entirely before cutoff, one at a time, without
+    blocking GPS inserts; returns the estimated number of removed rows."""
+    removed = 0
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for day in sorted(await _partition_days(conn)):
+            if day + timedelta(days=1) > cutoff:
+                break
+            name = partition_name(day)
+            estimate = (await conn.execute(text(
+                "SELECT reltuples FROM pg_class WHERE oid = to_regclass(:t)"
+            ), {"t": name})).scalar_one_or_none()
+            await conn.execute(text(f'ALTER TABLE {TABLE} DETACH PARTITION "{name}" CONCURRENTLY'))
+            await conn.execute(text(f'DROP TABLE "{name}"'))
+            removed += max(int(estimate or 0), 0)
+    return removed
+
+
+async def maintain_partitions(conn: AsyncConnection, today: date | None = None) -> int:
+    """Partitions d'hier à J+N (démarrage, purge quotidienne) /
+    Partitions from yesterday to D+N (startup, daily purge)."""
+    today = today or date.today()
+    return await ensure_partitions(
+        conn, today - timedelta(days=GPS_PARTITION_DAYS_BEHIND), today + timedelta(days=GPS_PARTITION_DAYS_AHEAD),
+    )
+
+
+async def convert_to_partitioned(conn: AsyncConnection) -> int:
+    """Convertir la table existante en table partitionnée (une fois, PostgreSQL) ;
+    retourne le nombre de lignes migrées / Convert the plain table (once, PostgreSQL)."""
+    legacy = f"{TABLE}_legacy"
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {legacy}"))
+    await conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {TABLE}_pkey TO {legacy}_pkey"))
+    for index in ("ix_gps_positions_tour_timestamp", "ix_gps_positions_tenant_id"):
+        await conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index.replace(TABLE, legacy)}"))
+    await conn.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE"))
+    await conn.execute(text(
+        f"CREATE TABLE {TABLE} ("
+        f"id INTEGER NOT NULL DEFAULT nextval('{TABLE}_id_seq'), "
+        "device_id INTEGER NOT NULL REFERENCES mobile_devices(id), "
+        "tour_id INTEGER NOT NULL REFERENCES tours(id), "
+        "latitude DOUBLE PRECISION NOT NULL, "
+        "longitude DOUBLE PRECISION NOT NULL, "
+        "accuracy DOUBLE PRECISION, "
+        "speed DOUBLE PRECISION, "
+        'timestamp VARCHAR(32) COLLATE "C" NOT NULL, '
+        "tenant_id INTEGER REFERENCES tenants(id), "
+        "PRIMARY KEY (id, timestamp)"
+        ") PARTITION BY RANGE (timestamp)"
+    ))
+    await conn.execute(text(f"CREATE INDEX ix_gps_positions_tour_timestamp ON {TABLE} (tour_id, timestamp)"))
+    await conn.execute(text(f"CREATE INDEX ix_gps_positions_tenant_id ON {TABLE} (tenant_id)"))
+    await conn.execute(text(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+
+    bounds = (await conn.execute(text(
+        f"SELECT min(substr(timestamp, 1, 10)), max(substr(timestamp, 1, 10)) FROM {legacy} "
+        "WHERE timestamp ~ '^\\d{4}-\\d{2}-\\d{2}'"
+    ))).one()
+    today = date.today()
+    first = today - timedelta(days=GPS_PARTITION_DAYS_BEHIND)
+    if bounds[0]:
+        first = min(first, date.fromisoformat(bounds[0]))
+    await ensure_partitions(conn, first, today + timedelta(days=GPS_PARTITION_DAYS_AHEAD))
+
+    moved = (await conn.execute(text(
+        f"INSERT INTO {TABLE} (id, device_id, tour_id, latitude, longitude, accuracy, speed, timestamp, tenant_id) "
+        f"SELECT id, device_id, tour_id, latitude, longitude, accuracy, speed, timestamp, tenant_id FROM {legacy}"
+    ))).rowcount
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+    await conn.execute(text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id"))
+    return moved or 0
+
+
+async def _partition_days(conn: AsyncConnection) -> set[date]:
+    """Jours des partitions journalières existantes / Days of existing daily partitions."""
+    names = (await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": TABLE})).scalars().all()
+    days = set()
+    for name in names:
+        suffix = name[len(_PARTITION_PREFIX):] if name.startswith(_PARTITION_PREFIX) else ""
+        if len(suffix) == 8 and suffix.isdigit():
+            days.add(date(int(suffix[:4]), int(suffix[4:6]), int(suffix[6:])))
+    return days
@@ -0,0 +1,234 @@
+"""Traces GPS simplifiées des tours / Simplified tour GPS trails.
+
+`GET /api/tracking/tour/{id}/trail` renvoyait tous les points bruts du tour
+(un point toutes les quelques secondes : plusieurs milliers de points, des
+mégaoctets de JSON pour une polyligne). La trace est désormais simplifiée
+(Douglas–Peucker, projection équirectangulaire locale) à trois niveaux de
+détail (`TRAIL_LEVELS`, tolérance en mètres) et stockée dans `gps_trails` :
+- calcul à la première lecture, tous niveaux d'un coup (une seule lecture des
+  points bruts) ;
+- réutilisée tant que la dernière position du tour (état temps réel,
+  `services/live_state.py`) est celle de la trace ; sinon (tour en cours)
+  PROLONGÉE : seuls les points postérieurs sont lus, et seule la fin de la
+  trace (dernier point gardé + nouveaux points) est simplifiée ;
+- un lot GPS en retard (points antérieurs à la trace) supprime la trace du
+  tour (`invalidate_trails`, même transaction que l'insertion) ;
+- la simplification (CPU, Python pur) tourne dans un thread
+  (`asyncio.to_thread`), pas sur la boucle d'événements.
+
+Le modal de trace colore les segments selon l'écart entre points (> 5 min =
+inactif) : la simplification garde les deux extrémités de chaque écart brut
+supérieur à `TRAIL_GAP_SECONDS` et n'espace jamais deux points gardés de plus
+de `TRAIL_MAX_INTERVAL_SECONDS`, donc les durées actives / inactives sont
+inchangées. Le niveau `raw` renvoie toujours les points bruts.
+"""
+
+import asyncio
+import json
+import math
+from datetime import datetime
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.gps_position import GPSPosition
+from app.models.gps_trail import GPSTrail
+from app.services.live_state import load_live_states
+
+# Tolérance Douglas–Peucker par niveau (m) / Douglas–Peucker tolerance per level (m)
+TRAIL_LEVELS = {"overview": 25.0, "standard": 5.0, "fine": 1.0}
+# Écart max entre deux points gardés (s), sous le seuil d'inactivité du modal (300 s) /
+# Max spacing between kept points (s), below the modal's inactivity threshold (300 s)
+TRAIL_MAX_INTERVAL_SECONDS = 120
+# Écart brut dont les deux extrémités sont toujours gardées (s) / Raw gap whose ends are always kept (s)
+TRAIL_GAP_SECONDS = 300
+
+_EARTH_RADIUS_M = 6_371_000.0
+# Colonnes d'un point compact / Compact point columns
+_POINT_FIELDS = ("id", "device_id", "latitude", "longitude", "accuracy", "speed", "timestamp")
+
+
+def _epoch(timestamp: str) -> float | None:
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def _douglas_peucker(xy: list[tuple[float, float]], first: int, last: int, tolerance: float, keep: list[bool]) -> None:
+    """Marquer les points gardés entre `first` et `last` (itératif) /
+    Mark kept points between first and last (iterative)."""
+    stack = [(first, last)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        (x1, y1), (x2, y2) = xy[start], xy[end]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        worst, worst_distance = -1, tolerance
+        for k in range(start + 1, end):
+            px, py = xy[k]
+            if length == 0.0:
+                distance = math.hypot(px - x1, py - y1)
+            else:
+                distance = abs(dy * px - dx * py + x2 * y1 - y2 * x1) / length
+            if distance > worst_distance:
+                worst, worst_distance = k, distance
+        if worst >= 0:
+            keep[worst] = True
+            stack.append((start, worst))
+            stack.append((worst, end))
+
+
+def simplify(
+    points: list[list],
+    tolerance_m: float,
+    max_interval_s: float = TRAIL_MAX_INTERVAL_SECONDS,
+) -> list[list]:
+    """Simplifier une trace triée par horodatage (points compacts `_POINT_FIELDS`) /
+    Simplify a timestamp-ordered trail (compact `_POINT_FIELDS` points)."""
+    n = len(points)
+    if n <= 2:
+        return list(points)
+    lat0 = math.radians(sum(p[2] for p in points) / n)
+    scale_x = _EARTH_RADIUS_M * math.cos(lat0)
+    xy = [(math.radians(p[3]) * scale_x, math.radians(p[2]) * _EARTH_RADIUS_M) for p in points]
+    times = [_epoch(p[6]) for p in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    # Segments continus : coupés aux écarts bruts et aux horodatages illisibles /
+    # Continuous runs: split at raw gaps and unreadable timestamps
+    start = 0
+    for k in range(1, n):
+        if times[k] is None or times[k - 1] is None or times[k] - times[k - 1] > TRAIL_GAP_SECONDS:
+            keep[k - 1] = keep[k] = True
+            _douglas_peucker(xy, start, k - 1, tolerance_m, keep)
+            start = k
+    _douglas_peucker(xy, start, n - 1, tolerance_m, keep)
+
+    # Espacement max : dernier point brut à moins de max_interval du précédent gardé /
+    # Max spacing: last raw point within max_interval of the previous kept one
+    last_kept = 0
+    for k in range(1, n):
+        if keep[k]:
+            last_kept = k
+        elif times[k + 1] is not None and times[last_kept] is not None \
+                and times[k + 1] - times[last_kept] > max_interval_s:
+            keep[k] = True
+            last_kept = k
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+def _read_points(points: str) -> list[dict]:
+    return [dict(zip(_POINT_FIELDS, p)) for p in json.loads(points)]
+
+
+def _upsert(dialect_name: str):
+    """INSERT … ON CONFLICT du dialecte / Dialect INSERT … ON CONFLICT."""
+    return (pg_insert if dialect_name == "postgresql" else sqlite_insert)(GPSTrail.__table__)
+
+
+def _simplify_levels(raw: list[list]) -> dict[str, list[list]]:
+    """Tous les niveaux d'une trace (CPU : hors boucle d'événements) /
+    Every level of a trail (CPU-bound: off the event loop)."""
+    return {name: simplify(raw, tolerance) for name, tolerance in TRAIL_LEVELS.items()}
+
+
+def _extend_levels(stored: dict[str, str], new: list[list]) -> dict[str, list[list]]:
+    """Prolonger chaque niveau avec des points postérieurs : seule la fin
+    (dernier point gardé, toujours le dernier point brut, puis les nouveaux) est
+    simplifiée / Extend each level with later points: only the tail (last kept
+    point, always the last raw point, then the new ones) is simplified."""
+    extended = {}
+    for name, tolerance in TRAIL_LEVELS.items():
+        points = json.loads(stored[name])
+        extended[name] = points + simplify([points[-1], *new], tolerance)[1:]
+    return extended
+
+
+async def _read_raw(db: AsyncSession, tour_id: int, after: str | None = None) -> list:
+    query = (
+        select(*(getattr(GPSPosition, f) for f in _POINT_FIELDS), GPSPosition.tenant_id)
+        .where(GPSPosition.tour_id == tour_id)
+        .order_by(GPSPosition.timestamp, GPSPosition.id)
+    )
+    if after is not None:
+        query = query.where(GPSPosition.timestamp > after)
+    return (await db.execute(query)).all()
+
+
+async def load_trail(db: AsyncSession, tour_id: int, level: str = "standard") -> list[dict]:
+    """Trace d'un tour au niveau demandé (`raw` = points bruts), triée par
+    horodatage (session de la requête, donc cloisonnée au tenant). Un tour en
+    cours ne relit que ses points postérieurs à la trace stockée /
+    Trail of a tour at the requested level, ordered by timestamp; an active
+    tour only reads its points after the stored trail."""
+    if level == "raw":
+        result = await db.execute(
+            select(GPSPosition).where(GPSPosition.tour_id == tour_id).order_by(GPSPosition.timestamp)
+        )
+        return [{f: getattr(p, f) for f in (*_POINT_FIELDS, "tour_id")} for p in result.scalars()]
+
+    state = (await load_live_states(db, [tour_id])).get(tour_id)
+    last_timestamp = state.timestamp if state is not None else None
+    stored = {}
+    if last_timestamp is not None:
+        stored = {row.level: row for row in (await db.execute(
+            select(GPSTrail.level, GPSTrail.points, GPSTrail.source_count, GPSTrail.source_last_timestamp)
+            .where(GPSTrail.tour_id == tour_id)
+        )).all()}
+        current = stored.get(level)
+        if current is not None and current.source_last_timestamp == last_timestamp:
+            return [{**p, "tour_id": tour_id} for p in _read_points(current.points)]
+
+    # Niveaux écrits ensemble : prolongeables si tous présents et au même point /
+    # Levels are written together: extendable when all present at the same point
+    ends = {row.source_last_timestamp for row in stored.values()}
+    after = ends.pop() if set(stored) == set(TRAIL_LEVELS) and len(ends) == 1 else None
+    rows = await _read_raw(db, tour_id, after) if after is not None and after < last_timestamp else []
+    if rows:
+        new = [list(row[:len(_POINT_FIELDS)]) for row in rows]
+        trails = await asyncio.to_thread(_extend_levels, {name: row.points for name, row in stored.items()}, new)
+        source_count = stored[level].source_count + len(new)
+    else:
+        rows = await _read_raw(db, tour_id)
+        if not rows:
+            return []
+        raw = [list(row[:len(_POINT_FIELDS)]) for row in rows]
+        trails = await asyncio.to_thread(_simplify_levels, raw)
+        source_count = len(raw)
+
+    # Hors ORM : tenant posé explicitement (celui des positions) / Outside the ORM: explicit tenant
+    conn = await db.connection()
+    stmt = _upsert(conn.dialect.name).values([
+        {"tour_id": tour_id, "level": name, "tenant_id": rows[-1].tenant_id,
+         "points": json.dumps(points, separators=(",", ":")), "point_count": len(points),
+         "source_count": source_count, "source_last_timestamp": rows[-1].timestamp}
+        for name, points in trails.items()
+    ])
+    await conn.execute(stmt.on_conflict_do_update(
+        index_elements=[GPSTrail.__table__.c.tour_id, GPSTrail.__table__.c.level],
+        set_={c: stmt.excluded[c] for c in ("points", "point_count", "source_count", "source_last_timestamp")},
+    ))
+    return [{**dict(zip(_POINT_FIELDS, p)), "tour_id": tour_id} for p in trails.get(level, [])]
+
+
+async def invalidate_trails(session: AsyncSession, rows: list[dict]) -> None:
+    """Supprimer les traces antérieures à des points reçus en retard (dicts de
+    `gps_ingest.GPS_COLUMNS`) / Drop trails older than late-arriving points."""
+    oldest: dict[int, str] = {}
+    for row in rows:
+        current = oldest.get(row["tour_id"])
+        if current is None or row["timestamp"] < current:
+            oldest[row["tour_id"]] = row["timestamp"]
+    if not oldest:
+        return
+    conn = await session.connection()
+    await conn.execute(delete(GPSTrail.__table__).where(or_(*(
+        (GPSTrail.tour_id == tour_id) & (GPSTrail.source_last_timestamp > timestamp)
+        for tour_id, timestamp in oldest.items()
+    ))))
@@ -0,0 +1,105 @@
+"""Suivi de progression des imports longs / Long-running import progress tracking.
+
+Le client fournit un identifiant `progress_id` à l'upload, puis interroge
+`GET /imports/progress/{progress_id}` pendant que la requête d'import tourne.
+Chaque entrée est indexée par (utilisateur, `progress_id`) : un appelant ne
+peut ni lire ni écraser l'entrée d'un autre utilisateur, même avec le même
+identifiant. Elle expire après `PROGRESS_TTL_SECONDS`.
+
+PLUSIEURS WORKERS : le registre est local au process, mais chaque changement
+de phase (et au plus un avancement par `PROGRESS_SHARE_SECONDS`) est relayé
+aux autres workers par un signal du bus de suivi (`services/tracking_bus.py`) ;
+l'interrogation peut donc tomber sur n'importe quel worker. Pas de ligne en
+base : l'import écrit dans une transaction ouverte pendant tout le suivi.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+from app.services.tracking_bus import on_signal, send_signal
+
+# Durée de conservation d'une entrée terminée ou abandonnée / Entry lifetime (seconds)
+PROGRESS_TTL_SECONDS = 3600
+# Intervalle min entre deux relais d'avancement aux autres workers / Min interval between relayed updates
+PROGRESS_SHARE_SECONDS = 0.5
+
+_SIGNAL = "import_progress"
+_TERMINAL_PHASES = frozenset({"done", "error"})
+
+
+@dataclass
+class ImportProgress:
+    """État d'avancement d'un import / Import progress state."""
+    user_id: int
+    progress_id: str
+    phase: str = "reading"       # reading, resolving, writing, done, error
+    total: int = 0               # cellules à écrire / cells to write
+    done: int = 0
+    message: str | None = None
+    updated_at: float = field(default_factory=time.monotonic)
+    shared_at: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "phase": self.phase,
+            "total": self.total,
+            "done": self.done,
+            "message": self.message,
+            "percent": round(100 * self.done / self.total, 1) if self.total else 0.0,
+        }
+
+
+_registry: dict[tuple[int, str], ImportProgress] = {}
+
+
+def _purge_expired() -> None:
+    now = time.monotonic()
+    for key in [k for k, p in _registry.items() if now - p.updated_at > PROGRESS_TTL_SECONDS]:
+        _registry.pop(key, None)
+
+
+def _share(progress: ImportProgress) -> None:
+    progress.shared_at = time.monotonic()
+    send_signal(_SIGNAL, {"user_id": progress.user_id, "progress_id": progress.progress_id,
+                          "phase": progress.phase, "total": progress.total, "done": progress.done,
+                          "message": progress.message})
+
+
+def _apply_remote(payload: dict) -> None:
+    """Entrée relayée par un autre worker / Entry relayed by another worker."""
+    _purge_expired()
+    progress = ImportProgress(**payload)
+    _registry[(progress.user_id, progress.progress_id)] = progress
+
+
+on_signal(_SIGNAL, _apply_remote)
+
+
+def start_progress(progress_id: str | None, user_id: int) -> ImportProgress | None:
+    """Créer l'entrée de suivi (None si le client n'en demande pas) /
+    Create a tracking entry (None when the client did not ask for one)."""
+    if not progress_id:
+        return None
+    _purge_expired()
+    progress = ImportProgress(user_id=user_id, progress_id=progress_id)
+    _registry[(user_id, progress_id)] = progress
+    _share(progress)
+    return progress
+
+
+def update_progress(progress: ImportProgress | None, **changes) -> None:
+    """Mettre à jour une entrée (no-op si suivi désactivé) / Update an entry (no-op if untracked)."""
+    if progress is None:
+        return
+    phase = progress.phase
+    for key, value in changes.items():
+        setattr(progress, key, value)
+    progress.updated_at = time.monotonic()
+    if (progress.phase != phase or progress.phase in _TERMINAL_PHASES
+            or progress.updated_at - progress.shared_at >= PROGRESS_SHARE_SECONDS):
+        _share(progress)
+
+
+def get_progress(progress_id: str, user_id: int) -> ImportProgress | None:
+    """Lire une entrée appartenant à l'utilisateur / Read an entry owned by the user."""
+    return _registry.get((user_id, progress_id))
@@ -0,0 +1,195 @@
+"""
+Moteur Niveau 1 incrémental / Incremental Level 1 engine.
+
+Construction des tours par plus proche voisin, en O(N²) au lieu de O(N³) :
+- listes de voisins précalculées depuis la matrice de distances (les
+  `NEIGHBOUR_LIST_SIZE` plus proches de chaque PDV, triés) ; au-delà, un
+  argmin vectorisé sur les PDV restants ;
+- état courant du tour tenu à jour (dernier nœud, charge, durée cumulée) :
+  tester un candidat coûte O(1) au lieu de recalculer tout le tour.
+
+Post-optimisation optionnelle (2-opt / Or-opt) sous budget de temps, sur la
+distance du tour, en respectant un découpage en blocs (SAS d'abord).
+
+Nœud 0 = base, nœuds 1..n = PDV. Distance inconnue = `UNKNOWN_DISTANCE_KM`
+(même pénalité que l'ancien `dist_cache.get(key, 9999)`).
+"""
+
+import time
+
+import numpy as np
+
+UNKNOWN_DISTANCE_KM = 9999.0
+NEIGHBOUR_LIST_SIZE = 64
+
+# Longueurs de segments déplacés par Or-opt / Or-opt segment lengths
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3)
+
+
+class Level1Engine:
+    """Construction plus-proche-voisin incrémentale / Incremental nearest-neighbour builder."""
+
+    def __init__(
+        self,
+        dist_km: np.ndarray,
+        travel_min: np.ndarray,
+        service_min: np.ndarray,
+        demand: np.ndarray,
+    ):
+        self.dist = np.where(np.isnan(dist_km), UNKNOWN_DISTANCE_KM, dist_km).astype(np.float64)
+        self.travel = travel_min.astype(np.float64)
+        self.service = service_min.astype(np.float64)
+        self.demand = demand.astype(np.float64)
+        self.n = len(self.dist) - 1
+        self._dist_list = self.dist.tolist()
+        self._neighbours = self._neighbour_lists()
+
+    def _neighbour_lists(self) -> list[list[int]]:
+        """k plus proches PDV de chaque nœud, à égalité l'indice le plus bas /
+        k nearest PDVs of every node, ties broken by lowest index."""
+        n = self.n
+        k = min(NEIGHBOUR_LIST_SIZE, n)
+        if k == 0:
+            return [[] for _ in range(n + 1)]
+        d = self.dist[:, 1:].copy()
+        d[np.arange(1, n + 1), np.arange(n)] = np.inf  # soi-même / self
+        if k < n:
+            part = np.argpartition(d, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(n), (n + 1, 1))
+        part_d = np.take_along_axis(d, part, axis=1)
+        order = np.lexsort((part, part_d), axis=1)
+        return (np.take_along_axis(part, order, axis=1) + 1).tolist()
+
+    def build_routes(self, capacity: float, max_minutes: float) -> list[list[int]]:
+        """Tours par plus proche voisin / Nearest-neighbour tours.
+
+        Graine = PDV restant le plus loin de la base ; on ajoute le plus proche
+        voisin du dernier arrêt tant que la capacité et `max_minutes` (aller,
+        déchargements et retour compris) sont respectées.
+        """
+        n = self.n
+        travel = self.travel.tolist()
+        service = self.service.tolist()
+        demand = self.demand.tolist()
+        remaining = np.ones(n + 1, dtype=bool)
+        remaining[0] = False
+        seeds = (np.argsort(-self.dist[0, 1:], kind="stable") + 1).tolist()
+        seed_ptr = 0
+        nb_ptr = [0] * (n + 1)
+        left = n
+        routes: list[list[int]] = []
+
+        def nearest(last: int) -> int:
+            neighbours = self._neighbours[last]
+            p = nb_ptr[last]
+            while p < len(neighbours) and not remaining[neighbours[p]]:
+                p += 1
+            nb_ptr[last] = p
+            if p < len(neighbours):
+                return neighbours[p]
+            # Liste épuisée : argmin sur tous les restants / list exhausted
+            row = np.where(remaining, self.dist[last], np.inf)
+            return int(np.argmin(row))
+
+        while left:
+            while not remaining[seeds[seed_ptr]]:
+                seed_ptr += 1
+            seed = seeds[seed_ptr]
+            route = [seed]
+            remaining[seed] = False
+            left -= 1
+            load = demand[seed]
+            # Durée cumulée hors retour / running duration without the return leg
+            elapsed = travel[0][seed] + service[seed]
+
+            while left:
+                last = route[-1]
+                cand = nearest(last)
+                if load + demand[cand] > capacity:
+                    break
+                est = elapsed + travel[last][cand] + service[cand] + travel[cand][0]
+                if est > max_minutes:
+                    break
+                route.append(cand)
+                remaining[cand] = False
+                left -= 1
+                load += demand[cand]
+                elapsed = elapsed + travel[last][cand] + service[cand]
+            routes.append(route)
+        return routes
+
+    def route_km(self, route: list[int]) -> float:
+        """Distance base → arrêts → base / Route length from and back to the base."""
+        d = self._dist_list
+        path = [0, *route, 0]
+        return sum(d[a][b] for a, b in zip(path, path[1:]))
+
+    def improve(self, route: list[int], split: int, deadline: float) -> list[int]:
+        """2-opt + Or-opt par première amélioration jusqu'à l'optimum local ou
+        l'échéance (`time.monotonic()`) / First-improvement 2-opt + Or-opt.
+
+        Les `split` premiers arrêts forment un bloc (SAS) qui reste en tête :
+        aucun mouvement ne traverse la frontière entre blocs.
+        """
+        if len(route) < 3:
+            return list(route)
+        d = self._dist_list
+        path = [0, *route, 0]
+        m = len(route)
+        blocks = [(lo, hi) for lo, hi in ((1, split), (split + 1, m)) if hi - lo >= 1]
+
+        improved = True
+        while improved and time.monotonic() < deadline:
+            improved = False
+            for lo, hi in blocks:
+                if self._two_opt_pass(path, d, lo, hi) or self._or_opt_pass(path, d, lo, hi):
+                    improved = True
+                    break
+        return path[1:-1]
+
+    @staticmethod
+    def _two_opt_pass(path: list[int], d: list[list[float]], lo: int, hi: int) -> bool:
+        """Inverser un segment [i, j] du bloc (distances asymétriques prises en
+        compte) / Reverse one segment of the block (asymmetric-safe)."""
+        # Sommes préfixes des arcs dans les deux sens / prefix sums both ways
+        fwd = [0.0]
+        bwd = [0.0]
+        for a, b in zip(path, path[1:]):
+            fwd.append(fwd[-1] + d[a][b])
+            bwd.append(bwd[-1] + d[b][a])
+        for i in range(lo, hi):
+            before = path[i - 1]
+            for j in range(i + 1, hi + 1):
+                after = path[j + 1]
+                old = d[before][path[i]] + (fwd[j] - fwd[i]) + d[path[j]][after]
+                new = d[before][path[j]] + (bwd[j] - bwd[i]) + d[path[i]][after]
+                if new < old - 1e-9:
+                    path[i:j + 1] = path[i:j + 1][::-1]
+                    return True
+        return False
+
+    @staticmethod
+    def _or_opt_pass(path: list[int], d: list[list[float]], lo: int, hi: int) -> bool:
+        """Déplacer un segment de 1 à 3 arrêts ailleurs dans le bloc /
+        Move a 1-3 stop segment elsewhere within the block."""
+        for length in OR_OPT_SEGMENT_LENGTHS:
+            for i in range(lo, hi - length + 2):
+                j = i + length - 1
+                prev, nxt = path[i - 1], path[j + 1]
+                first, last = path[i], path[j]
+                removal_gain = d[prev][first] + d[last][nxt] - d[prev][nxt]
+                # Arc (k, k+1) d'insertion, dans le bloc et hors segment /
+                # insertion arc (k, k+1), inside the block and outside the segment
+                for k in range(lo - 1, hi + 1):
+                    if i - 1 <= k <= j:
+                        continue
+                    a, b = path[k], path[k + 1]
+                    added = d[a][first] + d[last][b] - d[a][b]
+                    if added < removal_gain - 1e-9:
+                        segment = path[i:j + 1]
+                        del path[i:j + 1]
+                        insert_at = k + 1 if k < i else k + 1 - length
+                        path[insert_at:insert_at] = segment
+                        return True
+        return False
@@ -0,0 +1,285 @@
+"""État temps réel des tours / Tour live state.
+
+Le tableau de bord de suivi (`GET /api/tracking/positions`, interrogé en
+boucle) calculait à chaque appel la dernière position par tour
+(`max(timestamp)` GROUP BY sur `gps_positions`, table de plusieurs milliers
+de lignes/jour) et deux COUNT sur `tour_stops`. Désormais :
+- table miroir `tour_live_states` (une ligne par tour : dernière position,
+  arrêts totaux / livrés), écrite par UPSERT Core dans la transaction de
+  l'écriture source :
+  - insertion GPS (`gps_ingest.insert_positions`) → position, seulement si
+    plus récente que celle en place (lots reçus dans le désordre) ;
+  - écriture ORM sur `TourStop` (création, suppression, changement de
+    `delivery_status` ou de tour) → compteurs recalculés pour les seuls tours
+    touchés (hook `after_flush`, couvre les endpoints chauffeur comme la
+    composition des tours) ;
+- magasin mémoire par tour lu en priorité ; au COMMIT, les positions y sont
+  appliquées en place et les tours aux compteurs modifiés en sont retirés
+  (relus depuis la table au prochain appel, une requête par clé primaire) ;
+- plusieurs workers : les tours modifiés sont signalés aux autres workers par
+  le bus de suivi (`services/tracking_bus.py`), qui les retirent de leur
+  magasin — quel que soit le chemin d'écriture (lot GPS, tampon différé,
+  arrêt livré, composition), diffusé ou non aux WebSocket.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from sqlalchemy import case, event, func, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.tour import Tour
+from app.models.tour_live_state import TourLiveState
+from app.models.tour_stop import TourStop
+from app.services.tracking_bus import on_signal, send_signal
+
+# Durée de vie max d'une entrée (écritures hors process) / Max entry lifetime (out-of-process writes)
+LIVE_STATE_TTL_SECONDS = 60
+# Nombre max d'entrées (LRU) / Max entries (LRU)
+LIVE_STATE_MAX_ENTRIES = 20_000
+# Au-delà, le signal vide tout le magasin (taille NOTIFY) / Beyond, the signal clears the store (NOTIFY size)
+LIVE_STATE_SIGNAL_MAX_TOURS = 500
+
+_POSITION_FIELDS = ("latitude", "longitude", "accuracy", "speed", "timestamp")
+# Positions validées à appliquer / tours dont les compteurs ont changé, au COMMIT /
+# Positions to apply / tours whose counters changed, on COMMIT
+_POSITIONS_KEY = "_live_positions_pending"
+_STOPS_KEY = "_live_stops_touched"
+_SIGNAL = "live_state"
+
+
+@dataclass(frozen=True)
+class LiveState:
+    """État temps réel d'un tour / Live state of a tour."""
+    latitude: float | None
+    longitude: float | None
+    accuracy: float | None
+    speed: float | None
+    timestamp: str | None
+    stops_total: int
+    stops_delivered: int
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class LiveStateStore:
+    """Magasin LRU process des états de tours / Process-wide LRU tour live-state store."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = LIVE_STATE_TTL_SECONDS,
+        max_entries: int = LIVE_STATE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, LiveState] = OrderedDict()
+        self._generation = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, tour_id: int) -> LiveState | None:
+        state = self._entries.get(tour_id)
+        if state is None:
+            return None
+        if time.monotonic() - state.loaded_at > self.ttl_seconds:
+            del self._entries[tour_id]
+            return None
+        self._entries.move_to_end(tour_id)
+        return state
+
+    def put(self, tour_id: int, state: LiveState, generation: int) -> None:
+        """Enregistrer ; `generation` est celle lue AVANT le chargement /
+        Store; `generation` is read BEFORE loading."""
+        if generation != self._generation:
+            return
+        self._entries[tour_id] = state
+        self._entries.move_to_end(tour_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def apply_positions(self, positions: dict[int, dict]) -> None:
+        """Appliquer des positions validées aux tours présents (la plus récente
+        gagne) / Apply committed positions to present tours (newest wins)."""
+        self._generation += 1
+        for tour_id, position in positions.items():
+            state = self._entries.get(tour_id)
+            if state is None or (state.timestamp or "") > position["timestamp"]:
+                continue
+            self._entries[tour_id] = LiveState(
+                **{f: position[f] for f in _POSITION_FIELDS},
+                stops_total=state.stops_total,
+                stops_delivered=state.stops_delivered,
+                loaded_at=state.loaded_at,
+            )
+
+    def drop(self, tour_ids) -> None:
+        """Oublier des tours (relus au prochain appel) / Forget tours (reloaded on next read)."""
+        self._generation += 1
+        for tour_id in tour_ids:
+            self._entries.pop(tour_id, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+live_state_store = LiveStateStore()
+
+
+def _apply_remote(payload: dict) -> None:
+    """Tours modifiés par un autre worker (None : trop nombreux, tout vider) /
+    Tours changed by another worker (None: too many, clear everything)."""
+    if payload["tours"] is None:
+        live_state_store.clear()
+    else:
+        live_state_store.drop(payload["tours"])
+
+
+on_signal(_SIGNAL, _apply_remote)
+
+
+async def load_live_states(db: AsyncSession, tour_ids: list[int]) -> dict[int, LiveState]:
+    """États des tours depuis le magasin, les absents relus en une requête
+    (session de la requête, donc cloisonnée au tenant) /
+    Tour states from the store, misses read back in one query."""
+    states: dict[int, LiveState] = {}
+    missing = []
+    for tour_id in tour_ids:
+        state = live_state_store.get(tour_id)
+        if state is None:
+            missing.append(tour_id)
+        else:
+            states[tour_id] = state
+    if not missing:
+        return states
+    generation = live_state_store.generation()
+    rows = (await db.execute(
+        select(TourLiveState.tour_id, *(getattr(TourLiveState, f) for f in _POSITION_FIELDS),
+               TourLiveState.stops_total, TourLiveState.stops_delivered)
+        .where(TourLiveState.tour_id.in_(missing))
+    )).all()
+    for row in rows:
+        state = LiveState(**{f: getattr(row, f) for f in _POSITION_FIELDS},
+                          stops_total=row.stops_total, stops_delivered=row.stops_delivered)
+        live_state_store.put(row.tour_id, state, generation)
+        states[row.tour_id] = state
+    return states
+
+
+def _upsert(dialect_name: str):
+    """INSERT … ON CONFLICT du dialecte / Dialect INSERT … ON CONFLICT."""
+    return (pg_insert if dialect_name == "postgresql" else sqlite_insert)(TourLiveState.__table__)
+
+
+async def record_positions(session: AsyncSession, rows: list[dict]) -> None:
+    """Reporter la dernière position de chaque tour d'un lot GPS (dicts de
+    `gps_ingest.GPS_COLUMNS`) / Mirror the latest position of each tour in a GPS batch."""
+    latest: dict[int, dict] = {}
+    for row in rows:
+        current = latest.get(row["tour_id"])
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            latest[row["tour_id"]] = row
+    if not latest:
+        return
+    table = TourLiveState.__table__
+    conn = await session.connection()
+    stmt = _upsert(conn.dialect.name).values([
+        {"tour_id": tour_id, "tenant_id": row["tenant_id"], "stops_total": 0, "stops_delivered": 0,
+         **{f: row[f] for f in _POSITION_FIELDS}}
+        for tour_id, row in latest.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.tour_id],
+        set_={f: stmt.excluded[f] for f in _POSITION_FIELDS},
+        where=or_(table.c.timestamp.is_(None), table.c.timestamp <= stmt.excluded.timestamp),
+    )
+    await conn.execute(stmt)
+    pending = session.info.setdefault(_POSITIONS_KEY, {})
+    for tour_id, row in latest.items():
+        if tour_id not in pending or row["timestamp"] >= pending[tour_id]["timestamp"]:
+            pending[tour_id] = {f: row[f] for f in _POSITION_FIELDS}
+
+
+def _stop_counts_upsert(dialect_name: str, tour_ids):
+    """Compteurs recalculés pour ces tours (tours supprimés ignorés) /
+    Counters recomputed for these tours (deleted tours skipped)."""
+    table = TourLiveState.__table__
+    counts = (
+        select(
+            Tour.id,
+            Tour.tenant_id,
+            func.count(TourStop.id),
+            func.coalesce(func.sum(case((TourStop.delivery_status == "DELIVERED", 1), else_=0)), 0),
+        )
+        .select_from(Tour)
+        .outerjoin(TourStop, TourStop.tour_id == Tour.id)
+        .where(Tour.id.in_(sorted(tour_ids)))
+        .group_by(Tour.id, Tour.tenant_id)
+    )
+    stmt = _upsert(dialect_name).from_select(
+        ["tour_id", "tenant_id", "stops_total", "stops_delivered"], counts,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.tour_id],
+        set_={"stops_total": stmt.excluded.stops_total, "stops_delivered": stmt.excluded.stops_delivered},
+    )
+
+
+def _touched_tours(session: Session) -> set[int]:
+    """Tours dont les compteurs d'arrêts changent dans ce flush /
+    Tours whose stop counters change in this flush."""
+    touched: set[int] = set()
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, TourStop) and obj.tour_id is not None:
+            touched.add(obj.tour_id)
+    for obj in session.dirty:
+        if not isinstance(obj, TourStop):
+            continue
+        attrs = inspect(obj).attrs
+        for name in ("delivery_status", "tour_id"):
+            history = attrs[name].history
+            if history.has_changes():
+                touched.add(obj.tour_id)
+                touched.update(v for v in history.deleted if v is not None)
+    return touched
+
+
+# ── Tenue à jour automatique / Automatic upkeep ─────────────────────
+
+
+@event.listens_for(Session, "after_flush")
+def _mirror_stop_counters(session: Session, flush_context) -> None:
+    # new / dirty / deleted reflètent encore l'état d'avant flush, clés étrangères posées /
+    # new / dirty / deleted still reflect the pre-flush state, foreign keys set
+    touched = _touched_tours(session)
+    if not touched:
+        return
+    conn = session.connection()
+    conn.execute(_stop_counts_upsert(conn.dialect.name, touched))
+    session.info.setdefault(_STOPS_KEY, set()).update(touched)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session: Session) -> None:
+    positions = session.info.pop(_POSITIONS_KEY, None)
+    touched = session.info.pop(_STOPS_KEY, None)
+    if touched:
+        live_state_store.drop(touched)
+    if positions:
+        live_state_store.apply_positions(positions)
+    tours = set(touched or ()) | set(positions or ())
+    if tours:
+        send_signal(_SIGNAL, {"tours": sorted(tours) if len(tours) <= LIVE_STATE_SIGNAL_MAX_TOURS else None})
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop(_POSITIONS_KEY, None)
+    session.info.pop(_STOPS_KEY, None)
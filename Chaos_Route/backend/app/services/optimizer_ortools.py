@@ -1,17 +1,30 @@
 """
 Solveur OR-Tools CVRPTW / OR-Tools CVRPTW Solver.
 Fichier isolé — prend des dataclasses en entrée, retourne des tours bruts.
+
+Mode vectorisé (défaut) : les matrices de coût par classe de véhicule sont
+précalculées avec NumPy et enregistrées via RegisterTransitMatrix /
+RegisterUnaryTransitVector, l'évaluation des arcs se fait alors en C++.
+Vectorized mode (default): per-vehicle-class cost matrices are precomputed
+with NumPy and registered as matrices, so arc evaluation stays in C++.
 """
 
 from __future__ import annotations
 
 import logging
+import time
+from collections.abc import Callable
 from dataclasses import dataclass, field
 
+import numpy as np
 from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 
 log = logging.getLogger(__name__)
 
+# Intervalle min entre deux appels à `should_stop` (drapeau inter-process) /
+# Min interval between two `should_stop` calls (cross-process flag)
+STOP_POLL_SECONDS = 0.1
+
 
 # ── Dataclasses d'entrée/sortie ──────────────────────────────────────
 
@@ -42,6 +55,11 @@ class ORToolsInput:
     late_penalty_per_min: int = 500       # pénalité retard par minute / late penalty per minute
     drop_penalty: int = 1_000_000         # pénalité pour dropper un PDV / drop penalty per PDV
     cost_multiplier: float = 1.0          # multiplicateur coût d'arc / arc cost multiplier
+    vectorized: bool = True               # matrices C++ (False = callbacks Python) / C++ matrices (False = Python callbacks)
+    initial_routes: list[list[int]] | None = None  # départ à chaud : nœuds par slot / warm start: nodes per slot
+    stagnation_seconds: float = 0         # arrêt sans amélioration depuis N s (0 = jamais) / stop after N s without improvement
+    first_solution_strategy: str = "PATH_CHEAPEST_ARC"      # nom FirstSolutionStrategy / enum name
+    local_search_metaheuristic: str = "GUIDED_LOCAL_SEARCH"  # nom LocalSearchMetaheuristic / enum name
 
 
 @dataclass
@@ -53,12 +71,77 @@ class RawTour:
     total_distance_m: int
 
 
+# ── Précalcul des matrices / Matrix precomputation ──────────────────
+
+
+def build_cost_matrices(data: ORToolsInput) -> dict[int, np.ndarray]:
+    """Matrices de coût d'arc par classe cost_per_km_cents / Arc cost matrices per cost_per_km_cents class.
+    Même formule que l'ancien callback : int(((cpm * dist_m) // 1000 + tax) * multiplier).
+    Les slots de même coût km partagent une seule matrice (donc un seul callback).
+    """
+    dist = np.asarray(data.distance_matrix, dtype=np.int64)
+    tax = (
+        np.asarray(data.km_tax_matrix, dtype=np.int64)
+        if data.km_tax_matrix else np.zeros_like(dist)
+    )
+    matrices: dict[int, np.ndarray] = {}
+    for cpm in sorted({slot.cost_per_km_cents for slot in data.vehicles}):
+        cost = (cpm * dist) // 1000 + tax
+        if data.cost_multiplier != 1.0:
+            cost = np.trunc(cost * data.cost_multiplier).astype(np.int64)
+        matrices[cpm] = cost
+    return matrices
+
+
+def build_time_matrix(data: ORToolsInput) -> np.ndarray:
+    """Matrice transit temps = trajet + service au nœud de départ /
+    Time transit matrix = travel + service time at the origin node."""
+    travel = np.asarray(data.time_matrix, dtype=np.int64)
+    service = np.asarray(data.service_times, dtype=np.int64)
+    return travel + service[:, None]
+
+
+def _register_matrix(
+    routing: pywrapcp.RoutingModel,
+    manager: pywrapcp.RoutingIndexManager,
+    matrix: np.ndarray,
+    vectorized: bool,
+    name: str,
+) -> int:
+    """Enregistrer une matrice de transit (C++ ou callback Python) /
+    Register a transit matrix (C++ or Python callback)."""
+    if vectorized:
+        return routing.RegisterTransitMatrix(matrix.tolist())
+
+    rows = matrix.tolist()
+
+    def _matrix_cb(from_index: int, to_index: int) -> int:
+        try:
+            return rows[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+        except Exception:
+            log.exception("%s_cb error: from_index=%s, to_index=%s", name, from_index, to_index)
+            return 0
+
+    return routing.RegisterTransitCallback(_matrix_cb)
+
+
 # ── Solveur principal ────────────────────────────────────────────────
 
 
-def solve_cvrptw(data: ORToolsInput) -> tuple[list[RawTour], list[int]]:
+def solve_cvrptw(
+    data: ORToolsInput,
+    on_solution: Callable[[int, int], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
+) -> tuple[list[RawTour], list[int]]:
     """Résoudre le CVRPTW avec OR-Tools / Solve CVRPTW with OR-Tools.
     Retourne (tours, dropped_node_indices).
+
+    `on_solution(objective, vehicles_used)` est appelé à chaque nouvelle
+    solution trouvée ; `should_stop()` est interrogé pendant toute la recherche
+    (au plus toutes les `STOP_POLL_SECONDS`) : s'il devient vrai, la recherche
+    s'arrête et la meilleure solution courante est retournée. / Called on every
+    new solution; `should_stop()` is polled throughout the search and ends it
+    early with the best solution so far.
     """
     num_nodes = data.num_pdvs + 1   # depot + PDVs
     num_vehicles = len(data.vehicles)
@@ -103,42 +186,37 @@ def solve_cvrptw(data: ORToolsInput) -> tuple[list[RawTour], list[int]]:
     manager = pywrapcp.RoutingIndexManager(num_nodes, num_vehicles, 0)
     routing = pywrapcp.RoutingModel(manager)
 
-    # 2. Callback coût par véhicule / Cost callback per vehicle
-    has_tax = bool(data.km_tax_matrix)
-    cost_callback_indices: list[int] = []
+    # 2. Coût d'arc par classe de véhicule / Arc cost per vehicle class
+    # Un seul callback par cost_per_km_cents distinct (slots A/B partagés)
+    cost_cb_by_cpm: dict[int, int] = {}
+    for cpm, matrix in build_cost_matrices(data).items():
+        cost_cb_by_cpm[cpm] = _register_matrix(
+            routing, manager, matrix, data.vectorized, "cost",
+        )
     for v_idx, slot in enumerate(data.vehicles):
-        cost_per_km = slot.cost_per_km_cents  # centimes/km
-
-        def _cost_cb(from_index: int, to_index: int, _cpm=cost_per_km, _has_tax=has_tax) -> int:
-            try:
-                from_node = manager.IndexToNode(from_index)
-                to_node = manager.IndexToNode(to_index)
-                dist_m = data.distance_matrix[from_node][to_node]
-                fuel = (_cpm * dist_m) // 1000
-                tax = data.km_tax_matrix[from_node][to_node] if _has_tax else 0
-                return int((fuel + tax) * data.cost_multiplier)
-            except Exception:
-                log.exception("cost_cb error: from_index=%s, to_index=%s", from_index, to_index)
-                return 0
-
-        cb_idx = routing.RegisterTransitCallback(_cost_cb)
-        cost_callback_indices.append(cb_idx)
-        routing.SetArcCostEvaluatorOfVehicle(cb_idx, v_idx)
+        routing.SetArcCostEvaluatorOfVehicle(cost_cb_by_cpm[slot.cost_per_km_cents], v_idx)
+    log.info(
+        "OR-Tools: %d cost callbacks for %d vehicle slots (vectorized=%s)",
+        len(cost_cb_by_cpm), num_vehicles, data.vectorized,
+    )
 
     # 3. Coût fixe par véhicule / Fixed cost per vehicle
     for v_idx, slot in enumerate(data.vehicles):
         routing.SetFixedCostOfVehicle(slot.fixed_cost_cents, v_idx)
 
     # 4. Dimension Capacity / Capacity dimension
-    def _demand_cb(from_index: int) -> int:
-        try:
-            node = manager.IndexToNode(from_index)
-            return data.demands[node]
-        except Exception:
-            log.exception("demand_cb error: from_index=%s", from_index)
-            return 0
+    if data.vectorized:
+        demand_cb_idx = routing.RegisterUnaryTransitVector([int(d) for d in data.demands])
+    else:
+        def _demand_cb(from_index: int) -> int:
+            try:
+                node = manager.IndexToNode(from_index)
+                return data.demands[node]
+            except Exception:
+                log.exception("demand_cb error: from_index=%s", from_index)
+                return 0
 
-    demand_cb_idx = routing.RegisterUnaryTransitCallback(_demand_cb)
+        demand_cb_idx = routing.RegisterUnaryTransitCallback(_demand_cb)
     vehicle_capacities = [slot.capacity_eqp for slot in data.vehicles]
     routing.AddDimensionWithVehicleCapacity(
         demand_cb_idx,
@@ -149,18 +227,9 @@ def solve_cvrptw(data: ORToolsInput) -> tuple[list[RawTour], list[int]]:
     )
 
     # 5. Dimension Time / Time dimension
-    def _time_cb(from_index: int, to_index: int) -> int:
-        try:
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            travel = data.time_matrix[from_node][to_node]
-            service = data.service_times[from_node]
-            return travel + service
-        except Exception:
-            log.exception("time_cb error: from_index=%s, to_index=%s", from_index, to_index)
-            return 0
-
-    time_cb_idx = routing.RegisterTransitCallback(_time_cb)
+    time_cb_idx = _register_matrix(
+        routing, manager, build_time_matrix(data), data.vectorized, "time",
+    )
     routing.AddDimension(
         time_cb_idx,
         120,                    # slack max = 2h d'attente
@@ -211,19 +280,69 @@ def solve_cvrptw(data: ORToolsInput) -> tuple[list[RawTour], list[int]]:
     # 9. Paramètres de recherche / Search parameters
     search_params = pywrapcp.DefaultRoutingSearchParameters()
     search_params.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+        getattr(routing_enums_pb2.FirstSolutionStrategy, data.first_solution_strategy)
     )
     search_params.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        getattr(routing_enums_pb2.LocalSearchMetaheuristic, data.local_search_metaheuristic)
     )
     search_params.time_limit.seconds = data.time_limit_seconds
 
+    # Suivi des solutions / arrêt anticipé — Solution tracking / early stop
+    if on_solution is not None or should_stop is not None or data.stagnation_seconds > 0:
+        progress = {"best": None, "improved_at": time.monotonic()}
+
+        def _at_solution() -> None:
+            objective = routing.CostVar().Value()
+            if progress["best"] is None or objective < progress["best"]:
+                progress["best"] = objective
+                progress["improved_at"] = time.monotonic()
+            if on_solution is not None:
+                used = sum(
+                    1 for v_idx in range(num_vehicles)
+                    if not routing.IsEnd(routing.NextVar(routing.Start(v_idx)).Value())
+                )
+                on_solution(objective, used)
+
+        # Limite interrogée en continu par le solveur (pas seulement à chaque
+        # solution : une recherche qui stagne n'en produit plus) /
+        # Limit polled throughout the search, not only on new solutions (a
+        # stagnating search stops producing them)
+        polled = {"at": 0.0}
+
+        def _must_stop() -> bool:
+            now = time.monotonic()
+            if (
+                data.stagnation_seconds > 0
+                and progress["best"] is not None
+                and now - progress["improved_at"] > data.stagnation_seconds
+            ):
+                return True
+            if should_stop is None or now - polled["at"] < STOP_POLL_SECONDS:
+                return False
+            polled["at"] = now
+            return should_stop()
+
+        routing.AddAtSolutionCallback(_at_solution)
+        routing.AddSearchMonitor(routing.solver().CustomLimit(_must_stop))
+
+    # Départ à chaud depuis les tours d'un run précédent / Warm start from previous routes
+    initial = None
+    if data.initial_routes:
+        routing.CloseModelWithParameters(search_params)
+        initial = routing.ReadAssignmentFromRoutes(data.initial_routes, True)
+        if initial is None:
+            log.warning("OR-Tools: initial routes rejected, cold start")
+
     # 10. Résoudre / Solve
     log.info(
-        "OR-Tools: solving %d nodes, %d vehicles, time_limit=%ds...",
+        "OR-Tools: solving %d nodes, %d vehicles, time_limit=%ds, strategy=%s+%s, warm_start=%s...",
         num_nodes, num_vehicles, data.time_limit_seconds,
+        data.first_solution_strategy, data.local_search_metaheuristic, initial is not None,
     )
-    solution = routing.SolveWithParameters(search_params)
+    if initial is not None:
+        solution = routing.SolveFromAssignmentWithParameters(initial, search_params)
+    else:
+        solution = routing.SolveWithParameters(search_params)
     log.info("OR-Tools: solver status = %s", routing.status())
 
     if not solution:
@@ -0,0 +1,58 @@
+"""Cache des utilisateurs authentifiés / Authenticated-principal cache.
+
+Chaque appel authentifié relisait l'utilisateur, ses rôles, permissions et
+régions (4-5 requêtes) avant même l'endpoint, puis `require_permission`
+parcourait les listes imbriquées. Une entrée, indexée par user_id, conserve :
+- un instantané DÉTACHÉ de l'utilisateur (rôles, permissions, régions chargés),
+  jamais modifié : chaque requête en reçoit une copie attachée à sa session
+  (`merge(load=False)`, sans requête SQL) qu'elle peut modifier et valider ;
+- le tenant résolu, l'ensemble (resource, action) des permissions et les ids
+  de régions, précalculés.
+
+Invalidation au COMMIT d'une écriture ORM sur User / Role / Permission /
+Region (`CommitInvalidatedCache`), à la révocation d'un jeton de
+l'utilisateur, et par TTL (écritures Core ou hors process).
+"""
+
+from dataclasses import dataclass
+
+from app.models.region import Region
+from app.models.user import Permission, Role, User
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+
+# Durée de vie max d'une entrée / Max entry lifetime (seconds)
+PRINCIPAL_CACHE_TTL_SECONDS = 60
+# Nombre max d'entrées (LRU) / Max entries (LRU)
+PRINCIPAL_CACHE_MAX_ENTRIES = 5000
+
+# Modèles dont l'écriture invalide le cache / Models invalidating the cache
+_PRINCIPAL_MODELS = (User, Role, Permission, Region)
+# Attribut non mappé portant le Principal sur une instance User /
+# Unmapped attribute carrying the Principal on a User instance
+_PRINCIPAL_ATTR = "_principal"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Utilisateur authentifié précalculé / Precomputed authenticated user."""
+    user: User                                  # instantané détaché / detached snapshot
+    tenant_id: int | None                       # None = multi-société / cross-tenant
+    permissions: frozenset[tuple[str, str]]     # (resource, action)
+    region_ids: tuple[int, ...]
+
+
+def bind_principal(user: User, principal: Principal) -> User:
+    """Rattacher le Principal à une instance User / Attach the Principal to a User instance."""
+    setattr(user, _PRINCIPAL_ATTR, principal)
+    return user
+
+
+def principal_of(user: User) -> Principal | None:
+    """Principal rattaché (None : utilisateur chargé hors cache) /
+    Attached Principal (None: user loaded outside the cache)."""
+    return getattr(user, _PRINCIPAL_ATTR, None)
+
+
+principal_cache = CommitInvalidatedCache(
+    "principals", _PRINCIPAL_MODELS, PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES,
+)
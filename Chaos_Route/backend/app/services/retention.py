@@ -6,29 +6,42 @@ quotidiennement les données au-delà de leur durée, et journalise chaque purge
 dans l'audit log (traçabilité).
 
 Durées décidées (2026-07) : audit 12 mois (≥ 6 mois garanti), photos 12 mois,
-SMS 12 mois, GPS brut 60 jours (norme CNIL géolocalisation — à confirmer).
+SMS 12 mois, GPS brut 60 jours (norme CNIL géolocalisation — à confirmer ;
+suppression par partition journalière sur PostgreSQL, `services/gps_partitions.py`).
 Les logs applicatifs (stdout Docker) relèvent de l'infra : rotation Docker +
 agrégation 6 mois via Loki (action B4).
+
+Exécution : les suppressions se font par lots bornés (plage d'ids), chacun
+validé séparément avec une courte pause entre lots, pour ne jamais verrouiller
+une table de longues minutes ; les fichiers photos sont supprimés dans le pool
+de threads (la boucle d'événements reste libre). Débit et retard par catégorie
+dans `retention_metrics` (`GET /api/retention/metrics`).
 """
 
 import asyncio
 import json
 import logging
-from datetime import datetime, timedelta, timezone
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 
-from sqlalchemy import delete, select
+from sqlalchemy import delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models.audit import AuditLog
 from app.models.container_anomaly import AnomalyPhoto
 from app.models.control_evidence import ControlEvidence
 from app.models.driver_declaration import DeclarationPhoto
 from app.models.gps_position import GPSPosition
+from app.models.gps_trail import GPSTrail
 from app.models.retention_policy import RetentionPolicy
 from app.models.sms_queue import SmsQueue
 from app.models.ticket import TicketPhoto
+from app.models.timeline_change import TimelineChange
 from app.models.vehicle_inspection import InspectionPhoto
+from app.services import gps_partitions
 
 logger = logging.getLogger("chaos_route.retention")
 
@@ -106,44 +119,144 @@ def _delete_file(path_str: str | None) -> None:
         logger.warning("Fichier non supprimé %s : %s", path_str, exc)
 
 
-async def _purge_audit_logs(session: AsyncSession, days: int) -> int:
-    # Garantie plancher : jamais moins de 6 mois de journaux
-    days = max(days, MIN_AUDIT_RETENTION_DAYS)
-    result = await session.execute(delete(AuditLog).where(AuditLog.timestamp < _cutoff_iso(days)))
-    return result.rowcount or 0
+def _delete_files(paths: list[str | None]) -> None:
+    for path_str in paths:
+        _delete_file(path_str)
 
 
-async def _purge_gps_positions(session: AsyncSession, days: int) -> int:
-    result = await session.execute(
-        delete(GPSPosition).where(GPSPosition.timestamp < _cutoff_iso(days))
-    )
-    return result.rowcount or 0
+def _age_seconds(cutoff: str, oldest: str | None) -> float:
+    """Retard : écart entre la date limite et la plus vieille ligne restante /
+    Lag: gap between the cutoff and the oldest remaining row."""
+    if not oldest:
+        return 0.0
+    try:
+        cutoff_dt, oldest_dt = (datetime.fromisoformat(v.replace("Z", "+00:00")) for v in (cutoff, oldest))
+    except ValueError:
+        return 0.0
+    if cutoff_dt.tzinfo is None:
+        cutoff_dt = cutoff_dt.replace(tzinfo=timezone.utc)
+    if oldest_dt.tzinfo is None:
+        oldest_dt = oldest_dt.replace(tzinfo=timezone.utc)
+    return max((cutoff_dt - oldest_dt).total_seconds(), 0.0)
+
+
+@dataclass
+class PurgeStats:
+    """Mesures de la dernière purge d'une catégorie / Last purge metrics of a category."""
+    category: str
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    # False = budget de temps épuisé, reliquat au prochain cycle / time budget spent, backlog left
+    complete: bool = True
+    # Âge (s) de la plus vieille ligne expirée restante / Age of the oldest expired row left
+    lag_seconds: float = 0.0
+    finished_at: str | None = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.rows / self.seconds, 1) if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "rows": self.rows, "batches": self.batches, "seconds": round(self.seconds, 3),
+            "rows_per_second": self.rows_per_second, "complete": self.complete,
+            "lag_seconds": round(self.lag_seconds), "finished_at": self.finished_at,
+        }
+
+
+# Mesures de la dernière purge, par catégorie / Last purge metrics, per category
+retention_metrics: dict[str, PurgeStats] = {}
+
+
+class _BatchPurge:
+    """Suppression par lots bornés, validés un à un, avec pause entre lots et
+    budget de temps par catégorie / Bounded, individually committed batches
+    with a pause between them and a per-category time budget."""
+
+    def __init__(self, session: AsyncSession, stats: PurgeStats):
+        self.session = session
+        self.stats = stats
+        self.batch_rows = max(settings.RETENTION_BATCH_ROWS, 1)
+        self.pause = settings.RETENTION_BATCH_PAUSE_MS / 1000
+        self.deadline = time.monotonic() + settings.RETENTION_MAX_SECONDS_PER_CATEGORY
+
+    async def run(self, model, ts_col, cutoff: str, *conditions, path_col=None) -> int:
+        """Purger les lignes de `model` antérieures à `cutoff`. Avec `path_col`,
+        les fichiers sont supprimés (pool de threads) avant les lignes /
+        Purge rows older than cutoff; with path_col, files go first (thread pool)."""
+        where = (ts_col < cutoff, *conditions)
+        removed = 0
+        while True:
+            if time.monotonic() >= self.deadline:
+                self.stats.complete = False
+                oldest = (await self.session.execute(select(func.min(ts_col)).where(*where))).scalar()
+                self.stats.lag_seconds = max(self.stats.lag_seconds, _age_seconds(cutoff, oldest))
+                break
+            columns = (model.id,) if path_col is None else (model.id, path_col)
+            rows = (await self.session.execute(
+                select(*columns).where(*where).order_by(model.id).limit(self.batch_rows)
+            )).all()
+            if not rows:
+                break
+            if path_col is None:
+                # Plage d'ids : les lignes expirées sont contiguës dans l'ordre d'insertion /
+                # Id range: expired rows are contiguous in insertion order
+                stmt = delete(model).where(model.id.between(rows[0][0], rows[-1][0]), *where)
+            else:
+                await asyncio.to_thread(_delete_files, [r[1] for r in rows])
+                stmt = delete(model).where(model.id.in_([r[0] for r in rows]))
+            result = await self.session.execute(stmt)
+            await self.session.commit()
+            removed += result.rowcount or 0
+            self.stats.batches += 1
+            if len(rows) < self.batch_rows:
+                break
+            # Laisser respirer la base et la boucle / let the database and the loop breathe
+            await asyncio.sleep(self.pause)
+        self.stats.rows += removed
+        return removed
+
+
+async def _purge_audit_logs(purge: _BatchPurge, days: int) -> int:
+    # Garantie plancher : jamais moins de 6 mois de journaux
+    days = max(days, MIN_AUDIT_RETENTION_DAYS)
+    return await purge.run(AuditLog, AuditLog.timestamp, _cutoff_iso(days))
+
+
+async def _purge_gps_positions(purge: _BatchPurge, days: int) -> int:
+    # PostgreSQL partitionné : jours entiers supprimés par DROP de partition,
+    # le reste (jour à cheval, partition DEFAULT) par lots /
+    # Partitioned PostgreSQL: whole days dropped, the remainder in batches
+    session = purge.session
+    cutoff = _cutoff_iso(days)
+    removed = 0
+    partitioned = await gps_partitions.is_partitioned(await session.connection())
+    # Aucune transaction ouverte pendant le DETACH CONCURRENTLY / no open transaction during DETACH
+    await session.commit()
+    if partitioned:
+        removed = await gps_partitions.drop_partitions_before(session.bind, date.fromisoformat(cutoff[:10]))
+        await gps_partitions.maintain_partitions(await session.connection())
+        await session.commit()
+        purge.stats.rows += removed
+    removed += await purge.run(GPSPosition, GPSPosition.timestamp, cutoff)
+    # Traces simplifiées dérivées des positions purgées (une ligne par tour et niveau) /
+    # Trails derived from purged positions (one row per tour and level)
+    await session.execute(delete(GPSTrail).where(GPSTrail.source_last_timestamp < cutoff))
+    await session.commit()
+    return removed
 
 
-async def _purge_sms(session: AsyncSession, days: int) -> int:
+async def _purge_sms(purge: _BatchPurge, days: int) -> int:
     # Ne purge que les messages traités (SENT/FAILED) ; les PENDING restent en file
-    result = await session.execute(
-        delete(SmsQueue).where(
-            SmsQueue.created_at < _cutoff_iso(days),
-            SmsQueue.status != "PENDING",
-        )
-    )
-    return result.rowcount or 0
+    return await purge.run(SmsQueue, SmsQueue.created_at, _cutoff_iso(days), SmsQueue.status != "PENDING")
 
 
-async def _purge_photos(session: AsyncSession, days: int) -> int:
+async def _purge_photos(purge: _BatchPurge, days: int) -> int:
     total = 0
     for model, ts_col, path_col in _PHOTO_SOURCES:
         cutoff = _cutoff_date(days) if model is ControlEvidence else _cutoff_iso(days)
-        rows = (await session.execute(
-            select(model.id, path_col).where(ts_col < cutoff)
-        )).fetchall()
-        if not rows:
-            continue
-        for _, path_str in rows:
-            _delete_file(path_str)
-        await session.execute(delete(model).where(model.id.in_([r[0] for r in rows])))
-        total += len(rows)
+        total += await purge.run(model, ts_col, cutoff, path_col=path_col)
     return total
 
 
@@ -158,24 +271,42 @@ _PURGERS = {
 async def run_retention_purge(session: AsyncSession) -> dict[str, int]:
     """Exécuter la purge pour toutes les politiques actives / Run all active purges.
 
-    Retourne le nombre de lignes purgées par catégorie et journalise le
-    résultat dans l'audit log.
+    Chaque catégorie est purgée par lots de `RETENTION_BATCH_ROWS` lignes,
+    validés un à un (verrous courts), dans la limite de
+    `RETENTION_MAX_SECONDS_PER_CATEGORY` ; le reliquat part au cycle suivant
+    (voir `retention_metrics`). Retourne le nombre de lignes purgées par
+    catégorie et journalise le résultat dans l'audit log.
     """
     result = await session.execute(select(RetentionPolicy).where(RetentionPolicy.is_active))
-    policies = result.scalars().all()
+    policies = [(p.category, p.retention_days) for p in result.scalars().all()]
 
     counts: dict[str, int] = {}
-    for policy in policies:
-        purger = _PURGERS.get(policy.category)
+    for category, retention_days in policies:
+        purger = _PURGERS.get(category)
         if purger is None:
-            logger.warning("Catégorie de rétention inconnue : %s", policy.category)
+            logger.warning("Catégorie de rétention inconnue : %s", category)
             continue
-        counts[policy.category] = await purger(session, policy.retention_days)
+        stats = PurgeStats(category)
+        started = time.monotonic()
+        try:
+            counts[category] = await purger(_BatchPurge(session, stats), retention_days)
+        finally:
+            stats.seconds = time.monotonic() - started
+            stats.finished_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            retention_metrics[category] = stats
+        if not stats.complete:
+            logger.warning("Purge %s incomplète (budget de temps) : reliquat de %.0f h",
+                           category, stats.lag_seconds / 3600)
 
     # Ménage technique : liste noire des jetons expirés (STIME A4) /
     # Housekeeping: drop revocation entries for expired tokens
     from app.services.token_revocation import purge_expired_revocations
     counts["revoked_tokens_expired"] = await purge_expired_revocations(session)
+    # Journal des changements de timeline au-delà de l'horizon versionné /
+    # Timeline change log beyond the versioned horizon
+    counts["timeline_changes_expired"] = await _BatchPurge(session, PurgeStats("timeline_changes")).run(
+        TimelineChange, TimelineChange.date, _cutoff_date(settings.TIMELINE_CHANGES_KEEP_DAYS),
+    )
 
     # Traçabilité : une entrée d'audit par purge / One audit entry per purge run
     session.add(AuditLog(
@@ -0,0 +1,136 @@
+"""Cache des simulations aide à la décision / Decision support simulation cache.
+
+Les planificateurs relancent la simulation pour la même base, date et classe
+de température en ne changeant que l'ordre des priorités. Une entrée, indexée
+par l'empreinte des entrées (tenant, base, date, température, volumes non
+affectés, contrats disponibles), conserve :
+- les données chargées (PDV, distancier, prix carburant, taxe km) ; les PDV
+  sont des instantanés de valeurs (`PDVSnapshot`), pas des instances ORM :
+  une entrée survit aux sessions et aux rollbacks qui expirent ces dernières ;
+- les réponses déjà calculées, par paramètres de run : une requête identique
+  est servie sans recalcul ;
+- les meilleurs tours Niveau 2, réinjectés dans OR-Tools comme solution
+  initiale (`ReadAssignmentFromRoutes`) au run suivant.
+
+La base, les volumes et les contrats disponibles sont relus à chaque appel
+(ils font l'empreinte). Les autres données sont invalidées au COMMIT d'une
+écriture ORM sur les modèles de référence (`CommitInvalidatedCache`) ou quand
+le distancier change ; un TTL borne la durée de vie d'une entrée (écritures
+Core ou hors process).
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import TENANT_BYPASS
+from app.models.base_logistics import BaseLogistics
+from app.models.contract import Contract
+from app.models.fuel_price import FuelPrice
+from app.models.km_tax import KmTax
+from app.models.pdv import PDV
+from app.schemas.aide_decision import AideDecisionRequest, AideDecisionResponse
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+from app.services.distance_matrix_store import distance_store
+
+# Durée de vie max d'une entrée / Max entry lifetime (seconds)
+SIMULATION_CACHE_TTL_SECONDS = 600
+# Nombre max d'entrées (LRU) / Max entries (LRU)
+SIMULATION_CACHE_MAX_ENTRIES = 32
+
+# Modèles dont l'écriture invalide les données chargées / Models invalidating loaded data
+_REFERENCE_MODELS = (BaseLogistics, PDV, Contract, FuelPrice, KmTax)
+
+
+@dataclass(frozen=True, slots=True)
+class PDVSnapshot:
+    """Champs PDV lus par le solveur, détachés de toute session / PDV fields
+    read by the solver, detached from any session."""
+    id: int
+    code: str
+    name: str
+    city: str | None
+    latitude: float | None
+    longitude: float | None
+    delivery_window_start: str | None
+    delivery_window_end: str | None
+    dock_time_minutes: int | None
+    unload_time_per_eqp_minutes: int | None
+    has_sas_sec: bool
+    has_sas_frais: bool
+    has_sas_gel: bool
+    has_dock: bool
+    dock_has_niche: bool
+    allowed_vehicle_types: str | None
+
+
+PDV_SNAPSHOT_COLUMNS = tuple(getattr(PDV, name) for name in PDVSnapshot.__dataclass_fields__)
+
+
+@dataclass
+class SimulationInputs:
+    """Données chargées pour une empreinte / Loaded data for one fingerprint."""
+    pdvs: dict[int, PDVSnapshot]
+    dist_cache: object
+    dur_cache: object
+    fuel_prices: dict[str, float]
+    km_tax_cache: dict[tuple, float]
+
+
+@dataclass
+class SimulationEntry:
+    """Entrée de cache / Cache entry."""
+    inputs: SimulationInputs
+    results: dict[tuple, AideDecisionResponse] = field(default_factory=dict)
+    # Meilleurs tours Niveau 2 : ids PDV par slot véhicule / best L2 routes: PDV ids per slot
+    best_routes: list[list[int]] | None = None
+
+
+def simulation_fingerprint(
+    db: AsyncSession, request: AideDecisionRequest, pdv_agg: dict, contracts: list,
+) -> str:
+    """Empreinte des entrées d'une simulation / Fingerprint of a simulation's inputs."""
+    tenant = None if db.info.get(TENANT_BYPASS) else db.info.get("tenant_id")
+    h = hashlib.sha1()
+    h.update(repr((
+        tenant, request.base_origin_id, request.dispatch_date, request.temperature_class,
+    )).encode())
+    for pdv_id in sorted(pdv_agg):
+        agg = pdv_agg[pdv_id]
+        h.update(repr((pdv_id, agg["eqp_count"], agg["weight_kg"], agg["nb_colis"])).encode())
+    h.update(repr(sorted(c.id for c in contracts)).encode())
+    return h.hexdigest()
+
+
+def result_key(request: AideDecisionRequest) -> tuple:
+    """Paramètres de run hors empreinte / Run parameters outside the fingerprint."""
+    return (
+        request.level, request.time_limit_seconds, request.local_search_ms,
+        tuple(request.optimization_priorities), request.portfolio,
+    )
+
+
+class SimulationCache(CommitInvalidatedCache):
+    """Cache LRU process des simulations, vidé avec le distancier /
+    Process-wide LRU simulation cache, dropped with the distance matrix."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = SIMULATION_CACHE_TTL_SECONDS,
+        max_entries: int = SIMULATION_CACHE_MAX_ENTRIES,
+    ):
+        super().__init__("simulation_inputs", _REFERENCE_MODELS, ttl_seconds, max_entries,
+                         invalidated_by=(distance_store.snapshots,))
+
+    def put(self, fingerprint: str, inputs: SimulationInputs, generation: int) -> SimulationEntry:
+        """Enregistrer les données chargées ; `generation` est celle lue AVANT
+        le chargement (une invalidation concurrente rend l'entrée obsolète,
+        elle sert alors au seul appelant) / Store loaded data; `generation` is
+        read BEFORE loading."""
+        entry = SimulationEntry(inputs=inputs)
+        super().put(fingerprint, entry, generation)
+        return entry
+
+
+simulation_cache = SimulationCache()
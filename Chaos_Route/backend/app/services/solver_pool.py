@@ -0,0 +1,261 @@
+"""Pool de processus du solveur OR-Tools / OR-Tools solver process pool.
+
+`solve_cvrptw` est synchrone et tient le CPU 15-30 s : appelé directement depuis
+le service async, il bloquait la boucle d'événements (et donc toutes les autres
+requêtes du worker uvicorn). Il tourne désormais dans un `ProcessPoolExecutor`
+(contexte « spawn » : pas de fork d'un process multi-threadé).
+
+Les meilleures solutions intermédiaires remontent au process API par une file
+d'un `multiprocessing.Manager` ; l'annulation passe par un `Event` du même
+Manager, consulté par le solveur pendant la recherche (arrêt propre, meilleure
+solution courante retournée). Ce module n'importe que la configuration : c'est
+lui que les process enfants chargent.
+
+Mode portefeuille (`run_portfolio`) : plusieurs couples (premier placement,
+métaheuristique) sont lancés en parallèle dans le pool, sous la même limite de
+temps murale ; la meilleure solution (objectif OR-Tools) est retenue et la
+stratégie gagnante est journalisée pour ajuster les défauts par taille de base.
+Portfolio mode: several (first solution, metaheuristic) pairs run in parallel
+under one wall-clock limit; the best objective wins and the winner is logged.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue as queue_mod
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux remontées de progression (s) / Min progress interval
+PROGRESS_MIN_INTERVAL = 0.5
+# Fréquence de relève de la file de progression (s) / Progress queue polling period
+_POLL_SECONDS = 0.25
+
+# Portefeuille : (premier placement, métaheuristique) ; le premier couple est le
+# défaut historique / Portfolio: (first solution, metaheuristic); the first pair
+# is the historical default
+PORTFOLIO_STRATEGIES: tuple[tuple[str, str], ...] = (
+    ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    ("SAVINGS", "GUIDED_LOCAL_SEARCH"),
+    ("PARALLEL_CHEAPEST_INSERTION", "SIMULATED_ANNEALING"),
+    ("PATH_CHEAPEST_ARC", "TABU_SEARCH"),
+)
+# Temps restant minimal pour démarrer une stratégie en attente de process, et
+# temps garanti à la première (s) / Min remaining time to start a strategy
+# that waited for a process, and time granted to the first one (s)
+PORTFOLIO_MIN_SECONDS = 1
+
+_executor: ProcessPoolExecutor | None = None
+_manager = None
+
+
+@dataclass
+class PortfolioOutcome:
+    """Résultat d'une résolution en portefeuille / Portfolio solve result."""
+    tours: list
+    dropped: list[int]
+    strategy: str | None                  # stratégie gagnante / winning strategy
+    # Objectif final par stratégie (None = aucune solution ou non lancée) /
+    # final objective per strategy (None = no solution or not started)
+    objectives: dict[str, int | None] = field(default_factory=dict)
+
+
+def strategy_label(strategy: tuple[str, str]) -> str:
+    """« PREMIER_PLACEMENT+METAHEURISTIQUE » / "FIRST_SOLUTION+METAHEURISTIC"."""
+    return "+".join(strategy)
+
+
+def _solve_in_worker(
+    data, progress, stop, strategy: tuple[str, str] | None = None, deadline: float | None = None,
+    required: bool = False,
+) -> tuple[list, list[int], int | None] | None:
+    """Point d'entrée côté process enfant / Child-process entry point.
+
+    Retourne (tours, droppés, objectif final), ou None si la stratégie a
+    attendu un process au-delà de l'échéance du portefeuille (`deadline`,
+    horloge murale) ; une stratégie `required` tourne alors quand même
+    `PORTFOLIO_MIN_SECONDS`. Ne remonte que les améliorations (la recherche guidée
+    accepte des solutions moins bonnes), au plus une fois par
+    `PROGRESS_MIN_INTERVAL`.
+    """
+    from app.services.optimizer_ortools import solve_cvrptw
+
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining < PORTFOLIO_MIN_SECONDS:
+            if not required:
+                return None
+            remaining = PORTFOLIO_MIN_SECONDS
+        data.time_limit_seconds = min(data.time_limit_seconds, int(remaining))
+    label = None
+    if strategy is not None:
+        data.first_solution_strategy, data.local_search_metaheuristic = strategy
+        label = strategy_label(strategy)
+
+    started = time.monotonic()
+    state = {"best": None, "solutions": 0, "sent": 0.0}
+
+    def on_solution(objective: int, vehicles_used: int) -> None:
+        state["solutions"] += 1
+        if state["best"] is not None and objective >= state["best"]:
+            return
+        state["best"] = objective
+        now = time.monotonic()
+        if progress is not None and (state["solutions"] == 1 or now - state["sent"] >= PROGRESS_MIN_INTERVAL):
+            state["sent"] = now
+            event = {
+                "solutions": state["solutions"],
+                "best_objective": objective,
+                "vehicles_used": vehicles_used,
+                "elapsed_s": round(now - started, 2),
+            }
+            if label is not None:
+                event["strategy"] = label
+            progress.put(event)
+
+    should_stop = stop.is_set if stop is not None else None
+    tours, dropped = solve_cvrptw(data, on_solution=on_solution, should_stop=should_stop)
+    return tours, dropped, state["best"]
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.SOLVER_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _channels(with_progress: bool):
+    """File de progression + drapeau d'arrêt partagés / Shared progress queue + stop flag."""
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.get_context("spawn").Manager()
+    return (_manager.Queue() if with_progress else None), _manager.Event()
+
+
+def _drain(progress) -> list[dict]:
+    events = []
+    while True:
+        try:
+            events.append(progress.get_nowait())
+        except queue_mod.Empty:
+            return events
+
+
+async def _run_in_pool(
+    data, calls: list[tuple], on_progress: Callable[[dict], None] | None,
+) -> list:
+    """Lancer `_solve_in_worker(data, progress, stop, *call)` pour chaque appel
+    et attendre la fin de tous ; un même drapeau d'arrêt les couvre tous /
+    Run one worker per call and wait for all of them; one stop flag covers all.
+
+    Retourne les futures terminées (résultat ou exception) dans l'ordre des appels.
+    """
+    loop = asyncio.get_running_loop()
+    progress, stop = await asyncio.to_thread(_channels, on_progress is not None)
+    executor = _get_executor()
+    futures = [
+        loop.run_in_executor(executor, _solve_in_worker, data, progress, stop, *call)
+        for call in calls
+    ]
+    pending = set(futures)
+    try:
+        while pending:
+            _, pending = await asyncio.wait(pending, timeout=_POLL_SECONDS)
+            if progress is not None:
+                for event in await asyncio.to_thread(_drain, progress):
+                    on_progress(event)
+        return futures
+    except asyncio.CancelledError:
+        # Tâche annulée : prévenir les enfants (sinon ils tournent jusqu'à leur
+        # limite) / cancelled: tell the children to stop (otherwise they run to
+        # their time limit)
+        for future in futures:
+            future.cancel()
+        await asyncio.to_thread(stop.set)
+        raise
+
+
+async def run_solver(data, on_progress: Callable[[dict], None] | None = None) -> tuple[list, list[int]]:
+    """Résoudre dans le pool sans bloquer la boucle / Solve in the pool without blocking the loop.
+
+    `on_progress(event)` reçoit chaque amélioration (dans la boucle
+    d'événements). Annuler la tâche appelante arrête le solveur enfant.
+    """
+    (future,) = await _run_in_pool(data, [()], on_progress)
+    tours, dropped, _ = future.result()
+    return tours, dropped
+
+
+async def run_portfolio(
+    data,
+    on_progress: Callable[[dict], None] | None = None,
+    strategies: tuple[tuple[str, str], ...] = PORTFOLIO_STRATEGIES,
+) -> PortfolioOutcome:
+    """Résoudre avec plusieurs stratégies en parallèle, garder la meilleure /
+    Solve with several strategies in parallel, keep the best.
+
+    Toutes partagent la limite `data.time_limit_seconds` comptée depuis
+    l'appel : une stratégie qui attend un process libre n'a que le temps
+    restant (et n'est pas lancée sous `PORTFOLIO_MIN_SECONDS`) ; la première
+    est toujours lancée, avec au moins `PORTFOLIO_MIN_SECONDS`. `on_progress` ne reçoit que les améliorations de la
+    meilleure solution tous stratégies confondues (clé `strategy`). Une
+    stratégie en erreur est ignorée tant qu'une autre aboutit.
+    """
+    deadline = time.time() + data.time_limit_seconds
+    best_seen: dict[str, int | None] = {"objective": None}
+
+    def forward(event: dict) -> None:
+        if best_seen["objective"] is None or event["best_objective"] < best_seen["objective"]:
+            best_seen["objective"] = event["best_objective"]
+            on_progress(event)
+
+    calls = [(strategy, deadline, k == 0) for k, strategy in enumerate(strategies)]
+    futures = await _run_in_pool(data, calls, forward if on_progress is not None else None)
+
+    objectives: dict[str, int | None] = {}
+    best: tuple[int, str, tuple] | None = None
+    fallback = None
+    errors: list[BaseException] = []
+    for strategy, future in zip(strategies, futures):
+        label = strategy_label(strategy)
+        objectives[label] = None
+        if future.exception() is not None:
+            log.warning("Solver portfolio: %s failed", label, exc_info=future.exception())
+            errors.append(future.exception())
+            continue
+        result = future.result()
+        if result is None:
+            continue
+        fallback = fallback or result
+        objective = result[2]
+        objectives[label] = objective
+        if objective is not None and (best is None or objective < best[0]):
+            best = (objective, label, result)
+    if best is None and fallback is None and errors:
+        raise errors[0]
+    if best is None:
+        tours, dropped, _ = fallback
+        return PortfolioOutcome(tours=tours, dropped=dropped, strategy=None, objectives=objectives)
+    _, label, (tours, dropped, _) = best
+    return PortfolioOutcome(tours=tours, dropped=dropped, strategy=label, objectives=objectives)
+
+
+def shutdown_solver_pool() -> None:
+    """Arrêter le pool et le Manager (fin de vie de l'app) / Shut down pool and Manager."""
+    global _executor, _manager
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
@@ -0,0 +1,230 @@
+"""Versions de la timeline de planning / Planning timeline versions.
+
+L'écran de planning interroge `GET /api/tours/timeline` en continu ; chaque
+appel rechargeait trois jours de tours, arrêts et contrats pour renvoyer le
+plus souvent la même chose. Chaque modification d'un tour est désormais
+journalisée dans `timeline_changes` (une ligne par tour et par couple (base,
+jour) touché, ancien et nouveau en cas de déplacement) :
+- par un hook `after_flush` sur les écritures ORM (tour, arrêts, contrat dont
+  un libellé affiché change), dans la transaction qui modifie ;
+- par `record_timeline_changes` pour les écritures hors ORM (recalcul en
+  masse, import manifeste).
+
+Les lignes reçoivent leur `version` au COMMIT (`before_commit`), depuis
+l'horloge `timeline_clock` incrémentée par `UPDATE ... RETURNING` : le verrou
+de ligne est tenu jusqu'au COMMIT, donc les versions suivent l'ordre des
+commits. L'id (attribué à l'INSERT) ne convient pas : une transaction qui
+insère avant une autre mais valide après serait manquée par un client ayant
+déjà lu la version de la seconde.
+
+La version d'un couple (société, base, jour) est la plus grande de ses
+lignes : croissante, et comparable d'un couple à l'autre, donc un seul
+curseur suffit pour une fenêtre de plusieurs bases et jours. La timeline
+renvoie un ETag (304 si inchangée) et, avec `since=N`, seulement les tours
+modifiés après N (les autres sont gardés par le client).
+
+Le journal est purgé au-delà de `TIMELINE_CHANGES_KEEP_DAYS` (date du
+planning) ; une fenêtre plus ancienne est toujours servie en entier.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, insert, inspect, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.base_logistics import BaseLogistics
+from app.models.contract import Contract
+from app.models.timeline_change import TimelineChange, TimelineClock
+from app.models.tour import Tour
+from app.models.tour_stop import TourStop
+
+# Champs du contrat affichés dans la timeline / Contract fields shown in the timeline
+_CONTRACT_TIMELINE_FIELDS = ("code", "transporter_name", "vehicle_code", "vehicle_name")
+# Transaction avec des lignes à versionner au COMMIT / Transaction with rows to version at COMMIT
+_PENDING_KEY = "_timeline_pending"
+_COMMITTING_KEY = "_timeline_committing"
+_VERSION_KEY = "_timeline_version"
+
+
+def horizon() -> str:
+    """Plus ancienne date de planning versionnée / Oldest versioned planning date."""
+    return (datetime.now(timezone.utc) - timedelta(days=settings.TIMELINE_CHANGES_KEEP_DAYS)).strftime("%Y-%m-%d")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+async def record_timeline_changes(db: AsyncSession, tours: Iterable) -> None:
+    """Journaliser des tours modifiés hors ORM (objets ou lignes avec id,
+    base_id, date, tenant_id) / Log tours changed outside the ORM."""
+    now = _now()
+    rows = [
+        {"tenant_id": t.tenant_id, "base_id": t.base_id, "date": t.date, "tour_id": t.id, "changed_at": now}
+        for t in tours
+    ]
+    if rows:
+        conn = await db.connection()
+        await conn.execute(TimelineChange.__table__.insert(), rows)
+        db.info[_PENDING_KEY] = True
+
+
+# ── Lecture / Reading ─────────────────────────────────────────────
+
+
+def _scope(dates: list[str], base_id: int | None, region_ids: list[int] | None) -> list:
+    criteria = [TimelineChange.date.in_(dates)]
+    if base_id is not None:
+        criteria.append(TimelineChange.base_id == base_id)
+    if region_ids is not None:
+        criteria.append(TimelineChange.base_id.in_(
+            select(BaseLogistics.id).where(BaseLogistics.region_id.in_(region_ids))))
+    return criteria
+
+
+async def timeline_version(db: AsyncSession, dates: list[str], base_id: int | None = None,
+                           region_ids: list[int] | None = None) -> int:
+    """Version d'une fenêtre : la plus grande de ses couples (base, jour), 0 si
+    aucun changement / Window version: highest of its (base, day) versions."""
+    return (await db.scalar(
+        select(func.max(TimelineChange.version)).where(*_scope(dates, base_id, region_ids))
+    )) or 0
+
+
+async def changed_tour_ids(db: AsyncSession, since: int, dates: list[str], base_id: int | None = None,
+                           region_ids: list[int] | None = None) -> set[int]:
+    """Tours modifiés dans la fenêtre après la version `since` (y compris ceux
+    qui en sont sortis ou ont été supprimés) / Tours changed in the window after `since`."""
+    return set((await db.execute(
+        select(TimelineChange.tour_id).distinct()
+        .where(TimelineChange.version > since, *_scope(dates, base_id, region_ids))
+    )).scalars())
+
+
+def timeline_etag(version: int) -> str:
+    return f'W/"timeline-{version}"'
+
+
+# ── Journal dans la transaction d'écriture / Log in the writing transaction ──
+
+
+def _values(obj, attr: str) -> set:
+    """Valeur courante et valeur avant modification / Current and pre-change value."""
+    return {getattr(obj, attr), *inspect(obj).attrs[attr].history.deleted}
+
+
+def _changed(obj, attrs: tuple[str, ...]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def _log_timeline_changes(session: Session, flush_context) -> None:
+    """Journaliser, dans la transaction du flush, les tours dont la timeline
+    change / Log, in the flush's transaction, tours whose timeline changes."""
+    known: dict[int, Tour] = {}
+    keys: set[tuple] = set()  # (tenant_id, base_id, date, tour_id)
+    stop_tours: set[int] = set()
+    contract_ids: set[int] = set()
+    for status, objects in (("new", session.new), ("dirty", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            if isinstance(obj, Tour):
+                known[obj.id] = obj
+                if status != "dirty" or session.is_modified(obj, include_collections=False):
+                    keys.update(
+                        (obj.tenant_id, base_id, day, obj.id)
+                        for base_id in _values(obj, "base_id") if base_id
+                        for day in _values(obj, "date") if day
+                    )
+            elif isinstance(obj, TourStop):
+                if status != "dirty" or session.is_modified(obj, include_collections=False):
+                    stop_tours.update(tour_id for tour_id in _values(obj, "tour_id") if tour_id)
+            elif isinstance(obj, Contract):
+                if status == "dirty" and _changed(obj, _CONTRACT_TIMELINE_FIELDS):
+                    contract_ids.add(obj.id)
+    if not (keys or stop_tours or contract_ids):
+        return
+
+    conn = session.connection()
+    tours = Tour.__table__
+    unknown = []
+    for tour_id in stop_tours:
+        tour = known.get(tour_id) or session.identity_map.get(session.identity_key(Tour, tour_id))
+        if tour is None:
+            unknown.append(tour_id)
+        else:
+            keys.add((tour.tenant_id, tour.base_id, tour.date, tour_id))
+    if unknown:
+        keys.update(tuple(row) for row in conn.execute(
+            select(tours.c.tenant_id, tours.c.base_id, tours.c.date, tours.c.id)
+            .where(tours.c.id.in_(unknown))
+        ))
+
+    now = _now()
+    if keys:
+        conn.execute(TimelineChange.__table__.insert(), [
+            {"tenant_id": tenant_id, "base_id": base_id, "date": day, "tour_id": tour_id, "changed_at": now}
+            for tenant_id, base_id, day, tour_id in sorted(keys, key=lambda k: (k[1], k[2], k[3]))
+        ])
+    if contract_ids:
+        # Libellé de contrat modifié : tous ses tours encore versionnés, en une requête /
+        # Contract label changed: all its still-versioned tours, in one statement
+        conn.execute(TimelineChange.__table__.insert().from_select(
+            ["tenant_id", "base_id", "date", "tour_id", "changed_at"],
+            select(tours.c.tenant_id, tours.c.base_id, tours.c.date, tours.c.id, literal(now))
+            .where(tours.c.contract_id.in_(sorted(contract_ids)), tours.c.date >= horizon()),
+        ))
+    if session.info.get(_COMMITTING_KEY) and not session.in_nested_transaction():
+        # Flush du COMMIT lui-même : versionner tout de suite / The commit's own flush: stamp now
+        _stamp(session)
+    else:
+        session.info[_PENDING_KEY] = True
+
+
+# ── Version au COMMIT / Version at COMMIT ─────────────────────────
+
+
+def _stamp(session: Session) -> None:
+    """Donner aux lignes non versionnées de la transaction sa version, prise à
+    l'horloge au premier appel (verrou tenu jusqu'au COMMIT). Les lignes des
+    autres transactions en cours sont invisibles à l'UPDATE / Stamp the
+    transaction's unversioned rows with its version, taken from the clock on
+    first use; other in-flight transactions' rows are invisible to the UPDATE."""
+    conn = session.connection()
+    version = session.info.get(_VERSION_KEY)
+    if version is None:
+        clock = TimelineClock.__table__
+        version = conn.execute(
+            update(clock).where(clock.c.id == 1).values(version=clock.c.version + 1).returning(clock.c.version)
+        ).scalar()
+        if version is None:
+            # Horloge absente (base neuve, avant la migration) / No clock row yet
+            version = (conn.execute(select(func.max(TimelineChange.version))).scalar() or 0) + 1
+            conn.execute(insert(clock).values(id=1, version=version))
+        session.info[_VERSION_KEY] = version
+    changes = TimelineChange.__table__
+    conn.execute(update(changes).where(changes.c.version.is_(None)).values(version=version))
+
+
+@event.listens_for(Session, "before_commit")
+def _stamp_on_commit(session: Session) -> None:
+    """Versionner les lignes de la transaction ; les flushs restants du COMMIT
+    versionnent directement / Stamp the transaction's rows; the commit's own
+    flushes stamp directly."""
+    if session.in_nested_transaction():
+        return
+    session.info[_COMMITTING_KEY] = True
+    if session.info.pop(_PENDING_KEY, False):
+        _stamp(session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset_on_transaction_end(session: Session, transaction) -> None:
+    # Fin de la transaction racine (COMMIT ou ROLLBACK) ; les lignes d'un
+    # SAVEPOINT annulé ont disparu avec lui / Root transaction end
+    if transaction.parent is None:
+        for key in (_PENDING_KEY, _COMMITTING_KEY, _VERSION_KEY):
+            session.info.pop(key, None)
@@ -3,14 +3,62 @@
 Un logout (ou une rotation de refresh token) inscrit le jti du jeton dans la
 liste noire `revoked_tokens` ; toute utilisation ultérieure est refusée.
 Les entrées expirées sont purgées par la tâche de rétention quotidienne.
+
+La liste noire est tenue en mémoire (jetons non expirés) : `is_revoked` ne
+touche plus la base à chaque requête authentifiée. Les révocations de ce
+process y entrent à leur COMMIT et sont relayées aux autres workers par un
+signal du bus de suivi (`services/tracking_bus.py`) ; la liste est en outre
+relue toutes les `REVOKED_JTI_REFRESH_SECONDS` (signaux perdus, autres
+process). The blacklist is held in memory; local revocations join it on
+COMMIT and are signalled to the other workers; it is also reloaded
+periodically.
 """
 
+import time
 from datetime import datetime, timezone
 
-from sqlalchemy import delete, select
+from sqlalchemy import delete, event, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from app.models.revoked_token import RevokedToken
+from app.services.principal_cache import principal_cache
+from app.services.tracking_bus import on_signal, send_signal
+
+# Période de relecture de la liste noire (s) / Blacklist reload period (s)
+REVOKED_JTI_REFRESH_SECONDS = 60
+_PENDING_KEY = "_revoked_jtis_pending"
+_SIGNAL = "revoked_jtis"
+
+
+class _RevokedJtis:
+    """Jti révoqués non expirés / Non-expired revoked jtis."""
+
+    def __init__(self):
+        self.jtis: set[str] = set()
+        self.loaded_at: float | None = None
+
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > REVOKED_JTI_REFRESH_SECONDS
+
+    async def reload(self, session: AsyncSession) -> None:
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        before = set(self.jtis)
+        rows = await session.execute(select(RevokedToken.jti).where(RevokedToken.expires_at >= now))
+        # Garder les jti arrivés pendant la lecture / keep jtis added during the read
+        self.jtis = {row[0] for row in rows.all()} | (self.jtis - before)
+        self.loaded_at = time.monotonic()
+
+
+_revoked = _RevokedJtis()
+
+
+def _apply_remote(payload: dict) -> None:
+    """Révocations validées par un autre worker / Revocations committed by another worker."""
+    _revoked.jtis.update(payload["jtis"])
+
+
+on_signal(_SIGNAL, _apply_remote)
 
 
 def _exp_to_iso(payload: dict) -> str:
@@ -35,6 +83,9 @@ async def revoke_token(session: AsyncSession, payload: dict, reason: str) -> Non
         reason=reason,
     ))
     await session.flush()
+    session.info.setdefault(_PENDING_KEY, set()).add(jti)
+    if payload.get("sub"):
+        principal_cache.invalidate(int(payload["sub"]))
 
 
 async def is_revoked(session: AsyncSession, jti: str | None) -> bool:
@@ -43,10 +94,11 @@ async def is_revoked(session: AsyncSession, jti: str | None) -> bool:
         # Jetons émis avant A4 (sans jti) : non révocables individuellement,
         # ils expirent naturellement (access 30 min, refresh 7 j).
         return False
-    result = await session.execute(
-        select(RevokedToken.id).where(RevokedToken.jti == jti).limit(1)
-    )
-    return result.scalar_one_or_none() is not None
+    if jti in _revoked.jtis or jti in session.info.get(_PENDING_KEY, ()):
+        return True
+    if _revoked.stale():
+        await _revoked.reload(session)
+    return jti in _revoked.jtis
 
 
 async def purge_expired_revocations(session: AsyncSession) -> int:
@@ -54,3 +106,19 @@ async def purge_expired_revocations(session: AsyncSession) -> int:
     now = datetime.now(timezone.utc).isoformat(timespec="seconds")
     result = await session.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
     return result.rowcount or 0
+
+
+# ── Synchronisation avec les transactions / Transaction sync ───────
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        _revoked.jtis.update(pending)
+        send_signal(_SIGNAL, {"jtis": sorted(pending)})
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
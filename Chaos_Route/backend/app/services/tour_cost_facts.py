@@ -0,0 +1,339 @@
+"""Faits de coût par tour / Per-tour cost facts.
+
+La synthèse transporteur (`GET /api/tours/transporter-summary`) recalculait à
+chaque appel la décomposition du coût de tous les tours de la période (un
+COUNT par contrat/jour, les prix carburant date par date, une requête taxe km
+par segment, un rafraîchissement par surcharge) : des dizaines de secondes
+pour un mois d'une grande région. La décomposition est désormais persistée
+dans `tour_cost_facts` (une ligne par tour planifié) :
+- écrite par lots avec le moteur groupé de `services/tour_costing.py` : à la
+  lecture pour les tours sans fait, et par le recalcul en masse ;
+- supprimée dans la transaction qui modifie une de ses entrées (hook
+  `after_flush`) : tour (contrat ou jour → tous les tours du contrat ce
+  jour-là, dont la quote-part change ; km, base, départ → le tour), arrêts,
+  surcharges, contrat, prix carburant (jours de la période), taxe km (toute
+  la société). Une ligne présente est donc à jour ; une ligne absente est
+  recalculée à la prochaine lecture, seulement pour les tours concernés.
+
+Écritures concurrentes : une transaction qui invalide des faits incrémente
+l'horloge `tour_cost_fact_clock` juste avant son COMMIT (verrou de ligne
+gardé jusqu'au COMMIT) puis refait sa suppression ; un calcul lit l'horloge
+avant ses entrées et la relit `FOR SHARE` avant d'écrire ses faits : si elle
+a bougé, rien n'est enregistré (les faits calculés sont tout de même
+renvoyés). Une lecture ne peut donc pas enregistrer un fait périmé.
+`check_cost_facts` (POST /api/tours/cost-facts/rebuild) recalcule une
+période, compare et réécrit les écarts (écritures hors ORM, restauration).
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, delete, event, func, inspect, or_, select, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.contract import Contract
+from app.models.fuel_price import FuelPrice
+from app.models.km_tax import KmTax
+from app.models.tour import Tour
+from app.models.tour_cost_fact import TourCostFact, TourCostFactClock
+from app.models.tour_stop import TourStop
+from app.models.tour_surcharge import SurchargeStatus, TourSurcharge
+from app.services.tour_costing import CostInputs, load_cost_inputs
+
+# Tours par requête / insertion groupée / Tours per query / batched insert
+FACT_CHUNK = 1000
+# Valeurs d'un fait (hors clés) / Fact values (besides keys)
+FACT_VALUES = (
+    "fixed_share", "vacation_share", "fuel_cost", "km_tax_total",
+    "surcharges_total", "total_calculated", "fuel_price_missing",
+)
+# Champs qui déplacent un tour d'un (contrat, jour) à l'autre / Fields moving a tour between (contract, day)
+_TOUR_DAY_FIELDS = ("contract_id", "date")
+# Autres champs du tour qui entrent dans son coût / Other tour fields feeding its cost
+_TOUR_COST_FIELDS = ("base_id", "total_km", "departure_time")
+_STOP_COST_FIELDS = ("tour_id", "pdv_id", "sequence_order")
+_SURCHARGE_COST_FIELDS = ("tour_id", "amount", "status")
+# Clés session.info : conditions de suppression en attente du COMMIT, COMMIT
+# en cours / session.info keys: delete conditions awaiting COMMIT, COMMIT running
+_STALE_KEY = "cost_facts_stale"
+_COMMITTING_KEY = "cost_facts_committing"
+
+
+def _chunks(items: list, size: int = FACT_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert(dialect_name: str, table=TourCostFact.__table__):
+    """INSERT … ON CONFLICT du dialecte / Dialect INSERT … ON CONFLICT."""
+    return (pg_insert if dialect_name == "postgresql" else sqlite_insert)(table)
+
+
+async def read_fact_clock(db: AsyncSession, lock: bool = False) -> int:
+    """Version de l'horloge des entrées de coût, `FOR SHARE` si `lock` /
+    Cost-input clock version, FOR SHARE when `lock`."""
+    clock = TourCostFactClock.__table__
+    stmt = select(clock.c.version).where(clock.c.id == 1)
+    if lock:
+        stmt = stmt.with_for_update(read=True)
+    return (await db.execute(stmt)).scalar() or 0
+
+
+def _bump_clock(conn) -> None:
+    """Incrémenter l'horloge (ligne créée au besoin) ; le verrou de ligne est
+    gardé jusqu'au COMMIT / Bump the clock (row created if needed); the row
+    lock is held until COMMIT."""
+    clock = TourCostFactClock.__table__
+    bump = update(clock).where(clock.c.id == 1).values(version=clock.c.version + 1)
+    if conn.execute(bump).rowcount == 0:
+        conn.execute(_upsert(conn.dialect.name, clock).values(id=1, version=0).on_conflict_do_nothing())
+        conn.execute(bump)
+
+
+async def _surcharge_totals(db: AsyncSession, tour_ids: list[int]) -> dict[int, float]:
+    """Somme des surcharges validées par tour / Validated surcharges total per tour."""
+    totals: dict[int, float] = {}
+    for chunk in _chunks(tour_ids):
+        rows = await db.execute(
+            select(TourSurcharge.tour_id, func.sum(TourSurcharge.amount))
+            .where(TourSurcharge.tour_id.in_(chunk), TourSurcharge.status == SurchargeStatus.VALIDATED)
+            .group_by(TourSurcharge.tour_id)
+        )
+        totals.update((tour_id, float(total or 0)) for tour_id, total in rows)
+    return totals
+
+
+async def compute_cost_facts(db: AsyncSession, inputs: CostInputs) -> list[dict]:
+    """Faits (dicts de colonnes) des tours de `inputs` / Facts (column dicts) of the tours in `inputs`."""
+    costed = list(inputs.costed())
+    surcharges = await _surcharge_totals(db, [tour.id for tour, _ in costed])
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    facts = []
+    for tour, contract in costed:
+        parts = inputs.breakdown(tour, contract)
+        surcharges_total = surcharges.get(tour.id, 0.0)
+        facts.append({
+            "tour_id": tour.id, "tenant_id": tour.tenant_id,
+            "contract_id": tour.contract_id, "date": tour.date, **parts,
+            "surcharges_total": round(surcharges_total, 2),
+            "total_calculated": round(sum(parts.values()) + surcharges_total, 2),
+            "fuel_price_missing": not inputs.fuel_by_date.get(tour.date),
+            "computed_at": now,
+        })
+    return facts
+
+
+async def _write_facts(db: AsyncSession, facts: list[dict], clock: int) -> bool:
+    """Upsert hors ORM, tenant posé explicitement, si l'horloge vaut toujours
+    `clock` (lue avant les entrées) ; False sinon, rien n'est écrit /
+    Upsert outside the ORM, explicit tenant, only if the clock still reads
+    `clock` (read before the inputs); False otherwise, nothing written."""
+    if not facts:
+        return True
+    if await read_fact_clock(db, lock=True) != clock:
+        return False
+    conn = await db.connection()
+    for chunk in _chunks(facts):
+        stmt = _upsert(conn.dialect.name).values(chunk)
+        await conn.execute(stmt.on_conflict_do_update(
+            index_elements=[TourCostFact.__table__.c.tour_id],
+            set_={c: stmt.excluded[c] for c in ("contract_id", "date", *FACT_VALUES, "computed_at")},
+        ))
+    return True
+
+
+async def _delete_facts(db: AsyncSession, tour_ids: list[int]) -> None:
+    conn = await db.connection()
+    table = TourCostFact.__table__
+    for chunk in _chunks(tour_ids):
+        await conn.execute(delete(table).where(table.c.tour_id.in_(chunk)))
+
+
+async def store_cost_facts(db: AsyncSession, inputs: CostInputs, clock: int) -> list[dict]:
+    """Calculer les faits des tours de `inputs` et les enregistrer si
+    l'horloge vaut toujours `clock` (lue avant `inputs`) / Compute the facts
+    of the tours in `inputs`, store them if the clock still reads `clock`."""
+    facts = await compute_cost_facts(db, inputs)
+    await _write_facts(db, facts, clock)
+    return facts
+
+
+async def _stored_facts(db: AsyncSession, *criteria) -> dict[int, dict]:
+    rows = await db.execute(
+        select(TourCostFact.tour_id, TourCostFact.contract_id, TourCostFact.date,
+               *(getattr(TourCostFact, c) for c in FACT_VALUES))
+        .where(*criteria)
+    )
+    return {
+        row.tour_id: {
+            "contract_id": row.contract_id, "date": row.date,
+            **{c: float(getattr(row, c) or 0) for c in FACT_VALUES if c != "fuel_price_missing"},
+            "fuel_price_missing": bool(row.fuel_price_missing),
+        }
+        for row in rows
+    }
+
+
+async def load_cost_facts(db: AsyncSession, tour_ids: list[int]) -> dict[int, dict]:
+    """Faits des tours demandés, calculés et enregistrés pour ceux qui n'en ont
+    pas (tours non planifiés : absents) / Facts of the requested tours,
+    computed and stored for those without one (unplanned tours: absent)."""
+    facts: dict[int, dict] = {}
+    for chunk in _chunks(list(tour_ids)):
+        facts.update(await _stored_facts(db, TourCostFact.tour_id.in_(chunk)))
+    missing = [tour_id for tour_id in tour_ids if tour_id not in facts]
+    for chunk in _chunks(missing):
+        clock = await read_fact_clock(db)
+        for fact in await store_cost_facts(db, await load_cost_inputs(db, Tour.id.in_(chunk)), clock):
+            facts[fact["tour_id"]] = {k: fact[k] for k in ("contract_id", "date", *FACT_VALUES)}
+    return facts
+
+
+async def check_cost_facts(db: AsyncSession, date_from: str, date_to: str) -> dict:
+    """Contrôle de cohérence d'une période : recalcul complet, comparaison aux
+    faits enregistrés, réécriture des écarts / Consistency check of a period:
+    full recompute, compare with stored facts, rewrite the differences.
+
+    Si une écriture concurrente a bougé l'horloge, les écarts sont supprimés
+    (recalculés à la prochaine lecture) au lieu d'être réécrits /
+    After a concurrent write moved the clock, differences are dropped instead.
+    """
+    clock = await read_fact_clock(db)
+    expected = {
+        fact["tour_id"]: fact
+        for fact in await compute_cost_facts(db, await load_cost_inputs(db, Tour.date.between(date_from, date_to)))
+    }
+    stored = await _stored_facts(db, TourCostFact.date.between(date_from, date_to))
+
+    missing = [fact for tour_id, fact in expected.items() if tour_id not in stored]
+    mismatched = [
+        fact for tour_id, fact in expected.items()
+        if tour_id in stored and any(stored[tour_id][k] != fact[k] for k in ("contract_id", "date", *FACT_VALUES))
+    ]
+    orphans = [tour_id for tour_id in stored if tour_id not in expected]
+    if not await _write_facts(db, missing + mismatched, clock):
+        orphans += [fact["tour_id"] for fact in mismatched]
+    await _delete_facts(db, orphans)
+    return {
+        "date_from": date_from, "date_to": date_to, "tours": len(expected),
+        "missing": len(missing), "mismatched": len(mismatched), "orphans": len(orphans),
+    }
+
+
+# ── Invalidation dans la transaction d'écriture / Invalidation in the writing transaction ──
+
+
+@dataclass
+class _StaleFacts:
+    """Faits à supprimer après un flush / Facts to drop after a flush."""
+    days: set[tuple[int, str]] = field(default_factory=set)
+    tours: set[int] = field(default_factory=set)
+    contracts: set[int] = field(default_factory=set)
+    fuel_periods: set[tuple[int | None, str, str]] = field(default_factory=set)
+    tenants: set[int | None] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.days or self.tours or self.contracts or self.fuel_periods or self.tenants)
+
+
+def _values(obj, attr: str) -> set:
+    """Valeur courante et valeur avant modification / Current and pre-change value."""
+    history = inspect(obj).attrs[attr].history
+    return {getattr(obj, attr), *history.deleted}
+
+
+def _changed(obj, attrs: tuple[str, ...]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def _collect(session: Session) -> _StaleFacts:
+    stale = _StaleFacts()
+    for status, objects in (("new", session.new), ("dirty", session.dirty), ("deleted", session.deleted)):
+        for obj in objects:
+            if isinstance(obj, Tour):
+                if status != "dirty" or _changed(obj, _TOUR_DAY_FIELDS):
+                    stale.days.update(
+                        (contract_id, day) for contract_id in _values(obj, "contract_id") if contract_id
+                        for day in _values(obj, "date") if day
+                    )
+                elif _changed(obj, _TOUR_COST_FIELDS):
+                    stale.tours.add(obj.id)
+            elif isinstance(obj, TourStop):
+                if status != "dirty" or _changed(obj, _STOP_COST_FIELDS):
+                    stale.tours.update(tour_id for tour_id in _values(obj, "tour_id") if tour_id)
+            elif isinstance(obj, TourSurcharge):
+                if status != "dirty" or _changed(obj, _SURCHARGE_COST_FIELDS):
+                    stale.tours.update(tour_id for tour_id in _values(obj, "tour_id") if tour_id)
+            elif isinstance(obj, Contract):
+                if status != "new":
+                    stale.contracts.add(obj.id)
+            elif isinstance(obj, FuelPrice):
+                starts = [d for d in _values(obj, "start_date") if d]
+                ends = [d for d in _values(obj, "end_date") if d]
+                if starts and ends:
+                    stale.fuel_periods.add((obj.tenant_id, min(starts), max(ends)))
+            elif isinstance(obj, KmTax):
+                stale.tenants.add(obj.tenant_id)
+    return stale
+
+
+@event.listens_for(Session, "after_flush")
+def _drop_stale_facts(session: Session, flush_context) -> None:
+    """Supprimer, dans la transaction du flush, les faits dont une entrée vient
+    de changer / Drop, in the flush's transaction, facts whose inputs changed.
+
+    La condition est gardée pour `_drop_again_on_commit` ; un flush du COMMIT
+    lui-même incrémente l'horloge avant de supprimer / The condition is kept
+    for the commit hook; a flush run by COMMIT itself bumps the clock first.
+    """
+    stale = _collect(session)
+    if not stale:
+        return
+    table = TourCostFact.__table__
+    conditions = []
+    if stale.days:
+        conditions.append(tuple_(table.c.contract_id, table.c.date).in_(sorted(stale.days)))
+    if stale.tours:
+        conditions.append(table.c.tour_id.in_(sorted(stale.tours)))
+    if stale.contracts:
+        conditions.append(table.c.contract_id.in_(sorted(stale.contracts)))
+    for tenant_id, start, end in stale.fuel_periods:
+        period = table.c.date.between(start, end)
+        conditions.append(period if tenant_id is None else and_(period, table.c.tenant_id == tenant_id))
+    for tenant_id in stale.tenants:
+        conditions.append(true() if tenant_id is None else table.c.tenant_id == tenant_id)
+    condition = or_(*conditions)
+    conn = session.connection()
+    if session.info.get(_COMMITTING_KEY):
+        _bump_clock(conn)
+    else:
+        session.info.setdefault(_STALE_KEY, []).append(condition)
+    conn.execute(delete(table).where(condition))
+
+
+@event.listens_for(Session, "before_commit")
+def _drop_again_on_commit(session: Session) -> None:
+    """Incrémenter l'horloge puis refaire les suppressions de la transaction :
+    un fait écrit entre-temps par un calcul concurrent (lecture validée avant
+    le verrou) est supprimé, un calcul plus tardif voit l'horloge bouger /
+    Bump the clock, then redo the transaction's deletes."""
+    if session.in_nested_transaction():
+        return
+    session.info[_COMMITTING_KEY] = True
+    conditions = session.info.pop(_STALE_KEY, None)
+    if not conditions:
+        return
+    conn = session.connection()
+    _bump_clock(conn)
+    conn.execute(delete(TourCostFact.__table__).where(or_(*conditions)))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _reset_stale_facts(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop(_STALE_KEY, None)
+        session.info.pop(_COMMITTING_KEY, None)
@@ -0,0 +1,317 @@
+"""Moteur de coût des tours / Tour cost engine.
+
+Formule (inchangée) : (fixed_daily_cost / nb_tours_jour) + (vacation / nb_tours_jour)
++ (km × prix carburant × consumption_coefficient) + Σ taxe km par segment,
+chaque terme arrondi à 2 décimales.
+
+`compute_tour_cost` est une fonction pure sur des données préchargées, partagée
+par le calcul unitaire (`api/tours._calculate_cost`) et le recalcul en masse.
+
+`recalculate_costs` (POST /tours/recalculate) calculait tour par tour : un
+COUNT par contrat/jour, une lecture des prix carburant et une requête taxe km
+par segment, soit des milliers d'allers-retours pour un mois de planning. Le
+recalcul charge désormais tout en un nombre CONSTANT de requêtes :
+- tours (colonnes utiles, sans objets ORM) puis leurs arrêts ;
+- contrats (IN) ;
+- nb de tours par (contrat, jour) : un seul GROUP BY ;
+- prix carburant : une requête, résolus une fois par date distincte ;
+- taxes km : tous les segments distincts d'un coup (paquets de `KM_TAX_CHUNK`) ;
+puis un UPDATE groupé (executemany) des seuls tours dont le coût change. La
+durée de chaque phase est journalisée et renvoyée (`timings_ms`).
+
+`load_cost_inputs` / `CostInputs` portent ce chargement groupé, réutilisé par
+les faits de coût par tour (`services/tour_cost_facts.py`).
+"""
+
+import json
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Row, bindparam, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models.audit import AuditLog
+from app.models.contract import Contract
+from app.models.km_tax import KmTax
+from app.models.tour import Tour
+from app.models.tour_stop import TourStop
+from app.services.timeline_versions import record_timeline_changes
+from app.utils.fuel_pricing import contract_fuel_type, load_fuel_unit_prices_by_date, price_for_contract
+
+logger = logging.getLogger(__name__)
+
+# (origin_type, origin_id, dest_type, dest_id)
+Segment = tuple[str, int, str, int]
+
+# Segments par requête taxe km (4 paramètres chacun) / Segments per km-tax query (4 parameters each)
+KM_TAX_CHUNK = 500
+
+
+def build_segments(base_id: int, stops: list[dict]) -> list[Segment]:
+    """Construire la liste des segments du tour / Build list of tour segments.
+    Returns: [(origin_type, origin_id, dest_type, dest_id), ...]
+    """
+    segments: list[Segment] = []
+    sorted_stops = sorted(stops, key=lambda s: s.get("sequence_order", 0))
+    prev_type = "BASE"
+    prev_id = base_id
+    for stop in sorted_stops:
+        pdv_id = stop["pdv_id"]
+        segments.append((prev_type, prev_id, "PDV", pdv_id))
+        prev_type = "PDV"
+        prev_id = pdv_id
+    if sorted_stops:
+        segments.append(("PDV", sorted_stops[-1]["pdv_id"], "BASE", base_id))
+    return segments
+
+
+async def load_km_taxes(db: AsyncSession, segments: Iterable[Segment]) -> dict[Segment, float]:
+    """Taxe km des segments, en une requête par paquet de `KM_TAX_CHUNK` /
+    Km tax of the segments, one query per chunk.
+
+    Les segments sans taxe sont absents du résultat. Entrées en double pour un
+    même segment : la plus ancienne (id le plus bas) l'emporte.
+    """
+    wanted = list(set(segments))
+    key = tuple_(KmTax.origin_type, KmTax.origin_id, KmTax.destination_type, KmTax.destination_id)
+    taxes: dict[Segment, float] = {}
+    for start in range(0, len(wanted), KM_TAX_CHUNK):
+        rows = (await db.execute(
+            select(KmTax.origin_type, KmTax.origin_id, KmTax.destination_type, KmTax.destination_id,
+                   KmTax.tax_per_km)
+            .where(key.in_(wanted[start:start + KM_TAX_CHUNK]))
+            .order_by(KmTax.id)
+        )).all()
+        for origin_type, origin_id, dest_type, dest_id, tax in rows:
+            taxes.setdefault((origin_type, origin_id, dest_type, dest_id), float(tax or 0))
+    return taxes
+
+
+def cost_breakdown(
+    total_km: float,
+    contract: Contract,
+    nb_tours: int,
+    fuel_prices: dict[str, float],
+    segment_taxes: Iterable[float | None],
+) -> dict[str, float]:
+    """Composantes du coût d'un tour, chacune arrondie à 2 décimales /
+    Tour cost components, each rounded to 2 decimals.
+
+    `nb_tours` : tours du contrat ce jour ; `fuel_prices` : {fuel_type: prix} à
+    la date du tour ; `segment_taxes` : taxe de chaque segment (None = aucune).
+    """
+    # 1. Terme fixe + vacation / nombre de tours du contrat ce jour
+    nb_tours = nb_tours or 1
+    # 2. km * prix carburant (selon type du contrat) * coefficient consommation
+    fuel_price = price_for_contract(fuel_prices, contract)
+    consumption = float(contract.consumption_coefficient or 0)
+    # 3. Taxe km (montant forfaitaire par segment, pas un taux/km)
+    # Km tax (flat amount per segment, not a rate per km)
+    km_tax_total = 0.0
+    for tax in segment_taxes:
+        if tax:
+            km_tax_total += round(float(tax), 2)
+    return {
+        "fixed_share": round(float(contract.fixed_daily_cost or 0) / nb_tours, 2),
+        "vacation_share": round(float(contract.vacation or 0) / nb_tours, 2),
+        "fuel_cost": round(total_km * fuel_price * consumption, 2),
+        "km_tax_total": round(km_tax_total, 2),
+    }
+
+
+def compute_tour_cost(
+    total_km: float,
+    contract: Contract,
+    nb_tours: int,
+    fuel_prices: dict[str, float],
+    segment_taxes: Iterable[float | None],
+    tour_date: str,
+) -> tuple[float, list[str]]:
+    """Coût d'un tour à partir de données préchargées (pur) /
+    Tour cost from preloaded data (pure).
+    Retourne (cost, warnings) / Returns (cost, warnings)
+    """
+    warnings: list[str] = []
+    if not price_for_contract(fuel_prices, contract):
+        warnings.append(f"Aucun prix {contract_fuel_type(contract).lower()} trouvé pour la date {tour_date}")
+    # Arrondir chaque composant à 2 décimales (cohérent avec cost-breakdown)
+    # Round each component to 2 decimals (consistent with cost-breakdown)
+    cost = 0.0
+    for part in cost_breakdown(total_km, contract, nb_tours, fuel_prices, segment_taxes).values():
+        cost += part
+    return round(cost, 2), warnings
+
+
+class _PhaseTimer:
+    """Durée de chaque phase en ms / Per-phase duration in ms."""
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.timings[phase] = round(1000 * (now - self._last), 1)
+        self._last = now
+
+
+@dataclass
+class CostInputs:
+    """Tours planifiés d'un périmètre et tout ce que leur coût demande /
+    Planned tours of a scope and everything their cost needs."""
+    tours: list[Row]  # id, contract_id, date, base_id, total_km, total_cost, tenant_id
+    contracts: dict[int, Contract]
+    nb_tours: dict[tuple[int, str], int]
+    fuel_by_date: dict[str, dict[str, float]]
+    segments: dict[int, list[Segment]]
+    taxes: dict[Segment, float]
+
+    def costed(self) -> Iterator[tuple[Row, Contract]]:
+        """Tours dont le contrat est connu / Tours whose contract is known."""
+        for tour in self.tours:
+            contract = self.contracts.get(tour.contract_id)
+            if contract is not None:
+                yield tour, contract
+
+    def breakdown(self, tour: Row, contract: Contract) -> dict[str, float]:
+        return cost_breakdown(
+            float(tour.total_km or 0), contract, self.nb_tours.get((tour.contract_id, tour.date), 0),
+            self.fuel_by_date.get(tour.date, {}), [self.taxes.get(seg) for seg in self.segments[tour.id]],
+        )
+
+    def cost(self, tour: Row, contract: Contract) -> tuple[float, list[str]]:
+        return compute_tour_cost(
+            float(tour.total_km or 0), contract, self.nb_tours.get((tour.contract_id, tour.date), 0),
+            self.fuel_by_date.get(tour.date, {}), [self.taxes.get(seg) for seg in self.segments[tour.id]],
+            tour.date,
+        )
+
+
+async def load_cost_inputs(db: AsyncSession, *criteria, timer: _PhaseTimer | None = None) -> CostInputs:
+    """Charger, en nombre constant de requêtes, les tours planifiés (départ et
+    contrat renseignés) répondant à `criteria` et les données de leur coût /
+    Load planned tours matching `criteria` and their cost data, constant query count."""
+    timer = timer or _PhaseTimer()
+    criteria = (Tour.departure_time.isnot(None), Tour.contract_id.isnot(None), *criteria)
+    tours = (await db.execute(
+        select(Tour.id, Tour.contract_id, Tour.date, Tour.base_id, Tour.total_km, Tour.total_cost,
+               Tour.tenant_id)
+        .where(*criteria)
+    )).all()
+    stops: dict[int, list[dict]] = defaultdict(list)
+    if tours:
+        rows = await db.execute(
+            select(TourStop.tour_id, TourStop.pdv_id, TourStop.sequence_order)
+            .where(TourStop.tour_id.in_(select(Tour.id).where(*criteria)))
+        )
+        for tour_id, pdv_id, sequence_order in rows:
+            stops[tour_id].append({"pdv_id": pdv_id, "sequence_order": sequence_order})
+    timer.lap("tours")
+
+    contract_ids = {t.contract_id for t in tours}
+    contracts: dict[int, Contract] = {}
+    if contract_ids:
+        result = await db.execute(select(Contract).where(Contract.id.in_(contract_ids)))
+        contracts = {c.id: c for c in result.scalars()}
+    timer.lap("contracts")
+
+    # Nb de tours par (contrat, jour), tous statuts confondus comme le calcul unitaire /
+    # Tours per (contract, day), all statuses, as in the single-tour computation
+    dates = {t.date for t in tours}
+    nb_tours: dict[tuple[int, str], int] = {}
+    if contracts:
+        rows = await db.execute(
+            select(Tour.contract_id, Tour.date, func.count(Tour.id))
+            .where(Tour.contract_id.in_(list(contracts)), Tour.date.between(min(dates), max(dates)))
+            .group_by(Tour.contract_id, Tour.date)
+        )
+        nb_tours = {(cid, day): count for cid, day, count in rows}
+    timer.lap("nb_tours")
+
+    fuel_by_date = await load_fuel_unit_prices_by_date(db, dates)
+    timer.lap("fuel_prices")
+
+    segments = {t.id: build_segments(t.base_id, stops[t.id]) for t in tours if t.contract_id in contracts}
+    taxes = await load_km_taxes(db, (seg for segs in segments.values() for seg in segs))
+    timer.lap("km_taxes")
+    return CostInputs(tours, contracts, nb_tours, fuel_by_date, segments, taxes)
+
+
+async def recalculate_costs(
+    db: AsyncSession,
+    username: str,
+    date: str | None = None,
+    base_id: int | None = None,
+    contract_id: int | None = None,
+) -> dict:
+    """Recalculer en masse les coûts des tours planifiés (filtres optionnels) /
+    Bulk recalculate planned tour costs (optional filters).
+
+    Seuls les tours dont le coût change sont mis à jour, chacun avec une entrée
+    d'historique RECALCULATE (ancien / nouveau coût). L'UPDATE passe hors ORM :
+    les tours déjà chargés dans la session sont resynchronisés ici et signalés
+    à la timeline de planning. Les faits de coût (`tour_cost_facts`) du
+    périmètre sont réécrits au passage.
+    Retourne {"total", "updated", "timings_ms"}.
+    """
+    # Import local : tour_cost_facts importe ce module / local import: tour_cost_facts imports this module
+    from app.services.tour_cost_facts import read_fact_clock, store_cost_facts
+
+    timer = _PhaseTimer()
+    criteria = []
+    if date:
+        criteria.append(Tour.date == date)
+    if base_id:
+        criteria.append(Tour.base_id == base_id)
+    if contract_id:
+        criteria.append(Tour.contract_id == contract_id)
+    clock = await read_fact_clock(db)
+    inputs = await load_cost_inputs(db, *criteria, timer=timer)
+    tours = inputs.tours
+
+    changes: list[tuple[Row, float, float]] = []
+    missing_fuel: set[str] = set()
+    for tour, contract in inputs.costed():
+        new_cost, warnings = inputs.cost(tour, contract)
+        missing_fuel.update(warnings)
+        old_cost = float(tour.total_cost) if tour.total_cost else 0
+        if old_cost != new_cost:
+            changes.append((tour, old_cost, new_cost))
+    for warning in sorted(missing_fuel):
+        logger.warning("Recalculate: %s", warning)
+    timer.lap("compute")
+
+    if changes:
+        # Hors ORM, historique compris (executemany) : tenant posé explicitement /
+        # Outside the ORM, history included (executemany): explicit tenant
+        conn = await db.connection()
+        table = Tour.__table__
+        await conn.execute(
+            update(table).where(table.c.id == bindparam("b_id")).values(total_cost=bindparam("b_cost")),
+            [{"b_id": tour.id, "b_cost": new_cost} for tour, _, new_cost in changes],
+        )
+        now = datetime.utcnow().isoformat()
+        await conn.execute(AuditLog.__table__.insert(), [
+            {"entity_type": "tour", "entity_id": tour.id, "action": "RECALCULATE", "user": username,
+             "timestamp": now, "tenant_id": tour.tenant_id,
+             "changes": json.dumps({"old_cost": old_cost, "new_cost": new_cost}, ensure_ascii=False)}
+            for tour, old_cost, new_cost in changes
+        ])
+        await record_timeline_changes(db, [tour for tour, _, _ in changes])
+        sync = db.sync_session
+        for tour, _, new_cost in changes:
+            loaded = sync.identity_map.get(sync.identity_key(Tour, tour.id))
+            if loaded is not None:
+                set_committed_value(loaded, "total_cost", new_cost)
+    timer.lap("update")
+
+    await store_cost_facts(db, inputs, clock)
+    timer.lap("facts")
+
+    logger.info("Recalculate: %d tours, %d updated, timings (ms) %s", len(tours), len(changes), timer.timings)
+    return {"total": len(tours), "updated": len(changes), "timings_ms": timer.timings}
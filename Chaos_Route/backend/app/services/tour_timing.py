@@ -0,0 +1,142 @@
+"""
+Moteur de calcul des temps de tour / Tour timing engine.
+
+Chargement en nombre CONSTANT de requêtes, quel que soit le nombre d'arrêts :
+1 requête paramètres + 1 requête PDV + distancier en mémoire (0 requête à chaud).
+Le calcul lui-même (`compute_tour_times`) est une fonction pure sur des maps
+préchargées : réutilisable pour recalculer plusieurs tours / variantes d'ordre
+sans aller-retour base (glisser-déposer du planning).
+"""
+
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Protocol
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.parameter import Parameter
+from app.models.pdv import PDV
+from app.services.distance_matrix_store import DistanceEntry, get_distance_snapshot
+
+# -- Constantes par défaut / Default constants --
+DEFAULT_DOCK_TIME_MINUTES = 15
+DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES = 2  # minutes par EQC / minutes per EQC (nom hérité)
+
+PARAM_DOCK_TIME = "default_dock_time_minutes"
+PARAM_UNLOAD_TIME = "default_unload_time_per_eqp_minutes"
+
+
+class DistanceLookup(Protocol):
+    """Source de distances (instantané du distancier ou équivalent de test)."""
+
+    def lookup(
+        self, origin_type: str, origin_id: int, dest_type: str, dest_id: int,
+    ) -> DistanceEntry | None: ...
+
+
+@dataclass
+class TimingContext:
+    """Données préchargées pour le calcul des temps / Preloaded timing data."""
+    default_dock: int
+    default_unload: int
+    pdvs: Mapping[int, PDV]
+    distances: DistanceLookup
+
+
+async def load_timing_params(db: AsyncSession) -> tuple[int, int]:
+    """Lire les temps par défaut (quai, déchargement/EQP) en UNE requête /
+    Read default dock and unload-per-EQP times in ONE query."""
+    result = await db.execute(
+        select(Parameter.key, Parameter.value)
+        .where(Parameter.key.in_([PARAM_DOCK_TIME, PARAM_UNLOAD_TIME]))
+        .order_by(Parameter.id)
+    )
+    values: dict[str, str] = {}
+    for key, value in result.all():
+        values.setdefault(key, value)
+    return (
+        int(values.get(PARAM_DOCK_TIME, DEFAULT_DOCK_TIME_MINUTES)),
+        int(values.get(PARAM_UNLOAD_TIME, DEFAULT_UNLOAD_TIME_PER_EQP_MINUTES)),
+    )
+
+
+async def load_timing_context(db: AsyncSession, pdv_ids: Iterable[int]) -> TimingContext:
+    """Précharger paramètres, PDV et distancier / Preload parameters, PDVs and distances."""
+    default_dock, default_unload = await load_timing_params(db)
+    ids = {pid for pid in pdv_ids if pid is not None}
+    pdvs: dict[int, PDV] = {}
+    if ids:
+        result = await db.execute(select(PDV).where(PDV.id.in_(ids)))
+        pdvs = {p.id: p for p in result.scalars().all()}
+    distances = await get_distance_snapshot(db)
+    return TimingContext(default_dock, default_unload, pdvs, distances)
+
+
+def compute_tour_times(
+    departure_time: str,
+    stops_data: list[dict],
+    base_id: int,
+    ctx: TimingContext,
+) -> tuple[list[dict], str, int]:
+    """
+    Calculer les temps à chaque arrêt (fonction pure) / Calculate times at each stop (pure).
+
+    Returns: (enriched_stops, return_time, total_duration_minutes)
+    """
+    current_time = datetime.strptime(departure_time, "%H:%M")
+    prev_type = "BASE"
+    prev_id = base_id
+    enriched = []
+
+    for stop in stops_data:
+        pdv_id = stop["pdv_id"]
+        # Forcer float : eqp_count peut etre Decimal (colonne numeric en DB)
+        # et timedelta n'accepte pas Decimal /
+        # Force float: eqp_count may be Decimal (numeric column) and timedelta
+        # doesn't accept Decimal
+        eqp_count = float(stop["eqp_count"])
+
+        dist_entry = ctx.distances.lookup(prev_type, prev_id, "PDV", pdv_id)
+        travel_minutes = dist_entry.duration_minutes if dist_entry else 0
+        distance_km = float(dist_entry.distance_km) if dist_entry else 0.0
+
+        arrival = current_time + timedelta(minutes=travel_minutes)
+
+        pdv = ctx.pdvs.get(pdv_id)
+        dock_time = pdv.dock_time_minutes if (pdv and pdv.dock_time_minutes) else ctx.default_dock
+        unload_per_eqp = pdv.unload_time_per_eqp_minutes if (pdv and pdv.unload_time_per_eqp_minutes) else ctx.default_unload
+        unload_duration = dock_time + (eqp_count * unload_per_eqp)
+
+        departure = arrival + timedelta(minutes=unload_duration)
+
+        enriched.append({
+            "pdv_id": pdv_id,
+            "sequence_order": stop["sequence_order"],
+            "eqp_count": eqp_count,
+            "arrival_time": arrival.strftime("%H:%M"),
+            "departure_time": departure.strftime("%H:%M"),
+            "distance_from_previous_km": round(distance_km, 2),
+            "duration_from_previous_minutes": travel_minutes,
+        })
+
+        current_time = departure
+        prev_type = "PDV"
+        prev_id = pdv_id
+
+    if enriched:
+        last_pdv_id = enriched[-1]["pdv_id"]
+        return_dist = ctx.distances.lookup("PDV", last_pdv_id, "BASE", base_id)
+        return_minutes = return_dist.duration_minutes if return_dist else 0
+        return_time = (current_time + timedelta(minutes=return_minutes)).strftime("%H:%M")
+    else:
+        return_time = departure_time
+
+    start_dt = datetime.strptime(departure_time, "%H:%M")
+    end_dt = datetime.strptime(return_time, "%H:%M")
+    total_minutes = int((end_dt - start_dt).total_seconds() / 60)
+    if total_minutes < 0:
+        total_minutes += 24 * 60
+
+    return enriched, return_time, total_minutes
@@ -0,0 +1,267 @@
+"""Bus de diffusion du suivi entre workers / Cross-worker tracking broadcast bus.
+
+Le hub WebSocket (`api/ws_tracking.py`) ne connaît que les connexions de son
+process : avec plusieurs workers uvicorn, un lot GPS traité par le worker A
+n'atteignait pas les dispatchers connectés au worker B. `broadcast()` passe
+désormais par un backend interchangeable (`TRACKING_BROADCAST_BACKEND`) :
+- `memory` (défaut) : livraison locale seulement — un seul worker ;
+- `postgres` : livraison locale immédiate, puis `pg_notify` sur le canal
+  `TRACKING_CHANNEL` ; chaque worker écoute (`LISTEN`, connexion asyncpg
+  dédiée, reconnectée en cas de perte) et livre à SES connexions les messages
+  des autres workers.
+
+La publication n'attend jamais PostgreSQL : les NOTIFY sortants passent par
+une file bornée (`NOTIFY_QUEUE_SIZE`, la plus ancienne entrée perdue quand
+elle est pleine) vidée par une seule tâche d'envoi, sur sa propre connexion
+(distincte de celle du LISTEN, qui ne sert qu'à recevoir).
+
+Le cloisonnement est inchangé : l'enveloppe transporte le tenant (et la base)
+de la donnée, et le worker destinataire applique le même filtrage que pour un
+message local.
+
+Le même canal porte des SIGNAUX entre workers, jamais livrés aux WebSocket :
+`send_signal(kind, payload)` (appelable depuis un hook synchrone) les envoie
+aux autres workers, qui appellent le gestionnaire enregistré par
+`on_signal(kind, handler)` — état partagé (progression d'import) ou
+invalidation de caches locaux (caches de référence, état temps réel). Sans
+backend `postgres` (un seul worker), `send_signal` ne fait rien.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Canal LISTEN/NOTIFY / LISTEN/NOTIFY channel
+TRACKING_CHANNEL = "aegis_tracking"
+# Charge utile max d'un NOTIFY (limite PostgreSQL 8000 octets) / Max NOTIFY payload
+NOTIFY_MAX_BYTES = 7900
+# Délai max d'un NOTIFY (s) / Max NOTIFY time (s)
+NOTIFY_TIMEOUT_SECONDS = 2
+# NOTIFY en attente d'envoi par worker / Outgoing NOTIFY backlog per worker
+NOTIFY_QUEUE_SIZE = 1000
+# Attente avant reconnexion de l'écoute (s) / Listener reconnect delay (s)
+LISTEN_RETRY_SECONDS = 5
+
+Deliver = Callable[[dict, int | None, int | None], Awaitable[None]]
+SignalHandler = Callable[[dict], None]
+
+# Gestionnaires de signaux par type / Signal handlers per kind
+_signal_handlers: dict[str, SignalHandler] = {}
+# Backend qui relaie les signaux (None : un seul worker) / Backend relaying signals (None: single worker)
+_signal_backend: "PostgresNotifyBackend | None" = None
+
+
+def on_signal(kind: str, handler: SignalHandler) -> None:
+    """Enregistrer le gestionnaire d'un type de signal / Register the handler of a signal kind."""
+    _signal_handlers[kind] = handler
+
+
+def send_signal(kind: str, payload: dict) -> None:
+    """Envoyer un signal aux AUTRES workers, sans attendre / Send a signal to the
+    other workers, without waiting. No-op avec un seul worker."""
+    if _signal_backend is not None:
+        _signal_backend.signal(kind, payload)
+
+
+class InProcessBackend:
+    """Livraison aux seules connexions de ce process / Local-only delivery."""
+
+    name = "memory"
+
+    def __init__(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, message: dict, tenant_id: int | None, base_id: int | None) -> None:
+        await self._deliver(message, tenant_id, base_id)
+
+
+class PostgresNotifyBackend:
+    """Diffusion entre workers par LISTEN/NOTIFY / Cross-worker delivery via LISTEN/NOTIFY."""
+
+    name = "postgres"
+
+    def __init__(self, deliver: Deliver, dsn: str | None = None, channel: str = TRACKING_CHANNEL):
+        self._deliver = deliver
+        self._dsn = dsn or settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.channel = channel
+        # Identifiant de ce worker (ignore ses propres NOTIFY) / This worker's id (skips own NOTIFY)
+        self.origin = uuid.uuid4().hex
+        # Connexion LISTEN (réception) et connexion NOTIFY (envoi) /
+        # LISTEN connection (receiving) and NOTIFY connection (sending)
+        self._conn = None
+        self._notify_conn = None
+        self._task: asyncio.Task | None = None
+        self._outbox: asyncio.Queue[str] = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self._sender: asyncio.Task | None = None
+        # NOTIFY perdus, file pleine / NOTIFY dropped on a full queue
+        self.dropped = 0
+        self._pending: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        global _signal_backend
+        self._task = asyncio.create_task(self._listen_forever())
+        _signal_backend = self
+
+    async def stop(self) -> None:
+        global _signal_backend
+        if _signal_backend is self:
+            _signal_backend = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            async with asyncio.timeout(NOTIFY_TIMEOUT_SECONDS):
+                await self.flush()
+        except TimeoutError:
+            logger.warning("Suivi : %d NOTIFY non envoyés à l'arrêt", self._outbox.qsize())
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        for conn in (self._conn, self._notify_conn):
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        self._conn = self._notify_conn = None
+
+    async def flush(self) -> None:
+        """Attendre l'envoi des NOTIFY en file / Wait until queued NOTIFY are sent."""
+        if self._sender is not None and not self._sender.done():
+            await self._outbox.join()
+
+    def encode(self, message: dict, tenant_id: int | None, base_id: int | None) -> str:
+        """Enveloppe : origine, tenant, base, message / Envelope: origin, tenant, base, message."""
+        return json.dumps({"o": self.origin, "t": tenant_id, "b": base_id, "m": message},
+                          ensure_ascii=False, separators=(",", ":"))
+
+    async def publish(self, message: dict, tenant_id: int | None, base_id: int | None) -> None:
+        await self._deliver(message, tenant_id, base_id)
+        payload = self.encode(message, tenant_id, base_id)
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            logger.warning("Message de suivi trop volumineux pour NOTIFY (%s) : livré localement seulement",
+                           message.get("type"))
+            return
+        self._enqueue(payload)
+
+    def signal(self, kind: str, payload: dict) -> None:
+        """Signal aux autres workers, mis en file comme une publication (hooks
+        synchrones) / Signal the other workers, queued like a publication."""
+        encoded = json.dumps({"o": self.origin, "s": kind, "p": payload},
+                             ensure_ascii=False, separators=(",", ":"))
+        if len(encoded.encode()) > NOTIFY_MAX_BYTES:
+            logger.warning("Signal %s trop volumineux pour NOTIFY : non relayé", kind)
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._enqueue(encoded)
+
+    def _enqueue(self, payload: str) -> None:
+        """Mettre un NOTIFY en file sans attendre ; file pleine : le plus ancien
+        est perdu / Queue a NOTIFY without waiting; full queue drops the oldest."""
+        if self._outbox.full():
+            self._outbox.get_nowait()
+            self._outbox.task_done()
+            self.dropped += 1
+            if self.dropped % NOTIFY_QUEUE_SIZE == 1:
+                logger.warning("Suivi : file NOTIFY pleine, %d messages perdus vers les autres workers",
+                               self.dropped)
+        self._outbox.put_nowait(payload)
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.get_running_loop().create_task(self._send_forever())
+
+    async def _send_forever(self) -> None:
+        """Seule tâche d'envoi : vide la file dans l'ordre / Single sender: drains the queue in order."""
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await self._notify(payload)
+            finally:
+                self._outbox.task_done()
+
+    async def _notify(self, payload: str) -> None:
+        try:
+            async with asyncio.timeout(NOTIFY_TIMEOUT_SECONDS):
+                conn = self._notify_conn
+                if conn is None or conn.is_closed():
+                    import asyncpg
+
+                    conn = self._notify_conn = await asyncpg.connect(self._dsn)
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+        except Exception:
+            logger.warning("Échec de publication du suivi vers les autres workers", exc_info=True)
+            # Connexion dans un état inconnu après un délai dépassé : la refaire /
+            # Connection state unknown after a timeout: reopen it
+            conn, self._notify_conn = self._notify_conn, None
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+
+    async def receive(self, payload: str) -> None:
+        """Livrer localement un message d'un autre worker / Deliver another worker's message locally."""
+        try:
+            envelope = json.loads(payload)
+            origin = envelope["o"]
+            if "s" in envelope:
+                kind, data = envelope["s"], envelope["p"]
+            else:
+                tenant_id, base_id, message = envelope["t"], envelope["b"], envelope["m"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Enveloppe de suivi illisible ignorée")
+            return
+        if origin == self.origin:
+            return
+        if "s" in envelope:
+            handler = _signal_handlers.get(kind)
+            if handler is not None:
+                try:
+                    handler(data)
+                except Exception:
+                    logger.exception("Signal %s : échec du gestionnaire", kind)
+            return
+        await self._deliver(message, tenant_id, base_id)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        task = asyncio.create_task(self.receive(payload))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _listen_forever(self) -> None:
+        import asyncpg
+
+        while True:
+            try:
+                self._conn = await asyncpg.connect(self._dsn)
+                await self._conn.add_listener(self.channel, self._on_notify)
+                logger.info("Suivi : écoute du canal %s (worker %s)", self.channel, self.origin[:8])
+                while not self._conn.is_closed():
+                    await asyncio.sleep(LISTEN_RETRY_SECONDS)
+                logger.warning("Suivi : connexion d'écoute perdue, reconnexion")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Suivi : échec de l'écoute %s, nouvel essai dans %d s",
+                                 self.channel, LISTEN_RETRY_SECONDS)
+            await asyncio.sleep(LISTEN_RETRY_SECONDS)
+
+
+def make_backend(deliver: Deliver, name: str | None = None):
+    """Backend configuré (`TRACKING_BROADCAST_BACKEND`) / Configured backend."""
+    name = name or settings.TRACKING_BROADCAST_BACKEND
+    if name == "memory":
+        return InProcessBackend(deliver)
+    if name == "postgres":
+        if not settings.DATABASE_URL.startswith("postgresql"):
+            raise ValueError("TRACKING_BROADCAST_BACKEND=postgres exige une base PostgreSQL")
+        return PostgresNotifyBackend(deliver)
+    raise ValueError(f"TRACKING_BROADCAST_BACKEND inconnu : {name!r} (memory | postgres)")
@@ -5,6 +5,8 @@ on charge les prix valides à une date pour chaque type, puis on choisit le
 prix selon le type du contrat (défaut GASOIL pour les contrats legacy).
 """
 
+from collections.abc import Iterable
+
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -38,6 +40,37 @@ async def load_fuel_unit_prices(db: AsyncSession, date: str) -> dict[str, float]
     return out
 
 
+async def load_fuel_unit_prices_by_date(
+    db: AsyncSession, dates: Iterable[str],
+) -> dict[str, dict[str, float]]:
+    """Prix carburant par date et par type, en une requête /
+    Fuel prices per date and type, in one query.
+
+    Même règle que `load_fuel_unit_prices`, appliquée à chaque date à partir des
+    périodes qui recouvrent l'intervalle [min(dates), max(dates)].
+    Retourne {date: {fuel_type: prix}} (dict vide pour une date sans prix).
+    """
+    wanted = sorted(set(dates))
+    if not wanted:
+        return {}
+    rows = (await db.execute(
+        select(FuelPrice.fuel_type, FuelPrice.price_per_liter, FuelPrice.start_date, FuelPrice.end_date)
+        .where(FuelPrice.start_date <= wanted[-1], FuelPrice.end_date >= wanted[0])
+        .order_by(FuelPrice.start_date.desc())
+    )).all()
+    out: dict[str, dict[str, float]] = {}
+    for date in wanted:
+        prices: dict[str, float] = {}
+        for ft, price, start, end in rows:
+            if not start <= date <= end:
+                continue
+            key = (ft.value if hasattr(ft, "value") else str(ft)) if ft is not None else FuelType.DIESEL.value
+            if key not in prices:
+                prices[key] = float(price) if price is not None else 0.0
+        out[date] = prices
+    return out
+
+
 def price_for_contract(prices: dict[str, float], contract) -> float:
     """Prix carburant applicable au contrat (0.0 si absent)."""
     return prices.get(contract_fuel_type(contract), 0.0)
@@ -1,15 +1,55 @@
-"""Utilitaires géographiques / Geographic utilities."""
+"""Utilitaires géographiques / Geographic utilities.
+
+Module géo unique du backend : haversine scalaire et vectorisée (NumPy),
+matrices de distances et boîte englobante. Les coordonnées
+absentes (None) ou nulles (0, convention « non géocodé » des référentiels) sont
+traitées comme inconnues (NaN).
+"""
 
 import math
+from collections.abc import Iterable
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Correction vol d'oiseau → route (routes sinueuses) / Straight line → road factor
+ROAD_FACTOR = 1.3
 
 
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Distance Haversine en km / Haversine distance in km."""
-    R = 6371.0
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
     a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Haversine vectorisée avec broadcasting NumPy (km) / Broadcasting NumPy haversine (km).
+
+    NaN en entrée → NaN en sortie.
+    """
+    rlat1, rlon1, rlat2, rlon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((rlat2 - rlat1) / 2) ** 2 + np.cos(rlat1) * np.cos(rlat2) * np.sin((rlon2 - rlon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lats, lons, lats2=None, lons2=None) -> np.ndarray:
+    """Matrice des distances [len(lats), len(lats2)] en km / Pairwise distance matrix in km.
+
+    Sans second jeu de points : matrice carrée des points entre eux.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if lats2 is None:
+        lats2, lons2 = lats, lons
+    return haversine_np(lats[:, None], lons[:, None], np.asarray(lats2)[None, :], np.asarray(lons2)[None, :])
+
+
+def coord_array(values: Iterable) -> np.ndarray:
+    """Coordonnées → tableau float64, None/0 → NaN / Coordinates to float64, None/0 → NaN."""
+    return np.array([float(v) if v else np.nan for v in values], dtype=np.float64)
 
 
 def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float, float, float]:
@@ -20,3 +60,4 @@ def bounding_box(lat: float, lon: float, radius_km: float) -> tuple[float, float
     delta_lat = radius_km / 111.0
     delta_lon = radius_km / (111.0 * math.cos(math.radians(lat)))
     return (lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon)
+
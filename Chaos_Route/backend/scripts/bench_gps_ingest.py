@@ -0,0 +1,194 @@
+"""Test de charge de l'ingestion GPS / GPS ingestion load test.
+
+Simule N téléphones (200 par défaut) postant chacun un lot de positions sur
+`POST /api/driver/gps` au rythme de `RATE_LIMIT_GPS` (30/minute → un lot
+toutes les 2 s), pendant une durée donnée. Les départs sont étalés sur le
+premier intervalle, comme un parc réel. Le limiteur de débit est désactivé
+(tous les appels viennent du même client) : c'est le rythme des appareils
+simulés qui respecte la limite.
+
+Affiche lots/s, positions/s, latences p50/p95/p99/max, erreurs, et le nombre
+de positions effectivement en base en fin de test (tampon vidé).
+
+Base jetable par défaut (sqlite temporaire, schéma créé depuis les modèles) ;
+`--database-url` permet de viser une base PostgreSQL de test — JAMAIS la
+production : le script crée un tenant, des appareils, tours et affectations.
+
+Usage :
+    cd backend
+    python -m scripts.bench_gps_ingest --devices 200 --duration 30
+    python -m scripts.bench_gps_ingest --write-behind-ms 250
+    python -m scripts.bench_gps_ingest --database-url postgresql+asyncpg://.../aegis_bench
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+
+def _log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def _rate_interval(limit: str) -> float:
+    """« 30/minute » → 2.0 s entre deux lots / seconds between two batches."""
+    count, _, period = limit.partition("/")
+    seconds = {"second": 1, "minute": 60, "hour": 3600}[period.strip().rstrip("s")]
+    return seconds / int(count)
+
+
+async def _setup(devices: int) -> list[tuple[str, int]]:
+    """Tenant, base, appareils, tours et affectations / Fixture data.
+    Retourne (device_identifier, tour_id) par appareil simulé."""
+    from app.database import async_session, set_session_tenant
+    from app.models.base_logistics import BaseLogistics
+    from app.models.country import Country
+    from app.models.device_assignment import DeviceAssignment
+    from app.models.mobile_device import MobileDevice
+    from app.models.region import Region
+    from app.models.tenant import Tenant
+    from app.models.tour import Tour, TourStatus
+
+    sfx = uuid.uuid4().hex[:5].upper()
+    async with async_session() as db:
+        tenant = Tenant(code=f"G{sfx}", name=f"Bench GPS {sfx}")
+        db.add(tenant)
+        await db.commit()
+        set_session_tenant(db, tenant.id)
+        country = Country(name="Bench", code=sfx[:3])
+        db.add(country)
+        await db.flush()
+        region = Region(name=f"Bench GPS {sfx}", country_id=country.id)
+        db.add(region)
+        await db.flush()
+        base = BaseLogistics(code=f"G{sfx}", name="Base bench", region_id=region.id)
+        db.add(base)
+        await db.flush()
+        fleet = [
+            MobileDevice(device_identifier=f"bench-{sfx}-{k}", registration_code=f"{sfx}{k:04d}",
+                         is_active=True, profile="DRIVER")
+            for k in range(devices)
+        ]
+        tours = [
+            Tour(date="2026-07-08", code=f"G{sfx}-{k}", base_id=base.id, status=TourStatus.IN_PROGRESS)
+            for k in range(devices)
+        ]
+        db.add_all(fleet + tours)
+        await db.flush()
+        db.add_all([
+            DeviceAssignment(tour_id=tour.id, device_id=device.id, date="2026-07-08")
+            for device, tour in zip(fleet, tours)
+        ])
+        await db.commit()
+        return [(d.device_identifier, t.id) for d, t in zip(fleet, tours)]
+
+
+async def _phone(client, identifier: str, tour_id: int, interval: float, until: float,
+                 points: int, latencies: list[float], errors: list[int]) -> None:
+    rng = random.Random(identifier)
+    lat, lon = 50.5 + rng.uniform(-0.5, 0.5), 4.5 + rng.uniform(-0.5, 0.5)
+    await asyncio.sleep(rng.uniform(0, interval))
+    headers = {"X-Device-ID": identifier}
+    while time.monotonic() < until:
+        started = time.monotonic()
+        positions = []
+        for _ in range(points):
+            lat += rng.uniform(-0.0005, 0.0005)
+            lon += rng.uniform(-0.0005, 0.0005)
+            positions.append({"latitude": lat, "longitude": lon, "accuracy": 5.0, "speed": 50.0,
+                              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())})
+        resp = await client.post("/api/driver/gps", json={"tour_id": tour_id, "positions": positions},
+                                 headers=headers)
+        latencies.append(time.monotonic() - started)
+        if resp.status_code != 200:
+            errors.append(resp.status_code)
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--devices", type=int, default=200, help="téléphones simulés")
+    ap.add_argument("--duration", type=float, default=30, help="durée du test (s)")
+    ap.add_argument("--points", type=int, default=5, help="positions par lot")
+    ap.add_argument("--write-behind-ms", type=int, default=None,
+                    help="active le tampon d'écriture différée (GPS_WRITE_BEHIND_MS)")
+    ap.add_argument("--database-url", default=None,
+                    help="base de bench (défaut : sqlite temporaire)")
+    args = ap.parse_args()
+
+    tmp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp_dir.name, 'bench.db').as_posix()}"
+    if args.write_behind_ms is not None:
+        os.environ["GPS_WRITE_BEHIND_MS"] = str(args.write_behind_ms)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy import func, select
+
+    import app.main  # noqa: F401 — charge tous les modèles / loads every model
+    from app.config import settings
+    from app.database import Base, async_session, engine
+    from app.models.gps_position import GPSPosition
+    from app.services.gps_ingest import gps_write_behind_scheduler, gps_write_buffer
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    fleet = await _setup(args.devices)
+    interval = _rate_interval(settings.RATE_LIMIT_GPS)
+    _log(f"{args.devices} téléphones, un lot de {args.points} positions toutes les {interval:.1f} s "
+         f"({settings.RATE_LIMIT_GPS}), {args.duration:.0f} s, "
+         f"tampon={'%d ms' % settings.GPS_WRITE_BEHIND_MS if gps_write_buffer.enabled else 'non'}")
+
+    app.main.app.state.limiter.enabled = False
+    flusher = asyncio.create_task(gps_write_behind_scheduler()) if gps_write_buffer.enabled else None
+    latencies: list[float] = []
+    errors: list[int] = []
+    started = time.monotonic()
+    async with AsyncClient(transport=ASGITransport(app=app.main.app), base_url="http://bench") as client:
+        await asyncio.gather(*(
+            _phone(client, identifier, tour_id, interval, started + args.duration,
+                   args.points, latencies, errors)
+            for identifier, tour_id in fleet
+        ))
+    elapsed = time.monotonic() - started
+    if flusher is not None:
+        flusher.cancel()
+    await gps_write_buffer.flush()
+
+    async with async_session() as db:
+        stored = (await db.execute(
+            select(func.count(GPSPosition.id)).where(GPSPosition.tour_id.in_([t for _, t in fleet]))
+        )).scalar_one()
+
+    _log(f"lots      : {len(latencies)} ({len(latencies) / elapsed:.1f}/s), erreurs : {len(errors)}"
+         + (f" {sorted(set(errors))}" if errors else ""))
+    _log(f"positions : {stored} en base ({stored / elapsed:.0f}/s)")
+    if latencies:
+        _log("latence   : p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms, moyenne {:.1f} ms".format(
+            *(1000 * _percentile(latencies, p) for p in (50, 95, 99)),
+            1000 * max(latencies), 1000 * statistics.fmean(latencies),
+        ))
+
+    await engine.dispose()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Mesure du temps de démarrage du schéma / Schema startup time benchmark.
+
+Chronomètre `init_db` dans trois situations :
+- base vide (premier démarrage : création + migrations ponctuelles) ;
+- schéma existant, migration complète forcée (`SCHEMA_FORCE_MIGRATE`,
+  équivalent de l'ancien démarrage qui introspectait à chaque fois) ;
+- schéma à jour (empreinte identique : introspection sautée).
+
+Base jetable par défaut (sqlite temporaire) ; `--database-url` permet de viser
+une base PostgreSQL de test (copie de la prod pour des chiffres réalistes) —
+JAMAIS la production : les migrations y sont réellement appliquées.
+
+Usage :
+    cd backend
+    python -m scripts.bench_startup --runs 5
+    python -m scripts.bench_startup --database-url postgresql+asyncpg://.../aegis_bench
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+async def _timed(init_db, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        # Les étapes de migration impriment leur journal / migration steps print their log
+        with contextlib.redirect_stdout(io.StringIO()):
+            await init_db()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _report(label: str, timings: list[float]) -> None:
+    _log(f"{label:<28}: médiane {1000 * statistics.median(timings):8.1f} ms, "
+         f"min {1000 * min(timings):8.1f} ms, max {1000 * max(timings):8.1f} ms ({len(timings)} essais)")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5, help="essais par situation")
+    ap.add_argument("--database-url", default=None,
+                    help="base de bench (défaut : sqlite temporaire)")
+    args = ap.parse_args()
+
+    tmp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp_dir.name, 'bench.db').as_posix()}"
+    # Sans écho SQL (DEBUG) / no SQL echo
+    os.environ.setdefault("DEBUG", "false")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import app.main  # noqa: F401 — charge tous les modèles / loads every model
+    from app.config import settings
+    from app.database import engine, init_db
+
+    _log(f"base : {engine.url.render_as_string(hide_password=True)}")
+    _report("premier démarrage", await _timed(init_db, 1))
+    settings.SCHEMA_FORCE_MIGRATE = True
+    _report("migration complète (forcée)", await _timed(init_db, args.runs))
+    settings.SCHEMA_FORCE_MIGRATE = False
+    _report("schéma à jour", await _timed(init_db, args.runs))
+
+    await engine.dispose()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Benchmark de l'import matrice temps / Time-matrix import benchmark.
+
+Mesure la durée de `POST /imports/time-matrix` en fonction de la taille de la
+matrice carrée : un premier import (toutes les paires créées), puis un second
+import avec des temps modifiés (toutes les paires mises à jour).
+
+Base jetable par défaut (sqlite temporaire, schéma créé depuis les modèles) ;
+`--database-url` permet de viser une base PostgreSQL de test — JAMAIS la
+production : le script crée un tenant, des PDV et des distances de bench.
+
+Usage :
+    cd backend
+    python -m scripts.bench_time_matrix_import --sizes 50,100,200,400
+    python -m scripts.bench_time_matrix_import --database-url postgresql+asyncpg://.../aegis_bench
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import time as dt_time
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def _log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def _build_workbook(codes: list[str], seed: int) -> bytes:
+    """Matrice carrée au format d'import (header codes D+, labels, lignes) /
+    Square matrix in the import layout."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["code", "nom", "ville", *codes])
+    ws.append(["", "", "", *[f"Point {c}" for c in codes]])
+    for i, code in enumerate(codes):
+        ws.append([code, "", "", *[
+            None if i == j else dt_time(rng.randint(0, 2), rng.randint(0, 59))
+            for j in range(len(codes))
+        ]])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+async def _bench_size(size: int) -> tuple[float, float, int]:
+    from starlette.datastructures import UploadFile
+
+    from app.api.imports import import_time_matrix
+    from app.database import async_session, set_session_tenant
+    from app.models.country import Country
+    from app.models.pdv import PDV, PDVType
+    from app.models.region import Region
+    from app.models.tenant import Tenant
+
+    async with async_session() as db:
+        tenant = Tenant(code=f"B{uuid.uuid4().hex[:5]}", name=f"Bench {size}")
+        db.add(tenant)
+        await db.commit()
+        set_session_tenant(db, tenant.id)
+
+        country = Country(name="Bench", code=uuid.uuid4().hex[:3].upper())
+        db.add(country)
+        await db.flush()
+        region = Region(name=f"Bench {size}", country_id=country.id)
+        db.add(region)
+        await db.flush()
+        # Codes uniques par taille (pdvs.code est unique) / unique codes per size
+        codes = [str(1_000_000 + size * 10_000 + i) for i in range(size)]
+        db.add_all([PDV(code=c, name=c, type=PDVType.HYPER, region_id=region.id) for c in codes])
+        await db.commit()
+
+        user = SimpleNamespace(id=0, username="bench", is_superadmin=False,
+                               roles=[], tenant_id=tenant.id)
+        timings = []
+        cells = 0
+        for seed in (1, 2):
+            content = _build_workbook(codes, seed)
+            started = time.perf_counter()
+            result = await import_time_matrix(
+                file=UploadFile(BytesIO(content), filename="bench.xlsx"),
+                progress_id=None, db=db, user=user,
+            )
+            await db.commit()
+            timings.append(time.perf_counter() - started)
+            cells = max(cells, result["created"] + result["updated"] + result["skipped"])
+        return timings[0], timings[1], cells
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="50,100,200,400",
+                    help="tailles de matrice à mesurer, séparées par des virgules")
+    ap.add_argument("--database-url", default=None,
+                    help="base de bench (défaut : sqlite temporaire)")
+    args = ap.parse_args()
+
+    tmp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmp_dir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmp_dir.name, 'bench.db').as_posix()}"
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    import app.main  # noqa: F401 — charge tous les modèles / loads every model
+    from app.database import Base, engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    _log(f"{'points':>7} {'cellules':>9} {'création (s)':>13} {'mise à jour (s)':>16} {'cellules/s':>11}")
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        t_create, t_update, cells = await _bench_size(size)
+        _log(f"{size:>7} {cells:>9} {t_create:>13.2f} {t_update:>16.2f} {cells / t_create:>11.0f}")
+
+    await engine.dispose()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,9 +10,11 @@ import os
 import sys
 import uuid
 from pathlib import Path
+from typing import NamedTuple
 
 import pytest
 import pytest_asyncio
+from sqlalchemy import event
 
 # Pointer vers une DB de test isolee AVANT d'importer app.* /
 # Point to an isolated test DB BEFORE importing app.*
@@ -160,3 +162,202 @@ async def client(test_user):
         yield ac
 
     app.dependency_overrides.clear()
+
+
+class _SignalBus:
+    """Deux workers reliés par NOTIFY : ce process est le worker A, ses signaux
+    sont gardés ; `relay()` les livre au worker B (même process) /
+    Two workers linked by NOTIFY: this process is worker A; `relay()` delivers
+    its signals to worker B."""
+
+    def __init__(self):
+        from app.services.tracking_bus import PostgresNotifyBackend
+
+        async def deliver(*args):
+            pass
+
+        self.payloads: list[str] = []
+        self.worker_a = PostgresNotifyBackend(deliver, dsn="postgresql://unused")
+        self.worker_b = PostgresNotifyBackend(deliver, dsn="postgresql://unused")
+        self.worker_a._notify_conn = self
+
+    # Connexion NOTIFY factice du worker A / Worker A's fake NOTIFY connection
+    def is_closed(self) -> bool:
+        return False
+
+    async def execute(self, query: str, channel: str, payload: str):
+        self.payloads.append(payload)
+
+    async def relay(self) -> None:
+        """Livrer au worker B les signaux envoyés depuis le dernier relais /
+        Deliver the signals sent since the last relay to worker B."""
+        await self.worker_a.flush()  # NOTIFY envoyés par une tâche / NOTIFY sent by a task
+        payloads, self.payloads = self.payloads, []
+        for payload in payloads:
+            await self.worker_b.receive(payload)
+
+
+@pytest.fixture
+def signal_bus(monkeypatch):
+    """Signaux inter-workers émulés (backend `postgres` factice) /
+    Emulated cross-worker signals (fake `postgres` backend)."""
+    from app.services import tracking_bus
+
+    bus = _SignalBus()
+    monkeypatch.setattr(tracking_bus, "_signal_backend", bus.worker_a)
+    return bus
+
+
+# ── Requêtes SQL émises / Emitted SQL statements ───────────────────
+
+
+class _StatementRecorder:
+    """Requêtes SQL (en minuscules) émises dans un bloc `with` ; chaque bloc
+    repart d'une liste vide / Lower-cased SQL statements emitted inside a
+    `with` block; every block starts from an empty list."""
+
+    def __init__(self):
+        from app.database import engine
+
+        self.engine = engine.sync_engine
+        self.statements: list[str] = []
+
+    def __enter__(self):
+        self.statements.clear()
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement.lower())
+
+    def touching(self, *tables: str) -> list[str]:
+        """Requêtes lisant une des tables / Statements reading one of the tables."""
+        return [s for s in self.statements if any(f"from {t}" in s for t in tables)]
+
+
+@pytest.fixture
+def sql_recorder():
+    """Enregistreur de requêtes SQL / SQL statement recorder."""
+    recorder = _StatementRecorder()
+    yield recorder
+    if event.contains(recorder.engine, "before_cursor_execute", recorder._record):
+        event.remove(recorder.engine, "before_cursor_execute", recorder._record)
+
+
+# ── Fabriques / Factories ──────────────────────────────────────────
+
+
+@pytest.fixture
+def make_device(db_session):
+    """Fabrique d'appareils mobiles actifs / Active mobile device factory.
+
+    `await make_device(**fields)` ; `fields` surcharge les valeurs par défaut.
+    """
+    from app.models.mobile_device import MobileDevice
+
+    async def make(**fields):
+        values = {
+            "device_identifier": f"dev-{uuid.uuid4().hex[:10]}",
+            "registration_code": uuid.uuid4().hex[:8].upper(),
+            "is_active": True,
+            "profile": "DRIVER",
+            "allowed_features": "tours,pickups,declarations",
+            **fields,
+        }
+        device = MobileDevice(**values)
+        db_session.add(device)
+        await db_session.commit()
+        await db_session.refresh(device)
+        return device
+
+    return make
+
+
+@pytest.fixture
+def make_tour_with_assignment(db_session, test_region):
+    """Fabrique de tours validés affectés à un appareil (2026-07-08) /
+    Factory of validated tours assigned to a device (2026-07-08)."""
+    from app.models.base_logistics import BaseLogistics
+    from app.models.device_assignment import DeviceAssignment
+    from app.models.tour import Tour, TourStatus
+
+    async def make(device):
+        base = BaseLogistics(code=f"B{uuid.uuid4().hex[:5].upper()}", name="Base", region_id=test_region.id)
+        db_session.add(base)
+        await db_session.flush()
+        tour = Tour(date="2026-07-08", code=f"T-{uuid.uuid4().hex[:8]}", base_id=base.id,
+                    status=TourStatus.VALIDATED)
+        db_session.add(tour)
+        await db_session.flush()
+        db_session.add(DeviceAssignment(tour_id=tour.id, device_id=device.id, date="2026-07-08"))
+        await db_session.commit()
+        await db_session.refresh(tour)
+        return tour
+
+    return make
+
+
+class PlannedTours(NamedTuple):
+    base: object
+    tours: list
+    dates: tuple[str, str]
+
+
+@pytest_asyncio.fixture
+async def planned_tours(db_session, test_region) -> PlannedTours:
+    """Base, 3 PDV, 2 contrats (gazole / GNV), prix carburant, taxes km et
+    6 tours de 3 arrêts sur deux dates (non validés : flush seul) /
+    Base, 3 PDVs, 2 contracts, fuel prices, km taxes and 6 three-stop tours
+    over two dates (flushed, not committed)."""
+    from app.models.base_logistics import BaseLogistics
+    from app.models.contract import Contract
+    from app.models.fuel_price import FuelPrice, FuelType
+    from app.models.km_tax import KmTax
+    from app.models.pdv import PDV, PDVType
+    from app.models.tour import Tour
+    from app.models.tour_stop import TourStop
+
+    db, region = db_session, test_region
+    dates = ("2031-03-03", "2031-03-04")
+    base = BaseLogistics(code=f"B{uuid.uuid4().hex[:5].upper()}", name="Base", region_id=region.id)
+    pdvs = [
+        PDV(code=f"R{uuid.uuid4().hex[:5].upper()}", name="PDV", type=PDVType.HYPER, region_id=region.id,
+            latitude=50.0, longitude=4.0)
+        for _ in range(3)
+    ]
+    contracts = [
+        Contract(transporter_name="T", code=f"C{uuid.uuid4().hex[:8]}", region_id=region.id,
+                 fixed_daily_cost=301, vacation=97, consumption_coefficient=0.31, fuel_type=fuel_type)
+        for fuel_type in (FuelType.DIESEL, FuelType.GNV)
+    ]
+    db.add_all([base, *pdvs, *contracts])
+    db.add_all([
+        FuelPrice(fuel_type=FuelType.DIESEL, start_date="2031-03-01", end_date="2031-03-03", price_per_liter=1.71),
+        FuelPrice(fuel_type=FuelType.DIESEL, start_date="2031-03-04", end_date="2031-03-31", price_per_liter=1.83),
+        FuelPrice(fuel_type=FuelType.GNV, start_date="2031-03-01", end_date="2031-03-31", price_per_liter=1.12),
+    ])
+    await db.flush()
+    db.add_all([
+        KmTax(origin_type="BASE", origin_id=base.id, destination_type="PDV", destination_id=pdvs[0].id,
+              tax_per_km=4.257),
+        KmTax(origin_type="PDV", origin_id=pdvs[0].id, destination_type="PDV", destination_id=pdvs[1].id,
+              tax_per_km=1.5),
+        KmTax(origin_type="PDV", origin_id=pdvs[2].id, destination_type="BASE", destination_id=base.id,
+              tax_per_km=2.333),
+    ])
+
+    tours = []
+    for k in range(6):
+        tour = Tour(code=f"T-{uuid.uuid4().hex[:8]}", date=dates[k % 2], base_id=base.id,
+                    contract_id=contracts[k % 3 == 0].id, departure_time="06:00", total_km=87.5 + k)
+        db.add(tour)
+        await db.flush()
+        order = pdvs if k % 2 else pdvs[::-1]
+        db.add_all([TourStop(tour_id=tour.id, pdv_id=p.id, sequence_order=i + 1, eqp_count=5)
+                    for i, p in enumerate(order)])
+        tours.append(tour)
+    await db.flush()
+    return PlannedTours(base, tours, dates)
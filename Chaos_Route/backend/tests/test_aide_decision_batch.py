@@ -0,0 +1,112 @@
+"""Tests de l'aide à la décision en lot / Batch decision support tests.
+
+- répartition : un contrat exclusif reste à son périmètre, un contrat disputé
+  va au besoin non couvert le plus grand ;
+- lot de bout en bout : chaque contrat sert un seul périmètre, résumé global
+  = somme des périmètres ; un périmètre en échec est rapporté sans
+  interrompre les autres.
+"""
+
+import uuid
+
+import pytest
+
+from app.database import set_session_tenant
+from app.models.base_logistics import BaseLogistics
+from app.models.contract import Contract, TemperatureType
+from app.models.pdv import PDV, PDVType
+from app.models.tenant import Tenant
+from app.models.volume import Volume
+from app.schemas.aide_decision import AideDecisionBatchRequest
+from app.services import aide_decision_batch
+from app.services.aide_decision_batch import AideDecisionBatchService, allocate_contracts
+
+DISPATCH_DATE = "2026-11-05"
+
+
+def test_allocate_contracts_resolves_contention():
+    a, b = (1, "SEC"), (1, "FRAIS")
+    allocation = allocate_contracts(
+        [a, b],
+        demand={a: 100.0, b: 40.0},
+        eligible={10: [a], 11: [a, b], 12: [a, b], 13: [b], 14: []},
+        capacity={10: 54.0, 11: 54.0, 12: 30.0, 13: 20.0, 14: 54.0},
+    )
+    # b : 40 - 20 = 20 non couverts ; a : 100 - 54 = 46 → 11 pour a, puis
+    # a : 46 - 54 < 0 contre b : 20 → 12 pour b
+    assert allocation == {a: [10, 11], b: [12, 13]}
+
+
+@pytest.mark.asyncio
+async def test_batch_splits_contracts_and_consolidates(db_session, test_region, monkeypatch):
+    tenant = Tenant(code=f"BT{uuid.uuid4().hex[:4]}", name="Tenant BT")
+    db_session.add(tenant)
+    await db_session.commit()
+    set_session_tenant(db_session, tenant.id)
+
+    suffix = uuid.uuid4().hex[:5].upper()
+    bases = [
+        BaseLogistics(code=f"L{suffix}{k}", name=f"Base {k}", region_id=test_region.id,
+                      latitude=50.5 + k / 10, longitude=4.5)
+        for k in range(2)
+    ]
+    db_session.add_all(bases)
+    await db_session.flush()
+    for k in range(6):
+        pdv = PDV(code=f"L{suffix}{k:02d}", name=f"PDV {k}", type=PDVType.HYPER,
+                  region_id=test_region.id, latitude=50.4 + k / 20, longitude=4.4 + k / 15)
+        db_session.add(pdv)
+        await db_session.flush()
+        for base, temp in ((bases[k % 2], "SEC"), (bases[0], "FRAIS")):
+            db_session.add(Volume(pdv_id=pdv.id, date=DISPATCH_DATE, dispatch_date=DISPATCH_DATE,
+                                  eqp_count=10, temperature_class=temp, base_origin_id=base.id,
+                                  weight_kg=50, nb_colis=5))
+    temps = [TemperatureType.SEC, TemperatureType.BI_TEMP, TemperatureType.BI_TEMP, TemperatureType.FRAIS]
+    contracts = [
+        Contract(code=f"L{suffix}C{k}", transporter_name=f"T{k}", region_id=test_region.id,
+                 capacity_eqp=54, fixed_daily_cost=200, cost_per_km=1.2, temperature_type=temp)
+        for k, temp in enumerate(temps)
+    ]
+    db_session.add_all(contracts)
+    await db_session.commit()
+
+    batch = AideDecisionBatchRequest(dispatch_date=DISPATCH_DATE, scopes=[
+        {"base_origin_id": bases[0].id, "temperature_class": "SEC"},
+        {"base_origin_id": bases[1].id, "temperature_class": "SEC"},
+        {"base_origin_id": bases[0].id, "temperature_class": "FRAIS"},
+        {"base_origin_id": bases[0].id, "temperature_class": "SEC"},
+    ])
+    response = await AideDecisionBatchService(db_session).generate(batch)
+
+    assert len(response.scopes) == 3
+    assert response.warnings == ["Périmètres en double ignorés"]
+    # SEC-only pour 2 périmètres SEC, BI_TEMP pour les 3 / contested contracts
+    assert response.contested_contracts == 3
+    allocated = [cid for s in response.scopes for cid in s.contract_ids]
+    assert sorted(allocated) == sorted(c.id for c in contracts)
+    for scope in response.scopes:
+        used = {t.contract.contract_id for t in scope.result.tours if t.contract}
+        assert used <= set(scope.contract_ids)
+    assert [s.result.summary.total_eqp for s in response.scopes] == [30, 30, 60]
+
+    assert response.summary.total_eqp == 120
+    assert response.summary.total_tours == sum(s.result.summary.total_tours for s in response.scopes)
+    assert response.summary.total_cost == pytest.approx(
+        sum(s.result.summary.total_cost for s in response.scopes), abs=0.05
+    )
+
+    # Périmètre FRAIS en échec : les autres vont au bout / FRAIS scope fails, the others complete
+    generate = aide_decision_batch.AideDecisionService.generate
+
+    async def failing_frais(service, request, **kwargs):
+        if request.temperature_class == "FRAIS":
+            raise RuntimeError("distancier indisponible")
+        return await generate(service, request, **kwargs)
+
+    monkeypatch.setattr(aide_decision_batch.AideDecisionService, "generate", failing_frais)
+    response = await AideDecisionBatchService(db_session).generate(batch)
+    failed = [s for s in response.scopes if s.error]
+    assert [(s.temperature_class, s.result, s.error) for s in failed] == [("FRAIS", None, "distancier indisponible")]
+    assert any("distancier indisponible" in w for w in response.warnings)
+    assert [s.result.summary.total_eqp for s in response.scopes if s.result] == [30, 30]
+    assert response.summary.total_eqp == 60
@@ -0,0 +1,181 @@
+"""Tests des jobs aide à la décision / Decision support job tests.
+
+- le Niveau 2 tourne dans le pool de process, la progression (meilleure
+  solution courante) remonte aux abonnés, le résultat est conservé ;
+- un job n'est visible que de son demandeur ; le quota de jobs actifs est
+  appliqué ;
+- l'annulation arrête le solveur sans attendre sa limite de temps ;
+- un autre worker lit le job dans la ligne partagée, suit sa progression et
+  l'annule.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.database import set_session_tenant
+from app.models.base_logistics import BaseLogistics
+from app.models.pdv import PDV, PDVType
+from app.models.tenant import Tenant
+from app.models.volume import Volume
+from app.schemas.aide_decision import AideDecisionRequest
+from app.services import aide_decision_jobs
+from app.services.aide_decision_jobs import (
+    TooManyJobsError,
+    cancel_job,
+    get_job,
+    submit_job,
+    subscribe,
+    unsubscribe,
+)
+from app.services.solver_pool import shutdown_solver_pool
+
+DISPATCH_DATE = "2026-11-03"
+
+
+@pytest_asyncio.fixture
+async def scenario(db_session, test_region):
+    """Base + 12 PDV avec volumes non affectés, dans un tenant dédié."""
+    tenant = Tenant(code=f"AD{uuid.uuid4().hex[:4]}", name="Tenant AD")
+    db_session.add(tenant)
+    await db_session.commit()
+    set_session_tenant(db_session, tenant.id)
+
+    rnd = random.Random(5)
+    suffix = uuid.uuid4().hex[:5].upper()
+    base = BaseLogistics(code=f"B{suffix}", name="Base jobs", region_id=test_region.id,
+                         latitude=50.5, longitude=4.5)
+    db_session.add(base)
+    await db_session.flush()
+    for i in range(12):
+        pdv = PDV(code=f"J{suffix}{i:02d}", name=f"PDV {i}", type=PDVType.HYPER,
+                  region_id=test_region.id, has_dock=True,
+                  latitude=50.5 + rnd.uniform(-0.4, 0.4), longitude=4.5 + rnd.uniform(-0.6, 0.6))
+        db_session.add(pdv)
+        await db_session.flush()
+        db_session.add(Volume(pdv_id=pdv.id, date=DISPATCH_DATE, dispatch_date=DISPATCH_DATE,
+                              eqp_count=rnd.randint(4, 18), temperature_class="SEC",
+                              base_origin_id=base.id, weight_kg=100, nb_colis=10))
+    await db_session.commit()
+    yield tenant.id, base.id
+    shutdown_solver_pool()
+
+
+def _request(base_id: int, time_limit: int) -> AideDecisionRequest:
+    # Sans cache : ni résultat réutilisé ni départ à chaud / no cache: no reuse, no warm start
+    return AideDecisionRequest(dispatch_date=DISPATCH_DATE, base_origin_id=base_id,
+                               temperature_class="SEC", level=2, time_limit_seconds=time_limit,
+                               use_cache=False)
+
+
+async def _wait_progress(job) -> None:
+    deadline = time.monotonic() + 60
+    while job.progress is None and not job.finished and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+
+
+async def _remote_view(job_id: str, user_id: int):
+    """Le job vu d'un autre worker (ligne partagée seule) / The job as another worker sees it."""
+    local = aide_decision_jobs._jobs.pop(job_id)
+    try:
+        return await get_job(job_id, user_id)
+    finally:
+        aide_decision_jobs._jobs[job_id] = local
+
+
+async def _drain(queue: asyncio.Queue) -> list[dict]:
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+@pytest.mark.asyncio
+async def test_level2_job_streams_progress_and_keeps_result(scenario):
+    tenant_id, base_id = scenario
+    job = await submit_job(_request(base_id, time_limit=1), user_id=-1, tenant_id=tenant_id)
+    queue = subscribe(job)
+
+    await asyncio.wait_for(job.task, timeout=60)
+
+    assert job.status == "succeeded", job.error
+    assert job.result.summary.total_eqp > 0
+    assert len({s.pdv_id for t in job.result.tours for s in t.stops}) == 12
+    events = await _drain(queue)
+    progress = [e for e in events if e["type"] == "job_progress"]
+    assert progress and progress[0]["solutions"] == 1
+    # Seules les améliorations remontent / only improvements are streamed
+    objectives = [e["best_objective"] for e in progress]
+    assert objectives == sorted(objectives, reverse=True)
+    assert [e["job"]["status"] for e in events if e["type"] == "job_status"] == ["running", "succeeded"]
+
+    # Visible du seul demandeur / visible to its owner only
+    assert await get_job(job.id, -1) is job
+    assert await get_job(job.id, -1000) is None
+
+
+@pytest.mark.asyncio
+async def test_cancel_stops_the_solver(scenario):
+    tenant_id, base_id = scenario
+    job = await submit_job(_request(base_id, time_limit=30), user_id=-2, tenant_id=tenant_id)
+
+    # Attendre que le solveur ait trouvé une première solution / wait for the solver
+    await _wait_progress(job)
+    assert job.status == "running"
+
+    started = time.monotonic()
+    assert await cancel_job(job)
+    await asyncio.wait_for(asyncio.gather(job.task, return_exceptions=True), timeout=10)
+
+    assert job.status == "cancelled"
+    assert job.result is None
+    assert time.monotonic() - started < 10
+    assert not await cancel_job(job)
+
+
+@pytest.mark.asyncio
+async def test_active_job_quota(scenario, monkeypatch):
+    tenant_id, base_id = scenario
+    monkeypatch.setattr(aide_decision_jobs, "MAX_ACTIVE_JOBS_PER_USER", 1)
+    job = await submit_job(_request(base_id, time_limit=30), user_id=-4, tenant_id=tenant_id)
+    try:
+        with pytest.raises(TooManyJobsError):
+            await submit_job(_request(base_id, time_limit=30), user_id=-4, tenant_id=tenant_id)
+        other = await submit_job(_request(base_id, time_limit=30), user_id=-5, tenant_id=tenant_id)
+        assert await cancel_job(other)
+    finally:
+        await cancel_job(job)
+    await asyncio.wait_for(asyncio.gather(job.task, other.task, return_exceptions=True), timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_other_worker_follows_and_cancels(scenario, monkeypatch):
+    tenant_id, base_id = scenario
+    monkeypatch.setattr(aide_decision_jobs, "JOB_POLL_SECONDS", 0.1)
+    job = await submit_job(_request(base_id, time_limit=30), user_id=-3, tenant_id=tenant_id)
+    await _wait_progress(job)
+
+    remote = await _remote_view(job.id, -3)
+    assert remote is not job and remote.task is None
+    assert remote.status == "running"
+    assert await _remote_view(job.id, -1000) is None
+    queue = subscribe(remote)
+    try:
+        started = time.monotonic()
+        assert await cancel_job(remote)
+        await asyncio.wait_for(asyncio.gather(job.task, return_exceptions=True), timeout=10)
+        assert job.status == "cancelled" and job.cancel_requested
+        assert time.monotonic() - started < 10
+
+        # L'abonné distant voit la fin du job / the remote subscriber sees the job end
+        while (message := await asyncio.wait_for(queue.get(), timeout=5))["type"] != "job_status":
+            assert message["type"] == "job_progress"
+        assert message["job"]["status"] == "cancelled"
+    finally:
+        unsubscribe(remote, queue)
+    assert (await _remote_view(job.id, -3)).status == "cancelled"
+    assert not await cancel_job(await _remote_view(job.id, -3))
@@ -119,3 +119,65 @@ async def test_api_mutation_records_actor(db_session):
             if r.action == "CREATE" and r.changes and code in r.changes]
     assert rows, "la création via l'API doit être auditée"
     assert rows[0].user == user.username
+
+
+def _audit_inserts(statements: list[str]) -> list[str]:
+    return [s for s in statements if s.startswith(("insert into audit_logs", "insert into audit_outbox"))]
+
+
+@pytest.mark.asyncio
+async def test_flushes_batched_into_one_write_at_commit(db_session, sql_recorder):
+    """Plusieurs flushs d'une transaction → un seul INSERT d'audit au COMMIT ;
+    rien n'est écrit pour une transaction ou un SAVEPOINT annulés."""
+    from app.models.country import Country
+
+    db_session.info["actor"] = "auditor_test"
+    codes = [f"X{uuid.uuid4().hex[:2].upper()}" for _ in range(3)]
+    with sql_recorder:
+        for code in codes:
+            db_session.add(Country(name=f"Pays {code}", code=code))
+            await db_session.flush()
+        assert _audit_inserts(sql_recorder.statements) == []
+        await db_session.commit()
+        assert len(_audit_inserts(sql_recorder.statements)) == 1
+
+        db_session.add(Country(name="Annulé", code=f"W{uuid.uuid4().hex[:2].upper()}"))
+        await db_session.flush()
+        await db_session.rollback()
+
+        with pytest.raises(RuntimeError):
+            async with db_session.begin_nested():
+                db_session.add(Country(name="Savepoint annulé", code=f"V{uuid.uuid4().hex[:2].upper()}"))
+                await db_session.flush()
+                raise RuntimeError
+        await db_session.commit()
+        assert len(_audit_inserts(sql_recorder.statements)) == 2
+
+    rows = (await db_session.execute(
+        select(AuditLog).where(AuditLog.entity_type == "countries", AuditLog.user == "auditor_test")
+    )).scalars().all()
+    assert {c for c in codes if any(c in (r.changes or "") for r in rows)} == set(codes)
+    assert not any("annulé" in (r.changes or "") for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_outbox_mode_defers_audit_rows(db_session, monkeypatch):
+    from app.config import settings
+    from app.models.audit import AuditOutbox
+    from app.models.country import Country
+    from app.services.audit_trail import drain_audit_outbox
+
+    monkeypatch.setattr(settings, "AUDIT_WRITE_MODE", "outbox")
+    db_session.info["actor"] = "auditor_test"
+    code = f"U{uuid.uuid4().hex[:2].upper()}"
+    country = Country(name=f"Pays {code}", code=code)
+    db_session.add(country)
+    await db_session.commit()
+
+    assert await _audit_rows(db_session, "countries", country.id) == []
+    assert len((await db_session.execute(select(AuditOutbox))).scalars().all()) == 1
+
+    assert await drain_audit_outbox() >= 1
+    rows = await _audit_rows(db_session, "countries", country.id)
+    assert [r.action for r in rows][-1:] == ["CREATE"] and code in rows[-1].changes
+    assert (await db_session.execute(select(AuditOutbox))).scalars().all() == []
@@ -0,0 +1,110 @@
+"""Tests de l'extraction CMRO par lots / Batched CMRO extraction tests.
+
+- lots de `batch_size` tours, ordre global conservé (date, départ, priorité),
+  nombre de requêtes par lot borné, indépendant de la taille du lot ;
+- export xlsx (écriture seule) et csv : mêmes lignes que l'extraction JSON ;
+- CSV en flux : session dédiée (lue après la fermeture de celle de la
+  requête), au tenant de l'appelant.
+"""
+
+import csv
+import io
+
+import openpyxl
+import pytest
+import pytest_asyncio
+
+from app.database import async_session, set_session_tenant
+from app.models.tour_manifest_line import TourManifestLine
+from app.services.cmro_extraction import CMRO_EXPORT, iter_cmro_rows, stream_cmro_csv
+
+
+@pytest_asyncio.fixture
+async def cmro_tours(db_session, planned_tours):
+    """Tours planifiés avec priorités, départ avancé et lignes de manifeste /
+    Planned tours with priorities, an earlier departure and manifest lines."""
+    db, tours = db_session, planned_tours.tours
+    tours[1].priority = 3
+    tours[3].priority = 1
+    tours[5].departure_time = "05:00"
+    db.add_all([
+        TourManifestLine(tour_id=tours[0].id, pdv_code="X", support_number="1", eqc=1.5, nb_colis=3, scanned=True),
+        TourManifestLine(tour_id=tours[0].id, pdv_code="X", support_number="2", eqc=2.25, nb_colis=4, scanned=True),
+        TourManifestLine(tour_id=tours[2].id, pdv_code="X", support_number="3", eqc=9, nb_colis=9, scanned=False),
+    ])
+    await db.flush()
+    return planned_tours
+
+
+@pytest.mark.asyncio
+async def test_batches_keep_order_and_bounded_queries(db_session, cmro_tours, sql_recorder):
+    base, tours, dates = cmro_tours
+    batches = []
+    with sql_recorder:
+        async for rows in iter_cmro_rows(db_session, dates[0], dates[1], base.id, batch_size=2):
+            batches.append((rows, len(sql_recorder.statements)))
+
+    assert [len(rows) for rows, _ in batches] == [2, 2, 2]
+    # tours, arrêts, PDV, nb tours, prix carburant (dates nouvelles), taxes km, volumes livrés /
+    # tours, stops, PDVs, tour counts, fuel prices (new dates only), km taxes, delivered volumes
+    assert all(after - before <= 7 for (_, before), (_, after) in zip(batches, batches[1:]))
+
+    rows = [row for rows, _ in batches for row in rows]
+    by_code = {t.code: t for t in tours}
+    keys = [(by_code[r["code_tour"]].date, by_code[r["code_tour"]].departure_time,
+             by_code[r["code_tour"]].priority if by_code[r["code_tour"]].priority is not None else 999)
+            for r in rows]
+    assert keys == sorted(keys)
+    assert [r["code_tour"] for r in rows] == [
+        r["code_tour"] async for rows in iter_cmro_rows(db_session, dates[0], dates[1], base.id) for r in rows
+    ]
+    first = next(r for r in rows if r["code_tour"] == tours[0].code)
+    assert (first["eqc_liv"], first["colis_liv"]) == (3.75, 7)
+    assert next(r for r in rows if r["code_tour"] == tours[2].code)["eqc_liv"] == ""
+
+
+@pytest.mark.asyncio
+async def test_exports_match_extraction(client, db_session, cmro_tours, monkeypatch):
+    from app.services import cmro_extraction
+
+    base, _, dates = cmro_tours
+    await db_session.commit()
+    monkeypatch.setattr(cmro_extraction, "CMRO_BATCH_TOURS", 4)
+    params = {"date_from": dates[0], "date_to": dates[1], "base_id": base.id}
+
+    extraction = (await client.get("/api/tours/cmro-extraction", params=params)).json()
+    assert len(extraction["rows"]) == 6
+    headers = [col for _, col in CMRO_EXPORT]
+    expected = [[row[f] if row[f] != "" else None for f in extraction["fields"]] for row in extraction["rows"]]
+
+    resp = await client.get("/api/tours/cmro-extraction/export", params=params)
+    assert resp.status_code == 200, resp.text
+    ws = openpyxl.load_workbook(io.BytesIO(resp.content), read_only=True)["Tour_ERT"]
+    sheet = [list(r) for r in ws.iter_rows(values_only=True)]
+    assert sheet[0] == headers
+    assert sheet[1:] == expected
+
+    resp = await client.get("/api/tours/cmro-extraction/export", params={**params, "format": "csv"})
+    assert resp.status_code == 200, resp.text
+    assert resp.headers["content-disposition"].endswith('.csv"')
+    lines = list(csv.reader(io.StringIO(resp.content.decode("utf-8-sig")), delimiter=";"))
+    assert lines[0] == headers
+    assert [line[extraction["fields"].index("code_tour")] for line in lines[1:]] == \
+        [row["code_tour"] for row in extraction["rows"]]
+
+
+@pytest.mark.asyncio
+async def test_csv_stream_outlives_request_session(db_session, cmro_tours):
+    base, _, dates = cmro_tours
+    await db_session.commit()
+
+    async def lines(tenant_id) -> list:
+        async with async_session() as request_db:
+            set_session_tenant(request_db, tenant_id)
+            stream = stream_cmro_csv(request_db, dates[0], dates[1], base.id)
+        body = b"".join([chunk async for chunk in stream])
+        return list(csv.reader(io.StringIO(body.decode("utf-8-sig")), delimiter=";"))
+
+    assert len(await lines(None)) == 7
+    # Tenant de l'appelant conservé : aucun tour d'un autre tenant / caller's tenant kept
+    assert len(await lines(-1)) == 1
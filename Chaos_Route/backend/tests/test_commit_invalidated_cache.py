@@ -0,0 +1,81 @@
+"""Tests du cache invalidé au COMMIT / Commit-invalidated cache tests.
+
+- une écriture ORM sur un modèle suivi vide le cache au COMMIT, pas au flush ;
+  un ROLLBACK oublie la marque ; `mark_dirty` couvre les écritures Core ;
+- une invalidation pendant le chargement empêche de garder l'entrée ;
+- un cache dépendant (`invalidated_by`) est vidé avec son parent ;
+- LRU et TTL ;
+- plusieurs workers : une invalidation validée ici vide le cache d'un autre
+  worker (signal du bus de suivi).
+"""
+
+import time
+
+import pytest
+
+from app.models.region import Region
+from app.services.commit_invalidated_cache import CommitInvalidatedCache
+
+
+@pytest.mark.asyncio
+async def test_invalidated_on_commit_only(db_session, test_region):
+    cache = CommitInvalidatedCache("test_regions", (Region,), ttl_seconds=60)
+    cache.put("k", 1, cache.generation())
+
+    test_region.name = "Renamed"
+    await db_session.flush()
+    assert cache.is_dirty(db_session) and cache.get("k") == 1
+    await db_session.rollback()
+    assert not cache.is_dirty(db_session) and cache.get("k") == 1
+
+    test_region.name = "Renamed again"
+    await db_session.commit()
+    assert cache.get("k") is None
+
+    cache.put("k", 2, cache.generation())
+    cache.mark_dirty(db_session)
+    await db_session.commit()
+    assert cache.get("k") is None
+
+
+def test_generation_dependents_lru_and_ttl(monkeypatch):
+    parent = CommitInvalidatedCache("test_parent", max_entries=2)
+    child = CommitInvalidatedCache("test_child", invalidated_by=(parent,))
+
+    generation = parent.generation()
+    parent.invalidate()
+    parent.put("stale", 1, generation)
+    assert parent.get("stale") is None
+
+    child.put("k", 1, child.generation())
+    parent.invalidate("absent")
+    assert child.get("k") is None
+
+    for key in ("a", "b"):
+        parent.put(key, key, parent.generation())
+    parent.get("a")
+    parent.put("c", "c", parent.generation())
+    assert parent.get("b") is None and len(parent) == 2
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + parent.ttl_seconds + 1)
+    assert parent.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(db_session, test_region, signal_bus):
+    regions = CommitInvalidatedCache("test_relayed_regions", (Region,))
+    keyed = CommitInvalidatedCache("test_relayed_keys")
+    regions.put("k", "region", regions.generation())
+    test_region.name = "Renamed elsewhere"
+    await db_session.commit()
+    keyed.invalidate("key-1")
+
+    # Worker B : entrées encore en cache, vidées par les signaux de A /
+    # worker B: entries still cached, dropped by A's signals
+    regions.put("k", "region", regions.generation())
+    keyed.put("key-1", "value", keyed.generation())
+    keyed.put("key-2", "value", keyed.generation())
+    await signal_bus.relay()
+    assert regions.get("k") is None
+    assert keyed.get("key-1") is None and keyed.get("key-2") == "value"
@@ -0,0 +1,93 @@
+"""Tests de l'index de compatibilité PDV / véhicule / PDV–vehicle compatibility index tests.
+
+- masques équivalents aux règles historiques (type autorisé, quai / niche / hayon)
+  sur toutes les combinaisons ;
+- contrats disponibles pour un tour : filtrage par ET sur tous les contrats,
+  index relu sans requête PDV, invalidé par une écriture PDV.
+"""
+
+import itertools
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.contract import TailgateType, VehicleType
+from app.services.compatibility_index import CompatibilityIndex, capabilities, requirements, violations
+
+
+def _legacy_compatible(pdv, contract) -> bool:
+    """Règles avant l'index (tours._check_* / aide_decision._check_*)."""
+    vt = contract.vehicle_type.value if contract.vehicle_type else None
+    if pdv.allowed_vehicle_types and vt and vt not in pdv.allowed_vehicle_types.split("|"):
+        return False
+    tg = contract.tailgate_type.value if contract.tailgate_type else None
+    if not pdv.has_dock:
+        return bool(contract.has_tailgate)
+    return not (not pdv.dock_has_niche and contract.has_tailgate and tg == "RABATTABLE")
+
+
+def test_masks_match_legacy_rules():
+    pdvs = [
+        SimpleNamespace(id=k, has_dock=dock, dock_has_niche=niche, allowed_vehicle_types=allowed)
+        for k, (dock, niche, allowed) in enumerate(itertools.product(
+            (False, True), (False, True), (None, "", "SEMI", "PORTEUR|CITY", "VL|INCONNU"),
+        ))
+    ]
+    contracts = [
+        SimpleNamespace(id=k, vehicle_type=vt, has_tailgate=tailgate, tailgate_type=tg)
+        for k, (vt, tailgate, tg) in enumerate(itertools.product(
+            (None, *VehicleType), (False, True), (None, *TailgateType),
+        ))
+    ]
+    index = CompatibilityIndex.build([], contracts)
+    for pdv in pdvs:
+        expected = {c.id for c in contracts if _legacy_compatible(pdv, c)}
+        assert {c.id for c in contracts if not violations(requirements(pdv), capabilities(c))} == expected
+        assert index.eligible_contracts(requirements(pdv)) == expected
+
+
+@pytest.mark.asyncio
+async def test_available_contracts_uses_cached_index(client, db_session, test_region, sql_recorder):
+    from app.models.base_logistics import BaseLogistics
+    from app.models.contract import Contract
+    from app.models.pdv import PDV, PDVType
+    from app.models.tour import Tour
+    from app.models.tour_stop import TourStop
+
+    base = BaseLogistics(code=f"B{uuid.uuid4().hex[:5].upper()}", name="Base", region_id=test_region.id)
+    pdv = PDV(code=f"K{uuid.uuid4().hex[:5].upper()}", name="Sans quai", type=PDVType.HYPER,
+              region_id=test_region.id, has_dock=False, allowed_vehicle_types="PORTEUR|SEMI")
+    contracts = {
+        name: Contract(transporter_name="T", code=f"C{uuid.uuid4().hex[:8]}", region_id=test_region.id,
+                       vehicle_type=vt, has_tailgate=tailgate, tailgate_type=TailgateType.RABATTABLE)
+        for name, vt, tailgate in (
+            ("ok", VehicleType.PORTEUR, True), ("no_tailgate", VehicleType.SEMI, False),
+            ("wrong_type", VehicleType.CITY, True),
+        )
+    }
+    db_session.add_all([base, pdv, *contracts.values()])
+    await db_session.flush()
+    tour = Tour(code=f"T-{uuid.uuid4().hex[:8]}", date="2031-05-06", base_id=base.id)
+    db_session.add(tour)
+    await db_session.flush()
+    db_session.add(TourStop(tour_id=tour.id, pdv_id=pdv.id, sequence_order=1, eqp_count=3))
+    await db_session.commit()
+
+    params = {"date": "2031-05-06", "base_id": base.id, "tour_id": tour.id}
+    resp = await client.get("/api/tours/available-contracts", params=params)
+    assert resp.status_code == 200, resp.text
+    assert [c["id"] for c in resp.json()] == [contracts["ok"].id]
+
+    with sql_recorder:
+        assert [c["id"] for c in (await client.get("/api/tours/available-contracts", params=params)).json()] \
+            == [contracts["ok"].id]
+    assert not sql_recorder.touching("pdvs")
+
+    # Le PDV gagne un quai : le contrat sans hayon devient éligible /
+    # PDV gets a dock: the tailgate-less contract becomes eligible
+    pdv.has_dock = True
+    pdv.dock_has_niche = True
+    await db_session.commit()
+    ids = {c["id"] for c in (await client.get("/api/tours/available-contracts", params=params)).json()}
+    assert ids == {contracts["ok"].id, contracts["no_tailgate"].id}
@@ -0,0 +1,72 @@
+"""Tests du cache des appareils / Device cache tests.
+
+- un appareil en cache s'authentifie sans lire `mobile_devices` ni écrire de
+  ligne : last_seen_at est regroupé puis écrit en lot, hors audit ;
+- une désactivation validée côté admin est vue immédiatement (403).
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.models.audit import AuditLog
+from app.models.mobile_device import MobileDevice
+from app.services.device_cache import flush_last_seen, last_seen_buffer
+
+
+async def _make_device(db_session) -> MobileDevice:
+    device = MobileDevice(
+        device_identifier=str(uuid.uuid4()),
+        registration_code=uuid.uuid4().hex[:8].upper(),
+        is_active=True,
+        app_version="1.0.0",
+    )
+    db_session.add(device)
+    await db_session.commit()
+    return device
+
+
+@pytest.mark.asyncio
+async def test_cached_device_coalesces_last_seen(client, db_session, sql_recorder):
+    device = await _make_device(db_session)
+    headers = {"X-Device-ID": device.device_identifier, "X-App-Version": "1.0.0"}
+
+    assert (await client.get("/api/driver/device-info", headers=headers)).status_code == 200
+    with sql_recorder:
+        for _ in range(3):
+            assert (await client.get("/api/driver/device-info", headers=headers)).status_code == 200
+    assert not [s for s in sql_recorder.statements if "mobile_devices" in s or "audit_logs" in s]
+
+    # Lecture admin : valeur en attente superposée / admin read overlays the pending value
+    resp = await client.get(f"/api/devices/{device.id}")
+    assert resp.json()["last_seen_at"] is not None
+    assert last_seen_buffer.pending(device.id) == resp.json()["last_seen_at"]
+
+    # Écriture en lot, sans entrée d'audit / batch write, no audit entry
+    assert await flush_last_seen() >= 1
+    assert last_seen_buffer.pending(device.id) is None
+    stored = (await db_session.execute(
+        select(MobileDevice.last_seen_at).where(MobileDevice.id == device.id)
+    )).scalar_one()
+    assert stored == resp.json()["last_seen_at"]
+    audits = (await db_session.execute(
+        select(AuditLog).where(AuditLog.entity_type == "mobile_devices", AuditLog.entity_id == device.id,
+                               AuditLog.action == "UPDATE")
+    )).scalars().all()
+    assert audits == []
+
+    # Nouvelle version d'application : écrite tout de suite / app update written immediately
+    await client.get("/api/driver/device-info", headers={**headers, "X-App-Version": "1.1.0"})
+    assert (await client.get(f"/api/devices/{device.id}")).json()["app_version"] == "1.1.0"
+
+
+@pytest.mark.asyncio
+async def test_deactivation_is_seen_immediately(client, db_session):
+    device = await _make_device(db_session)
+    headers = {"X-Device-ID": device.device_identifier}
+    assert (await client.get("/api/driver/device-info", headers=headers)).status_code == 200
+
+    resp = await client.put(f"/api/devices/{device.id}", json={"is_active": False})
+    assert resp.status_code == 200, resp.text
+    assert (await client.get("/api/driver/device-info", headers=headers)).status_code == 403
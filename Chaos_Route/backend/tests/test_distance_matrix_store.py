@@ -0,0 +1,90 @@
+"""Tests du distancier en mémoire / In-memory distance matrix store tests.
+
+- lookups symétriques : le sens saisi est prioritaire, sinon le sens inverse ;
+- sous-matrices : paires inconnues à NaN / -1 ;
+- cloisonnement : un instantané par tenant, jamais de fuite cross-tenant ;
+- invalidation au commit d'une écriture ORM sur `distance_matrix`.
+"""
+
+import math
+import uuid
+
+import pytest
+
+from app.database import set_session_tenant
+from app.models.distance_matrix import DistanceMatrix
+from app.models.tenant import Tenant
+from app.services.distance_matrix_store import (
+    MISSING_DURATION,
+    DistanceMatrixSnapshot,
+    distance_store,
+    get_distance_snapshot,
+)
+
+
+def test_snapshot_lookup_is_symmetric_and_prefers_direct_entry():
+    snap = DistanceMatrixSnapshot.from_rows([
+        ("BASE", 1, "PDV", 10, 12.5, 20),
+        ("PDV", 10, "PDV", 11, 3.0, 5),
+        ("PDV", 11, "PDV", 10, 4.0, 7),
+    ])
+    assert snap.lookup("BASE", 1, "PDV", 10) == (12.5, 20)
+    # Inverse déduit / reverse inferred
+    assert snap.lookup("PDV", 10, "BASE", 1) == (12.5, 20)
+    # Les deux sens saisis : chacun garde le sien / both entered: each keeps its own
+    assert snap.lookup("PDV", 10, "PDV", 11) == (3.0, 5)
+    assert snap.lookup("PDV", 11, "PDV", 10) == (4.0, 7)
+    assert snap.lookup("PDV", 10, "PDV", 99) is None
+    assert snap.lookup("SUPPLIER", 1, "PDV", 10) is None
+
+
+def test_snapshot_submatrix_marks_unknown_pairs():
+    snap = DistanceMatrixSnapshot.from_rows([("BASE", 1, "PDV", 10, 12.5, 20)])
+    dist, dur = snap.submatrix([("BASE", 1), ("PDV", 10), ("PDV", 404)])
+    assert dist[0, 1] == pytest.approx(12.5)
+    assert dur[1, 0] == 20
+    assert math.isnan(dist[0, 2])
+    assert dur[2, 1] == MISSING_DURATION
+
+
+def test_empty_snapshot():
+    snap = DistanceMatrixSnapshot.from_rows([])
+    assert len(snap) == 0
+    assert snap.lookup("BASE", 1, "PDV", 1) is None
+    dist, dur = snap.submatrix([("BASE", 1), ("PDV", 1)])
+    assert dist.shape == (2, 2) and math.isnan(dist[0, 1])
+    assert (dur == MISSING_DURATION).all()
+
+
+@pytest.mark.asyncio
+async def test_store_scoped_by_tenant_and_invalidated_on_commit(db_session):
+    ta = Tenant(code=f"SA{uuid.uuid4().hex[:4]}", name="Tenant SA")
+    tb = Tenant(code=f"SB{uuid.uuid4().hex[:4]}", name="Tenant SB")
+    db_session.add_all([ta, tb])
+    await db_session.commit()
+
+    set_session_tenant(db_session, ta.id)
+    db_session.add(DistanceMatrix(origin_type="BASE", origin_id=7001, destination_type="PDV",
+                                  destination_id=7001, distance_km=10, duration_minutes=15))
+    await db_session.commit()
+
+    snap_a = await get_distance_snapshot(db_session)
+    assert snap_a.lookup("PDV", 7001, "BASE", 7001) == (10.0, 15)
+    # Servi depuis le cache / served from cache
+    assert await get_distance_snapshot(db_session) is snap_a
+
+    set_session_tenant(db_session, tb.id)
+    snap_b = await get_distance_snapshot(db_session)
+    assert snap_b.lookup("BASE", 7001, "PDV", 7001) is None
+
+    # Écriture validée → instantané rechargé / committed write → snapshot reloaded
+    set_session_tenant(db_session, ta.id)
+    db_session.add(DistanceMatrix(origin_type="BASE", origin_id=7001, destination_type="PDV",
+                                  destination_id=7002, distance_km=30, duration_minutes=35))
+    await db_session.commit()
+    snap_a2 = await get_distance_snapshot(db_session)
+    assert snap_a2 is not snap_a
+    assert snap_a2.lookup("BASE", 7001, "PDV", 7002) == (30.0, 35)
+
+    set_session_tenant(db_session, None)
+    distance_store.invalidate()
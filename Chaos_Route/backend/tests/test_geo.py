@@ -0,0 +1,36 @@
+"""Tests du module géo vectorisé / Vectorized geo module tests.
+
+- haversine NumPy identique à la version scalaire, NaN propagé ;
+- coordonnées absentes ou nulles traitées comme inconnues.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from app.utils.geo import coord_array, haversine, haversine_matrix, haversine_np
+
+
+def _points(n: int = 300, seed: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    # Nuage autour de la Belgique / cloud around Belgium
+    rng = np.random.default_rng(seed)
+    return rng.uniform(49.5, 51.5, n), rng.uniform(2.5, 6.4, n)
+
+
+def test_haversine_np_matches_scalar():
+    assert haversine(48.8566, 2.3522, 45.7640, 4.8357) == pytest.approx(391.5, abs=0.5)
+    lats, lons = _points(20)
+    mat = haversine_matrix(lats, lons)
+    assert mat.shape == (20, 20)
+    assert np.allclose(np.diag(mat), 0.0)
+    for i, j in [(0, 1), (5, 17), (19, 3)]:
+        assert mat[i, j] == pytest.approx(haversine(lats[i], lons[i], lats[j], lons[j]), rel=1e-9)
+    assert math.isnan(haversine_np(50.0, 4.0, np.nan, 4.5))
+
+
+def test_coord_array_treats_none_and_zero_as_unknown():
+    arr = coord_array([50.1, None, 0, 4])
+    assert arr[0] == 50.1 and arr[3] == 4.0
+    assert np.isnan(arr[1]) and np.isnan(arr[2])
+
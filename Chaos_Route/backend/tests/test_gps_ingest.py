@@ -0,0 +1,92 @@
+"""Tests du pipeline d'ingestion GPS / GPS ingestion pipeline tests.
+
+- lot inséré hors ORM avec le tenant de l'appareil ; le contexte (affectation,
+  consentement, tour) n'est lu qu'une fois ;
+- une affectation retirée (commit) est vue immédiatement (403) ;
+- tampon d'écriture différée : positions insérées au flush, toutes ensemble.
+"""
+
+import pytest
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.models.device_assignment import DeviceAssignment
+from app.models.gps_position import GPSPosition
+from app.services.gps_ingest import gps_write_buffer
+
+
+def _payload(tour_id: int, n: int = 3) -> dict:
+    return {"tour_id": tour_id, "positions": [
+        {"latitude": 50.5 + k / 1000, "longitude": 4.5, "accuracy": 5.0, "speed": 50.0,
+         "timestamp": f"2026-07-08T10:00:{k:02d}+00:00"}
+        for k in range(n)
+    ]}
+
+
+async def _stored(db_session, tour_id: int) -> list[GPSPosition]:
+    return (await db_session.execute(
+        select(GPSPosition).where(GPSPosition.tour_id == tour_id).order_by(GPSPosition.timestamp)
+    )).scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_batch_insert_uses_cached_context(
+    client, db_session, make_device, make_tour_with_assignment, sql_recorder,
+):
+    device = await make_device()
+    tour = await make_tour_with_assignment(device)
+    headers = {"X-Device-ID": device.device_identifier}
+
+    resp = await client.post("/api/driver/gps", json=_payload(tour.id), headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["inserted"] == 3
+
+    with sql_recorder:
+        resp = await client.post("/api/driver/gps", json=_payload(tour.id, 2), headers=headers)
+    assert resp.json()["inserted"] == 2
+    assert [s for s in sql_recorder.statements if s.startswith("select")] == []
+    assert len([s for s in sql_recorder.statements if s.startswith("insert into gps_positions")]) == 1
+
+    stored = await _stored(db_session, tour.id)
+    assert len(stored) == 5
+    assert {p.tenant_id for p in stored} == {device.tenant_id}
+    assert {p.device_id for p in stored} == {device.id}
+
+    # Affectation retirée : refus immédiat / assignment removed: refused at once
+    assignment = (await db_session.execute(
+        select(DeviceAssignment).where(DeviceAssignment.tour_id == tour.id)
+    )).scalar_one()
+    await db_session.delete(assignment)
+    await db_session.commit()
+    resp = await client.post("/api/driver/gps", json=_payload(tour.id), headers=headers)
+    assert resp.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_write_behind_groups_batches(
+    client, db_session, make_device, make_tour_with_assignment, monkeypatch,
+):
+    monkeypatch.setattr(settings, "GPS_WRITE_BEHIND_MS", 200)
+    devices = [await make_device() for _ in range(2)]
+    tours = [await make_tour_with_assignment(d) for d in devices]
+
+    for device, tour in zip(devices, tours):
+        resp = await client.post("/api/driver/gps", json=_payload(tour.id),
+                                 headers={"X-Device-ID": device.device_identifier})
+        assert resp.json()["inserted"] == 3
+    assert len(gps_write_buffer) == 6
+    assert await _stored(db_session, tours[0].id) == []
+
+    assert await gps_write_buffer.flush() == 6
+    count = (await db_session.execute(
+        select(func.count(GPSPosition.id)).where(GPSPosition.tour_id.in_([t.id for t in tours]))
+    )).scalar_one()
+    assert count == 6
+
+    # Tampon plein : insertion directe / full buffer: direct insert
+    monkeypatch.setattr(settings, "GPS_WRITE_BEHIND_MAX_ROWS", 2)
+    resp = await client.post("/api/driver/gps", json=_payload(tours[0].id),
+                             headers={"X-Device-ID": devices[0].device_identifier})
+    assert resp.json()["inserted"] == 3
+    assert len(gps_write_buffer) == 0
+    assert len(await _stored(db_session, tours[0].id)) == 6
@@ -0,0 +1,96 @@
+"""Tests des traces GPS simplifiées / Simplified GPS trail tests.
+
+- simplification : beaucoup moins de points, extrémités et écarts bruts
+  conservés, jamais plus de `TRAIL_MAX_INTERVAL_SECONDS` entre deux points ;
+- endpoint : trace calculée une fois puis relue sans lire `gps_positions` ;
+  de nouveaux points la prolongent (seuls ceux-ci sont relus) ; un lot en
+  retard la fait recalculer ; `raw` renvoie tous les points.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.gps_trails import TRAIL_MAX_INTERVAL_SECONDS, simplify
+
+_START = datetime(2026, 7, 8, 10, 0, tzinfo=timezone.utc)
+
+
+def _at(seconds: int) -> str:
+    return (_START + timedelta(seconds=seconds)).isoformat()
+
+
+def _seconds(point) -> float:
+    return (datetime.fromisoformat(point[6]) - _START).total_seconds()
+
+
+def test_simplify_keeps_shape_gaps_and_spacing():
+    # 30 min en ligne droite (un point / 2 s), arrêt de 10 min, virage à angle droit /
+    # 30 min straight (one point / 2 s), 10-minute stop, right-angle turn
+    points = [[k, 1, 50.0 + k * 1e-5, 4.0, 5.0, 40.0, _at(2 * k)] for k in range(900)]
+    points += [[900 + k, 1, points[-1][2], 4.0 + k * 1e-5, 5.0, 40.0, _at(2400 + 2 * k)] for k in range(300)]
+
+    kept = simplify(points, tolerance_m=5.0)
+    assert len(kept) < len(points) / 10
+    assert kept[0] is points[0] and kept[-1] is points[-1]
+    # Les deux extrémités de l'arrêt / both ends of the stop
+    assert points[899] in kept and points[900] in kept
+    gaps = [_seconds(b) - _seconds(a) for a, b in zip(kept, kept[1:])]
+    assert max(g for g in gaps if g < 600) <= TRAIL_MAX_INTERVAL_SECONDS
+    assert gaps.count(602) == 1
+
+
+async def _post(client, device, tour_id: int, seconds: range) -> None:
+    positions = [{"latitude": 50.0 + s * 1e-5, "longitude": 4.0, "accuracy": 5.0, "speed": 40.0,
+                  "timestamp": _at(s)} for s in seconds]
+    for start in range(0, len(positions), 100):
+        resp = await client.post("/api/driver/gps", json={"tour_id": tour_id, "positions": positions[start:start + 100]},
+                                 headers={"X-Device-ID": device.device_identifier})
+        assert resp.status_code == 200, resp.text
+
+
+@pytest.mark.asyncio
+async def test_trail_endpoint_stores_and_refreshes(client, make_device, make_tour_with_assignment, sql_recorder):
+    device = await make_device()
+    tour = await make_tour_with_assignment(device)
+    await _post(client, device, tour.id, range(10, 610, 2))
+    url = f"/api/tracking/tour/{tour.id}/trail"
+
+    resp = await client.get(url)
+    assert resp.status_code == 200, resp.text
+    trail = resp.json()
+    assert 2 <= len(trail) < 20
+    assert (trail[0]["timestamp"], trail[-1]["timestamp"]) == (_at(10), _at(608))
+    assert set(trail[0]) >= {"id", "device_id", "tour_id", "latitude", "longitude", "timestamp"}
+
+    with sql_recorder:
+        assert (await client.get(url)).json() == trail
+    assert not any("gps_positions" in s for s in sql_recorder.statements)
+
+    # Tour en cours : virage puis nouveaux points, seule la fin est relue /
+    # Active tour: turn then new points, only the tail is read
+    resp = await client.post("/api/driver/gps", json={"tour_id": tour.id, "positions": [
+        {"latitude": 50.00598, "longitude": 4.0 + k * 1e-4, "accuracy": 5.0, "speed": 40.0,
+         "timestamp": _at(610 + 2 * k)} for k in range(1, 11)
+    ]}, headers={"X-Device-ID": device.device_identifier})
+    assert resp.status_code == 200
+    with sql_recorder:
+        extended = (await client.get(url)).json()
+    reads = sql_recorder.touching("gps_positions")
+    assert len(reads) == 1 and "gps_positions.timestamp >" in reads[0]
+    assert extended[:len(trail)] == trail
+    assert extended[-1]["timestamp"] == _at(630) and len(extended) > len(trail)
+    assert (await client.get(url)).json() == extended
+    trail = extended
+
+    # Lot en retard : hors de la ligne, doit apparaître / late off-line point must show up
+    resp = await client.post("/api/driver/gps", json={"tour_id": tour.id, "positions": [
+        {"latitude": 50.0, "longitude": 4.01, "accuracy": 5.0, "speed": 0.0, "timestamp": _at(0)},
+    ]}, headers={"X-Device-ID": device.device_identifier})
+    assert resp.status_code == 200
+    trail = (await client.get(url)).json()
+    assert trail[0]["timestamp"] == _at(0)
+
+    raw = (await client.get(url, params={"detail": "raw"})).json()
+    assert len(raw) == 311
+    assert (await client.get(url, params={"detail": "bogus"})).status_code == 422
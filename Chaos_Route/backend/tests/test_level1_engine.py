@@ -0,0 +1,101 @@
+"""Tests du moteur Niveau 1 incrémental / Incremental Level 1 engine tests.
+
+- mêmes tours que l'ancienne boucle plus-proche-voisin en O(N³) (recalcul
+  complet du tour à chaque candidat), y compris au-delà des listes de voisins ;
+- 2-opt / Or-opt : jamais plus long, bloc SAS conservé en tête.
+"""
+
+import time
+
+import numpy as np
+
+from app.services.level1_engine import NEIGHBOUR_LIST_SIZE, Level1Engine
+
+
+def _instance(n: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    xy = np.vstack([[0.0, 0.0], rng.uniform(-60, 60, (n, 2))])
+    dist = np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=2)
+    dist[1, 2] = np.nan  # paire inconnue / unknown pair
+    dist[2, 1] = np.nan
+    travel = np.where(np.isnan(dist), 0, np.floor(dist)).astype(np.int64)
+    service = np.concatenate([[0.0], rng.uniform(15, 40, n)])
+    demand = np.concatenate([[0.0], rng.integers(2, 20, n).astype(float)])
+    return dist, travel, service, demand
+
+
+def _reference_routes(dist, travel, service, demand, capacity, max_minutes):
+    """Ancien algorithme, recalcul complet du tour à chaque essai / former algorithm."""
+    n = len(dist) - 1
+    d = np.where(np.isnan(dist), 9999.0, dist)
+
+    def tour_time(route):
+        total, prev = 0.0, 0
+        for k in route:
+            total += travel[prev, k] + service[k]
+            prev = k
+        return total + travel[prev, 0]
+
+    order = sorted(range(1, n + 1), key=lambda k: d[0, k], reverse=True)
+    remaining = set(order)
+    routes = []
+    while remaining:
+        seed = next(k for k in order if k in remaining)
+        route = [seed]
+        remaining.discard(seed)
+        load = demand[seed]
+        while remaining:
+            best = min(sorted(remaining), key=lambda c: d[route[-1], c])
+            if load + demand[best] > capacity or tour_time(route + [best]) > max_minutes:
+                break
+            route.append(best)
+            remaining.discard(best)
+            load += demand[best]
+        routes.append(route)
+    return routes
+
+
+def test_build_routes_matches_former_nearest_neighbour():
+    n = NEIGHBOUR_LIST_SIZE * 2 + 10  # force le repli argmin / forces the argmin fallback
+    dist, travel, service, demand = _instance(n)
+    engine = Level1Engine(dist, travel, service, demand)
+    routes = engine.build_routes(capacity=54, max_minutes=570)
+
+    assert routes == _reference_routes(dist, travel, service, demand, 54, 570)
+    assert sorted(k for r in routes for k in r) == list(range(1, n + 1))
+
+
+def test_improve_shortens_and_keeps_sas_block_first():
+    dist, travel, service, demand = _instance(40, seed=11)
+    engine = Level1Engine(dist, travel, service, demand)
+    route = list(range(1, 13))
+    sas = set(route[:4])
+
+    improved = engine.improve(route, split=4, deadline=time.monotonic() + 2)
+
+    assert sorted(improved) == sorted(route)
+    assert set(improved[:4]) == sas
+    assert engine.route_km(improved) < engine.route_km(route)
+
+    # Échéance dépassée : tour inchangé / expired budget: route unchanged
+    assert engine.improve(route, split=4, deadline=time.monotonic() - 1) == route
+
+
+def test_pair_matrix_view_behaves_like_former_cache_dict():
+    from app.services.aide_decision import _PairMatrix
+
+    points = [("BASE", 1), ("PDV", 10), ("PDV", 11)]
+    km = np.array([[0.0, 5.0, np.nan], [5.0, 0.0, 2.5], [np.nan, 2.5, 0.0]])
+    known = ~np.isnan(km)
+    np.fill_diagonal(known, False)
+    cache = _PairMatrix(points, km, known)
+
+    assert cache.get(("BASE", 1, "PDV", 10)) == 5.0
+    assert cache.get(("PDV", 11, "PDV", 10), 9999) == 2.5
+    assert cache.get(("BASE", 1, "PDV", 11), 9999) == 9999
+    assert ("PDV", 10, "PDV", 10) not in cache
+    assert ("PDV", 99, "BASE", 1) not in cache
+    assert len(cache) == 4 and set(cache) == {
+        ("BASE", 1, "PDV", 10), ("PDV", 10, "BASE", 1),
+        ("PDV", 10, "PDV", 11), ("PDV", 11, "PDV", 10),
+    }
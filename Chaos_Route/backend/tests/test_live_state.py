@@ -0,0 +1,137 @@
+"""Tests de l'état temps réel des tours / Tour live-state tests.
+
+- composition et livraison des arrêts → compteurs tenus à jour au COMMIT ;
+- lot GPS → dernière position reportée, un lot plus ancien ne l'écrase pas ;
+- tableau de bord : une seule requête (les tours) une fois l'état en mémoire,
+  sans lecture de `gps_positions` ni de `tour_stops` ;
+- rattrapage au démarrage pour les tours sans état ;
+- plusieurs workers : toute écriture validée retire le tour du magasin des
+  autres workers (signal du bus de suivi), lot GPS comme arrêt livré.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.models.tour_live_state import TourLiveState
+from app.services import live_state
+from app.services.live_state import LiveState, live_state_store
+
+
+async def _tour_with_stops(db_session, test_region, make_tour, device, n: int = 3):
+    from app.models.pdv import PDV, PDVType
+    from app.models.tour_stop import TourStop
+
+    tour = await make_tour(device)
+    tour.delivery_date = "2026-07-08"
+    code = uuid.uuid4().hex[:6].upper()
+    pdv = PDV(code=code, name=f"PDV {code}", type=PDVType.HYPER, region_id=test_region.id)
+    db_session.add(pdv)
+    await db_session.flush()
+    stops = [TourStop(tour_id=tour.id, pdv_id=pdv.id, sequence_order=k, eqp_count=1) for k in range(n)]
+    db_session.add_all(stops)
+    await db_session.commit()
+    return tour, stops
+
+
+def _gps(tour_id: int, second: int, latitude: float) -> dict:
+    return {"tour_id": tour_id, "positions": [
+        {"latitude": latitude, "longitude": 4.5, "accuracy": 5.0, "speed": 40.0,
+         "timestamp": f"2026-07-08T10:00:{second:02d}+00:00"},
+    ]}
+
+
+async def _dashboard(client, tour_id: int) -> dict:
+    resp = await client.get("/api/tracking/positions", params={"date": "2026-07-08"})
+    assert resp.status_code == 200, resp.text
+    return next(p for p in resp.json() if p["tour_id"] == tour_id)
+
+
+@pytest.mark.asyncio
+async def test_positions_and_counters_follow_writes(
+    client, db_session, test_region, make_device, make_tour_with_assignment, sql_recorder,
+):
+    device = await make_device()
+    tour, stops = await _tour_with_stops(db_session, test_region, make_tour_with_assignment, device)
+    headers = {"X-Device-ID": device.device_identifier}
+
+    state = await db_session.get(TourLiveState, tour.id)
+    assert (state.stops_total, state.stops_delivered, state.timestamp) == (3, 0, None)
+
+    assert (await client.post("/api/driver/gps", json=_gps(tour.id, 10, 50.7), headers=headers)).status_code == 200
+    position = await _dashboard(client, tour.id)
+    assert (position["latitude"], position["stops_total"], position["stops_delivered"]) == (50.7, 3, 0)
+
+    # Lot en retard : la position la plus récente reste / late batch: newest position stays
+    assert (await client.post("/api/driver/gps", json=_gps(tour.id, 5, 50.1), headers=headers)).status_code == 200
+    assert (await _dashboard(client, tour.id))["latitude"] == 50.7
+    live_state_store.clear()
+    assert (await _dashboard(client, tour.id))["latitude"] == 50.7
+    assert (await client.post("/api/driver/gps", json=_gps(tour.id, 20, 50.9), headers=headers)).status_code == 200
+
+    stops[0].delivery_status = "DELIVERED"
+    await db_session.commit()
+
+    assert (await _dashboard(client, tour.id))["stops_delivered"] == 1
+    with sql_recorder:
+        position = await _dashboard(client, tour.id)
+    assert (position["latitude"], position["timestamp"]) == (50.9, "2026-07-08T10:00:20+00:00")
+    assert (position["stops_total"], position["stops_delivered"]) == (3, 1)
+    assert len(sql_recorder.statements) == 1
+    assert not any("gps_positions" in s or "tour_stops" in s for s in sql_recorder.statements)
+
+
+@pytest.mark.asyncio
+async def test_backfill_restores_missing_state(db_session, test_region, make_device, make_tour_with_assignment):
+    from app.database import _backfill_tour_live_states
+    from app.models.gps_position import GPSPosition
+
+    device = await make_device()
+    tour, stops = await _tour_with_stops(db_session, test_region, make_tour_with_assignment, device, n=2)
+    db_session.add(GPSPosition(device_id=device.id, tour_id=tour.id, latitude=51.0, longitude=4.0,
+                               timestamp="2026-07-08T09:00:00+00:00"))
+    await db_session.execute(delete(TourLiveState).where(TourLiveState.tour_id == tour.id))
+    await db_session.commit()
+    live_state_store.clear()
+
+    await _backfill_tour_live_states()
+    row = (await db_session.execute(
+        select(TourLiveState.stops_total, TourLiveState.latitude, TourLiveState.timestamp)
+        .where(TourLiveState.tour_id == tour.id)
+    )).one()
+    assert tuple(row) == (2, 51.0, "2026-07-08T09:00:00+00:00")
+
+
+@pytest.mark.asyncio
+async def test_writes_drop_state_on_other_workers(
+    client, db_session, test_region, make_device, make_tour_with_assignment, signal_bus, monkeypatch,
+):
+    device = await make_device()
+    tour, stops = await _tour_with_stops(db_session, test_region, make_tour_with_assignment, device)
+    headers = {"X-Device-ID": device.device_identifier}
+    other = LiveState(50.0, 4.0, None, None, "2026-07-08T09:00:00", 3, 0)
+
+    def cached_on_worker_b(tour_id: int) -> None:
+        live_state_store.put(tour_id, other, live_state_store.generation())
+
+    await signal_bus.relay()
+    cached_on_worker_b(tour.id)
+    assert (await client.post("/api/driver/gps", json=_gps(tour.id, 30, 50.2), headers=headers)).status_code == 200
+    cached_on_worker_b(tour.id)
+    await signal_bus.relay()
+    assert live_state_store.get(tour.id) is None
+
+    stops[1].delivery_status = "DELIVERED"
+    await db_session.commit()
+    cached_on_worker_b(tour.id)
+    cached_on_worker_b(-1)
+    await signal_bus.relay()
+    assert live_state_store.get(tour.id) is None and live_state_store.get(-1) == other
+
+    # Trop de tours pour un NOTIFY : tout le magasin est vidé / too many tours: whole store cleared
+    monkeypatch.setattr(live_state, "LIVE_STATE_SIGNAL_MAX_TOURS", 0)
+    stops[2].delivery_status = "DELIVERED"
+    await db_session.commit()
+    await signal_bus.relay()
+    assert live_state_store.get(-1) is None
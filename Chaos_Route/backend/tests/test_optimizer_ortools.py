@@ -0,0 +1,198 @@
+"""Tests du solveur OR-Tools / OR-Tools solver tests.
+
+Le mode vectorisé (matrices C++) doit produire les mêmes coûts d'arc que
+l'ancien callback Python, avec un seul callback par classe de coût km ; chaque
+stratégie du portefeuille résout l'instance et la meilleure est retenue, la
+première reste bornée par l'échéance commune ; le
+drapeau d'arrêt est interrogé pendant la recherche, pas seulement à chaque
+solution.
+"""
+
+import math
+
+import pytest
+
+from app.services.optimizer_ortools import (
+    STOP_POLL_SECONDS,
+    ORToolsInput,
+    VehicleSlot,
+    build_cost_matrices,
+    build_time_matrix,
+    solve_cvrptw,
+)
+
+
+def _input(vectorized: bool = True, n: int = 8) -> ORToolsInput:
+    # Nœuds sur un cercle autour du dépôt / Nodes on a circle around the depot
+    coords = [(0.0, 0.0)] + [
+        (10 * math.cos(2 * math.pi * i / n), 10 * math.sin(2 * math.pi * i / n))
+        for i in range(n)
+    ]
+    dist = [[int(math.dist(a, b) * 1000) for b in coords] for a in coords]
+    time = [[d // 1000 for d in row] for row in dist]
+    tax = [[0 if i == j else 50 for j in range(n + 1)] for i in range(n + 1)]
+    nodes = set(range(1, n + 1))
+    vehicles = [
+        VehicleSlot(contract_idx=0, capacity_eqp=20, fixed_cost_cents=10000,
+                    cost_per_km_cents=120, compatible_nodes=nodes),
+        VehicleSlot(contract_idx=0, capacity_eqp=20, fixed_cost_cents=0,
+                    cost_per_km_cents=120, compatible_nodes=nodes),
+        VehicleSlot(contract_idx=1, capacity_eqp=20, fixed_cost_cents=10000,
+                    cost_per_km_cents=95, compatible_nodes=nodes),
+    ]
+    return ORToolsInput(
+        num_pdvs=n,
+        pdv_ids=list(range(n + 1)),
+        demands=[0] + [5] * n,
+        service_times=[0] + [15] * n,
+        time_windows=[(0, 600)] + [(0, 540)] * n,
+        distance_matrix=dist,
+        time_matrix=time,
+        vehicles=vehicles,
+        km_tax_matrix=tax,
+        time_limit_seconds=1,
+        vectorized=vectorized,
+    )
+
+
+def test_cost_matrices_deduplicate_vehicle_classes():
+    data = _input()
+    matrices = build_cost_matrices(data)
+    assert sorted(matrices) == [95, 120]
+    # Même formule que l'ancien callback / Same formula as the former callback
+    d = data.distance_matrix[0][3]
+    assert matrices[120][0][3] == (120 * d) // 1000 + 50
+    assert matrices[95][0][0] == 0
+
+
+def test_cost_matrix_applies_multiplier():
+    data = _input()
+    data.cost_multiplier = 1.5
+    d = data.distance_matrix[2][5]
+    assert build_cost_matrices(data)[95][2][5] == int(((95 * d) // 1000 + 50) * 1.5)
+
+
+def test_time_matrix_adds_origin_service_time():
+    data = _input()
+    t = build_time_matrix(data)
+    assert t[0][1] == data.time_matrix[0][1]
+    assert t[1][2] == data.time_matrix[1][2] + 15
+
+
+def test_vectorized_and_callback_modes_agree():
+    tours_vec, dropped_vec = solve_cvrptw(_input(vectorized=True))
+    tours_cb, dropped_cb = solve_cvrptw(_input(vectorized=False))
+    assert dropped_vec == dropped_cb == []
+    assert sorted(n for t in tours_vec for n in t.node_sequence) == list(range(1, 9))
+    assert sum(t.total_distance_m for t in tours_vec) == sum(t.total_distance_m for t in tours_cb)
+
+
+def test_warm_start_keeps_solution_and_stops_on_stagnation():
+    import time
+
+    data = _input(n=12)
+    tours, dropped = solve_cvrptw(data)
+    assert not dropped
+    routes = [[] for _ in data.vehicles]
+    for t in tours:
+        routes[t.vehicle_slot] = t.node_sequence
+
+    warm = _input(n=12)
+    warm.time_limit_seconds = 30
+    warm.initial_routes = routes
+    warm.stagnation_seconds = 0.5
+    objectives: list[int] = []
+    started = time.monotonic()
+    warm_tours, warm_dropped = solve_cvrptw(warm, on_solution=lambda obj, used: objectives.append(obj))
+
+    # Arrêt bien avant la limite, jamais pire que la solution injectée /
+    # stops long before the limit, never worse than the injected solution
+    assert time.monotonic() - started < 10
+    assert not warm_dropped
+    assert objectives
+    assert sum(t.total_distance_m for t in warm_tours) <= sum(t.total_distance_m for t in tours)
+
+
+def test_stop_flag_polled_and_throttled():
+    import time
+
+    data = _input(n=12)
+    data.time_limit_seconds = 30
+    started = time.monotonic()
+    solutions: list[int] = []
+    polls: list[float] = []
+
+    def should_stop() -> bool:
+        polls.append(time.monotonic())
+        return time.monotonic() - started > 0.5
+
+    tours, dropped = solve_cvrptw(data, on_solution=lambda obj, used: solutions.append(obj),
+                                  should_stop=should_stop)
+
+    # Arrêt bien avant la limite ; drapeau inter-process interrogé au plus
+    # toutes les STOP_POLL_SECONDS / stops long before the limit; the
+    # cross-process flag is polled at most every STOP_POLL_SECONDS
+    elapsed = time.monotonic() - started
+    assert elapsed < 5
+    assert tours and not dropped and solutions
+    assert len(polls) <= elapsed / STOP_POLL_SECONDS + 2
+
+
+def test_every_portfolio_strategy_solves():
+    from app.services.solver_pool import PORTFOLIO_STRATEGIES
+
+    for first_solution, metaheuristic in PORTFOLIO_STRATEGIES:
+        data = _input()
+        data.first_solution_strategy = first_solution
+        data.local_search_metaheuristic = metaheuristic
+        tours, dropped = solve_cvrptw(data)
+        assert not dropped, (first_solution, metaheuristic)
+        assert sorted(n for t in tours for n in t.node_sequence) == list(range(1, 9))
+
+
+def test_portfolio_deadline_bounds_every_strategy():
+    import time
+
+    from app.services.solver_pool import PORTFOLIO_MIN_SECONDS, _solve_in_worker
+
+    # Échéance passée : seule la première stratégie tourne, au minimum /
+    # Deadline passed: only the first strategy runs, for the minimum time
+    strategy = ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH")
+    assert _solve_in_worker(_input(), None, None, strategy, time.time() - 5) is None
+    data = _input()
+    data.time_limit_seconds = 30
+    started = time.monotonic()
+    tours, dropped, _ = _solve_in_worker(data, None, None, strategy, time.time() - 5, True)
+    assert data.time_limit_seconds == PORTFOLIO_MIN_SECONDS
+    assert time.monotonic() - started < PORTFOLIO_MIN_SECONDS + 5
+    assert tours and not dropped
+
+
+@pytest.mark.asyncio
+async def test_portfolio_keeps_best_strategy():
+    from app.services.solver_pool import (
+        PORTFOLIO_STRATEGIES,
+        run_portfolio,
+        shutdown_solver_pool,
+        strategy_label,
+    )
+
+    data = _input(n=12)
+    data.time_limit_seconds = 3
+    events: list[dict] = []
+    try:
+        outcome = await run_portfolio(data, on_progress=events.append)
+    finally:
+        shutdown_solver_pool()
+
+    labels = [strategy_label(s) for s in PORTFOLIO_STRATEGIES]
+    assert list(outcome.objectives) == labels
+    solved = {label: obj for label, obj in outcome.objectives.items() if obj is not None}
+    assert outcome.strategy in solved
+    assert solved[outcome.strategy] == min(solved.values())
+    assert not outcome.dropped
+    assert sorted(n for t in outcome.tours for n in t.node_sequence) == list(range(1, 13))
+    # Seules les améliorations globales remontent / only global improvements are streamed
+    objectives = [e["best_objective"] for e in events]
+    assert objectives == sorted(objectives, reverse=True) and len(set(objectives)) == len(objectives)
+    assert all(e["strategy"] in labels for e in events)
@@ -0,0 +1,108 @@
+"""Tests du cache des utilisateurs authentifiés / Authenticated-principal cache tests.
+
+- une fois l'utilisateur en cache, une requête authentifiée ne lit plus ni
+  `users` / rôles / permissions ni `revoked_tokens` ;
+- une modification validée des permissions d'un rôle est vue immédiatement ;
+- une révocation n'entre dans la liste noire qu'au COMMIT, et celle des
+  autres workers par un signal du bus de suivi.
+"""
+
+import uuid
+
+import pytest
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def role_user(db_session):
+    from app.models.user import Permission, Role, User
+    from app.utils.auth import hash_password
+
+    sfx = uuid.uuid4().hex[:8]
+    password = f"Cache!Solide#{sfx}"
+    role = Role(name=f"role_{sfx}", permissions=[Permission(resource="tours", action="read")])
+    user = User(
+        username=f"principal_{sfx}", email=f"principal-{sfx}@chaos-route.app",
+        hashed_password=hash_password(password), is_active=True, roles=[role],
+    )
+    db_session.add(user)
+    await db_session.commit()
+    return user, role, password
+
+
+@pytest.mark.asyncio
+async def test_cached_principal_skips_auth_queries(role_user, sql_recorder):
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    user, _, password = role_user
+    app.state.limiter.enabled = False
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            resp = await ac.post("/api/auth/login", json={"username": user.username, "password": password})
+            headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+            assert (await ac.get("/api/auth/me", headers=headers)).status_code == 200
+
+            with sql_recorder:
+                resp = await ac.get("/api/auth/me", headers=headers)
+    finally:
+        app.state.limiter.enabled = True
+
+    assert resp.status_code == 200
+    assert resp.json()["permissions"] == ["tours:read"]
+    assert sql_recorder.touching("users", "roles", "permissions", "user_roles", "revoked_tokens") == []
+
+
+@pytest.mark.asyncio
+async def test_committed_role_change_invalidates(db_session, role_user):
+    from app.api.deps import get_principal, user_has_permission
+    from app.models.user import Permission
+
+    user, role, _ = role_user
+    principal = await get_principal(user.id)
+    assert principal.permissions == {("tours", "read")}
+    assert await get_principal(user.id) is principal
+    assert user_has_permission(principal.user, "tours", "read")
+    assert not user_has_permission(principal.user, "tours", "update")
+
+    role.permissions.append(Permission(resource="tours", action="update"))
+    await db_session.commit()
+
+    refreshed = await get_principal(user.id)
+    assert refreshed is not principal
+    assert user_has_permission(refreshed.user, "tours", "update")
+
+
+@pytest.mark.asyncio
+async def test_revocation_joins_blacklist_on_commit(db_session, role_user, sql_recorder):
+    from app.services.token_revocation import is_revoked, revoke_token
+
+    user, _, _ = role_user
+    payload = {"jti": uuid.uuid4().hex, "sub": str(user.id), "type": "access", "exp": 4102444800}
+
+    await revoke_token(db_session, payload, reason="logout")
+    assert await is_revoked(db_session, payload["jti"])  # visible dans sa transaction
+    await db_session.rollback()
+    assert not await is_revoked(db_session, payload["jti"])
+
+    await revoke_token(db_session, payload, reason="logout")
+    await db_session.commit()
+    with sql_recorder:
+        assert await is_revoked(db_session, payload["jti"])
+    assert sql_recorder.statements == []
+
+
+@pytest.mark.asyncio
+async def test_revocation_reaches_other_workers(db_session, role_user, signal_bus):
+    from app.services.token_revocation import _revoked, revoke_token
+
+    user, _, _ = role_user
+    payload = {"jti": uuid.uuid4().hex, "sub": str(user.id), "type": "access", "exp": 4102444800}
+    await revoke_token(db_session, payload, reason="logout")
+    await db_session.commit()
+
+    # Worker B : liste noire chargée avant la révocation / worker B: list loaded before the revocation
+    _revoked.jtis.discard(payload["jti"])
+    await signal_bus.relay()
+    assert payload["jti"] in _revoked.jtis
@@ -168,3 +168,43 @@ async def test_retention_api(client, db_session):
     # Restaurer la valeur GPS par défaut
     resp = await client.put("/api/retention/gps_positions", json={"retention_days": 60})
     assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_purge_runs_in_bounded_batches(client, db_session, monkeypatch):
+    """Lots bornés validés un à un ; budget épuisé = reliquat mesuré."""
+    from sqlalchemy import select
+
+    from app.config import settings
+    from app.services.retention import retention_metrics
+
+    await ensure_default_policies(db_session)
+    monkeypatch.setattr(settings, "RETENTION_BATCH_ROWS", 2)
+    monkeypatch.setattr(settings, "RETENTION_BATCH_PAUSE_MS", 0)
+
+    def old_sms(n: int) -> list[SmsQueue]:
+        return [SmsQueue(phone="+32470000000", body="lot", status="SENT",
+                         created_at=_iso(400 + k), sent_at=_iso(400)) for k in range(n)]
+
+    # Budget nul : rien n'est purgé, le retard est mesuré
+    monkeypatch.setattr(settings, "RETENTION_MAX_SECONDS_PER_CATEGORY", 0)
+    rows = old_sms(5)
+    db_session.add_all(rows)
+    await db_session.commit()
+    await run_retention_purge(db_session)
+    stats = retention_metrics["sms_messages"]
+    assert (stats.complete, stats.rows) == (False, 0)
+    assert stats.lag_seconds >= 35 * 86400
+
+    monkeypatch.setattr(settings, "RETENTION_MAX_SECONDS_PER_CATEGORY", 60)
+    counts = await run_retention_purge(db_session)
+    stats = retention_metrics["sms_messages"]
+    assert counts["sms_messages"] >= 5
+    assert stats.complete and stats.lag_seconds == 0
+    assert stats.batches >= 3
+    ids = [r.id for r in rows]
+    assert (await db_session.execute(select(SmsQueue.id).where(SmsQueue.id.in_(ids)))).all() == []
+
+    resp = await client.get("/api/retention/metrics")
+    assert resp.status_code == 200
+    assert resp.json()["sms_messages"]["rows"] == stats.rows
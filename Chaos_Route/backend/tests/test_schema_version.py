@@ -0,0 +1,94 @@
+"""Tests du démarrage versionné / Versioned startup tests.
+
+- empreinte du schéma stable, sensible à un ajout de colonne ;
+- schéma à jour : aucune introspection, migrations ponctuelles une seule fois ;
+- schéma modifié : migration complète puis nouvelle empreinte enregistrée ;
+- un rétro-remplissage en échec n'est pas marqué appliqué : retenté ensuite.
+"""
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, select, text
+
+from app import database
+from app.database import schema_fingerprint
+
+_STEPS = (
+    "_migrate_enum_values", "_migrate_create_enum_types", "_migrate_missing_columns",
+    "_seed_default_tenant_and_backfill", "_migrate_column_types", "_migrate_missing_indexes",
+    "_migrate_missing_foreign_keys",
+)
+
+
+def test_fingerprint_tracks_model_changes():
+    def metadata(extra: bool) -> MetaData:
+        meta = MetaData()
+        table = Table("things", meta, Column("id", Integer, primary_key=True), Column("name", String(20)))
+        if extra:
+            table.append_column(Column("code", String(8)))
+        return meta
+
+    assert schema_fingerprint(metadata(False)) == schema_fingerprint(metadata(False))
+    assert schema_fingerprint(metadata(False)) != schema_fingerprint(metadata(True))
+
+
+async def _prepare(monkeypatch, recorded: str | None):
+    calls: list[str] = []
+
+    async def once():
+        calls.append("once")
+
+    monkeypatch.setattr(database, "ONE_OFF_MIGRATIONS", [("test_once", once)])
+    for step in _STEPS:
+        async def record(step=step):
+            calls.append(step)
+        monkeypatch.setattr(database, step, record)
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database._schema_meta.create_all)
+        await conn.execute(database._schema_migrations.delete().where(
+            database._schema_migrations.c.name == "test_once"))
+    if recorded is not None:
+        await database._record_fingerprint(recorded)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_current_schema_skips_introspection(monkeypatch, sql_recorder):
+    calls = await _prepare(monkeypatch, None)
+    await database._record_fingerprint(schema_fingerprint())
+
+    await database.init_db()
+    assert calls == ["once"]
+
+    with sql_recorder:
+        await database.init_db()
+    assert calls == ["once"]
+    assert len(sql_recorder.statements) == 2  # empreinte + migrations appliquées
+
+
+@pytest.mark.asyncio
+async def test_changed_schema_runs_full_migration(monkeypatch):
+    calls = await _prepare(monkeypatch, "empreinte-perimee")
+
+    await database.init_db()
+    assert calls == [*_STEPS, "once"]
+    assert await database._recorded_fingerprint() == schema_fingerprint()
+
+
+@pytest.mark.asyncio
+async def test_failed_backfill_is_retried(monkeypatch, capsys):
+    await _prepare(monkeypatch, None)
+    monkeypatch.setattr(database, "ONE_OFF_MIGRATIONS", [("test_once", database._backfill_tour_type)])
+
+    async def applied() -> bool:
+        async with database.engine.connect() as conn:
+            return (await conn.execute(select(database._schema_migrations.c.name).where(
+                database._schema_migrations.c.name == "test_once"))).first() is not None
+
+    monkeypatch.setattr(database, "text", lambda sql: text(sql.replace("UPDATE tours", "UPDATE missing_tours")))
+    await database._run_one_off_migrations()
+    assert "WARN test_once" in capsys.readouterr().out
+    assert not await applied()
+
+    monkeypatch.setattr(database, "text", text)
+    await database._run_one_off_migrations()
+    assert await applied()
@@ -0,0 +1,131 @@
+"""Tests du cache de simulation aide à la décision / Simulation cache tests.
+
+- une requête identique est servie depuis le cache, un autre ordre de
+  priorités réutilise les données chargées ;
+- l'empreinte suit les volumes non affectés ; une écriture validée sur un
+  PDV invalide le cache ; `use_cache=False` le contourne ;
+- les données en cache survivent au rollback de la session qui les a
+  chargées (relance depuis une autre session, comme les jobs).
+"""
+
+import random
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.database import async_session, set_session_tenant
+from app.models.base_logistics import BaseLogistics
+from app.models.pdv import PDV, PDVType
+from app.models.tenant import Tenant
+from app.models.volume import Volume
+from app.schemas.aide_decision import AideDecisionRequest
+from app.services.aide_decision import AideDecisionService
+from app.services.simulation_cache import simulation_cache
+
+DISPATCH_DATE = "2026-11-04"
+
+
+@pytest_asyncio.fixture
+async def scenario(db_session, test_region):
+    tenant = Tenant(code=f"SC{uuid.uuid4().hex[:4]}", name="Tenant SC")
+    db_session.add(tenant)
+    await db_session.commit()
+    set_session_tenant(db_session, tenant.id)
+
+    rnd = random.Random(9)
+    suffix = uuid.uuid4().hex[:5].upper()
+    base = BaseLogistics(code=f"S{suffix}", name="Base cache", region_id=test_region.id,
+                         latitude=50.5, longitude=4.5)
+    db_session.add(base)
+    await db_session.flush()
+    pdvs = []
+    for i in range(8):
+        pdv = PDV(code=f"S{suffix}{i:02d}", name=f"PDV {i}", type=PDVType.HYPER,
+                  region_id=test_region.id, latitude=50.5 + rnd.uniform(-0.4, 0.4),
+                  longitude=4.5 + rnd.uniform(-0.6, 0.6))
+        db_session.add(pdv)
+        pdvs.append(pdv)
+    await db_session.flush()
+    for pdv in pdvs:
+        db_session.add(Volume(pdv_id=pdv.id, date=DISPATCH_DATE, dispatch_date=DISPATCH_DATE,
+                              eqp_count=rnd.randint(4, 18), temperature_class="SEC",
+                              base_origin_id=base.id, weight_kg=100, nb_colis=10))
+    await db_session.commit()
+    simulation_cache.invalidate()
+    return base, pdvs
+
+
+def _request(base_id: int, **kwargs) -> AideDecisionRequest:
+    return AideDecisionRequest(dispatch_date=DISPATCH_DATE, base_origin_id=base_id,
+                               temperature_class="SEC", level=1, **kwargs)
+
+
+class _CountingService(AideDecisionService):
+    loads = 0
+
+    async def _load_inputs(self, *args):
+        type(self).loads += 1
+        return await super()._load_inputs(*args)
+
+
+@pytest.mark.asyncio
+async def test_identical_request_served_from_cache(db_session, scenario):
+    base, _ = scenario
+    _CountingService.loads = 0
+
+    first = await _CountingService(db_session).generate(_request(base.id))
+    again = await _CountingService(db_session).generate(_request(base.id))
+    assert again == first and again is not first
+    assert _CountingService.loads == 1
+
+    # Autre ordre de priorités : nouveau calcul, données réutilisées /
+    # other priority order: new run, loaded data reused
+    reordered = _request(base.id, optimization_priorities=["punctuality", "cost", "fill_rate", "num_tours"])
+    await _CountingService(db_session).generate(reordered)
+    assert _CountingService.loads == 1
+
+    await _CountingService(db_session).generate(_request(base.id, use_cache=False))
+    assert _CountingService.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_follows_volumes_and_reference_writes(db_session, scenario):
+    base, pdvs = scenario
+    _CountingService.loads = 0
+    first = await _CountingService(db_session).generate(_request(base.id))
+
+    # Nouveau volume non affecté : nouvelle empreinte / new unassigned volume: new fingerprint
+    db_session.add(Volume(pdv_id=pdvs[0].id, date=DISPATCH_DATE, dispatch_date=DISPATCH_DATE,
+                          eqp_count=3, temperature_class="SEC", base_origin_id=base.id,
+                          weight_kg=10, nb_colis=1))
+    await db_session.commit()
+    second = await _CountingService(db_session).generate(_request(base.id))
+    assert _CountingService.loads == 2
+    assert second.summary.total_eqp == first.summary.total_eqp + 3
+
+    # Écriture validée sur un PDV : cache vidé / committed PDV write: cache dropped
+    pdvs[1].has_dock = not pdvs[1].has_dock
+    await db_session.commit()
+    await _CountingService(db_session).generate(_request(base.id))
+    assert _CountingService.loads == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_inputs_survive_rollback(db_session, scenario):
+    base, _ = scenario
+    _CountingService.loads = 0
+    tenant_id = db_session.info["tenant_id"]
+
+    async with async_session() as db:
+        set_session_tenant(db, tenant_id)
+        first = await _CountingService(db).generate(_request(base.id))
+        await db.rollback()  # comme un job / like a job run
+
+    reordered = _request(base.id, optimization_priorities=["punctuality", "cost", "fill_rate", "num_tours"])
+    async with async_session() as db:
+        set_session_tenant(db, tenant_id)
+        again = await _CountingService(db).generate(reordered)
+        await db.rollback()
+    assert _CountingService.loads == 1
+    assert again.summary.total_eqp == first.summary.total_eqp
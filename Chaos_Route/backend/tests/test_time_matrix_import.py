@@ -0,0 +1,130 @@
+"""Tests de l'import matrice temps en lots / Batched time-matrix import tests.
+
+- mêmes compteurs created/updated/skipped que l'ancien import cellule par cellule
+  (recherche bidirectionnelle, y compris sur les lignes créées plus haut dans le fichier) ;
+- lignes insérées dans le tenant de la session, trace d'audit résumée ;
+- distancier en mémoire invalidé au commit (écritures hors flush ORM) ;
+- suivi de progression par `progress_id`, propre à chaque utilisateur et
+  relayé aux autres workers.
+"""
+
+import asyncio
+import uuid
+from datetime import time as dt_time
+from io import BytesIO
+from types import SimpleNamespace
+
+import openpyxl
+import pytest
+from sqlalchemy import select
+from starlette.datastructures import UploadFile
+
+from app.api.imports import get_import_progress, import_time_matrix
+from app.database import set_session_tenant
+from app.models.audit import AuditLog
+from app.models.distance_matrix import DistanceMatrix
+from app.models.pdv import PDV, PDVType
+from app.models.tenant import Tenant
+from app.services import import_progress
+from app.services.distance_matrix_store import get_distance_snapshot
+from app.services.import_progress import get_progress, start_progress, update_progress
+
+
+def _workbook(codes: list[str], cells: dict[tuple[int, int], dt_time]) -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["code", "nom", "ville", *codes])
+    ws.append(["", "", "", *[f"Point {c}" for c in codes]])
+    for i, code in enumerate(codes):
+        ws.append([code, "", "", *[cells.get((i, j)) for j in range(len(codes))]])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_time_matrix_import_batches_and_keeps_counters(db_session, test_region):
+    tenant = Tenant(code=f"TM{uuid.uuid4().hex[:4]}", name="Tenant TM")
+    db_session.add(tenant)
+    await db_session.commit()
+    set_session_tenant(db_session, tenant.id)
+
+    base_code = 900000 + uuid.uuid4().int % 90000
+    codes = [str(base_code + i) for i in range(3)]
+    pdvs = [PDV(code=c, name=c, type=PDVType.HYPER, region_id=test_region.id) for c in codes]
+    db_session.add_all(pdvs)
+    await db_session.commit()
+    p1, p2, p3 = (p.id for p in pdvs)
+    db_session.add(DistanceMatrix(origin_type="PDV", origin_id=p1, destination_type="PDV",
+                                  destination_id=p2, distance_km=12, duration_minutes=10))
+    await db_session.commit()
+    assert (await get_distance_snapshot(db_session)).lookup("PDV", p1, "PDV", p2).duration_minutes == 10
+
+    content = _workbook(codes, {
+        (0, 1): dt_time(0, 10),  # inchangé / unchanged → skipped
+        (0, 2): dt_time(0, 30),  # nouveau / new → created
+        (1, 0): dt_time(0, 20),  # inverse existant modifié / existing reverse → updated
+        (1, 2): dt_time(0, 15),  # created
+        (2, 0): dt_time(0, 30),  # inverse créé plus haut, identique → skipped
+        (2, 1): dt_time(0, 15),  # skipped
+    })
+    user = SimpleNamespace(id=-1, username="import-tester", is_superadmin=False,
+                           roles=[], tenant_id=tenant.id)
+    progress_id = uuid.uuid4().hex
+
+    result = await import_time_matrix(
+        file=UploadFile(BytesIO(content), filename="matrice.xlsx"),
+        progress_id=progress_id, db=db_session, user=user,
+    )
+    await db_session.commit()
+
+    assert (result["created"], result["updated"], result["skipped"]) == (2, 1, 3)
+    assert result["errors"] == []
+
+    rows = (await db_session.execute(
+        select(DistanceMatrix).where(DistanceMatrix.origin_id.in_([p1, p2, p3]))
+    )).scalars().all()
+    durations = {(r.origin_id, r.destination_id): r.duration_minutes for r in rows}
+    assert durations == {(p1, p2): 20, (p1, p3): 30, (p2, p3): 15}
+    assert all(r.tenant_id == tenant.id for r in rows)
+
+    audit = (await db_session.execute(
+        select(AuditLog).where(AuditLog.action == "IMPORT", AuditLog.user == "import-tester")
+    )).scalars().all()
+    assert len(audit) == 1 and audit[0].tenant_id == tenant.id
+
+    # Distancier rechargé après le commit / distance store reloaded after commit
+    assert (await get_distance_snapshot(db_session)).lookup("PDV", p3, "PDV", p1).duration_minutes == 30
+
+    progress = await get_import_progress(progress_id, user=user)
+    assert progress["phase"] == "done"
+    assert progress["done"] == progress["total"] == 3
+    assert progress["percent"] == 100.0
+
+    set_session_tenant(db_session, None)
+
+
+@pytest.mark.asyncio
+async def test_progress_scoped_by_user_and_shared_across_workers(signal_bus):
+
+    # Même identifiant, deux utilisateurs : deux entrées / same id, two users: two entries
+    progress_id = uuid.uuid4().hex
+    mine = start_progress(progress_id, user_id=-1)
+    theirs = start_progress(progress_id, user_id=-2)
+    update_progress(theirs, phase="error", message="fichier illisible")
+    assert get_progress(progress_id, -1).phase == "reading"
+
+    update_progress(mine, phase="writing", total=4, done=0)
+    update_progress(mine, done=1)  # avancement non relayé (intervalle) / throttled
+    update_progress(mine, phase="done", done=4)
+    await asyncio.sleep(0)
+    assert len(signal_bus.payloads) == 5
+
+    # Worker B : registre vide, alimenté par les signaux de A / worker B fed by A's signals
+    import_progress._registry.clear()
+    await signal_bus.relay()
+    assert get_progress(progress_id, -1).as_dict() == {
+        "phase": "done", "total": 4, "done": 4, "message": None, "percent": 100.0,
+    }
+    assert get_progress(progress_id, -2).message == "fichier illisible"
+    assert get_progress(progress_id, -3) is None
@@ -0,0 +1,136 @@
+"""Tests de la timeline versionnée / Versioned planning timeline tests.
+
+- ETag stable tant que rien ne change : 304 sans relire les tours ;
+- écriture ORM (arrêt, déplacement, suppression, libellé de contrat) ou hors
+  ORM (recalcul en masse) : nouvelle version, `since=N` ne renvoie que les
+  tours concernés (`removed` pour ceux sortis de la fenêtre) ;
+- fenêtre antérieure au journal : servie en entier, sans ETag ;
+- commits croisés : une transaction qui insère avant une autre mais valide
+  après reste vue par un client qui a lu la version de la seconde.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import select, text
+
+from app.database import async_session
+from app.models.contract import Contract
+from app.models.tour_stop import TourStop
+from app.services.timeline_versions import timeline_etag
+from app.services.tour_costing import recalculate_costs
+
+
+@pytest.mark.asyncio
+async def test_etag_and_changes_since(client, db_session, planned_tours, sql_recorder):
+    base, tours, dates = planned_tours
+    await db_session.commit()
+    params = {"date": dates[0], "base_id": base.id}
+
+    resp = await client.get("/api/tours/timeline", params=params)
+    assert resp.status_code == 200, resp.text
+    assert {t["tour_id"] for t in resp.json()} == {t.id for t in tours}
+    etag, version = resp.headers["etag"], int(resp.headers["x-timeline-version"])
+    assert version > 0
+
+    with sql_recorder:
+        resp = await client.get("/api/tours/timeline", params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert not sql_recorder.touching("tours")
+
+    async def changes(since: int) -> dict:
+        resp = await client.get("/api/tours/timeline", params={**params, "since": since})
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    # Arrêt modifié : seul son tour revient / Stop changed: only its tour comes back
+    stop = (await db_session.execute(select(TourStop).where(TourStop.tour_id == tours[0].id))).scalars().first()
+    stop.eqp_count = 9
+    await db_session.commit()
+    resp = await client.get("/api/tours/timeline", params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["etag"] != etag
+    delta = await changes(version)
+    assert [t["tour_id"] for t in delta["tours"]] == [tours[0].id] and delta["removed"] == []
+    assert {s["id"]: s["eqp_count"] for s in delta["tours"][0]["stops"]}[stop.id] == 9
+    version = delta["version"]
+    assert (await changes(version))["tours"] == []
+
+    # Tour déplacé hors fenêtre, tour supprimé / Tour moved out of the window, tour deleted
+    tours[1].date = "2031-04-01"
+    await db_session.delete(tours[2])
+    await db_session.commit()
+    delta = await changes(version)
+    assert delta["tours"] == [] and delta["removed"] == sorted([tours[1].id, tours[2].id])
+    version = delta["version"]
+
+    # Recalcul en masse (UPDATE hors ORM) / Bulk recalculation (Core UPDATE)
+    result = await recalculate_costs(db_session, "timeline", base_id=base.id)
+    await db_session.commit()
+    delta = await changes(version)
+    assert len(delta["tours"]) == result["updated"] - 1 > 0  # tours[1] hors fenêtre / out of the window
+    version = delta["version"]
+
+    # Libellé de contrat affiché : tous ses tours / Displayed contract label: all its tours
+    contract = await db_session.get(Contract, tours[0].contract_id)
+    contract.vehicle_name = "Semi 12"
+    await db_session.commit()
+    delta = await changes(version)
+    remaining = {t.id for t in tours if t.contract_id == contract.id} - {tours[1].id, tours[2].id}
+    assert {t["tour_id"] for t in delta["tours"]} == remaining
+    assert {t["vehicle_name"] for t in delta["tours"]} == {"Semi 12"}
+
+
+@pytest.mark.asyncio
+async def test_window_before_horizon_is_served_in_full(client, db_session, test_region):
+    from app.models.base_logistics import BaseLogistics
+    from app.models.tour import Tour
+
+    base = BaseLogistics(code=f"B{uuid.uuid4().hex[:5].upper()}", name="Base", region_id=test_region.id)
+    db_session.add(base)
+    await db_session.flush()
+    tour = Tour(code=f"T-{uuid.uuid4().hex[:8]}", date="2020-01-06", base_id=base.id, departure_time="06:00")
+    db_session.add(tour)
+    await db_session.commit()
+
+    params = {"date": "2020-01-06", "base_id": base.id}
+    resp = await client.get("/api/tours/timeline", params=params)
+    assert resp.status_code == 200 and "etag" not in resp.headers
+    body = (await client.get("/api/tours/timeline", params={**params, "since": 10**9})).json()
+    assert body["full"] is True and [t["tour_id"] for t in body["tours"]] == [tour.id]
+
+
+@pytest.mark.asyncio
+async def test_interleaved_commits_are_not_missed(client, db_session, planned_tours):
+    base, tours, dates = planned_tours
+    await db_session.commit()
+    params = {"date": dates[0], "base_id": base.id}
+    resp = await client.get("/api/tours/timeline", params=params)
+    version = int(resp.headers["x-timeline-version"])
+
+    async def change_stop(db, tour) -> None:
+        stop = (await db.execute(select(TourStop).where(TourStop.tour_id == tour.id))).scalars().first()
+        stop.eqp_count += 1
+        await db.flush()
+
+    # SQLite sérialise les écritures : on reproduit l'allocation d'ids de
+    # PostgreSQL (séquence à l'INSERT) en réattribuant les ids. A insère en
+    # premier (id bas) mais valide après B (id haut) / SQLite serializes
+    # writes: reproduce PostgreSQL's INSERT-time ids by reassigning them.
+    async with async_session() as b:
+        await change_stop(b, tours[1])
+        low = (await b.execute(text("SELECT MIN(id) FROM timeline_changes WHERE version IS NULL"))).scalar()
+        await b.execute(text("UPDATE timeline_changes SET id = id + 1000 WHERE version IS NULL"))
+        await b.commit()
+    delta = (await client.get("/api/tours/timeline", params={**params, "since": version})).json()
+    assert [t["tour_id"] for t in delta["tours"]] == [tours[1].id]
+    version = delta["version"]
+
+    async with async_session() as a:
+        await change_stop(a, tours[0])
+        await a.execute(text("UPDATE timeline_changes SET id = :low WHERE version IS NULL"), {"low": low})
+        await a.commit()
+    resp = await client.get("/api/tours/timeline", params=params, headers={"If-None-Match": timeline_etag(version)})
+    assert resp.status_code == 200
+    delta = (await client.get("/api/tours/timeline", params={**params, "since": version})).json()
+    assert [t["tour_id"] for t in delta["tours"]] == [tours[0].id]
+    assert delta["version"] > version
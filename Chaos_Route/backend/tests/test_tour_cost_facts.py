@@ -0,0 +1,129 @@
+"""Tests des faits de coût par tour / Per-tour cost fact tests.
+
+- synthèse transporteur servie depuis les faits (mêmes montants que le calcul
+  unitaire), sans relire les taxes km au second appel ;
+- un tour ajouté au même contrat / jour ou une surcharge validée invalident
+  les faits concernés dans la transaction d'écriture ;
+- contrôle de cohérence : un fait altéré est détecté et réécrit ;
+- une écriture validée entre la lecture des entrées et l'enregistrement
+  empêche d'enregistrer le fait calculé.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models.tour import Tour
+from app.models.tour_cost_fact import TourCostFact
+from app.models.tour_surcharge import SurchargeStatus, TourSurcharge
+from app.services import tour_cost_facts
+
+
+def _summary_tours(payload: dict) -> dict[int, dict]:
+    return {
+        tour["tour_id"]: tour
+        for transporter in payload["transporters"]
+        for contract in transporter["contracts"]
+        for tour in contract["tours"]
+    }
+
+
+@pytest.mark.asyncio
+async def test_summary_reads_and_refreshes_facts(client, db_session, planned_tours, test_user, sql_recorder):
+    from app.models.surcharge_type import SurchargeType
+
+    base, tours, dates = planned_tours
+    await db_session.commit()
+    params = {"date_from": dates[0], "date_to": dates[1], "base_id": base.id}
+
+    resp = await client.get("/api/tours/transporter-summary", params=params)
+    assert resp.status_code == 200, resp.text
+    rows = _summary_tours(resp.json())
+    assert set(rows) == {t.id for t in tours}
+    # Coût recalculé unitairement (recalcul en masse) = total des faits / single-tour cost = fact total
+    await client.post("/api/tours/recalculate", params={"base_id": base.id})
+    for tour in tours:
+        await db_session.refresh(tour)
+        assert rows[tour.id]["cost_breakdown"]["total_calculated"] == float(tour.total_cost)
+
+    with sql_recorder:
+        assert _summary_tours((await client.get("/api/tours/transporter-summary", params=params)).json()) == rows
+    assert not sql_recorder.touching("km_tax")
+
+    # Un tour de plus sur le contrat / jour du premier : quote-part divisée /
+    # One more tour for the first tour's contract and day: shares split
+    first = tours[0]
+    siblings = [t.id for t in tours if (t.contract_id, t.date) == (first.contract_id, first.date)]
+    db_session.add(Tour(code=f"T-{uuid.uuid4().hex[:8]}", date=first.date, base_id=base.id,
+                        contract_id=first.contract_id, departure_time="14:00", total_km=10))
+    stype = SurchargeType(code=f"S{uuid.uuid4().hex[:6]}", label="Attente")
+    db_session.add(stype)
+    await db_session.flush()
+    surcharge = TourSurcharge(tour_id=tours[1].id, amount=42.5, motif="attente", surcharge_type_id=stype.id,
+                              status=SurchargeStatus.VALIDATED, created_by_id=test_user.id,
+                              created_at="2031-03-04T10:00:00")
+    db_session.add(surcharge)
+    await db_session.flush()
+    left = set((await db_session.execute(
+        select(TourCostFact.tour_id).where(TourCostFact.tour_id.in_([t.id for t in tours]))
+    )).scalars())
+    assert left == {t.id for t in tours} - set(siblings) - {tours[1].id}
+    await db_session.commit()
+
+    refreshed = _summary_tours((await client.get("/api/tours/transporter-summary", params=params)).json())
+    share = rows[first.id]["cost_breakdown"]["fixed_share"]
+    assert refreshed[first.id]["cost_breakdown"]["fixed_share"] == round(301 / (len(siblings) + 1), 2) != share
+    assert refreshed[tours[1].id]["surcharges_total"] == 42.5
+    assert refreshed[tours[1].id]["cost_breakdown"]["total_calculated"] == round(
+        rows[tours[1].id]["cost_breakdown"]["total_calculated"] + 42.5, 2)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_repairs_tampered_facts(client, db_session, planned_tours):
+    base, tours, dates = planned_tours
+    await db_session.commit()
+    params = {"date_from": dates[0], "date_to": dates[1]}
+    assert (await client.get("/api/tours/transporter-summary", params={**params, "base_id": base.id})).status_code == 200
+
+    conn = await db_session.connection()
+    await conn.execute(update(TourCostFact.__table__)
+                       .where(TourCostFact.__table__.c.tour_id == tours[2].id).values(fuel_cost=0))
+    await db_session.commit()
+
+    resp = await client.post("/api/tours/cost-facts/rebuild", params=params)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["mismatched"] == 1
+    again = (await client.post("/api/tours/cost-facts/rebuild", params=params)).json()
+    assert (again["missing"], again["mismatched"], again["orphans"]) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_write_prevents_storing_fact(client, db_session, planned_tours, monkeypatch):
+    base, tours, dates = planned_tours
+    await db_session.commit()
+    params = {"date_from": dates[0], "date_to": dates[1], "base_id": base.id}
+    load_inputs = tour_cost_facts.load_cost_inputs
+
+    async def load_then_concurrent_write(db, *criteria, **kwargs):
+        # Écriture validée par une autre transaction pendant le calcul /
+        # Write committed by another transaction while computing
+        inputs = await load_inputs(db, *criteria, **kwargs)
+        await (await db.connection()).run_sync(tour_cost_facts._bump_clock)
+        return inputs
+
+    monkeypatch.setattr(tour_cost_facts, "load_cost_inputs", load_then_concurrent_write)
+    resp = await client.get("/api/tours/transporter-summary", params=params)
+    assert resp.status_code == 200, resp.text
+    assert set(_summary_tours(resp.json())) == {t.id for t in tours}
+    stored = (await db_session.execute(
+        select(TourCostFact.tour_id).where(TourCostFact.tour_id.in_([t.id for t in tours]))
+    )).scalars().all()
+    assert stored == []
+
+    monkeypatch.setattr(tour_cost_facts, "load_cost_inputs", load_inputs)
+    assert (await client.get("/api/tours/transporter-summary", params=params)).status_code == 200
+    stored = (await db_session.execute(
+        select(TourCostFact.tour_id).where(TourCostFact.tour_id.in_([t.id for t in tours]))
+    )).scalars().all()
+    assert sorted(stored) == sorted(t.id for t in tours)
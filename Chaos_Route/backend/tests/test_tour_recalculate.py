@@ -0,0 +1,50 @@
+"""Tests du recalcul de coût en masse / Bulk tour cost recalculation tests.
+
+- mêmes coûts que le calcul unitaire (`_calculate_cost`), tours partagés par
+  contrat / jour, taxes km et prix carburant par date ;
+- nombre de requêtes constant (une seule requête taxe km pour tous les segments) ;
+- second passage : rien à mettre à jour.
+"""
+
+import pytest
+from sqlalchemy import select
+
+from app.api.tours import _calculate_cost
+from app.models.audit import AuditLog
+from app.models.contract import Contract
+from app.models.tour_stop import TourStop
+from app.services.tour_costing import recalculate_costs
+
+
+@pytest.mark.asyncio
+async def test_bulk_recalculate_matches_single_tour_cost(db_session, planned_tours, sql_recorder):
+    base, tours, _ = planned_tours
+    expected = {}
+    for tour in tours:
+        contract = await db_session.get(Contract, tour.contract_id)
+        stops = (await db_session.execute(
+            select(TourStop.pdv_id, TourStop.sequence_order).where(TourStop.tour_id == tour.id)
+        )).mappings().all()
+        expected[tour.id], _ = await _calculate_cost(
+            db_session, float(tour.total_km), contract, tour.date, base.id, [dict(s) for s in stops],
+        )
+
+    with sql_recorder:
+        result = await recalculate_costs(db_session, "bulk", base_id=base.id)
+    statements = sql_recorder.statements
+
+    assert (result["total"], result["updated"]) == (6, 6)
+    assert set(result["timings_ms"]) >= {"tours", "nb_tours", "fuel_prices", "km_taxes", "update"}
+    assert {t.id: float(t.total_cost) for t in tours} == expected
+    assert sum("from km_tax" in s for s in statements) == 1
+    # + surcharges, faits de coût et leur horloge (lue deux fois), journal timeline /
+    # + surcharges, cost facts and their clock (read twice), timeline log
+    assert len(statements) <= 14
+
+    logs = (await db_session.execute(
+        select(AuditLog).where(AuditLog.action == "RECALCULATE", AuditLog.user == "bulk")
+    )).scalars().all()
+    assert {log.entity_id for log in logs} == set(expected)
+
+    again = await recalculate_costs(db_session, "bulk", base_id=base.id)
+    assert (again["total"], again["updated"]) == (6, 0)
@@ -0,0 +1,78 @@
+"""Tests du moteur de temps de tour / Tour timing engine tests.
+
+- mode pur : mêmes horaires que l'ancien calcul arrêt par arrêt ;
+- mode chargé : nombre de requêtes constant quel que soit le nombre d'arrêts
+  (plus de N+1 PDV / distancier / paramètres).
+"""
+
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.distance_matrix_store import DistanceMatrixSnapshot
+from app.services.tour_timing import TimingContext, compute_tour_times
+
+
+def _ctx(pdvs=None) -> TimingContext:
+    distances = DistanceMatrixSnapshot.from_rows([
+        ("BASE", 1, "PDV", 10, 30.0, 40),
+        ("PDV", 10, "PDV", 11, 5.5, 10),
+        ("PDV", 11, "BASE", 1, 33.0, 45),
+    ])
+    return TimingContext(default_dock=15, default_unload=2, pdvs=pdvs or {}, distances=distances)
+
+
+def test_compute_tour_times_pure():
+    pdvs = {11: SimpleNamespace(dock_time_minutes=20, unload_time_per_eqp_minutes=None)}
+    stops = [
+        {"pdv_id": 10, "sequence_order": 1, "eqp_count": 5},
+        {"pdv_id": 11, "sequence_order": 2, "eqp_count": 2.5},
+    ]
+    enriched, return_time, total = compute_tour_times("04:00", stops, 1, _ctx(pdvs))
+
+    # 04:00 + 40 → 04:40, + 15 + 5×2 → 05:05
+    assert enriched[0]["arrival_time"] == "04:40"
+    assert enriched[0]["departure_time"] == "05:05"
+    assert enriched[0]["distance_from_previous_km"] == 30.0
+    # + 10 → 05:15, dock PDV 20 + 2.5×2 → 05:40 ; retour inverse déduit 45 → 06:25
+    assert enriched[1]["arrival_time"] == "05:15"
+    assert enriched[1]["departure_time"] == "05:40"
+    assert return_time == "06:25"
+    assert total == 145
+
+
+def test_compute_tour_times_empty_and_midnight():
+    enriched, return_time, total = compute_tour_times("08:00", [], 1, _ctx())
+    assert enriched == [] and return_time == "08:00" and total == 0
+
+    stops = [{"pdv_id": 10, "sequence_order": 1, "eqp_count": 0}]
+    _, return_time, total = compute_tour_times("23:30", stops, 1, _ctx())
+    # 23:30 + 40 + 15 + 40 (retour déduit) → lendemain / next day
+    assert return_time == "01:05"
+    assert total == 95
+
+
+@pytest.mark.asyncio
+async def test_calculate_tour_times_constant_queries(db_session, test_region, sql_recorder):
+    from app.api.tours import calculate_tour_times
+    from app.models.pdv import PDV, PDVType
+
+    pdvs = []
+    for _ in range(12):
+        code = f"TT{uuid.uuid4().hex[:5].upper()}"
+        pdvs.append(PDV(code=code, name=code, type=PDVType.HYPER, region_id=test_region.id))
+    db_session.add_all(pdvs)
+    await db_session.commit()
+
+    async def run(n: int) -> int:
+        stops = [
+            {"pdv_id": p.id, "sequence_order": i + 1, "eqp_count": 1}
+            for i, p in enumerate(pdvs[:n])
+        ]
+        with sql_recorder:
+            await calculate_tour_times("05:00", stops, 1, db_session)
+        return len(sql_recorder.statements)
+
+    await run(1)  # réchauffe le distancier / warm the distance snapshot
+    assert await run(2) == await run(12)
@@ -0,0 +1,140 @@
+"""Tests du bus de diffusion entre workers / Cross-worker broadcast bus tests.
+
+Deux hubs (un par « worker ») reliés par un faux canal NOTIFY : un message
+publié sur l'un atteint les clients de l'autre, avec le même cloisonnement
+tenant, sans doublon chez l'émetteur ; la publication n'attend pas un NOTIFY
+lent et la file d'envoi reste bornée.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.api.ws_tracking import TrackingConnectionManager
+from app.services import tracking_bus
+from app.services.tracking_bus import InProcessBackend, PostgresNotifyBackend, make_backend
+
+
+class _FakeWS:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent.append(data)
+
+
+class _FakeChannel:
+    """Canal NOTIFY partagé entre les workers / NOTIFY channel shared by workers."""
+
+    def __init__(self):
+        self.listeners: list[PostgresNotifyBackend] = []
+        self.notified: list[str] = []
+
+    def is_closed(self) -> bool:
+        return False
+
+    async def execute(self, query: str, channel: str, payload: str):
+        assert query == "SELECT pg_notify($1, $2)"
+        self.notified.append(payload)
+        for backend in self.listeners:
+            backend._on_notify(self, 0, channel, payload)
+
+
+async def _worker(channel: _FakeChannel) -> TrackingConnectionManager:
+    mgr = TrackingConnectionManager()
+    backend = PostgresNotifyBackend(mgr.deliver, dsn="postgresql://unused")
+    backend._notify_conn = channel
+    channel.listeners.append(backend)
+    mgr.backend = backend
+    return mgr
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_other_worker_tenant_scoped():
+    channel = _FakeChannel()
+    worker_a, worker_b = await _worker(channel), await _worker(channel)
+    a1, b1, b2, b_admin = _FakeWS(), _FakeWS(), _FakeWS(), _FakeWS()
+    await worker_a.connect(a1, tenant_id=1)
+    await worker_b.connect(b1, tenant_id=1)
+    await worker_b.connect(b2, tenant_id=2)
+    await worker_b.connect(b_admin, tenant_id=None)
+
+    await worker_a.broadcast({"type": "gps_update", "tour_id": 42, "latitude": 50.1}, tenant_id=1, base_id=7)
+    await _settle()
+
+    assert len(channel.notified) == 1
+    assert len(a1.sent) == 1, "l'émetteur ne doit pas recevoir son propre NOTIFY"
+    assert [json.loads(m)["tour_id"] for m in b1.sent] == [42]
+    assert b2.sent == [], "FUITE : un client d'un autre tenant a reçu l'événement"
+    assert len(b_admin.sent) == 1
+    # Base transportée : un abonné à la base 7 du worker B la reçoit / base travels along
+    worker_b.subscribe(b1, bases=[7])
+    await worker_a.broadcast({"type": "stop_event", "tour_id": 43}, tenant_id=1, base_id=8)
+    await _settle()
+    assert len(b1.sent) == 1
+
+
+@pytest.mark.asyncio
+async def test_oversized_or_garbled_payloads(monkeypatch):
+    channel = _FakeChannel()
+    worker = await _worker(channel)
+    ws = _FakeWS()
+    await worker.connect(ws, tenant_id=1)
+
+    monkeypatch.setattr(tracking_bus, "NOTIFY_MAX_BYTES", 50)
+    await worker.broadcast({"type": "alert", "tour_id": 1, "message": "x" * 100}, tenant_id=1)
+    assert channel.notified == []
+    assert len(ws.sent) == 1, "livré localement malgré tout"
+
+    await worker.backend.receive("pas du json")
+    await worker.backend.receive(json.dumps({"o": "autre"}))
+    assert len(ws.sent) == 1
+
+
+@pytest.mark.asyncio
+async def test_publish_does_not_wait_for_notify(monkeypatch):
+    channel = _FakeChannel()
+    released = asyncio.Event()
+    execute = channel.execute
+
+    async def slow_execute(*args):
+        await released.wait()
+        await execute(*args)
+
+    channel.execute = slow_execute
+    monkeypatch.setattr(tracking_bus, "NOTIFY_QUEUE_SIZE", 3)
+    worker = await _worker(channel)
+    ws = _FakeWS()
+    await worker.connect(ws, tenant_id=1)
+
+    for tour_id in range(6):
+        await asyncio.wait_for(worker.broadcast({"type": "gps_update", "tour_id": tour_id}, tenant_id=1), 0.5)
+    assert len(ws.sent) == 6, "livraison locale sans attendre le NOTIFY"
+    assert channel.notified == []
+
+    released.set()
+    await worker.backend.flush()
+    # Le premier était déjà en cours d'envoi ; file de 3, les plus anciens perdus /
+    # The first was already being sent; queue of 3, the oldest dropped
+    assert [json.loads(p)["m"]["tour_id"] for p in channel.notified] == [0, 3, 4, 5]
+    assert worker.backend.dropped == 2
+
+
+def test_make_backend():
+    async def deliver(message, tenant_id, base_id):
+        pass
+
+    assert isinstance(make_backend(deliver), InProcessBackend)
+    with pytest.raises(ValueError):
+        make_backend(deliver, "kafka")
+    with pytest.raises(ValueError):
+        make_backend(deliver, "postgres")  # base de test SQLite
@@ -0,0 +1,120 @@
+"""Tests du hub de diffusion WebSocket / WebSocket broadcast hub tests.
+
+- un client lent ne bloque pas l'émetteur ; ses `gps_update` en attente sont
+  fusionnés par tour, les autres messages conservés dans l'ordre ;
+- message sérialisé une seule fois pour tous les destinataires ;
+- abonnements par base / tour (base retenue par tour) ;
+- file pleine sans position à écarter : connexion fermée.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.api import ws_tracking
+from app.api.ws_tracking import TrackingConnectionManager
+
+
+class _FakeWS:
+    def __init__(self, gate: asyncio.Event | None = None):
+        self.sent: list[str] = []
+        self.gate = gate
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = code
+
+
+def _gps(tour_id: int, latitude: float) -> dict:
+    return {"type": "gps_update", "tour_id": tour_id, "latitude": latitude}
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_and_gps_coalesces():
+    mgr = TrackingConnectionManager()
+    gate = asyncio.Event()
+    slow, fast = _FakeWS(gate), _FakeWS()
+    await mgr.connect(slow, tenant_id=1)
+    await mgr.connect(fast, tenant_id=1)
+
+    await mgr.broadcast(_gps(7, 50.0), tenant_id=1)  # en cours d'envoi, bloqué
+    for k in range(1, 6):
+        await asyncio.wait_for(mgr.broadcast(_gps(7, 50.0 + k), tenant_id=1), timeout=1)
+    await mgr.broadcast({"type": "alert", "tour_id": 7}, tenant_id=1)
+
+    assert len(fast.sent) == 7
+    assert slow.sent == []
+
+    gate.set()
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert slow.sent == [fast.sent[0], fast.sent[5], fast.sent[6]]
+    assert mgr._connections[slow].coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_message_serialized_once(monkeypatch):
+    calls = []
+    real_dumps = ws_tracking.json.dumps
+    monkeypatch.setattr(ws_tracking.json, "dumps", lambda *a, **k: calls.append(1) or real_dumps(*a, **k))
+    mgr = TrackingConnectionManager()
+    clients = [_FakeWS() for _ in range(5)]
+    for ws in clients:
+        await mgr.connect(ws, tenant_id=1)
+    await mgr.broadcast(_gps(1, 50.0), tenant_id=1)
+    assert len(calls) == 1
+    assert all(ws.sent[0] is clients[0].sent[0] for ws in clients)
+
+
+@pytest.mark.asyncio
+async def test_topic_subscriptions():
+    mgr = TrackingConnectionManager()
+    by_base, by_tour, everything = _FakeWS(), _FakeWS(), _FakeWS()
+    for ws in (by_base, by_tour, everything):
+        await mgr.connect(ws, tenant_id=1)
+    mgr.subscribe(by_base, bases=[3])
+    mgr.subscribe(by_tour, tours=[11])
+
+    await mgr.broadcast(_gps(10, 50.0), tenant_id=1, base_id=3)
+    await mgr.broadcast(_gps(11, 50.0), tenant_id=1, base_id=4)
+    # Base retenue depuis le gps_update du tour 11 / base remembered from tour 11's gps_update
+    await mgr.broadcast({"type": "stop_event", "tour_id": 11}, tenant_id=1)
+    await mgr.broadcast({"type": "tour_assigned", "tour_id": 10}, tenant_id=1)
+    await mgr.broadcast({"type": "notice"}, tenant_id=1)
+
+    def types(ws):
+        return [(m["type"], m.get("tour_id")) for m in map(json.loads, ws.sent)]
+
+    assert types(by_base) == [("gps_update", 10), ("tour_assigned", 10), ("notice", None)]
+    assert types(by_tour) == [("gps_update", 11), ("stop_event", 11), ("notice", None)]
+    assert len(everything.sent) == 5
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_connection(monkeypatch):
+    monkeypatch.setattr(ws_tracking, "WS_QUEUE_MAX_MESSAGES", 2)
+    mgr = TrackingConnectionManager()
+    stuck = _FakeWS(asyncio.Event())
+    await mgr.connect(stuck, tenant_id=1)
+
+    await mgr.broadcast({"type": "alert", "tour_id": 1}, tenant_id=1)  # en cours d'envoi
+    await mgr.broadcast(_gps(1, 50.0), tenant_id=1)
+    await mgr.broadcast({"type": "alert", "tour_id": 1}, tenant_id=1)
+    # Pleine : la position en attente est écartée / full: the pending position is dropped
+    await mgr.broadcast({"type": "alert", "tour_id": 1}, tenant_id=1)
+    assert stuck in mgr._connections
+    # Plus rien à écarter : connexion fermée / nothing left to drop: connection closed
+    await mgr.broadcast({"type": "alert", "tour_id": 1}, tenant_id=1)
+    await asyncio.sleep(0)
+    assert stuck not in mgr._connections
+    assert stuck.closed == 1013
+    assert mgr.active_connections == []